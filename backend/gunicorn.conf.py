@@ -0,0 +1,17 @@
+# Configuración de gunicorn (gunicorn -c gunicorn.conf.py wsgi:app)
+#
+# The gevent worker serves every request in a greenlet and makes socket I/O
+# (MySQL via PyMySQL, Ollama/OpenAI via httpx) cooperative, so a chat or task
+# stream that waits minutes on the model costs a greenlet instead of pinning a
+# whole sync worker. Set GUNICORN_WORKER_CLASS=sync to go back to the previous
+# behaviour.
+import os
+
+bind = os.environ.get("GUNICORN_BIND") or "0.0.0.0:6000"
+workers = int(os.environ.get("GUNICORN_WORKERS") or 4)
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS") or "gevent"
+# Concurrent requests (open streams included) per gevent worker
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS") or 1000)
+# Async workers heartbeat while streams are open; this only bounds stuck workers
+timeout = int(os.environ.get("GUNICORN_TIMEOUT") or 120)
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE") or 5)
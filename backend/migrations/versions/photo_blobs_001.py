@@ -0,0 +1,32 @@
+"""add tbl_photo_blobs for the content-addressed pump photo store
+
+Revision ID: photo_blobs_001
+Revises: pumps_keyset_index_001
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "photo_blobs_001"
+down_revision = "pumps_keyset_index_001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "tbl_photo_blobs",
+        sa.Column("content_hash", sa.String(length=64), nullable=False),
+        sa.Column("extension", sa.String(length=10), nullable=False),
+        sa.Column("size_bytes", sa.Integer(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("content_hash"),
+    )
+
+
+def downgrade():
+    op.drop_table("tbl_photo_blobs")
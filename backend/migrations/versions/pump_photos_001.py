@@ -0,0 +1,124 @@
+"""move pump photos from the tbl_pumps.photos JSON column into tbl_pump_photos
+
+Revision ID: pump_photos_001
+Revises: photo_blobs_001
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+
+import json
+import re
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "pump_photos_001"
+down_revision = "photo_blobs_001"
+branch_labels = None
+depends_on = None
+
+BLOB_NAME_RE = re.compile(r"^([0-9a-f]{64})\.([a-z0-9]{1,10})$")
+BATCH_SIZE = 1000
+
+
+def _photo_names(raw):
+    try:
+        names = json.loads(raw) if raw else []
+    except (TypeError, ValueError):
+        return []
+    return [name for name in names if isinstance(name, str)]
+
+
+def upgrade():
+    op.create_table(
+        "tbl_pump_photos",
+        sa.Column("ccn_pump_photo", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("ccn_pump", sa.String(length=64), nullable=False),
+        sa.Column("filename", sa.String(length=80), nullable=False),
+        sa.Column("size_bytes", sa.Integer(), nullable=True),
+        sa.Column("content_hash", sa.String(length=64), nullable=True),
+        sa.Column("width", sa.Integer(), nullable=True),
+        sa.Column("height", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["ccn_pump"], ["tbl_pumps.ccn_pump"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("ccn_pump_photo"),
+        sa.UniqueConstraint("ccn_pump", "filename", name="uq_pump_photos_pump_file"),
+    )
+    op.create_index("idx_pump_photos_content_hash", "tbl_pump_photos", ["content_hash"])
+
+    # Backfill one row per entry of every pump's photos list, in list order
+    bind = op.get_bind()
+    blob_sizes = dict(
+        bind.execute(sa.text("SELECT content_hash, size_bytes FROM tbl_photo_blobs"))
+    )
+    photos_table = sa.table(
+        "tbl_pump_photos",
+        sa.column("ccn_pump", sa.String),
+        sa.column("filename", sa.String),
+        sa.column("size_bytes", sa.Integer),
+        sa.column("content_hash", sa.String),
+        sa.column("created_at", sa.DateTime),
+    )
+    now = datetime.now()
+    rows = []
+    pumps = bind.execute(
+        sa.text(
+            "SELECT ccn_pump, photos FROM tbl_pumps "
+            "WHERE photos IS NOT NULL AND photos != '[]'"
+        )
+    ).fetchall()
+    for ccn_pump, raw in pumps:
+        for filename in dict.fromkeys(_photo_names(raw)):
+            match = BLOB_NAME_RE.match(filename)
+            content_hash = match.group(1) if match else None
+            rows.append(
+                {
+                    "ccn_pump": ccn_pump,
+                    "filename": filename[:80],
+                    "size_bytes": blob_sizes.get(content_hash),
+                    "content_hash": content_hash,
+                    "created_at": now,
+                }
+            )
+            if len(rows) >= BATCH_SIZE:
+                op.bulk_insert(photos_table, rows)
+                rows = []
+    if rows:
+        op.bulk_insert(photos_table, rows)
+
+    # Reference counts are now the number of photo rows per blob
+    op.execute(
+        "UPDATE tbl_photo_blobs SET ref_count = ("
+        "SELECT COUNT(*) FROM tbl_pump_photos "
+        "WHERE tbl_pump_photos.content_hash = tbl_photo_blobs.content_hash)"
+    )
+
+    with op.batch_alter_table("tbl_pumps", schema=None) as batch_op:
+        batch_op.drop_column("photos")
+
+
+def downgrade():
+    with op.batch_alter_table("tbl_pumps", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("photos", sa.Text(), nullable=True))
+
+    bind = op.get_bind()
+    photos = {}
+    for ccn_pump, filename in bind.execute(
+        sa.text(
+            "SELECT ccn_pump, filename FROM tbl_pump_photos ORDER BY ccn_pump_photo"
+        )
+    ):
+        photos.setdefault(ccn_pump, []).append(filename)
+    for ccn_pump, names in photos.items():
+        bind.execute(
+            sa.text("UPDATE tbl_pumps SET photos = :photos WHERE ccn_pump = :ccn"),
+            {"photos": json.dumps(names), "ccn": ccn_pump},
+        )
+    op.execute("UPDATE tbl_pumps SET photos = '[]' WHERE photos IS NULL")
+
+    op.drop_index("idx_pump_photos_content_hash", table_name="tbl_pump_photos")
+    op.drop_table("tbl_pump_photos")
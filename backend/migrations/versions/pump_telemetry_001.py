@@ -0,0 +1,82 @@
+"""add pump telemetry readings, rollups and rollup watermarks
+
+Revision ID: pump_telemetry_001
+Revises: pump_photos_001
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "pump_telemetry_001"
+down_revision = "pump_photos_001"
+branch_labels = None
+depends_on = None
+
+METRICS = [
+    "flow_rate",
+    "pressure",
+    "power",
+    "efficiency",
+    "voltage",
+    "current",
+    "power_factor",
+]
+
+
+def upgrade():
+    op.create_table(
+        "tbl_pump_readings",
+        sa.Column(
+            "ccn_pump_reading",
+            sa.BigInteger().with_variant(sa.Integer(), "sqlite"),
+            autoincrement=True,
+            nullable=False,
+        ),
+        sa.Column("ccn_pump", sa.String(length=64), nullable=False),
+        sa.Column("recorded_at", sa.DateTime(), nullable=False),
+        *[sa.Column(metric, sa.Float(), nullable=True) for metric in METRICS],
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["ccn_pump"], ["tbl_pumps.ccn_pump"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("ccn_pump_reading"),
+    )
+    op.create_index(
+        "idx_pump_readings_pump_recorded_at",
+        "tbl_pump_readings",
+        ["ccn_pump", "recorded_at"],
+    )
+
+    op.create_table(
+        "tbl_pump_reading_rollups",
+        sa.Column("ccn_pump", sa.String(length=64), nullable=False),
+        sa.Column("resolution", sa.String(length=3), nullable=False),
+        sa.Column("bucket_start", sa.DateTime(), nullable=False),
+        sa.Column("metric", sa.String(length=20), nullable=False),
+        sa.Column("sample_count", sa.Integer(), nullable=False),
+        sa.Column("value_sum", sa.Float(), nullable=False),
+        sa.Column("value_min", sa.Float(), nullable=False),
+        sa.Column("value_max", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["ccn_pump"], ["tbl_pumps.ccn_pump"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("ccn_pump", "resolution", "bucket_start", "metric"),
+    )
+
+    op.create_table(
+        "tbl_rollup_watermarks",
+        sa.Column("name", sa.String(length=50), nullable=False),
+        sa.Column("last_id", sa.BigInteger(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+
+
+def downgrade():
+    op.drop_table("tbl_rollup_watermarks")
+    op.drop_table("tbl_pump_reading_rollups")
+    op.drop_index("idx_pump_readings_pump_recorded_at", table_name="tbl_pump_readings")
+    op.drop_table("tbl_pump_readings")
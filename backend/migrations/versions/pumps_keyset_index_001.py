@@ -0,0 +1,27 @@
+"""add (created_at, ccn_pump) index to tbl_pumps for keyset pagination
+
+Revision ID: pumps_keyset_index_001
+Revises: add_is_public_ai_tasks
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "pumps_keyset_index_001"
+down_revision = "add_is_public_ai_tasks"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "idx_pumps_created_at_ccn_pump",
+        "tbl_pumps",
+        ["created_at", "ccn_pump"],
+    )
+
+
+def downgrade():
+    op.drop_index("idx_pumps_created_at_ccn_pump", table_name="tbl_pumps")
@@ -0,0 +1,33 @@
+"""add next_maintenance indexes to tbl_pumps for maintenance-due range scans
+
+Revision ID: pumps_maintenance_index_001
+Revises: pump_telemetry_001
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "pumps_maintenance_index_001"
+down_revision = "pump_telemetry_001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "idx_pumps_next_maintenance",
+        "tbl_pumps",
+        ["next_maintenance"],
+    )
+    op.create_index(
+        "idx_pumps_status_next_maintenance",
+        "tbl_pumps",
+        ["status", "next_maintenance"],
+    )
+
+
+def downgrade():
+    op.drop_index("idx_pumps_status_next_maintenance", table_name="tbl_pumps")
+    op.drop_index("idx_pumps_next_maintenance", table_name="tbl_pumps")
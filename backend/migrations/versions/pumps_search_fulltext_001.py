@@ -0,0 +1,33 @@
+"""add a FULLTEXT index over model, serial_number and location for pump search
+
+Revision ID: pumps_search_fulltext_001
+Revises: pumps_maintenance_index_001
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "pumps_search_fulltext_001"
+down_revision = "pumps_maintenance_index_001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FULLTEXT only exists on MySQL; other backends search with LIKE
+    if op.get_bind().dialect.name != "mysql":
+        return
+    op.create_index(
+        "ft_pumps_search",
+        "tbl_pumps",
+        ["model", "serial_number", "location"],
+        mysql_prefix="FULLTEXT",
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "mysql":
+        return
+    op.drop_index("ft_pumps_search", table_name="tbl_pumps")
@@ -0,0 +1,26 @@
+"""add tbl_users.updated_at so owner renames change the pump fleet version
+
+Revision ID: users_updated_at_001
+Revises: pumps_search_fulltext_001
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "users_updated_at_001"
+down_revision = "pumps_search_fulltext_001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("tbl_users", sa.Column("updated_at", sa.DateTime(), nullable=True))
+    op.create_index("idx_users_updated_at", "tbl_users", ["updated_at"])
+
+
+def downgrade():
+    op.drop_index("idx_users_updated_at", table_name="tbl_users")
+    op.drop_column("tbl_users", "updated_at")
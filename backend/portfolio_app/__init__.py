@@ -78,6 +78,11 @@ def create_app():
     from portfolio_app.models import tbl_users
     from portfolio_app.models import tbl_token_block_list
     from portfolio_app.models import tbl_pumps
+    from portfolio_app.models import tbl_photo_blobs
+    from portfolio_app.models import tbl_pump_photos
+    from portfolio_app.models import tbl_pump_readings
+    from portfolio_app.models import tbl_pump_reading_rollups
+    from portfolio_app.models import tbl_rollup_watermarks
     from portfolio_app.models import tbl_roles
     from portfolio_app.models import tbl_permissions
     from portfolio_app.models import tbl_role_permissions
@@ -109,6 +114,9 @@ def create_app():
     from portfolio_app.resources.resource_posts import blueprint_api_post
     from portfolio_app.resources.resource_categories import blueprint_api_category
     from portfolio_app.resources.resource_pumps import blueprint_api_pump
+    from portfolio_app.resources.resource_pump_telemetry import (
+        blueprint_api_pump_telemetry,
+    )
     from portfolio_app.resources.resource_analysis import blueprint_api_analysis
     from portfolio_app.resources.resource_roles import blueprint_api_roles
     from portfolio_app.resources.resource_swagger import blueprint_api_swagger
@@ -129,6 +137,7 @@ def create_app():
     app.register_blueprint(blueprint_api_post, url_prefix="")
     app.register_blueprint(blueprint_api_category, url_prefix="")
     app.register_blueprint(blueprint_api_pump, url_prefix="")
+    app.register_blueprint(blueprint_api_pump_telemetry, url_prefix="")
     app.register_blueprint(blueprint_api_analysis, url_prefix="")
     app.register_blueprint(blueprint_api_roles, url_prefix="")
     app.register_blueprint(blueprint_api_swagger, url_prefix="")
@@ -427,6 +427,39 @@ def list_audit_logs_command(limit):
         click.echo(f"❌ Error listing audit logs: {str(e)}")
 
 
+@click.command("rollup-telemetry")
+@click.option(
+    "--settle-seconds",
+    type=float,
+    default=None,
+    help="Solo lecturas ingeridas hace al menos estos segundos",
+)
+@with_appcontext
+def rollup_telemetry_command(settle_seconds):
+    """Agregar las lecturas de telemetría pendientes en los rollups 1m/1h/1d"""
+    from portfolio_app.services.pump_telemetry_service import PumpTelemetryService
+
+    folded = PumpTelemetryService.rollup(settle_seconds=settle_seconds)
+    click.echo(f"📈 Lecturas agregadas: {folded}")
+    click.echo(f"⏳ Pendientes: {PumpTelemetryService.pending_readings()}")
+
+
+@click.command("sweep-photos")
+@click.option(
+    "--grace-seconds",
+    type=float,
+    default=None,
+    help="Solo blobs creados hace al menos estos segundos",
+)
+@with_appcontext
+def sweep_photos_command(grace_seconds):
+    """Eliminar los blobs de fotos que dejaron subidas fallidas"""
+    from portfolio_app.services.photo_store_service import PhotoStore
+
+    removed = PhotoStore.sweep_orphans(grace_seconds=grace_seconds)
+    click.echo(f"🧹 Blobs eliminados: {len(removed)}")
+
+
 def register_commands(app):
     """Registrar comandos personalizados"""
     app.cli.add_command(cleanup_static_command)
@@ -439,3 +472,5 @@ def register_commands(app):
     app.cli.add_command(list_users_command)
     app.cli.add_command(reset_password_command)
     app.cli.add_command(list_audit_logs_command)
+    app.cli.add_command(rollup_telemetry_command)
+    app.cli.add_command(sweep_photos_command)
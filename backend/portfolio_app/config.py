@@ -36,6 +36,22 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = os.path.join("portfolio_app", "static", "pumps")
     ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
+    # Content-addressed photo store (sharded by SHA-256)
+    PHOTO_STORE_ROOT = os.path.join("portfolio_app", "static", "photo_store")
+    # nginx "internal" location aliased to PHOTO_STORE_ROOT; when set, photo
+    # responses carry X-Accel-Redirect instead of the file body
+    PHOTO_ACCEL_REDIRECT_PREFIX = os.environ.get("PHOTO_ACCEL_REDIRECT_PREFIX") or ""
+    # Longest life of the in-memory photo ownership index; photo changes made
+    # by this worker rebuild it at once, other workers' deletes after this
+    PHOTO_INDEX_MAX_AGE_SECONDS = float(
+        os.environ.get("PHOTO_INDEX_MAX_AGE_SECONDS") or 300
+    )
+    # Age after which flask sweep-photos removes blobs left unreferenced by
+    # failed uploads
+    PHOTO_ORPHAN_GRACE_SECONDS = float(
+        os.environ.get("PHOTO_ORPHAN_GRACE_SECONDS") or 3600
+    )
+    USE_X_SENDFILE = os.environ.get("USE_X_SENDFILE", "False").lower() == "true"
 
     # Email configuration (Outlook/Hotmail)
     MAIL_SERVER = os.environ.get("MAIL_SERVER") or "smtp-mail.outlook.com"
@@ -52,6 +68,87 @@ class Config:
     # OpenAI configuration
     OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 
+    # Pump analysis snapshot: how often to check for writes made by other workers
+    PUMP_SNAPSHOT_REVALIDATE_SECONDS = float(
+        os.environ.get("PUMP_SNAPSHOT_REVALIDATE_SECONDS") or 5.0
+    )
+    # Telemetry rollups only fold readings ingested at least this long ago, so
+    # ingest transactions still in flight are not skipped by the watermark
+    TELEMETRY_ROLLUP_SETTLE_SECONDS = float(
+        os.environ.get("TELEMETRY_ROLLUP_SETTLE_SECONDS") or 30.0
+    )
+    # Maintenance summary refresh period; 0 disables the background thread
+    MAINTENANCE_SCHEDULER_INTERVAL_SECONDS = float(
+        os.environ.get("MAINTENANCE_SCHEDULER_INTERVAL_SECONDS") or 300.0
+    )
+    # Pump search: "memory" keeps a trigram index per worker, "database" uses
+    # the FULLTEXT index (e.g. when workers share one cache). Fleets larger
+    # than PUMP_SEARCH_MAX_INDEXED_PUMPS always use the database.
+    PUMP_SEARCH_BACKEND = os.environ.get("PUMP_SEARCH_BACKEND") or "memory"
+    PUMP_SEARCH_MAX_INDEXED_PUMPS = int(
+        os.environ.get("PUMP_SEARCH_MAX_INDEXED_PUMPS") or 250000
+    )
+    # Analysis chat: estimated token limit of the pump data context, and how
+    # many client-supplied pumpsData payloads keep their built context
+    ANALYSIS_CONTEXT_TOKEN_BUDGET = int(
+        os.environ.get("ANALYSIS_CONTEXT_TOKEN_BUDGET") or 6000
+    )
+    ANALYSIS_CONTEXT_CACHE_SIZE = int(
+        os.environ.get("ANALYSIS_CONTEXT_CACHE_SIZE") or 16
+    )
+    # Most pumps the chat retrieval stage puts in the prompt per question
+    ANALYSIS_RETRIEVAL_LIMIT = int(os.environ.get("ANALYSIS_RETRIEVAL_LIMIT") or 25)
+    # Shared LLM clients: read timeouts of local (Ollama) and remote backends,
+    # and the keep-alive pool of each (base_url, api_key)
+    LLM_LOCAL_TIMEOUT_SECONDS = float(
+        os.environ.get("LLM_LOCAL_TIMEOUT_SECONDS") or 300
+    )
+    LLM_REMOTE_TIMEOUT_SECONDS = float(
+        os.environ.get("LLM_REMOTE_TIMEOUT_SECONDS") or 60
+    )
+    LLM_CONNECT_TIMEOUT_SECONDS = float(
+        os.environ.get("LLM_CONNECT_TIMEOUT_SECONDS") or 5
+    )
+    LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS") or 20)
+    LLM_MAX_KEEPALIVE_CONNECTIONS = int(
+        os.environ.get("LLM_MAX_KEEPALIVE_CONNECTIONS") or 10
+    )
+    LLM_KEEPALIVE_EXPIRY_SECONDS = float(
+        os.environ.get("LLM_KEEPALIVE_EXPIRY_SECONDS") or 30
+    )
+    # Longest run of a streamed AI task before it is marked failed
+    AI_TASK_TIMEOUT_SECONDS = float(os.environ.get("AI_TASK_TIMEOUT_SECONDS") or 300)
+    # Cached chat answers: lifetime and total size of the response cache
+    LLM_RESPONSE_CACHE_TTL_SECONDS = float(
+        os.environ.get("LLM_RESPONSE_CACHE_TTL_SECONDS") or 3600
+    )
+    LLM_RESPONSE_CACHE_MAX_BYTES = int(
+        os.environ.get("LLM_RESPONSE_CACHE_MAX_BYTES") or 8 * 1024 * 1024
+    )
+    # Inference admission control (per worker): concurrent model calls per
+    # backend, waiters allowed per backend and per user, and the longest wait
+    LLM_LOCAL_MAX_CONCURRENCY = int(os.environ.get("LLM_LOCAL_MAX_CONCURRENCY") or 2)
+    LLM_REMOTE_MAX_CONCURRENCY = int(os.environ.get("LLM_REMOTE_MAX_CONCURRENCY") or 8)
+    LLM_QUEUE_MAX_DEPTH = int(os.environ.get("LLM_QUEUE_MAX_DEPTH") or 32)
+    LLM_QUEUE_MAX_PER_USER = int(os.environ.get("LLM_QUEUE_MAX_PER_USER") or 4)
+    LLM_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("LLM_QUEUE_TIMEOUT_SECONDS") or 60)
+    # AI insights: age after which an unchanged fingerprint is regenerated in
+    # the background, and number of insight slots (dashboard + charts) kept
+    INSIGHT_CACHE_TTL_SECONDS = float(
+        os.environ.get("INSIGHT_CACHE_TTL_SECONDS") or 21600
+    )
+    INSIGHT_CACHE_SIZE = int(os.environ.get("INSIGHT_CACHE_SIZE") or 64)
+    # Wait after a failed background refresh before the slot is retried
+    INSIGHT_REFRESH_RETRY_SECONDS = float(
+        os.environ.get("INSIGHT_REFRESH_RETRY_SECONDS") or 60
+    )
+    # AI agents: services kept per worker, and seconds between background
+    # health probes of one Ollama backend
+    AGENT_CACHE_SIZE = int(os.environ.get("AGENT_CACHE_SIZE") or 32)
+    AGENT_HEALTH_PROBE_INTERVAL_SECONDS = float(
+        os.environ.get("AGENT_HEALTH_PROBE_INTERVAL_SECONDS") or 300
+    )
+
 
 class DevelopmentConfig(Config):
     """Development configuration."""
@@ -87,6 +184,9 @@ class TestingConfig(Config):
     # JWT
     JWT_SECRET_KEY = "test-jwt-secret"
 
+    # No background maintenance scheduler thread in tests
+    MAINTENANCE_SCHEDULER_INTERVAL_SECONDS = 0
+
 
 class ProductionConfig(Config):
     """Production configuration."""
@@ -0,0 +1,43 @@
+import hashlib
+from functools import wraps
+from flask import Response, make_response, request
+
+
+def conditional_on_fleet_version(f):
+    """
+    Decorador para GETs de bombas con validadores ETag / Last-Modified
+
+    The strong ETag combines the fleet version with the request path, query and
+    Accept header, so each representation gets its own tag. A matching
+    If-None-Match (or, without it, If-Modified-Since) is answered with 304
+    before the view runs, without querying pump data or serializing anything.
+    """
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        from portfolio_app.services.pump_snapshot_service import get_fleet_version
+
+        token, last_modified = get_fleet_version().current()
+        key = f"{token}|{request.full_path}|{request.headers.get('Accept', '')}"
+        etag = hashlib.sha1(key.encode()).hexdigest()
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        else:
+            since = request.if_modified_since
+            not_modified = bool(since and last_modified and last_modified <= since)
+
+        if not_modified:
+            response = Response(status=304)
+        else:
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag)
+        if last_modified:
+            response.last_modified = last_modified
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+
+    return decorated_function
@@ -0,0 +1,21 @@
+from datetime import datetime
+from portfolio_app import db
+
+
+class PhotoBlob(db.Model):
+    """Content-addressed photo file shared by every pump that references it"""
+
+    __tablename__ = "tbl_photo_blobs"
+    content_hash = db.Column(db.String(64), primary_key=True)  # SHA-256 hex
+    extension = db.Column(db.String(10), nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=False)
+    # Number of tbl_pump_photos rows that reference this blob
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    @property
+    def filename(self):
+        return f"{self.content_hash}.{self.extension}"
+
+    def __repr__(self):
+        return f"PhotoBlob('{self.filename}', refs: {self.ref_count})"
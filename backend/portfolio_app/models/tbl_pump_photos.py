@@ -0,0 +1,30 @@
+from datetime import datetime
+from portfolio_app import db
+
+
+class PumpPhoto(db.Model):
+    """One photo attached to a pump, in upload order"""
+
+    __tablename__ = "tbl_pump_photos"
+    ccn_pump_photo = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    ccn_pump = db.Column(
+        db.String(64),
+        db.ForeignKey("tbl_pumps.ccn_pump", ondelete="CASCADE"),
+        nullable=False,
+    )
+    filename = db.Column(db.String(80), nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=True)
+    # SHA-256 of the content for photos in the blob store; NULL for legacy uploads
+    content_hash = db.Column(db.String(64), nullable=True)
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        # One row per (pump, file); also backs "photos of these pumps" IN lookups
+        db.UniqueConstraint("ccn_pump", "filename", name="uq_pump_photos_pump_file"),
+        db.Index("idx_pump_photos_content_hash", "content_hash"),
+    )
+
+    def __repr__(self):
+        return f"PumpPhoto('{self.ccn_pump}', '{self.filename}')"
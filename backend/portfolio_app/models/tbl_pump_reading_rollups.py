@@ -0,0 +1,25 @@
+from portfolio_app import db
+
+
+class PumpReadingRollup(db.Model):
+    """Aggregate of one metric of a pump over a 1m, 1h or 1d bucket"""
+
+    __tablename__ = "tbl_pump_reading_rollups"
+    ccn_pump = db.Column(
+        db.String(64),
+        db.ForeignKey("tbl_pumps.ccn_pump", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    resolution = db.Column(db.String(3), primary_key=True)  # "1m", "1h", "1d"
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    metric = db.Column(db.String(20), primary_key=True)
+    sample_count = db.Column(db.Integer, nullable=False)
+    value_sum = db.Column(db.Float, nullable=False)
+    value_min = db.Column(db.Float, nullable=False)
+    value_max = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return (
+            f"PumpReadingRollup('{self.ccn_pump}', {self.resolution}, "
+            f"'{self.bucket_start}', {self.metric})"
+        )
@@ -0,0 +1,38 @@
+from datetime import datetime
+from portfolio_app import db
+
+
+class PumpReading(db.Model):
+    """One telemetry sample of a pump (append-only)"""
+
+    __tablename__ = "tbl_pump_readings"
+    ccn_pump_reading = db.Column(
+        db.BigInteger().with_variant(db.Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
+    ccn_pump = db.Column(
+        db.String(64),
+        db.ForeignKey("tbl_pumps.ccn_pump", ondelete="CASCADE"),
+        nullable=False,
+    )
+    # Momento de la medición en el equipo
+    recorded_at = db.Column(db.DateTime, nullable=False)
+    # A reading may carry any subset of the metrics
+    flow_rate = db.Column(db.Float, nullable=True)
+    pressure = db.Column(db.Float, nullable=True)
+    power = db.Column(db.Float, nullable=True)
+    efficiency = db.Column(db.Float, nullable=True)
+    voltage = db.Column(db.Float, nullable=True)
+    current = db.Column(db.Float, nullable=True)
+    power_factor = db.Column(db.Float, nullable=True)
+    # Momento de la ingesta; rollups only read readings older than a settle delay
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        # Backs per-pump range scans and the "latest reading" lookups of ingest
+        db.Index("idx_pump_readings_pump_recorded_at", "ccn_pump", "recorded_at"),
+    )
+
+    def __repr__(self):
+        return f"PumpReading('{self.ccn_pump}', '{self.recorded_at}')"
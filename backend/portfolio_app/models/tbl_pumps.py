@@ -2,8 +2,8 @@ from datetime import datetime
 import hashlib
 import uuid
 import os
-import json
 from portfolio_app import db
+from portfolio_app.models.tbl_pump_photos import PumpPhoto
 
 
 class Pump(db.Model):
@@ -29,10 +29,23 @@ class Pump(db.Model):
     power_factor = db.Column(db.Float, nullable=False)
     last_maintenance = db.Column(db.DateTime, nullable=False)
     next_maintenance = db.Column(db.DateTime, nullable=False)
-    # Campo para almacenar las rutas de las fotografías como JSON array
-    photos = db.Column(db.Text, nullable=True, default="[]")
     user_id = db.Column(db.Integer, db.ForeignKey("tbl_users.ccn_user"), nullable=False)
     user = db.relationship("User", backref="pumps")
+    # Fotografías en tbl_pump_photos, en orden de subida
+    photo_records = db.relationship(
+        "PumpPhoto",
+        order_by="PumpPhoto.ccn_pump_photo",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+    __table_args__ = (
+        # Backs keyset (cursor) pagination ordered by (created_at, ccn_pump)
+        db.Index("idx_pumps_created_at_ccn_pump", "created_at", "ccn_pump"),
+        # Back maintenance-due range scans, overall and per status
+        db.Index("idx_pumps_next_maintenance", "next_maintenance"),
+        db.Index("idx_pumps_status_next_maintenance", "status", "next_maintenance"),
+    )
 
     def __init__(
         self,
@@ -68,16 +81,21 @@ class Pump(db.Model):
         self.last_maintenance = last_maintenance
         self.next_maintenance = next_maintenance
         self.user_id = user_id
-        self.photos = json.dumps(photos or [])
+        for photo in photos or []:
+            self.add_photo(photo)
         self.created_at = datetime.now()
         self.updated_at = datetime.now()
-        # Generate hash for ccn_pump using model, serial_number and uuid for uniqueness
-        unique_string = f"{model}_{serial_number}_{str(uuid.uuid4())}"
-        self.ccn_pump = hashlib.sha256(unique_string.encode()).hexdigest()
+        self.ccn_pump = Pump.generate_ccn(model, serial_number)
 
         # Crear directorio para las fotos de esta bomba
         self._create_pump_directory()
 
+    @staticmethod
+    def generate_ccn(model, serial_number):
+        """Generate hash for ccn_pump using model, serial_number and uuid for uniqueness"""
+        unique_string = f"{model}_{serial_number}_{str(uuid.uuid4())}"
+        return hashlib.sha256(unique_string.encode()).hexdigest()
+
     def _create_pump_directory(self):
         """Crear directorio específico para las fotos de esta bomba"""
         pump_dir = os.path.join("portfolio_app", "static", "pumps", self.ccn_pump)
@@ -85,27 +103,28 @@ class Pump(db.Model):
         return pump_dir
 
     def get_photos_list(self):
-        """Obtener la lista de fotos como array de Python"""
-        try:
-            return json.loads(self.photos) if self.photos else []
-        except (json.JSONDecodeError, TypeError):
-            return []
+        """Obtener la lista de nombres de fotos en orden de subida"""
+        return [photo.filename for photo in self.photo_records]
 
-    def add_photo(self, photo_filename):
-        """Agregar una nueva foto a la lista"""
-        photos_list = self.get_photos_list()
-        if photo_filename not in photos_list:
-            photos_list.append(photo_filename)
-            self.photos = json.dumps(photos_list)
+    def add_photo(self, photo_filename, **details):
+        """
+        Agregar una nueva foto
+
+        Each photo is its own tbl_pump_photos row, so concurrent uploads to the
+        same pump insert independently. ``details`` may carry size_bytes,
+        content_hash, width and height.
+        """
+        if photo_filename not in self.get_photos_list():
+            self.photo_records.append(PumpPhoto(filename=photo_filename, **details))
             self.updated_at = datetime.now()
 
     def remove_photo(self, photo_filename):
-        """Remover una foto de la lista"""
-        photos_list = self.get_photos_list()
-        if photo_filename in photos_list:
-            photos_list.remove(photo_filename)
-            self.photos = json.dumps(photos_list)
-            self.updated_at = datetime.now()
+        """Remover una foto"""
+        for photo in self.photo_records:
+            if photo.filename == photo_filename:
+                self.photo_records.remove(photo)
+                self.updated_at = datetime.now()
+                break
 
     def get_pump_directory(self):
         """Obtener la ruta del directorio de fotos de esta bomba"""
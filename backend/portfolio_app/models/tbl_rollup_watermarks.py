@@ -0,0 +1,16 @@
+from datetime import datetime
+from portfolio_app import db
+
+
+class RollupWatermark(db.Model):
+    """Last source row folded into the rollups of an append-only table"""
+
+    __tablename__ = "tbl_rollup_watermarks"
+    name = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(
+        db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now
+    )
+
+    def __repr__(self):
+        return f"RollupWatermark('{self.name}', {self.last_id})"
@@ -12,11 +12,18 @@ class User(db.Model):
     email = db.Column(db.String(100), unique=True, nullable=False)
     password = db.Column(db.String(300), nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    # Pump payloads embed owner names, so renames move the pump fleet version
+    updated_at = db.Column(
+        db.DateTime, nullable=True, default=datetime.now, onupdate=datetime.now
+    )
     account_id = db.Column(db.String(300), nullable=False, unique=True)
 
     posts = db.relationship("Post", back_populates="author")
     comments = db.relationship("Comment", backref="user", lazy=True)
 
+    # Backs MAX(updated_at) in the pump fleet version stamp
+    __table_args__ = (db.Index("idx_users_updated_at", "updated_at"),)
+
     def __init__(self, first_name, middle_name, last_name, email, password):
         self.first_name = first_name
         self.middle_name = middle_name
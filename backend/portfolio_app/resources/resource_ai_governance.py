@@ -14,8 +14,6 @@ from flask import (
 from flask_jwt_extended import jwt_required, get_jwt_identity, current_user
 from marshmallow import ValidationError
 from datetime import datetime
-import asyncio
-import concurrent.futures
 import json
 
 from ..extensions import db
@@ -46,8 +44,20 @@ from ..schemas.schema_ai_governance import (
     DashboardStatsResponseSchema,
 )
 from ..decorators.auth_decorators import require_permission
-from ..services.ai_agent_service import create_ai_agent
+from ..services.ai_agent_service import (
+    create_ai_agent,
+    get_agent_service_cache,
+    ollama_health,
+)
+from ..services.async_bridge_service import iterate_callback_stream, run_coroutine
 from ..services.blockchain_service import get_blockchain_service
+from ..services.inference_scheduler_service import (
+    PRIORITY_BATCH,
+    InferenceQueueFull,
+    get_inference_scheduler,
+    queue_full_response,
+)
+from ..services.llm_client_service import get_llm_client_registry
 
 # Create blueprint
 blueprint_api_ai_governance = Blueprint("ai_governance", __name__)
@@ -128,7 +138,6 @@ def create_agent():
         # Log to blockchain
         try:
             blockchain = get_blockchain_service()
-            import asyncio
 
             async def log_agent_creation():
                 return await blockchain.log_decision(
@@ -142,7 +151,7 @@ def create_agent():
                     }
                 )
 
-            tx_hash = asyncio.run(log_agent_creation())
+            tx_hash = run_coroutine(log_agent_creation())
         except Exception as e:
             import logging
 
@@ -187,6 +196,7 @@ def update_agent(agent_id):
         agent.updated_at = datetime.utcnow()
 
         db.session.commit()
+        get_agent_service_cache().invalidate(agent_id)
 
         response_schema = AIAgentResponseSchema()
         return (
@@ -220,6 +230,7 @@ def delete_agent(agent_id):
         agent = AIAgent.query.get_or_404(agent_id)
         agent.status = "disabled"
         db.session.commit()
+        get_agent_service_cache().invalidate(agent_id)
 
         return (
             jsonify({"success": True, "message": "AI agent disabled successfully"}),
@@ -321,7 +332,17 @@ def execute_task():
         # Create AI agent service (will fetch config from database)
         agent_service = create_ai_agent(data["agent_id"])
 
-        # Execute task (async function needs to be run with asyncio)
+        # Batch tasks queue behind interactive chat on the same backend
+        try:
+            ticket = get_inference_scheduler().acquire(
+                agent_service.inference_backend,
+                f"user:{current_user_id}",
+                PRIORITY_BATCH,
+            )
+        except InferenceQueueFull as e:
+            return queue_full_response(e)
+
+        # Execute task (the agent coroutine is driven without an event loop)
         async def run_task():
             return await agent_service.execute_task(
                 task_data={
@@ -334,18 +355,10 @@ def execute_task():
                 company_id=data.get("company_id"),
             )
 
-        # Handle asyncio properly - Flask runs synchronously, so we can safely use asyncio.run
-        # However, if there's already an event loop, we need to handle it differently
         try:
-            # Try to get existing event loop
-            loop = asyncio.get_running_loop()
-            # If we get here, there's a running loop - use ThreadPoolExecutor
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(asyncio.run, run_task())
-                result = future.result(timeout=300)  # 5 minute timeout
-        except RuntimeError:
-            # No running loop, safe to use asyncio.run
-            result = asyncio.run(run_task())
+            result = run_coroutine(run_task())
+        finally:
+            ticket.release()
 
         return jsonify(result), 201 if result["success"] else 500
 
@@ -398,14 +411,39 @@ def execute_task_stream():
             logging.error(f"Error loading task data: {str(e)}")
             return jsonify({"success": False, "error": f"Error loading task data: {str(e)}"}), 400
 
+        # Create AI agent service; creation errors are reported in the stream
+        agent_service, agent_error = None, None
+        try:
+            agent_service = create_ai_agent(data["agent_id"])
+        except Exception as e:
+            agent_error = e
+
+        # Batch tasks queue behind interactive chat on the same backend
+        ticket = None
+        if agent_service is not None:
+            try:
+                ticket = get_inference_scheduler().acquire(
+                    agent_service.inference_backend,
+                    f"user:{current_user_id}",
+                    PRIORITY_BATCH,
+                )
+            except InferenceQueueFull as e:
+                return queue_full_response(e)
+        # The slot goes back when the task ends, or on close if it never started
+        task_state = {"started": False}
+
+        def release_unstarted():
+            if ticket is not None and not task_state["started"]:
+                ticket.release()
+
         def generate():
             """Generator function for Server-Sent Events"""
             try:
                 # Send initial status
                 yield f"data: {json.dumps({'type': 'status', 'message': 'Iniciando tarea...', 'status': 'processing'})}\n\n"
 
-                # Create AI agent service
-                agent_service = create_ai_agent(data["agent_id"])
+                if agent_error is not None:
+                    raise agent_error
 
                 # Create task record
                 from datetime import datetime
@@ -428,67 +466,44 @@ def execute_task_stream():
 
                 yield f"data: {json.dumps({'type': 'task_id', 'task_id': task_id})}\n\n"
 
-                # Use a queue to collect stream chunks
-                import queue
-
-                stream_queue = queue.Queue()
                 task_result = {"result": None, "error": None}
 
-                def stream_callback(chunk):
-                    """Callback to collect stream chunks"""
-                    try:
-                        stream_queue.put(chunk)
-                        if chunk.get("type") == "complete":
-                            task_result["result"] = chunk.get("result")
-                            print(
-                                f"✅ Stream callback received 'complete' for task {task_id}"
-                            )
-                        elif chunk.get("type") == "error":
-                            task_result["error"] = chunk.get("error")
-                            print(
-                                f"❌ Stream callback received 'error' for task {task_id}: {chunk.get('error')}"
-                            )
-                    except Exception as callback_ex:
-                        print(f"❌ Error in stream_callback: {callback_ex}")
+                def record_chunk(chunk):
+                    """Keep the outcome announced by the stream chunks"""
+                    if chunk.get("type") == "complete":
+                        task_result["result"] = chunk.get("result")
+                        print(
+                            f"✅ Stream callback received 'complete' for task {task_id}"
+                        )
+                    elif chunk.get("type") == "error":
+                        task_result["error"] = chunk.get("error")
+                        print(
+                            f"❌ Stream callback received 'error' for task {task_id}: {chunk.get('error')}"
+                        )
 
-                # Capture the application object before creating the thread
-                # This is necessary because current_app is a proxy that doesn't work across threads
                 app = current_app._get_current_object()
 
-                # Execute task with streaming in a separate thread
-                def run_task_thread():
-                    # Create application context for this thread using the captured app
-                    with app.app_context():
-
-                        async def run_streaming_task():
-                            return await agent_service.execute_task_streaming(
-                                task_data={
-                                    "task_id": task_id,
-                                    "task_type": data["task_type"],
-                                    "task_name": data.get("task_name"),
-                                    "input_data": data["input_data"],
-                                },
-                                submitted_by=current_user_id,
-                                stream_callback=stream_callback,
-                            )
-
+                # Runs in a greenlet; every emit() hands one chunk to this generator
+                def run_streaming_task(emit):
+                    with app.app_context(), ticket:
                         try:
                             print(f"🚀 Starting task execution for {task_id}")
-                            loop = asyncio.get_running_loop()
-                            with concurrent.futures.ThreadPoolExecutor() as executor:
-                                future = executor.submit(
-                                    asyncio.run, run_streaming_task()
+                            result = run_coroutine(
+                                agent_service.execute_task_streaming(
+                                    task_data={
+                                        "task_id": task_id,
+                                        "task_type": data["task_type"],
+                                        "task_name": data.get("task_name"),
+                                        "input_data": data["input_data"],
+                                    },
+                                    submitted_by=current_user_id,
+                                    stream_callback=emit,
                                 )
-                                task_result["result"] = future.result(timeout=300)
-                            print(
-                                f"✅ Task execution completed for {task_id}, result: {task_result['result'] is not None}"
                             )
-                        except RuntimeError:
-                            print(f"🚀 Starting task execution (no loop) for {task_id}")
-                            task_result["result"] = asyncio.run(run_streaming_task())
                             print(
-                                f"✅ Task execution completed (no loop) for {task_id}, result: {task_result['result'] is not None}"
+                                f"✅ Task execution completed for {task_id}, result: {result is not None}"
                             )
+                            return result
                         except Exception as e:
                             import traceback
 
@@ -505,7 +520,7 @@ def execute_task_stream():
                                     task.error_message = str(e)
                                     task.completed_at = datetime.utcnow()
                                     db.session.commit()
-                                    stream_callback(
+                                    emit(
                                         {
                                             "type": "error",
                                             "error": str(e),
@@ -513,82 +528,47 @@ def execute_task_stream():
                                     )
                             except Exception as db_error:
                                 print(f"❌ Error updating failed task: {db_error}")
-
-                # Start task execution in background
-                import threading
-
-                task_thread = threading.Thread(target=run_task_thread)
-                task_thread.start()
-
-                # Stream chunks as they arrive
-                while task_thread.is_alive() or not stream_queue.empty():
-                    try:
-                        chunk = stream_queue.get(timeout=0.5)
-                        yield f"data: {json.dumps(chunk)}\n\n"
-
-                        if (
-                            chunk.get("type") == "complete"
-                            or chunk.get("type") == "error"
-                        ):
-                            break
-                    except queue.Empty:
-                        # Check if thread is still alive
-                        if not task_thread.is_alive():
-                            break
-                        continue
-
-                # Wait for thread to complete and get remaining chunks
-                task_thread.join(timeout=300)  # Wait up to 5 minutes
-
-                # If thread is still alive, it means it timed out or is stuck
-                if task_thread.is_alive():
-                    # Mark task as failed due to timeout
+                            return task_result["result"]
+
+                # Stream chunks as they arrive; past the deadline the task gets
+                # StreamTimeout and is marked failed like any other error
+                task_state["started"] = True
+                for kind, value in iterate_callback_stream(
+                    run_streaming_task,
+                    timeout=app.config.get("AI_TASK_TIMEOUT_SECONDS", 300),
+                ):
+                    if kind == "result":
+                        task_result["result"] = value
+                        break
+                    record_chunk(value)
+                    yield f"data: {json.dumps(value)}\n\n"
+
+                # Send final result if we have it
+                if task_result["result"]:
+                    yield f"data: {json.dumps({'type': 'complete', 'result': task_result['result']})}\n\n"
+                elif task_result["error"]:
+                    yield f"data: {json.dumps({'type': 'error', 'error': task_result['error']})}\n\n"
+                else:
+                    # If the task finished but no result/error, check task status
                     try:
                         with app.app_context():
                             task = AITask.query.get(task_id)
-                            if task and task.status == "processing":
-                                task.status = "failed"
-                                task.error_message = (
-                                    "Task execution timeout or thread stuck"
-                                )
-                                task.completed_at = datetime.utcnow()
-                                db.session.commit()
-                    except Exception as timeout_error:
-                        print(f"❌ Error marking timeout task: {timeout_error}")
-
-                    yield f"data: {json.dumps({'type': 'error', 'error': 'Task execution timeout'})}\n\n"
-                else:
-                    # Get any remaining chunks
-                    while not stream_queue.empty():
-                        chunk = stream_queue.get_nowait()
-                        yield f"data: {json.dumps(chunk)}\n\n"
-
-                    # Send final result if we have it
-                    if task_result["result"]:
-                        yield f"data: {json.dumps({'type': 'complete', 'result': task_result['result']})}\n\n"
-                    elif task_result["error"]:
-                        yield f"data: {json.dumps({'type': 'error', 'error': task_result['error']})}\n\n"
-                    else:
-                        # If thread finished but no result/error, check task status
-                        try:
-                            with app.app_context():
-                                task = AITask.query.get(task_id)
-                                if task:
-                                    if task.status == "processing":
-                                        # Task is still processing but thread finished - mark as failed
-                                        task.status = "failed"
-                                        task.error_message = "Task execution completed but no result received"
-                                        task.completed_at = datetime.utcnow()
-                                        db.session.commit()
-                                        yield f"data: {json.dumps({'type': 'error', 'error': 'Task execution completed but no result received'})}\n\n"
-                                    else:
-                                        # Task has a status, send it
-                                        yield f"data: {json.dumps({'type': 'complete', 'result': {'success': True, 'task_id': task_id, 'status': task.status}})}\n\n"
-                        except Exception as status_check_error:
-                            print(
-                                f"❌ Error checking task status: {status_check_error}"
-                            )
-                            yield f"data: {json.dumps({'type': 'error', 'error': 'Unable to determine task status'})}\n\n"
+                            if task:
+                                if task.status == "processing":
+                                    # Task is still processing but execution finished - mark as failed
+                                    task.status = "failed"
+                                    task.error_message = "Task execution completed but no result received"
+                                    task.completed_at = datetime.utcnow()
+                                    db.session.commit()
+                                    yield f"data: {json.dumps({'type': 'error', 'error': 'Task execution completed but no result received'})}\n\n"
+                                else:
+                                    # Task has a status, send it
+                                    yield f"data: {json.dumps({'type': 'complete', 'result': {'success': True, 'task_id': task_id, 'status': task.status}})}\n\n"
+                    except Exception as status_check_error:
+                        print(
+                            f"❌ Error checking task status: {status_check_error}"
+                        )
+                        yield f"data: {json.dumps({'type': 'error', 'error': 'Unable to determine task status'})}\n\n"
 
             except Exception as e:
                 import logging
@@ -598,7 +578,7 @@ def execute_task_stream():
                 logger.error(f"Error in streaming: {str(e)}\n{traceback.format_exc()}")
                 yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
 
-        return Response(
+        response = Response(
             stream_with_context(generate()),
             mimetype="text/event-stream",
             headers={
@@ -607,6 +587,8 @@ def execute_task_stream():
                 "Connection": "keep-alive",
             },
         )
+        response.call_on_close(release_unstarted)
+        return response
 
     except ValidationError as err:
         return jsonify({"success": False, "error": err.messages}), 400
@@ -846,7 +828,7 @@ def approve_task(approval_id):
                 }
             )
 
-        tx_hash = asyncio.run(log_approval())
+        tx_hash = run_coroutine(log_approval())
 
         approval.blockchain_tx_hash = tx_hash
         task.blockchain_tx_hash = tx_hash
@@ -930,7 +912,7 @@ def reject_task(approval_id):
                 }
             )
 
-        tx_hash = asyncio.run(log_rejection())
+        tx_hash = run_coroutine(log_rejection())
 
         approval.blockchain_tx_hash = tx_hash
 
@@ -1206,6 +1188,45 @@ def get_dashboard_stats():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@blueprint_api_ai_governance.route("/api/v1/ai/llm-clients/metrics", methods=["GET"])
+@jwt_required()
+@require_permission("ai_agents", "read")
+def get_llm_client_metrics():
+    """Get connection pool metrics of the shared LLM clients (this worker)"""
+    return (
+        jsonify({"success": True, "clients": get_llm_client_registry().metrics()}),
+        200,
+    )
+
+
+@blueprint_api_ai_governance.route("/api/v1/ai/inference/metrics", methods=["GET"])
+@jwt_required()
+@require_permission("ai_agents", "read")
+def get_inference_metrics():
+    """Get concurrency, queue depth and wait times of the inference scheduler"""
+    return (
+        jsonify({"success": True, "inference": get_inference_scheduler().metrics()}),
+        200,
+    )
+
+
+@blueprint_api_ai_governance.route("/api/v1/ai/agent-cache/metrics", methods=["GET"])
+@jwt_required()
+@require_permission("ai_agents", "read")
+def get_agent_cache_metrics():
+    """Get agent service cache counters and Ollama health probes (this worker)"""
+    return (
+        jsonify(
+            {
+                "success": True,
+                "agents": get_agent_service_cache().stats(),
+                "health": ollama_health(),
+            }
+        ),
+        200,
+    )
+
+
 @blueprint_api_ai_governance.route("/api/v1/ai/blockchain/audit", methods=["GET"])
 @jwt_required()
 @require_permission("ai_agents", "read")
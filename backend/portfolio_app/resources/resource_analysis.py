@@ -8,142 +8,75 @@ from flask import (
     request,
 )
 from sqlalchemy import func
-import pandas as pd
 from flask_jwt_extended import jwt_required
-from typing import Dict, Any, List
 import os
 import json
 
 from portfolio_app import db
-from portfolio_app.models.tbl_pumps import Pump
-from portfolio_app.services.openai_service import OpenAIService
+from portfolio_app.decorators.cache_decorators import conditional_on_fleet_version
+from portfolio_app.services.analysis_context_service import (
+    estimate_tokens,
+    get_analysis_context_builder,
+)
+from portfolio_app.services.analysis_retrieval_service import (
+    AnalysisRetrievalService,
+)
+from portfolio_app.services.inference_scheduler_service import (
+    PRIORITY_INTERACTIVE,
+    InferenceQueueFull,
+    get_inference_scheduler,
+    queue_full_response,
+    requester_key,
+)
+from portfolio_app.services.llm_client_service import (
+    get_ollama_client,
+    ollama_base_url,
+)
+from portfolio_app.services.llm_response_cache_service import (
+    get_llm_response_cache,
+    response_key,
+)
+from portfolio_app.services.pump_aggregation_service import PumpAggregationService
+from portfolio_app.services.pump_anomaly_service import (
+    DEFAULT_MIN_GROUP_SIZE,
+    DEFAULT_OUTLIER_LIMIT,
+    DEFAULT_POWER_TOLERANCE,
+    DEFAULT_Z_THRESHOLD,
+    PumpAnomalyService,
+)
+from portfolio_app.services.pump_snapshot_service import get_fleet_version
 from openai import OpenAI
-import re
-
 
 blueprint_api_analysis = Blueprint("api_analysis", __name__, url_prefix="")
 
 
-def _pumps_query_to_dataframe() -> pd.DataFrame:
-    pumps = Pump.query.with_entities(
-        Pump.ccn_pump,
-        Pump.model,
-        Pump.serial_number,
-        Pump.location,
-        Pump.purchase_date,
-        Pump.status,
-        Pump.flow_rate,
-        Pump.pressure,
-        Pump.power,
-        Pump.efficiency,
-        Pump.voltage,
-        Pump.current,
-        Pump.power_factor,
-        Pump.last_maintenance,
-        Pump.next_maintenance,
-        Pump.user_id,
-    ).all()
-
-    if not pumps:
-        return pd.DataFrame(
-            columns=[
-                "ccn_pump",
-                "model",
-                "serial_number",
-                "location",
-                "purchase_date",
-                "status",
-                "flow_rate",
-                "pressure",
-                "power",
-                "efficiency",
-                "voltage",
-                "current",
-                "power_factor",
-                "last_maintenance",
-                "next_maintenance",
-                "user_id",
-            ]
-        )
+@jwt_required()
+@blueprint_api_analysis.route("/api/v1/analysis/pumps/dashboard", methods=["GET"])
+@conditional_on_fleet_version
+def pumps_dashboard() -> Response:
+    """
+    All pump analysis sections computed from one grouped query.
+
+    Query params:
+      sections: comma-separated subset of summary, status_distribution,
+                locations, numeric_stats, insights (default: all)
+    """
+    sections = [
+        s.strip() for s in request.args.get("sections", "").split(",") if s.strip()
+    ]
+    try:
+        dashboard = PumpAggregationService.dashboard(sections)
+    except ValueError as e:
+        return make_response(jsonify({"error": str(e)}), 400)
 
-    df = pd.DataFrame(
-        pumps,
-        columns=[
-            "ccn_pump",
-            "model",
-            "serial_number",
-            "location",
-            "purchase_date",
-            "status",
-            "flow_rate",
-            "pressure",
-            "power",
-            "efficiency",
-            "voltage",
-            "current",
-            "power_factor",
-            "last_maintenance",
-            "next_maintenance",
-            "user_id",
-        ],
-    )
-
-    # Ensure datetime types
-    for col in ["purchase_date", "last_maintenance", "next_maintenance"]:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors="coerce")
-
-    return df
+    return make_response(jsonify(dashboard), 200)
 
 
 @jwt_required()
 @blueprint_api_analysis.route("/api/v1/analysis/pumps/summary", methods=["GET"])
+@conditional_on_fleet_version
 def pumps_summary() -> Response:
-    df: pd.DataFrame = _pumps_query_to_dataframe()
-    total: int = int(len(df))
-
-    def count_status(value: str) -> int:
-        if df.empty or "status" not in df:
-            return 0
-        return int((df["status"] == value).sum())
-
-    # Contar todos los estados disponibles
-    active = count_status("Active")
-    maintenance = count_status("Maintenance")
-    inactive = count_status("Inactive")
-    standby = count_status("Standby")
-    testing = count_status("Testing")
-    repair = count_status("Repair")
-
-    # Crear diccionario dinámico con todos los estados encontrados
-    status_counts = {}
-    if active > 0:
-        status_counts["Active"] = active
-    if maintenance > 0:
-        status_counts["Maintenance"] = maintenance
-    if inactive > 0:
-        status_counts["Inactive"] = inactive
-    if standby > 0:
-        status_counts["Standby"] = standby
-    if testing > 0:
-        status_counts["Testing"] = testing
-    if repair > 0:
-        status_counts["Repair"] = repair
-
-    response = {
-        "total_pumps": total,
-        "status": status_counts,
-        "metrics": {
-            "operational_efficiency_pct": (
-                round((active / total) * 100, 1) if total else 0.0
-            ),
-            "maintenance_pct": round((maintenance / total) * 100, 1) if total else 0.0,
-            "system_availability_pct": (
-                round(((active + standby) / total) * 100, 1) if total else 0.0
-            ),
-        },
-    }
-
+    response = PumpAggregationService.dashboard(["summary"])["summary"]
     return make_response(jsonify(response), 200)
 
 
@@ -151,606 +84,89 @@ def pumps_summary() -> Response:
 @blueprint_api_analysis.route(
     "/api/v1/analysis/pumps/status-distribution", methods=["GET"]
 )
+@conditional_on_fleet_version
 def pumps_status_distribution():
-    df = _pumps_query_to_dataframe()
-    total = int(len(df))
-    if total == 0:
+    section = PumpAggregationService.dashboard(["status_distribution"])
+    response = section["status_distribution"]
+    if response["total"] == 0:
         return make_response(jsonify({"distribution": []}), 200)
 
-    counts = (
-        df["status"].value_counts().rename_axis("status").reset_index(name="count")
-        if not df.empty and "status" in df
-        else pd.DataFrame({"status": [], "count": []})
-    )
-
-    counts["percentage"] = counts["count"].apply(lambda c: round((c / total) * 100, 1))
-
-    distribution = counts.to_dict(orient="records")
-    return make_response(jsonify({"distribution": distribution, "total": total}), 200)
+    return make_response(jsonify(response), 200)
 
 
 @jwt_required()
 @blueprint_api_analysis.route("/api/v1/analysis/pumps/location", methods=["GET"])
+@conditional_on_fleet_version
 def pumps_by_location():
-    df = _pumps_query_to_dataframe()
-    if df.empty or "location" not in df:
-        return make_response(jsonify({"locations": []}), 200)
-
-    # If location contains pattern like "Building - Room", group by the first part
-    def extract_building(location: str) -> str:
-        if not isinstance(location, str):
-            return "Unknown"
-        return location.split(" - ")[0]
-
-    df["building"] = df["location"].apply(extract_building)
-    grouped = (
-        df.groupby("building")
-        .size()
-        .reset_index(name="count")
-        .sort_values("count", ascending=False)
-    )
-    locations = grouped.to_dict(orient="records")
+    # "Building - Room" locations are grouped by their building part
+    locations = PumpAggregationService.dashboard(["locations"])["locations"]
     return make_response(jsonify({"locations": locations}), 200)
 
 
 @jwt_required()
 @blueprint_api_analysis.route("/api/v1/analysis/pumps/numeric-stats", methods=["GET"])
+@conditional_on_fleet_version
 def pumps_numeric_stats():
-    df = _pumps_query_to_dataframe()
-    numeric_cols = [
-        "flow_rate",
-        "pressure",
-        "power",
-        "efficiency",
-        "voltage",
-        "current",
-        "power_factor",
-    ]
-
-    if df.empty:
-        return make_response(jsonify({"stats": {c: None for c in numeric_cols}}), 200)
-
-    stats = {}
-    for col in numeric_cols:
-        if col in df.columns:
-            series = pd.to_numeric(df[col], errors="coerce")
-            stats[col] = {
-                "min": None if series.dropna().empty else float(series.min()),
-                "max": None if series.dropna().empty else float(series.max()),
-                "mean": None if series.dropna().empty else float(series.mean()),
-                "median": None if series.dropna().empty else float(series.median()),
-                "std": None if series.dropna().empty else float(series.std(ddof=0)),
-                "count": int(series.count()),
-            }
-        else:
-            stats[col] = None
-
+    stats = PumpAggregationService.dashboard(["numeric_stats"])["numeric_stats"]
     return make_response(jsonify({"stats": stats}), 200)
 
 
 @jwt_required()
 @blueprint_api_analysis.route("/api/v1/analysis/pumps/insights", methods=["GET"])
+@conditional_on_fleet_version
 def pumps_insights() -> Response:
     """Generate AI insights from pump analysis data"""
     try:
-        # Get summary data
-        df: pd.DataFrame = _pumps_query_to_dataframe()
-        total: int = int(len(df))
-
-        def count_status(value: str) -> int:
-            if df.empty or "status" not in df:
-                return 0
-            return int((df["status"] == value).sum())
-
-        # Count all statuses
-        active: int = count_status("Active")
-        maintenance: int = count_status("Maintenance")
-        inactive: int = count_status("Inactive")
-        standby: int = count_status("Standby")
-
-        status_counts: Dict[str, int] = {}
-        if active > 0:
-            status_counts["Active"] = active
-        if maintenance > 0:
-            status_counts["Maintenance"] = maintenance
-        if inactive > 0:
-            status_counts["Inactive"] = inactive
-        if standby > 0:
-            status_counts["Standby"] = standby
-
-        summary_data = {
-            "total_pumps": total,
-            "status": status_counts,
-            "metrics": {
-                "operational_efficiency_pct": (
-                    round((active / total) * 100, 1) if total else 0.0
-                ),
-                "maintenance_pct": (
-                    round((maintenance / total) * 100, 1) if total else 0.0
-                ),
-                "system_availability_pct": (
-                    round(((active + standby) / total) * 100, 1) if total else 0.0
-                ),
-            },
-        }
-
-        # Get status distribution
-        if total == 0:
-            status_distribution = []
-        else:
-            counts = (
-                df["status"]
-                .value_counts()
-                .rename_axis("status")
-                .reset_index(name="count")
-                if not df.empty and "status" in df
-                else pd.DataFrame({"status": [], "count": []})
-            )
-            counts["percentage"] = counts["count"].apply(
-                lambda c: round((c / total) * 100, 1)
-            )
-            status_distribution = counts.to_dict(orient="records")
-
-        # Get numeric stats
-        numeric_cols = [
-            "flow_rate",
-            "pressure",
-            "power",
-            "efficiency",
-            "voltage",
-            "current",
-            "power_factor",
-        ]
-        if df.empty:
-            numeric_stats = {c: None for c in numeric_cols}
-        else:
-            numeric_stats = {}
-            for col in numeric_cols:
-                if col in df.columns:
-                    series = pd.to_numeric(df[col], errors="coerce")
-                    numeric_stats[col] = {
-                        "min": None if series.dropna().empty else float(series.min()),
-                        "max": None if series.dropna().empty else float(series.max()),
-                        "mean": None if series.dropna().empty else float(series.mean()),
-                        "median": (
-                            None if series.dropna().empty else float(series.median())
-                        ),
-                        "std": (
-                            None if series.dropna().empty else float(series.std(ddof=0))
-                        ),
-                        "count": int(series.count()),
-                    }
-                else:
-                    numeric_stats[col] = None
-
-        # Get location data
-        locations = []
-        if not df.empty and "location" in df.columns:
-            location_counts = df["location"].value_counts().reset_index()
-            location_counts.columns = ["building", "count"]
-            locations = location_counts.to_dict(orient="records")
-
-        # Generate AI insights
-        insights = OpenAIService.generate_pump_insights(
-            summary_data, status_distribution, numeric_stats, locations
-        )
-
+        insights = PumpAggregationService.dashboard(["insights"])["insights"]
         return make_response(jsonify({"insights": insights}), 200)
 
     except Exception as e:
         return make_response(jsonify({"error": str(e)}), 500)
 
 
-def _get_ollama_client() -> OpenAI:
-    """
-    Create an OpenAI-compatible client configured for Ollama.
-    """
-    base_url = os.getenv("OLLAMA_BASE_URL")
-
-    is_docker = os.path.exists("/.dockerenv") or os.getenv("DOCKER_CONTAINER")
-    if not base_url:
-        if is_docker:
-            base_url = "http://host.docker.internal:11434/v1"
-        else:
-            base_url = "http://localhost:11434/v1"
-
-    client = OpenAI(
-        api_key="ollama",
-        base_url=base_url,
-        timeout=300.0,
-    )
-    return client
-
-
-def _build_analysis_context() -> str:
+@jwt_required()
+@blueprint_api_analysis.route("/api/v1/analysis/pumps/anomalies", methods=["GET"])
+@conditional_on_fleet_version
+def pumps_anomalies() -> Response:
     """
-    Build context from pump analysis data for the AI assistant.
+    Ranked fleet outliers: robust z-scores per (model, location) group and
+    power vs voltage * current * power_factor consistency.
+
+    Query params:
+      threshold: |z| that flags a metric (default 3.5)
+      power_tolerance: allowed relative power gap (default 0.25)
+      min_group_size: smallest group that is z-scored (default 5)
+      metrics: comma-separated metrics to score (default: all)
+      limit: number of outliers returned (default 100)
     """
+    metrics = [
+        m.strip() for m in request.args.get("metrics", "").split(",") if m.strip()
+    ]
     try:
-        df = _pumps_query_to_dataframe()
-        total = int(len(df))
-
-        if total == 0:
-            return "No pump data available in the system."
-
-        # Get summary data
-        def count_status(value: str) -> int:
-            if df.empty or "status" not in df:
-                return 0
-            return int((df["status"] == value).sum())
-
-        active = count_status("Active")
-        maintenance = count_status("Maintenance")
-        inactive = count_status("Inactive")
-        standby = count_status("Standby")
-        testing = count_status("Testing")
-        repair = count_status("Repair")
-
-        status_counts = {}
-        if active > 0:
-            status_counts["Active"] = active
-        if maintenance > 0:
-            status_counts["Maintenance"] = maintenance
-        if inactive > 0:
-            status_counts["Inactive"] = inactive
-        if standby > 0:
-            status_counts["Standby"] = standby
-        if testing > 0:
-            status_counts["Testing"] = testing
-        if repair > 0:
-            status_counts["Repair"] = repair
-
-        # Get status distribution
-        if not df.empty and "status" in df:
-            counts = (
-                df["status"]
-                .value_counts()
-                .rename_axis("status")
-                .reset_index(name="count")
-            )
-            counts["percentage"] = counts["count"].apply(
-                lambda c: round((c / total) * 100, 1)
-            )
-            status_distribution = counts.to_dict(orient="records")
-        else:
-            status_distribution = []
-
-        # Get location data
-        locations = []
-        if not df.empty and "location" in df.columns:
-            location_counts = df["location"].value_counts().reset_index()
-            location_counts.columns = ["building", "count"]
-            locations = location_counts.to_dict(orient="records")
-
-        # Get numeric stats
-        numeric_cols = [
-            "flow_rate",
-            "pressure",
-            "power",
-            "efficiency",
-            "voltage",
-            "current",
-            "power_factor",
-        ]
-        numeric_stats = {}
-        if not df.empty:
-            for col in numeric_cols:
-                if col in df.columns:
-                    series = pd.to_numeric(df[col], errors="coerce")
-                    numeric_stats[col] = {
-                        "min": None if series.dropna().empty else float(series.min()),
-                        "max": None if series.dropna().empty else float(series.max()),
-                        "mean": None if series.dropna().empty else float(series.mean()),
-                        "median": (
-                            None if series.dropna().empty else float(series.median())
-                        ),
-                        "std": (
-                            None if series.dropna().empty else float(series.std(ddof=0))
-                        ),
-                        "count": int(series.count()),
-                    }
-
-        # Build detailed pump list for individual queries
-        # Limit to 500 pumps to avoid context overflow
-        max_pumps_detail = 500
-        pump_details = []
-
-        if not df.empty:
-            # Select relevant columns for pump details
-            detail_cols = [
-                "ccn_pump",
-                "model",
-                "serial_number",
-                "location",
-                "status",
-                "flow_rate",
-                "pressure",
-                "power",
-                "efficiency",
-                "voltage",
-                "current",
-                "power_factor",
-                "last_maintenance",
-                "next_maintenance",
-                "purchase_date",
-            ]
-
-            # Get available columns
-            available_cols = [col for col in detail_cols if col in df.columns]
-            pump_df = df[available_cols].head(max_pumps_detail)
-
-            # Convert to list of dicts, handling datetime serialization
-            for _, row in pump_df.iterrows():
-                pump_dict = {}
-                for col in available_cols:
-                    value = row[col]
-                    # Convert datetime to string
-                    if pd.isna(value):
-                        pump_dict[col] = None
-                    elif isinstance(value, pd.Timestamp):
-                        pump_dict[col] = value.strftime("%Y-%m-%d %H:%M:%S")
-                    else:
-                        pump_dict[col] = value
-                pump_details.append(pump_dict)
-
-        # Build context string - optimize JSON size for large datasets
-        # Use compact JSON format to reduce token count
-        pump_details_json = json.dumps(pump_details, separators=(",", ":"), default=str)
-
-        # Build context string
-        # Create a searchable index of pump IDs for quick lookup
-        pump_ids_list = [
-            pump.get("ccn_pump") for pump in pump_details if pump.get("ccn_pump")
-        ]
-
-        context = f"""PUMP ANALYSIS DATA CONTEXT:
-
-Total Pumps: {total}
-
-=== INDIVIDUAL PUMP DATA ===
-You have access to detailed information about each pump. Each pump has a unique ID (ccn_pump) that you can use to look up specific information.
-When a user asks about a specific pump ID, you MUST search for it in the pump list below.
-
-IMPORTANT: The pump ID is a 64-character hexadecimal string. When searching, look for the exact match in the "ccn_pump" field.
-
-Available Pump IDs (first {len(pump_ids_list)} of {total}):
-{', '.join(pump_ids_list[:50])}{'...' if len(pump_ids_list) > 50 else ''}
-
-Full Pump Details (showing {len(pump_details)} of {total} pumps):
-{pump_details_json}
-
-=== SUMMARY STATISTICS ===
-
-Status Distribution:
-{json.dumps(status_distribution, indent=2)}
-
-Status Counts:
-{json.dumps(status_counts, indent=2)}
-
-Location Distribution (Top 10):
-{json.dumps(locations[:10], indent=2)}
-
-Numeric Statistics (aggregated):
-{json.dumps(numeric_stats, indent=2)}
-
-System Metrics:
-- Operational Efficiency: {round((active / total) * 100, 1) if total else 0.0}%
-- Maintenance: {round((maintenance / total) * 100, 1) if total else 0.0}%
-- System Availability: {round(((active + standby) / total) * 100, 1) if total else 0.0}%
-
-=== CRITICAL INSTRUCTIONS FOR PUMP ID LOOKUP ===
-1. When a user provides a pump ID (64-character hex string), you MUST search for it in the "Full Pump Details" JSON array above
-2. Look for the "ccn_pump" field in each pump object - it contains the unique identifier
-3. Once found, provide ALL available information about that pump:
-   - ccn_pump (the ID itself)
-   - model
-   - serial_number
-   - location
-   - status (THIS IS THE CURRENT STATE OF THE PUMP)
-   - flow_rate, pressure, power, efficiency, voltage, current, power_factor
-   - last_maintenance, next_maintenance, purchase_date
-4. If the ID is not in the list above, say: "The pump ID was not found in the available data. It may not exist, or it may be beyond the first {len(pump_details)} pumps in the system (total: {total} pumps)."
-5. DO NOT say you don't have access - you DO have access to the pump data above. Search carefully!
-"""
-        return context
+        result = PumpAnomalyService.detect(
+            threshold=request.args.get("threshold", DEFAULT_Z_THRESHOLD, type=float),
+            power_tolerance=request.args.get(
+                "power_tolerance", DEFAULT_POWER_TOLERANCE, type=float
+            ),
+            min_group_size=request.args.get(
+                "min_group_size", DEFAULT_MIN_GROUP_SIZE, type=int
+            ),
+            limit=request.args.get("limit", DEFAULT_OUTLIER_LIMIT, type=int),
+            metrics=metrics or None,
+        )
+    except ValueError as e:
+        return make_response(jsonify({"error": str(e)}), 400)
     except Exception as e:
-        current_app.logger.error(f"Error building analysis context: {str(e)}")
-        return f"Error loading pump data: {str(e)}"
+        return make_response(jsonify({"error": str(e)}), 500)
 
+    return make_response(jsonify(result), 200)
 
-def _build_analysis_context_from_pumps_data(pumps_data: List[Dict[str, Any]]) -> str:
+
+def _get_ollama_client() -> OpenAI:
     """
-    Build context from pumps data sent from Redux store (frontend).
-    This avoids database queries and uses the data already loaded in the frontend.
+    Shared OpenAI-compatible client of the Ollama backend (pooled connections).
     """
-    try:
-        if not pumps_data:
-            return "No pump data available in the system."
-
-        total = len(pumps_data)
-
-        # Convert to DataFrame for easier processing
-        df = pd.DataFrame(pumps_data)
-
-        # Get summary data
-        def count_status(value: str) -> int:
-            if df.empty or "status" not in df:
-                return 0
-            return int((df["status"] == value).sum())
-
-        active = count_status("Active")
-        maintenance = count_status("Maintenance")
-        inactive = count_status("Inactive")
-        standby = count_status("Standby")
-        testing = count_status("Testing")
-        repair = count_status("Repair")
-
-        status_counts = {}
-        if active > 0:
-            status_counts["Active"] = active
-        if maintenance > 0:
-            status_counts["Maintenance"] = maintenance
-        if inactive > 0:
-            status_counts["Inactive"] = inactive
-        if standby > 0:
-            status_counts["Standby"] = standby
-        if testing > 0:
-            status_counts["Testing"] = testing
-        if repair > 0:
-            status_counts["Repair"] = repair
-
-        # Get status distribution
-        if not df.empty and "status" in df:
-            counts = (
-                df["status"]
-                .value_counts()
-                .rename_axis("status")
-                .reset_index(name="count")
-            )
-            counts["percentage"] = counts["count"].apply(
-                lambda c: round((c / total) * 100, 1)
-            )
-            status_distribution = counts.to_dict(orient="records")
-        else:
-            status_distribution = []
-
-        # Get location data
-        locations = []
-        if not df.empty and "location" in df.columns:
-            location_counts = df["location"].value_counts().reset_index()
-            location_counts.columns = ["building", "count"]
-            locations = location_counts.to_dict(orient="records")
-
-        # Get numeric stats
-        numeric_cols = [
-            "flow_rate",
-            "pressure",
-            "power",
-            "efficiency",
-            "voltage",
-            "current",
-            "power_factor",
-        ]
-        numeric_stats = {}
-        if not df.empty:
-            for col in numeric_cols:
-                if col in df.columns:
-                    series = pd.to_numeric(df[col], errors="coerce")
-                    numeric_stats[col] = {
-                        "min": None if series.dropna().empty else float(series.min()),
-                        "max": None if series.dropna().empty else float(series.max()),
-                        "mean": None if series.dropna().empty else float(series.mean()),
-                        "median": (
-                            None if series.dropna().empty else float(series.median())
-                        ),
-                        "std": (
-                            None if series.dropna().empty else float(series.std(ddof=0))
-                        ),
-                        "count": int(series.count()),
-                    }
-
-        # Build detailed pump list - use all pumps from Redux
-        pump_details = []
-        detail_cols = [
-            "ccn_pump",
-            "model",
-            "serial_number",
-            "location",
-            "status",
-            "flow_rate",
-            "pressure",
-            "power",
-            "efficiency",
-            "voltage",
-            "current",
-            "power_factor",
-            "last_maintenance",
-            "next_maintenance",
-            "purchase_date",
-        ]
-
-        for pump in pumps_data:
-            pump_dict = {}
-            for col in detail_cols:
-                if col in pump:
-                    value = pump[col]
-                    # Handle datetime strings from frontend
-                    if isinstance(value, str) and ("T" in value or "-" in value):
-                        # Try to parse as datetime
-                        try:
-                            from datetime import datetime
-
-                            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
-                            pump_dict[col] = dt.strftime("%Y-%m-%d %H:%M:%S")
-                        except:
-                            pump_dict[col] = value
-                    elif value is None:
-                        pump_dict[col] = None
-                    else:
-                        pump_dict[col] = value
-            pump_details.append(pump_dict)
-
-        # Build context string
-        pump_ids_list = [
-            pump.get("ccn_pump") for pump in pump_details if pump.get("ccn_pump")
-        ]
-        pump_details_json = json.dumps(pump_details, separators=(",", ":"), default=str)
-
-        context = f"""PUMP ANALYSIS DATA CONTEXT:
-
-Total Pumps: {total}
-
-=== INDIVIDUAL PUMP DATA ===
-You have access to detailed information about each pump. Each pump has a unique ID (ccn_pump) that you can use to look up specific information.
-When a user asks about a specific pump ID, you MUST search for it in the pump list below.
-
-IMPORTANT: The pump ID is a 64-character hexadecimal string. When searching, look for the exact match in the "ccn_pump" field.
-
-Available Pump IDs (all {len(pump_ids_list)} pumps):
-{', '.join(pump_ids_list[:100])}{'...' if len(pump_ids_list) > 100 else ''}
-
-Full Pump Details (all {len(pump_details)} pumps):
-{pump_details_json}
-
-=== SUMMARY STATISTICS ===
-
-Status Distribution:
-{json.dumps(status_distribution, indent=2)}
-
-Status Counts:
-{json.dumps(status_counts, indent=2)}
-
-Location Distribution (Top 10):
-{json.dumps(locations[:10], indent=2)}
-
-Numeric Statistics (aggregated):
-{json.dumps(numeric_stats, indent=2)}
-
-System Metrics:
-- Operational Efficiency: {round((active / total) * 100, 1) if total else 0.0}%
-- Maintenance: {round((maintenance / total) * 100, 1) if total else 0.0}%
-- System Availability: {round(((active + standby) / total) * 100, 1) if total else 0.0}%
-
-=== CRITICAL INSTRUCTIONS FOR PUMP ID LOOKUP ===
-1. When a user provides a pump ID (64-character hex string), you MUST search for it in the "Full Pump Details" JSON array above
-2. Look for the "ccn_pump" field in each pump object - it contains the unique identifier
-3. Once found, provide ALL available information about that pump:
-   - ccn_pump (the ID itself)
-   - model
-   - serial_number
-   - location
-   - status (THIS IS THE CURRENT STATE OF THE PUMP)
-   - flow_rate, pressure, power, efficiency, voltage, current, power_factor
-   - last_maintenance, next_maintenance, purchase_date
-4. If the ID is not in the list above, say: "The pump ID was not found in the available data."
-5. DO NOT say you don't have access - you DO have access to the pump data above. Search carefully!
-"""
-        return context
-    except Exception as e:
-        current_app.logger.error(
-            f"Error building analysis context from pumps data: {str(e)}"
-        )
-        return f"Error processing pump data: {str(e)}"
+    return get_ollama_client()
 
 
 @jwt_required()
@@ -792,78 +208,40 @@ def pumps_analysis_chat_stream():
         # Check if pumps data was sent from Redux store
         pumps_data_from_frontend = payload.get("pumpsData", [])
 
-        # If we have pumps data from frontend, use it; otherwise build from database
-        if pumps_data_from_frontend:
-            # Use data from Redux store
-            analysis_context = _build_analysis_context_from_pumps_data(
-                pumps_data_from_frontend
+        last_user_message = next(
+            (
+                m.get("content", "")
+                for m in reversed(messages)
+                if m.get("role") == "user"
+            ),
+            "",
+        )
+
+        # Cached fleet summary (from the Redux data or the snapshot) plus only
+        # the pumps the question is about, as many as fit the token budget
+        cacheable = True
+        try:
+            token_budget = current_app.config.get("ANALYSIS_CONTEXT_TOKEN_BUDGET", 6000)
+            built = get_analysis_context_builder().build(
+                pumps_data_from_frontend, token_budget, include_details=False
+            )
+            retrieved = AnalysisRetrievalService.retrieve(last_user_message)
+            analysis_context = (
+                built["context"]
+                + "\n"
+                + AnalysisRetrievalService.render(
+                    retrieved, max(0, token_budget - built["tokens"] - 1)
+                )
+            )
+            current_app.logger.info(
+                f"Analysis context: ~{estimate_tokens(analysis_context)} tokens "
+                f"of {token_budget}, {retrieved['matched']} matching pumps"
+                f"{' (cached summary)' if built['cached'] else ''}"
             )
-        else:
-            # Fallback to database query
-            analysis_context = _build_analysis_context()
-
-        # Check if the last user message contains a pump ID (64-character hex string)
-        # If so, fetch that specific pump and add it to the context
-        if messages:
-            last_user_message = None
-            for msg in reversed(messages):
-                if msg.get("role") == "user":
-                    last_user_message = msg.get("content", "")
-                    break
-
-            if last_user_message:
-                # Look for 64-character hexadecimal strings (pump IDs)
-                pump_id_pattern = r"\b[0-9a-f]{64}\b"
-                pump_ids_found = re.findall(pump_id_pattern, last_user_message.lower())
-
-                if pump_ids_found:
-                    # Fetch specific pumps from database
-                    specific_pumps = []
-                    for pump_id in pump_ids_found[
-                        :3
-                    ]:  # Limit to 3 IDs to avoid overload
-                        pump = Pump.query.filter_by(ccn_pump=pump_id).first()
-                        if pump:
-                            pump_dict = {
-                                "ccn_pump": pump.ccn_pump,
-                                "model": pump.model,
-                                "serial_number": pump.serial_number,
-                                "location": pump.location,
-                                "status": pump.status,
-                                "flow_rate": float(pump.flow_rate),
-                                "pressure": float(pump.pressure),
-                                "power": float(pump.power),
-                                "efficiency": float(pump.efficiency),
-                                "voltage": float(pump.voltage),
-                                "current": float(pump.current),
-                                "power_factor": float(pump.power_factor),
-                                "last_maintenance": (
-                                    pump.last_maintenance.strftime("%Y-%m-%d %H:%M:%S")
-                                    if pump.last_maintenance
-                                    else None
-                                ),
-                                "next_maintenance": (
-                                    pump.next_maintenance.strftime("%Y-%m-%d %H:%M:%S")
-                                    if pump.next_maintenance
-                                    else None
-                                ),
-                                "purchase_date": (
-                                    pump.purchase_date.strftime("%Y-%m-%d %H:%M:%S")
-                                    if pump.purchase_date
-                                    else None
-                                ),
-                            }
-                            specific_pumps.append(pump_dict)
-
-                    if specific_pumps:
-                        # Add specific pump data to context
-                        specific_pumps_json = json.dumps(
-                            specific_pumps, separators=(",", ":"), default=str
-                        )
-                        analysis_context += f"\n\n=== SPECIFIC ASSET(S) REQUESTED ===\n"
-                        analysis_context += f"The user is asking about the following asset ID(s). Here is the complete information:\n"
-                        analysis_context += f"{specific_pumps_json}\n"
-                        analysis_context += f"IMPORTANT: Use this information to answer the user's question about these specific asset(s).\n"
+        except Exception as e:
+            current_app.logger.error(f"Error building analysis context: {str(e)}")
+            analysis_context = f"Error loading pump data: {str(e)}"
+            cacheable = False
 
         # Language mapping
         language_names = {
@@ -887,33 +265,62 @@ def pumps_analysis_chat_stream():
             f"{analysis_context}\n"
             f"=== END CONTEXT ===\n\n"
             f"CRITICAL RULES FOR ANSWERING:\n"
-            f"1. When a user asks about a specific asset ID (a 64-character hex string), you MUST:\n"
-            f"   - Search through the 'Full Pump Details' JSON array in the context above\n"
-            f"   - Look for the exact match in the 'ccn_pump' field of each asset object\n"
-            f"   - Extract ALL information about that asset and provide it to the user\n"
-            f"   - The 'status' field tells you the current state of the asset\n"
+            f"1. The 'RETRIEVED ASSETS' table lists the assets relevant to the latest question, one per line, "
+            f"with the columns named in its header row. When a user asks about a specific asset ID (a 64-character hex string) "
+            f"or serial number, look for the exact match in the 'ccn_pump' or 'serial_number' column\n"
             f"2. NEVER say you don't have access to the equipment data - you DO have access in the context above\n"
-            f"3. If you cannot find an asset ID, check if it's in the 'Available Pump IDs' list first\n"
+            f"3. Use the summary statistics for fleet-wide questions (counts, distributions, averages) "
+            f"and the table for individual assets\n"
             f"4. Use the data above to provide accurate answers about asset status, locations, metrics, maintenance, and operational condition.\n"
             f"5. Be specific with numbers and percentages when available\n"
             f"6. For individual asset queries, ALWAYS provide: model, serial_number, location, status (current state), and all technical metrics\n"
             f"7. If asked about trends or insights, analyze the data provided\n"
-            f"8. If an asset ID is not found after searching, inform the user that it may not exist or may be beyond the displayed limit\n"
+            f"8. If an asset ID is listed under 'Pump IDs not found', inform the user that it does not exist\n"
         )
 
         # Prepare messages
         openai_messages = [{"role": "system", "content": system_prompt}]
         openai_messages.extend(messages)
 
+        # Repeated questions on the same fleet version replay the cached answer
+        cache = get_llm_response_cache()
+        cached_chunks = None
+        if cacheable:
+            cache.sync("analysis", get_fleet_version().current()[0])
+            cache_key = response_key(
+                model_name, system_prompt, messages, temperature=0.7
+            )
+            cached_chunks = cache.get(cache_key)
+
+        # The stream only talks to the model: give the DB connection back now
+        db.session.close()
+
         # Get Ollama client
         logger = current_app.logger
         client = _get_ollama_client()
         app = current_app._get_current_object()
 
+        # Wait for a model slot last (429 when the backend queue is full), so
+        # nothing can raise between acquiring it and the stream owning it
+        ticket = None
+        if cached_chunks is None:
+            try:
+                ticket = get_inference_scheduler().acquire(
+                    ollama_base_url(), requester_key(), PRIORITY_INTERACTIVE
+                )
+            except InferenceQueueFull as e:
+                return queue_full_response(e)
+
         @stream_with_context
         def generate():
             with app.app_context():
                 try:
+                    if cached_chunks is not None:
+                        for content in cached_chunks:
+                            yield f"data: {json.dumps({'type': 'chunk', 'content': content})}\n\n"
+                        yield f"data: {json.dumps({'type': 'complete'})}\n\n"
+                        return
+
                     response = client.chat.completions.create(
                         model=model_name,
                         messages=openai_messages,
@@ -921,18 +328,33 @@ def pumps_analysis_chat_stream():
                         temperature=0.7,
                     )
 
+                    chunks = []
                     for chunk in response:
                         if chunk.choices[0].delta.content:
                             content = chunk.choices[0].delta.content
+                            chunks.append(content)
                             yield f"data: {json.dumps({'type': 'chunk', 'content': content})}\n\n"
 
+                    if cacheable and chunks:
+                        cache.put(cache_key, chunks, "analysis")
                     yield f"data: {json.dumps({'type': 'complete'})}\n\n"
 
                 except Exception as e:
                     logger.error(f"Error in analysis chat stream: {str(e)}")
                     yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
-
-        return Response(generate(), mimetype="text/event-stream")
+                finally:
+                    if ticket is not None:
+                        ticket.release()
+
+        response = Response(
+            generate(),
+            mimetype="text/event-stream",
+            headers={"X-Cache": "HIT" if cached_chunks is not None else "MISS"},
+        )
+        if ticket is not None:
+            # Frees the slot if the client goes away before streaming starts
+            response.call_on_close(ticket.release)
+        return response
 
     except Exception as e:
         current_app.logger.error(f"Error in pumps analysis chat: {str(e)}")
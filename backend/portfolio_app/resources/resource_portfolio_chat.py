@@ -1,10 +1,26 @@
 import os
 import json
+import hashlib
 
 from flask import Blueprint, current_app, request, Response, stream_with_context
 
 from openai import OpenAI
 
+from portfolio_app.services.inference_scheduler_service import (
+    PRIORITY_INTERACTIVE,
+    InferenceQueueFull,
+    get_inference_scheduler,
+    queue_full_response,
+    requester_key,
+)
+from portfolio_app.services.llm_client_service import (
+    get_ollama_client,
+    ollama_base_url,
+)
+from portfolio_app.services.llm_response_cache_service import (
+    get_llm_response_cache,
+    response_key,
+)
 
 blueprint_api_portfolio_chat = Blueprint("blueprint_api_portfolio_chat", __name__)
 
@@ -27,6 +43,7 @@ def _clear_cv_cache():
     """Clear the CV text cache. Useful after fixing CV loading issues."""
     global _cv_text_cache
     _cv_text_cache = None
+    get_llm_response_cache().invalidate("portfolio")
 
 
 def _extract_cv_summary(cv_text: str, max_chars: int = None) -> str:
@@ -230,27 +247,16 @@ def _load_cv_text() -> str:
         return ""
 
 
+def _cv_version() -> str:
+    """Hash of the loaded CV text, the version of cached portfolio answers"""
+    return hashlib.sha256(_load_cv_text().encode()).hexdigest()
+
+
 def _get_ollama_client() -> OpenAI:
     """
-    Create an OpenAI-compatible client configured for Ollama.
+    Shared OpenAI-compatible client of the Ollama backend (pooled connections).
     """
-    # Try explicit env first
-    base_url = os.getenv("OLLAMA_BASE_URL")
-
-    # Fallback to host.docker.internal when running in Docker
-    is_docker = os.path.exists("/.dockerenv") or os.getenv("DOCKER_CONTAINER")
-    if not base_url:
-        if is_docker:
-            base_url = "http://host.docker.internal:11434/v1"
-        else:
-            base_url = "http://localhost:11434/v1"
-
-    client = OpenAI(
-        api_key="ollama",  # dummy key for Ollama
-        base_url=base_url,
-        timeout=300.0,
-    )
-    return client
+    return get_ollama_client()
 
 
 def _build_system_prompt(role: str, language: str = "en") -> str:
@@ -385,8 +391,31 @@ def portfolio_chat_stream():
             if r in ("user", "assistant") and c:
                 openai_messages.append({"role": r, "content": c})
 
+        # Repeated questions on the same CV replay the cached answer
+        cache = get_llm_response_cache()
+        cache.sync("portfolio", _cv_version())
+        cache_key = response_key(
+            model_name,
+            system_prompt,
+            openai_messages[1:],
+            temperature=0.3,
+            max_tokens=CHAT_MAX_TOKENS,
+        )
+        cached_chunks = cache.get(cache_key)
+
         client = _get_ollama_client()
 
+        # Wait for a model slot last (429 when the backend queue is full), so
+        # nothing can raise between acquiring it and the stream owning it
+        ticket = None
+        if cached_chunks is None:
+            try:
+                ticket = get_inference_scheduler().acquire(
+                    ollama_base_url(), requester_key(), PRIORITY_INTERACTIVE
+                )
+            except InferenceQueueFull as e:
+                return queue_full_response(e)
+
         def generate():
             def send_event(obj):
                 data = json.dumps(obj, ensure_ascii=False)
@@ -401,6 +430,12 @@ def portfolio_chat_stream():
                     }
                 )
 
+                if cached_chunks is not None:
+                    for content in cached_chunks:
+                        yield from send_event({"type": "chunk", "content": content})
+                    yield from send_event({"type": "complete"})
+                    return
+
                 stream = client.chat.completions.create(
                     model=model_name,
                     messages=openai_messages,
@@ -409,13 +444,18 @@ def portfolio_chat_stream():
                     stream=True,
                 )
 
+                chunks = []
                 for chunk in stream:
                     delta = chunk.choices[0].delta
                     if delta and getattr(delta, "content", None):
+                        chunks.append(delta.content)
                         yield from send_event(
                             {"type": "chunk", "content": delta.content}
                         )
 
+                if chunks:
+                    cache.put(cache_key, chunks, "portfolio")
+
                 # Completion event
                 yield from send_event({"type": "complete"})
 
@@ -427,11 +467,19 @@ def portfolio_chat_stream():
                         "error": str(e),
                     }
                 )
+            finally:
+                if ticket is not None:
+                    ticket.release()
 
-        return Response(
+        response = Response(
             stream_with_context(generate()),
             mimetype="text/event-stream",
+            headers={"X-Cache": "HIT" if cached_chunks is not None else "MISS"},
         )
+        if ticket is not None:
+            # Frees the slot if the client goes away before streaming starts
+            response.call_on_close(ticket.release)
+        return response
     except Exception as outer_err:  # pragma: no cover - defensive
         current_app.logger.error(f"Portfolio chat endpoint error: {outer_err}")
         return (
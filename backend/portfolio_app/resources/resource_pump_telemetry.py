@@ -0,0 +1,106 @@
+from flask import Blueprint, jsonify, request, make_response
+from flask_jwt_extended import jwt_required
+import io
+from datetime import datetime, timedelta
+from portfolio_app import db
+from portfolio_app.models.tbl_pumps import Pump
+from portfolio_app.decorators.auth_decorators import require_permission
+from portfolio_app.services.pump_import_service import PumpImportService
+from portfolio_app.services.pump_snapshot_service import get_pump_snapshot
+from portfolio_app.services.pump_telemetry_service import (
+    DEFAULT_MAX_POINTS,
+    PumpTelemetryService,
+    parse_reading_time,
+    parse_duration,
+)
+
+blueprint_api_pump_telemetry = Blueprint("api_pump_telemetry", __name__, url_prefix="")
+
+DEFAULT_SERIES_RANGE = timedelta(hours=24)
+
+
+@blueprint_api_pump_telemetry.route("api/v1/pumps/telemetry", methods=["POST"])
+@jwt_required()
+@require_permission("pumps", "update")
+def ingest_pump_telemetry():
+    """
+    Recibir lecturas de telemetría en lote (NDJSON)
+
+    One JSON object per line: {"ccn_pump": ..., "recorded_at": ISO string or
+    epoch seconds, "flow_rate": ..., "pressure": ..., ...} with any subset of
+    the metrics. Valid readings are stored in one transaction; the response
+    lists the lines that failed.
+    """
+    try:
+        text_stream = io.TextIOWrapper(request.stream, encoding="utf-8-sig")
+        last_values = {}
+        report = PumpTelemetryService.ingest(
+            PumpImportService.iter_records(text_stream, "ndjson"),
+            last_values=last_values,
+        )
+        db.session.commit()
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return make_response(jsonify({"error": "Body must be UTF-8 encoded"}), 400)
+    except Exception as e:
+        db.session.rollback()
+        return make_response(jsonify({"error": str(e)}), 500)
+
+    if report["accepted"]:
+        if last_values:
+            # Core updates bypass the Pump mapper events that keep the snapshot current
+            get_pump_snapshot().apply_values(last_values)
+        try:
+            PumpTelemetryService.schedule_rollup()
+        except Exception as e:
+            print(f"⚠️ Could not schedule telemetry rollup: {str(e)}")
+
+    return make_response(jsonify(report), 201 if report["accepted"] else 400)
+
+
+@blueprint_api_pump_telemetry.route(
+    "api/v1/pumps/<string:ccn_pump>/telemetry", methods=["GET"]
+)
+@jwt_required()
+@require_permission("pumps", "read")
+def get_pump_telemetry(ccn_pump):
+    """
+    Serie temporal de las métricas de una bomba
+
+    Query: ``from`` / ``to`` (ISO or epoch seconds; default the last 24 hours),
+    ``metrics=a,b`` (default all), and ``step`` (``30s``, ``5m``, ``1h``...)
+    or ``max_points`` (default 500) to pick the resolution.
+    """
+    if not db.session.get(Pump, ccn_pump):
+        return make_response(jsonify({"msg": "Pump not found"}), 404)
+
+    try:
+        end = (
+            parse_reading_time(request.args["to"])
+            if request.args.get("to")
+            else datetime.now()
+        )
+        start = (
+            parse_reading_time(request.args["from"])
+            if request.args.get("from")
+            else end - DEFAULT_SERIES_RANGE
+        )
+        metrics = [
+            m.strip() for m in request.args.get("metrics", "").split(",") if m.strip()
+        ]
+        max_points = request.args.get("max_points", DEFAULT_MAX_POINTS, type=int)
+        result = PumpTelemetryService.series(
+            ccn_pump,
+            start,
+            end,
+            metrics or None,
+            step_seconds=parse_duration(request.args.get("step"), "step"),
+            max_points=max_points,
+        )
+    except ValueError as e:
+        return make_response(jsonify({"error": str(e)}), 400)
+    except Exception as e:
+        return make_response(jsonify({"error": str(e)}), 500)
+
+    result.update(ccn_pump=ccn_pump, start=start.isoformat(), end=end.isoformat())
+    return make_response(jsonify(result), 200)
@@ -5,26 +5,74 @@ from flask import (
     make_response,
     send_from_directory,
     current_app,
+    Response,
+    stream_with_context,
 )
 from flask_jwt_extended import jwt_required, current_user
+from werkzeug.exceptions import NotFound
 from werkzeug.utils import secure_filename
+import io
+import mimetypes
 import os
-import uuid
-from datetime import datetime
+import math
+import json
+import base64
+import binascii
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, text
 from portfolio_app import db
 from portfolio_app.models.tbl_pumps import Pump
-from portfolio_app.schemas.schema_pumps import SchemaPump
+from portfolio_app.schemas.schema_pumps import SchemaPump, PumpProjection
 from portfolio_app.decorators.auth_decorators import (
     require_permission,
     require_ownership_or_permission,
 )
+from portfolio_app.decorators.cache_decorators import conditional_on_fleet_version
 from portfolio_app.services.audit_log_service import AuditLogService
+from portfolio_app.services.pump_bulk_service import PumpBulkService
+from portfolio_app.services.pump_export_service import PumpExportService
+from portfolio_app.services.pump_maintenance_service import (
+    DEFAULT_DUE_LIMIT,
+    MAX_DUE_LIMIT,
+    MAX_DUE_WITHIN_DAYS,
+    PumpMaintenanceService,
+    get_maintenance_scheduler,
+)
+from portfolio_app.services.photo_store_service import (
+    PhotoStore,
+    blob_hash,
+    blob_path,
+    blob_relpath,
+    get_photo_ownership_index,
+)
+from portfolio_app.services.pump_image_service import (
+    PHOTO_SIZES,
+    PumpImageService,
+    rendition_filename,
+    rendition_filenames,
+)
+from portfolio_app.services.pump_import_service import (
+    IMPORT_FORMATS,
+    PumpImportService,
+    parse_date_field,
+)
+from portfolio_app.services.pump_search_service import (
+    DEFAULT_SEARCH_LIMIT,
+    PumpSearchService,
+    get_pump_search_index,
+)
+from portfolio_app.services.pump_snapshot_service import get_pump_snapshot
+from portfolio_app.services.pump_telemetry_service import parse_duration
 
 blueprint_api_pump = Blueprint("api_pump", __name__, url_prefix="")
 
 # Configuración para archivos
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+PHOTO_MAX_AGE = 365 * 24 * 3600  # Photo URLs are content-addressed
+
+# ?format= values accepted by the streaming export of /api/v1/pumps/all
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
 
 
 def allowed_file(filename):
@@ -32,35 +80,129 @@ def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def parse_date_field(date_str):
-    """Parse date field that can be in YYYY-MM-DD or ISO format"""
+def encode_pump_cursor(created_at, ccn_pump, direction):
+    """Build an opaque keyset cursor pointing at a pump's (created_at, ccn_pump)"""
+    payload = {
+        "c": created_at.isoformat(),
+        "id": ccn_pump,
+        "d": direction,
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_pump_cursor(token):
+    """Decode a keyset cursor into (created_at, ccn_pump, direction)"""
     try:
-        # Try ISO format first
-        if "T" in date_str or "Z" in date_str:
-            return datetime.fromisoformat(date_str.replace("Z", "+00:00"))
-        # Try simple date format YYYY-MM-DD
-        return datetime.strptime(date_str, "%Y-%m-%d")
-    except (ValueError, AttributeError) as e:
-        raise ValueError(f"Invalid date format: {date_str}. {str(e)}")
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = payload["d"]
+        if direction not in ("next", "prev"):
+            raise ValueError(direction)
+        return datetime.fromisoformat(payload["c"]), str(payload["id"]), direction
+    except (ValueError, KeyError, TypeError, binascii.Error) as e:
+        raise ValueError(f"Invalid cursor: {token}") from e
+
+
+def approximate_pumps_total():
+    """
+    Cheap row-count estimate for tbl_pumps
+
+    Uses the storage engine's table statistics where available (MySQL
+    information_schema, PostgreSQL pg_class) and falls back to COUNT(*).
+    """
+    dialect = db.engine.dialect.name
+    if dialect in ("mysql", "mariadb"):
+        estimate = db.session.execute(
+            text(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+            ),
+            {"table": Pump.__tablename__},
+        ).scalar()
+    elif dialect == "postgresql":
+        estimate = db.session.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = :table"),
+            {"table": Pump.__tablename__},
+        ).scalar()
+    else:
+        estimate = None
+
+    if estimate is None or estimate < 0:
+        estimate = Pump.query.count()
+    return int(estimate)
+
+
+def pump_projection_from_request(extra_columns=()):
+    """
+    PumpProjection for the ``fields=`` query argument (all fields by default)
+
+    ``photo_size=`` selects the rendition photo_urls point at (thumb by default).
+    """
+    return PumpProjection.from_arg(
+        request.args.get("fields"), extra_columns, request.args.get("photo_size")
+    )
 
 
 def save_pump_photo(file, pump_id):
-    """Guardar una foto de bomba en el directorio correspondiente"""
+    """
+    Guardar una foto de bomba en el almacén direccionado por contenido
+
+    Identical uploads share one blob; the returned name is ``<sha256>.<ext>``.
+    ``pump_id`` is kept for callers; blobs are not stored per pump.
+    """
     if file and allowed_file(file.filename):
-        # Generar nombre único para el archivo
         file_extension = file.filename.rsplit(".", 1)[1].lower()
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
+        filename = PhotoStore.save(file, file_extension)
+
+        # Generar miniaturas WebP en segundo plano (una vez por contenido)
+        file_path = blob_path(filename)
+        directory = os.path.dirname(file_path)
+        if not all(
+            os.path.exists(os.path.join(directory, rendition))
+            for rendition in rendition_filenames(filename)
+        ):
+            try:
+                PumpImageService.schedule_renditions(file_path)
+            except Exception as e:
+                print(f"⚠️ Could not schedule renditions for {file_path}: {str(e)}")
+
+        return filename
+    return None
 
-        # Crear directorio si no existe
-        pump_dir = os.path.join("portfolio_app", "static", "pumps", pump_id)
-        os.makedirs(pump_dir, exist_ok=True)
 
-        # Guardar archivo
-        file_path = os.path.join(pump_dir, unique_filename)
-        file.save(file_path)
+def send_pump_photo(directory, filename, size):
+    """
+    Respond with a stored photo or one of its renditions
 
-        return unique_filename
-    return None
+    Range requests and conditional GETs are handled by send_from_directory
+    (and USE_X_SENDFILE when enabled). With PHOTO_ACCEL_REDIRECT_PREFIX set,
+    store blobs are handed to nginx through X-Accel-Redirect. Names are
+    content-addressed (or random for legacy uploads), so exact matches are
+    cached as immutable.
+    """
+    served = PumpImageService.resolve(directory, filename, size)
+    exact = served == rendition_filename(filename, size)
+
+    accel_prefix = current_app.config.get("PHOTO_ACCEL_REDIRECT_PREFIX")
+    if accel_prefix and blob_hash(filename):
+        response = Response(
+            mimetype=mimetypes.guess_type(served)[0] or "application/octet-stream"
+        )
+        response.headers["X-Accel-Redirect"] = (
+            f"{accel_prefix.rstrip('/')}/{blob_relpath(filename).rsplit('/', 1)[0]}/{served}"
+        )
+    else:
+        response = send_from_directory(directory, served)
+
+    if exact:
+        response.headers["Cache-Control"] = (
+            f"public, max-age={PHOTO_MAX_AGE}, immutable"
+        )
+    else:
+        # Rendition not rendered yet: serve the original without long-term caching
+        response.headers["Cache-Control"] = "no-cache"
+    return response
 
 
 @blueprint_api_pump.route("api/v1/pumps", methods=["POST"])
@@ -140,7 +282,9 @@ def create_pump():
 
                 saved_filename = save_pump_photo(file, new_pump.ccn_pump)
                 if saved_filename:
-                    new_pump.add_photo(saved_filename)
+                    new_pump.add_photo(
+                        saved_filename, **PhotoStore.describe(saved_filename)
+                    )
                     uploaded_photos.append(saved_filename)
 
         db.session.commit()
@@ -166,6 +310,145 @@ def create_pump():
         return make_response(jsonify({"error": str(e)}), 500)
 
 
+@blueprint_api_pump.route("api/v1/pumps/bulk", methods=["POST"])
+@jwt_required()
+@require_permission("pumps", "create")
+def bulk_create_pumps():
+    """
+    Importar bombas desde un archivo CSV o NDJSON
+
+    The upload is sent as multipart field ``file`` or as the raw request body.
+    The format comes from ``?format=csv|ndjson``, the file extension or the
+    Content-Type. Rows are validated as they are read and the valid ones are
+    inserted in one transaction; the response lists the rows that failed.
+    Rows without ``user_id`` are assigned to the importing user.
+    """
+    upload = request.files.get("file")
+    if upload is not None:
+        source = upload.stream
+        hint = (
+            upload.filename.rsplit(".", 1)[-1].lower()
+            if "." in (upload.filename or "")
+            else upload.mimetype
+        )
+    else:
+        source = request.stream
+        hint = request.mimetype
+
+    file_format = IMPORT_FORMATS.get(request.args.get("format") or hint)
+    if file_format is None:
+        return make_response(
+            jsonify({"error": "Upload must be CSV or NDJSON (use ?format=csv|ndjson)"}),
+            400,
+        )
+
+    try:
+        text_stream = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+        report = PumpImportService.import_records(
+            PumpImportService.iter_records(text_stream, file_format),
+            default_user_id=getattr(current_user, "ccn_user", None),
+        )
+        db.session.commit()
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return make_response(jsonify({"error": "Upload must be UTF-8 encoded"}), 400)
+    except Exception as e:
+        db.session.rollback()
+        return make_response(jsonify({"error": str(e)}), 500)
+
+    if report["imported"]:
+        # Core inserts bypass the Pump mapper events that keep the snapshot and
+        # the search index current
+        get_pump_snapshot().invalidate()
+        get_pump_search_index().invalidate()
+
+        if hasattr(current_user, "ccn_user"):
+            AuditLogService.log_create(
+                ccn_user=current_user.ccn_user,
+                resource="pumps",
+                description=f"Bulk imported {report['imported']} pumps ({report['failed']} rows rejected)",
+            )
+
+    return make_response(jsonify(report), 201 if report["imported"] else 400)
+
+
+@blueprint_api_pump.route("api/v1/pumps/bulk", methods=["PATCH"])
+@jwt_required()
+@require_permission("pumps", "update")
+def bulk_update_pumps():
+    """
+    Actualizar varias bombas con una sola sentencia UPDATE
+
+    Body: {"ids": [...]} and/or {"filter": {"status": ..., "location": ...,
+    "model": ...}} plus {"changes": {field: value, ...}}
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        clauses = PumpBulkService.criteria(payload)
+        updated = PumpBulkService.update(clauses, payload.get("changes"))
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return make_response(jsonify({"error": str(e)}), 400)
+    except Exception as e:
+        db.session.rollback()
+        return make_response(jsonify({"error": str(e)}), 500)
+
+    # Set-based SQL bypasses the Pump mapper events that keep the snapshot and
+    # the search index current
+    get_pump_snapshot().invalidate()
+    get_pump_search_index().invalidate()
+
+    if updated and hasattr(current_user, "ccn_user"):
+        AuditLogService.log_update(
+            ccn_user=current_user.ccn_user,
+            resource="pumps",
+            description=f"Bulk updated {updated} pumps: {', '.join(sorted(payload['changes']))}",
+        )
+
+    return make_response(
+        jsonify({"msg": "Pumps updated successfully", "updated": updated}), 200
+    )
+
+
+@blueprint_api_pump.route("api/v1/pumps/bulk", methods=["DELETE"])
+@jwt_required()
+@require_permission("pumps", "delete")
+def bulk_delete_pumps():
+    """
+    Eliminar varias bombas por lista de IDs y/o filtro
+
+    Photo directories are removed in a background thread pool after commit.
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        clauses = PumpBulkService.criteria(payload)
+        deleted = PumpBulkService.delete(clauses)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return make_response(jsonify({"error": str(e)}), 400)
+    except Exception as e:
+        db.session.rollback()
+        return make_response(jsonify({"error": str(e)}), 500)
+
+    get_pump_snapshot().invalidate()
+    get_pump_search_index().invalidate()
+    PhotoStore.collect_released()
+    PumpBulkService.schedule_photo_cleanup(deleted)
+
+    if deleted and hasattr(current_user, "ccn_user"):
+        AuditLogService.log_delete(
+            ccn_user=current_user.ccn_user,
+            resource="pumps",
+            description=f"Bulk deleted {len(deleted)} pumps",
+        )
+
+    return make_response(
+        jsonify({"msg": "Pumps deleted successfully", "deleted": len(deleted)}), 200
+    )
+
+
 @blueprint_api_pump.route("api/v1/pumps/<string:ccn_pump>/photos", methods=["POST"])
 @jwt_required()
 @require_permission("pumps", "update")
@@ -201,7 +484,9 @@ def upload_pump_photos(ccn_pump):
 
                 saved_filename = save_pump_photo(file, pump.ccn_pump)
                 if saved_filename:
-                    pump.add_photo(saved_filename)
+                    pump.add_photo(
+                        saved_filename, **PhotoStore.describe(saved_filename)
+                    )
                     uploaded_photos.append(saved_filename)
 
         db.session.commit()
@@ -238,14 +523,20 @@ def delete_pump_photo(ccn_pump, photo_filename):
         if photo_filename not in photos_list:
             return make_response(jsonify({"msg": "Photo not found"}), 404)
 
-        # Eliminar archivo físico
-        file_path = os.path.join(pump.get_pump_directory(), photo_filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        # Eliminar archivo físico (fotos anteriores al almacén); los blobs se
+        # eliminan cuando ninguna bomba los referencia
+        if not blob_hash(photo_filename):
+            file_path = os.path.join(pump.get_pump_directory(), photo_filename)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            PumpImageService.remove_renditions(
+                pump.get_pump_directory(), photo_filename
+            )
 
         # Remover de la base de datos
         pump.remove_photo(photo_filename)
         db.session.commit()
+        PhotoStore.collect_released()
 
         # Verificar si el directorio quedó vacío y eliminarlo
         pump_dir = pump.get_pump_directory()
@@ -267,126 +558,180 @@ def delete_pump_photo(ccn_pump, photo_filename):
     "api/v1/pumps/<string:ccn_pump>/photos/<string:photo_filename>", methods=["GET"]
 )
 def get_pump_photo(ccn_pump, photo_filename):
-    """Servir una foto específica de una bomba"""
-    try:
-        pump = Pump.query.filter_by(ccn_pump=ccn_pump).first()
-        if not pump:
-            return make_response(jsonify({"msg": "Pump not found"}), 404)
+    """Servir una foto específica de una bomba (?size=thumb|medium|full)"""
+    size = request.args.get("size", "full")
+    if size not in PHOTO_SIZES:
+        return make_response(
+            jsonify({"error": f"size must be one of: {', '.join(PHOTO_SIZES)}"}), 400
+        )
 
-        photos_list = pump.get_photos_list()
-        if photo_filename not in photos_list:
+    try:
+        # Ownership comes from an in-memory index, not a query per hit
+        if not get_photo_ownership_index().owns(ccn_pump, photo_filename):
             return make_response(jsonify({"msg": "Photo not found"}), 404)
 
-        # Usar ruta absoluta desde el directorio raíz de la aplicación
-        pump_dir = os.path.join(
-            os.getcwd(), "portfolio_app", "static", "pumps", ccn_pump
-        )
-        photo_path = os.path.join(pump_dir, photo_filename)
-
-        if not os.path.exists(photo_path):
-            return make_response(jsonify({"msg": "Photo file not found"}), 404)
+        if blob_hash(photo_filename):
+            directory = os.path.dirname(os.path.abspath(blob_path(photo_filename)))
+        else:
+            # Fotos anteriores al almacén: directorio propio de la bomba
+            directory = os.path.join(
+                os.getcwd(), "portfolio_app", "static", "pumps", ccn_pump
+            )
 
-        return send_from_directory(pump_dir, photo_filename)
+        return send_pump_photo(directory, photo_filename, size)
 
+    except NotFound:
+        return make_response(jsonify({"msg": "Photo file not found"}), 404)
     except Exception as e:
         return make_response(jsonify({"error": str(e)}), 500)
 
 
 @blueprint_api_pump.route("api/v1/pumps/<string:ccn_pump>", methods=["GET"])
+@conditional_on_fleet_version
 def get_pump(ccn_pump):
-    query_pump = (
-        Pump.query.options(db.joinedload(Pump.user))
-        .filter_by(ccn_pump=ccn_pump)
-        .first()
-    )
-    if not query_pump:
+    try:
+        projection = pump_projection_from_request()
+    except ValueError as e:
+        return make_response(jsonify({"error": str(e)}), 400)
+
+    row = db.session.execute(
+        projection.select().where(Pump.ccn_pump == ccn_pump)
+    ).first()
+    if not row:
         return make_response(jsonify({"msg": "Pump not found"}), 404)
 
-    schema_pump = SchemaPump(many=False)
-    pump = schema_pump.dump(query_pump)
-
-    # Obtener el dominio de la API desde variables de entorno o usar el valor por defecto
-    api_domain = os.getenv("API_DOMAIN", "https://api.ruizdev7.com")
-
-    # Agregar URLs completas para las fotos usando el dominio de la API
-    pump["photo_urls"] = [
-        f"{api_domain}/api/v1/pumps/{ccn_pump}/photos/{photo}"
-        for photo in query_pump.get_photos_list()
-    ]
-
-    # Agregar información del usuario
-    if query_pump.user:
-        pump["user_ccn"] = query_pump.user.ccn_user
-        middle = (
-            f" {query_pump.user.middle_name}" if query_pump.user.middle_name else ""
-        )
-        pump["user_name"] = (
-            f"{query_pump.user.first_name}{middle} {query_pump.user.last_name}"
-        )
-    else:
-        pump["user_ccn"] = None
-        pump["user_name"] = "Unknown User"
-
-    return make_response(jsonify({"Pump": pump}), 200)
+    return make_response(jsonify({"Pump": projection.dump(row)}), 200)
 
 
 @blueprint_api_pump.route("api/v1/pumps", methods=["GET"])
 @jwt_required()
 @require_permission("pumps", "read")
+@conditional_on_fleet_version
 def get_all_pumps():
+    # Cursor (keyset) mode: ?cursor= (empty for the first page) or ?cursor=<token>
+    if "cursor" in request.args:
+        return get_pumps_by_cursor()
+
+    try:
+        projection = pump_projection_from_request()
+    except ValueError as e:
+        return make_response(jsonify({"error": str(e)}), 400)
+
     # Get query parameters for pagination
-    page = request.args.get("page", 1, type=int)
+    page = max(request.args.get("page", 1, type=int), 1)
     per_page = request.args.get("per_page", 100, type=int)  # Default 100 per page
+    if per_page < 1:
+        per_page = 100
 
     # Get total count
     total_pumps = Pump.query.count()
+    pages = math.ceil(total_pumps / per_page) if total_pumps else 0
 
     # Get paginated pumps
-    pumps = Pump.query.options(db.joinedload(Pump.user)).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
-
-    schema_pump = SchemaPump(many=True)
-    pumps_data = schema_pump.dump(pumps.items)
-
-    # Obtener el dominio de la API desde variables de entorno o usar el valor por defecto
-    api_domain = os.getenv("API_DOMAIN", "https://api.ruizdev7.com")
-
-    # Agregar URLs de fotos y información del usuario para cada bomba
-    for i, pump in enumerate(pumps.items):
-        pumps_data[i]["photo_urls"] = [
-            f"{api_domain}/api/v1/pumps/{pump.ccn_pump}/photos/{photo}"
-            for photo in pump.get_photos_list()
-        ]
-
-        # Agregar información del usuario
-        if pump.user:
-            pumps_data[i]["user_ccn"] = pump.user.ccn_user
-            middle = f" {pump.user.middle_name}" if pump.user.middle_name else ""
-            pumps_data[i][
-                "user_name"
-            ] = f"{pump.user.first_name}{middle} {pump.user.last_name}"
-        else:
-            pumps_data[i]["user_ccn"] = None
-            pumps_data[i]["user_name"] = "Unknown User"
-
-    import json
+    rows = db.session.execute(
+        projection.select().limit(per_page).offset((page - 1) * per_page)
+    ).all()
 
     response_data = {
-        "Pumps": pumps_data,
+        "Pumps": projection.dump_many(rows),
         "pagination": {
             "page": page,
             "per_page": per_page,
             "total": total_pumps,
-            "pages": pumps.pages,
-            "has_next": pumps.has_next,
-            "has_prev": pumps.has_prev,
+            "pages": pages,
+            "has_next": page < pages,
+            "has_prev": page > 1,
         },
     }
     return make_response(jsonify(response_data), 200)
 
 
+def get_pumps_by_cursor():
+    """
+    Keyset pagination over (created_at, ccn_pump)
+
+    Query params:
+      cursor: opaque token from next_cursor/prev_cursor, empty for the first page
+      per_page: page size (default 100, max 1000)
+      include_total: "approx" to add an estimated total from table statistics
+      fields: optional comma-separated field projection
+
+    Each page is a single index range scan, so latency does not depend on
+    how deep the page is.
+    """
+    per_page = min(max(request.args.get("per_page", 100, type=int), 1), 1000)
+    token = request.args.get("cursor", "")
+
+    try:
+        projection = pump_projection_from_request(
+            extra_columns=("created_at", "ccn_pump")
+        )
+    except ValueError as e:
+        return make_response(jsonify({"error": str(e)}), 400)
+
+    query = projection.select()
+    direction = "next"
+    if token:
+        try:
+            created_at, ccn_pump, direction = decode_pump_cursor(token)
+        except ValueError as e:
+            return make_response(jsonify({"error": str(e)}), 400)
+
+        if direction == "next":
+            query = query.where(
+                or_(
+                    Pump.created_at > created_at,
+                    and_(Pump.created_at == created_at, Pump.ccn_pump > ccn_pump),
+                )
+            )
+        else:
+            query = query.where(
+                or_(
+                    Pump.created_at < created_at,
+                    and_(Pump.created_at == created_at, Pump.ccn_pump < ccn_pump),
+                )
+            )
+
+    if direction == "next":
+        query = query.order_by(Pump.created_at.asc(), Pump.ccn_pump.asc())
+    else:
+        query = query.order_by(Pump.created_at.desc(), Pump.ccn_pump.desc())
+
+    # Fetch one extra row to learn whether another page exists in this direction
+    rows = db.session.execute(query.limit(per_page + 1)).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if direction == "next":
+        has_next, has_prev = has_more, bool(token)
+    else:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+
+    def cursor_for(row, cursor_direction):
+        return encode_pump_cursor(
+            projection.value(row, "created_at"),
+            projection.value(row, "ccn_pump"),
+            cursor_direction,
+        )
+
+    pagination = {
+        "per_page": per_page,
+        "next_cursor": cursor_for(rows[-1], "next") if has_next and rows else None,
+        "prev_cursor": cursor_for(rows[0], "prev") if has_prev and rows else None,
+        "has_next": has_next and bool(rows),
+        "has_prev": has_prev and bool(rows),
+    }
+    if request.args.get("include_total") == "approx":
+        pagination["total"] = approximate_pumps_total()
+        pagination["total_is_approximate"] = True
+
+    response_data = {"Pumps": projection.dump_many(rows), "pagination": pagination}
+    return make_response(jsonify(response_data), 200)
+
+
 @blueprint_api_pump.route("api/v1/pumps/count", methods=["GET"])
+@conditional_on_fleet_version
 def get_pumps_count():
     """Endpoint de prueba para verificar el conteo de bombas"""
     count = Pump.query.count()
@@ -395,41 +740,152 @@ def get_pumps_count():
     )
 
 
-@blueprint_api_pump.route("api/v1/pumps/all", methods=["GET"])
+@blueprint_api_pump.route("api/v1/pumps/maintenance/due", methods=["GET"])
 @jwt_required()
 @require_permission("pumps", "read")
-def get_all_pumps_no_pagination():
-    """Endpoint para obtener todas las bombas sin paginación"""
-    # Get all pumps without pagination
-    pumps = Pump.query.options(db.joinedload(Pump.user)).all()
-    total_pumps = len(pumps)
+def get_pumps_maintenance_due():
+    """
+    Bombas con mantenimiento pendiente
+
+    ``within=7d`` (also ``12h``, ``2w``...) sets the horizon; overdue pumps are
+    included unless ``include_overdue=false``. ``status=a,b`` filters by
+    status and ``limit`` caps the list (default 500). Pumps are ordered by
+    next_maintenance and read with an index range scan.
+    """
+    try:
+        within = parse_duration(request.args.get("within") or "7d", "within")
+        if within > MAX_DUE_WITHIN_DAYS * 86400:
+            raise ValueError(f"within must be at most {MAX_DUE_WITHIN_DAYS}d")
+        limit = request.args.get("limit", DEFAULT_DUE_LIMIT, type=int)
+        if not 1 <= limit <= MAX_DUE_LIMIT:
+            raise ValueError(f"limit must be between 1 and {MAX_DUE_LIMIT}")
+        projection = pump_projection_from_request(extra_columns=["next_maintenance"])
+    except ValueError as e:
+        return make_response(jsonify({"error": str(e)}), 400)
+
+    statuses = [
+        s.strip() for s in request.args.get("status", "").split(",") if s.strip()
+    ]
+    include_overdue = request.args.get("include_overdue", "true").lower() != "false"
+    now = datetime.now()
+    clauses = PumpMaintenanceService.due_clauses(
+        now, timedelta(seconds=within), statuses, include_overdue
+    )
+
+    rows = db.session.execute(
+        projection.select()
+        .where(*clauses)
+        .order_by(Pump.next_maintenance, Pump.ccn_pump)
+        .limit(limit + 1)
+    ).all()
+    truncated = len(rows) > limit
+    rows = rows[:limit]
+    overdue = sum(1 for row in rows if projection.value(row, "next_maintenance") < now)
 
-    schema_pump = SchemaPump(many=True)
-    pumps_data = schema_pump.dump(pumps)
+    return make_response(
+        jsonify(
+            {
+                "Pumps": projection.dump_many(rows),
+                "as_of": now.isoformat(),
+                "within_seconds": within,
+                "overdue": overdue,
+                "upcoming": len(rows) - overdue,
+                "truncated": truncated,
+            }
+        ),
+        200,
+    )
 
-    # Obtener el dominio de la API desde variables de entorno o usar el valor por defecto
-    api_domain = os.getenv("API_DOMAIN", "https://api.ruizdev7.com")
 
-    # Agregar URLs de fotos y información del usuario para cada bomba
-    for i, pump in enumerate(pumps):
-        pumps_data[i]["photo_urls"] = [
-            f"{api_domain}/api/v1/pumps/{pump.ccn_pump}/photos/{photo}"
-            for photo in pump.get_photos_list()
-        ]
+@blueprint_api_pump.route("api/v1/pumps/maintenance/summary", methods=["GET"])
+@jwt_required()
+@require_permission("pumps", "read")
+def get_pumps_maintenance_summary():
+    """
+    Resumen de mantenimiento por ubicación (vencido / próximos 7 y 30 días)
 
-        # Agregar información del usuario
-        if pump.user:
-            pumps_data[i]["user_ccn"] = pump.user.ccn_user
-            middle = f" {pump.user.middle_name}" if pump.user.middle_name else ""
-            pumps_data[i][
-                "user_name"
-            ] = f"{pump.user.first_name}{middle} {pump.user.last_name}"
-        else:
-            pumps_data[i]["user_ccn"] = None
-            pumps_data[i]["user_name"] = "Unknown User"
+    Served from the document published by the maintenance scheduler.
+    """
+    try:
+        document, etag = get_maintenance_scheduler().document()
+    except Exception as e:
+        return make_response(jsonify({"error": str(e)}), 500)
+
+    response = make_response(jsonify(document), 200)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response.make_conditional(request)
+
+
+@blueprint_api_pump.route("api/v1/pumps/search", methods=["GET"])
+@jwt_required()
+@require_permission("pumps", "read")
+@conditional_on_fleet_version
+def search_pumps():
+    """
+    Buscar bombas por número de serie, modelo, ubicación o ID
+
+    ``q`` is split on whitespace and every token must match; ``limit`` caps the
+    ranked results (default 20). Each result carries its score and
+    ``highlights`` per matched field, HTML-escaped with ``<mark>`` around the
+    matches.
+    """
+    try:
+        limit = request.args.get("limit", DEFAULT_SEARCH_LIMIT, type=int)
+        result = PumpSearchService.search(request.args.get("q", ""), limit)
+    except ValueError as e:
+        return make_response(jsonify({"error": str(e)}), 400)
+    except Exception as e:
+        return make_response(jsonify({"error": str(e)}), 500)
+
+    return make_response(jsonify(result), 200)
+
+
+def stream_pumps_export(mimetype, projection):
+    """Stream the whole fleet as NDJSON or CSV from a server-side cursor"""
+    if mimetype == "text/csv":
+        chunks = PumpExportService.csv_stream(projection)
+        headers = {"Content-Disposition": "attachment; filename=pumps.csv"}
+    else:
+        chunks = PumpExportService.ndjson_stream(projection)
+        headers = {}
+
+    # Ask reverse proxies (nginx) not to buffer so rows reach the client early
+    headers["X-Accel-Buffering"] = "no"
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+
+@blueprint_api_pump.route("api/v1/pumps/all", methods=["GET"])
+@jwt_required()
+@require_permission("pumps", "read")
+@conditional_on_fleet_version
+def get_all_pumps_no_pagination():
+    """
+    Endpoint para obtener todas las bombas sin paginación
+
+    Sending ``Accept: application/x-ndjson`` or ``Accept: text/csv`` (or
+    ``?format=ndjson|csv``) streams the fleet in batches instead of building
+    one JSON document in memory. ``fields=`` limits the returned fields.
+    """
+    try:
+        projection = pump_projection_from_request()
+    except ValueError as e:
+        return make_response(jsonify({"error": str(e)}), 400)
+
+    export_format = EXPORT_FORMATS.get(request.args.get("format", ""))
+    if export_format is None:
+        export_format = request.accept_mimetypes.best_match(
+            ["application/json", "application/x-ndjson", "text/csv"]
+        )
+    if export_format in ("application/x-ndjson", "text/csv"):
+        return stream_pumps_export(export_format, projection)
+
+    # Get all pumps without pagination
+    rows = db.session.execute(projection.select()).all()
+    total_pumps = len(rows)
 
     response_data = {
-        "Pumps": pumps_data,
+        "Pumps": projection.dump_many(rows),
         "total": total_pumps,
         "message": f"Retrieved all {total_pumps} pumps without pagination",
     }
@@ -450,14 +906,19 @@ def delete_pump(ccn_pump):
     deleted_photos = []
     failed_deletions = []
 
-    if os.path.exists(pump_dir):
-        photos_list = pump.get_photos_list()
+    photos_list = pump.get_photos_list()
+    # Blobs are shared; their references are dropped when the pump is deleted
+    deleted_photos.extend(photo for photo in photos_list if blob_hash(photo))
 
+    if os.path.exists(pump_dir):
         for photo in photos_list:
+            if blob_hash(photo):
+                continue
             photo_path = os.path.join(pump_dir, photo)
             if os.path.exists(photo_path):
                 try:
                     os.remove(photo_path)
+                    PumpImageService.remove_renditions(pump_dir, photo)
                     deleted_photos.append(photo)
                 except Exception as e:
                     failed_deletions.append(photo)
@@ -476,6 +937,7 @@ def delete_pump(ccn_pump):
     # Eliminar de la base de datos
     db.session.delete(pump)
     db.session.commit()
+    PhotoStore.collect_released()
 
     # Log pump deletion
     if hasattr(current_user, "ccn_user"):
@@ -549,7 +1011,9 @@ def update_pump(ccn_pump):
                 if file.filename != "":
                     saved_filename = save_pump_photo(file, pump.ccn_pump)
                     if saved_filename:
-                        pump.add_photo(saved_filename)
+                        pump.add_photo(
+                            saved_filename, **PhotoStore.describe(saved_filename)
+                        )
                         uploaded_photos.append(saved_filename)
 
         db.session.commit()
@@ -621,7 +1085,9 @@ def patch_pump(ccn_pump):
                 if file.filename != "":
                     saved_filename = save_pump_photo(file, pump.ccn_pump)
                     if saved_filename:
-                        pump.add_photo(saved_filename)
+                        pump.add_photo(
+                            saved_filename, **PhotoStore.describe(saved_filename)
+                        )
                         uploaded_photos.append(saved_filename)
 
         db.session.commit()
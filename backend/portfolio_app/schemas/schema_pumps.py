@@ -1,5 +1,18 @@
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from marshmallow import fields as ma_fields
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
+from sqlalchemy import select
+from portfolio_app.extensions import db
+from portfolio_app.models.tbl_pump_photos import PumpPhoto
 from portfolio_app.models.tbl_pumps import Pump
+from portfolio_app.models.tbl_users import User
+from portfolio_app.services.pump_image_service import (
+    DEFAULT_LIST_PHOTO_SIZE,
+    PHOTO_SIZES,
+)
 
 
 class SchemaPump(SQLAlchemyAutoSchema):
@@ -7,3 +20,191 @@ class SchemaPump(SQLAlchemyAutoSchema):
         model = Pump
         include_relationships = True
         load_instances = True
+        exclude = ("photo_records",)
+
+    photos = ma_fields.Function(lambda pump: pump.get_photos_list())
+
+
+# Fields of a serialized pump, in response order
+PUMP_FIELDS = [
+    "ccn_pump",
+    "model",
+    "serial_number",
+    "location",
+    "purchase_date",
+    "created_at",
+    "updated_at",
+    "status",
+    "flow_rate",
+    "pressure",
+    "power",
+    "efficiency",
+    "voltage",
+    "current",
+    "power_factor",
+    "last_maintenance",
+    "next_maintenance",
+    "photos",
+    "user",
+    "user_ccn",
+    "user_name",
+    "photo_urls",
+]
+
+# Table columns each field is computed from
+_FIELD_COLUMNS = {field: [field] for field in PUMP_FIELDS[:17]}
+_FIELD_COLUMNS.update(
+    {
+        "photos": ["ccn_pump"],
+        "user": ["user_id"],
+        "user_ccn": [],
+        "user_name": [],
+        "photo_urls": ["ccn_pump"],
+    }
+)
+_USER_FIELDS = {"user_ccn", "user_name"}
+_PHOTO_FIELDS = {"photos", "photo_urls"}
+PHOTO_CHUNK_SIZE = 1000
+_USER_COLUMNS = ["ccn_user", "first_name", "middle_name", "last_name"]
+
+
+def _iso(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def load_photo_map(ccn_pumps: Sequence[str], connection=None) -> Dict[str, List[str]]:
+    """
+    Photo file names of many pumps, in upload order, with one IN query per
+    PHOTO_CHUNK_SIZE pumps
+
+    ``connection`` defaults to the session; pass a separate one while the
+    session's connection is streaming a server-side cursor.
+    """
+    executor = connection if connection is not None else db.session
+    photos: Dict[str, List[str]] = {}
+    for start in range(0, len(ccn_pumps), PHOTO_CHUNK_SIZE):
+        chunk = ccn_pumps[start : start + PHOTO_CHUNK_SIZE]
+        rows = executor.execute(
+            select(PumpPhoto.ccn_pump, PumpPhoto.filename)
+            .where(PumpPhoto.ccn_pump.in_(chunk))
+            .order_by(PumpPhoto.ccn_pump_photo)
+        )
+        for ccn_pump, filename in rows:
+            photos.setdefault(ccn_pump, []).append(filename)
+    return photos
+
+
+class PumpProjection:
+    """
+    Lean, precompiled serializer for pump rows
+
+    Selects only the columns needed for the requested ``fields`` (joining
+    tbl_users only when a user field is asked for) and turns each result tuple
+    into a dict through precomputed column positions, without building ORM
+    objects or going through marshmallow. Photo fields are filled from one
+    batched tbl_pump_photos query per dumped page.
+    """
+
+    def __init__(
+        self,
+        fields: Optional[Iterable[str]] = None,
+        extra_columns: Sequence[str] = (),
+        photo_size: str = DEFAULT_LIST_PHOTO_SIZE,
+    ):
+        if photo_size not in PHOTO_SIZES:
+            raise ValueError(f"photo_size must be one of: {', '.join(PHOTO_SIZES)}")
+        self.photo_size = photo_size
+        self.fields = list(fields) if fields else list(PUMP_FIELDS)
+        unknown = [f for f in self.fields if f not in PUMP_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown pump fields: {', '.join(unknown)}")
+
+        self.needs_user = bool(_USER_FIELDS.intersection(self.fields))
+        self.needs_photos = bool(_PHOTO_FIELDS.intersection(self.fields))
+
+        # Pump columns to SELECT, deduplicated in a stable order
+        self.columns: List[str] = []
+        for name in [c for f in self.fields for c in _FIELD_COLUMNS[f]] + list(
+            extra_columns
+        ):
+            if name not in self.columns:
+                self.columns.append(name)
+        self._position = {name: i for i, name in enumerate(self.columns)}
+        self._user_offset = len(self.columns)
+
+        self.api_domain = os.getenv("API_DOMAIN", "https://api.ruizdev7.com")
+        self._getters = [(f, self._compile(f)) for f in self.fields]
+
+    @classmethod
+    def from_arg(
+        cls,
+        value: Optional[str],
+        extra_columns: Sequence[str] = (),
+        photo_size: Optional[str] = None,
+    ) -> "PumpProjection":
+        """Build from a ``fields=a,b,c`` query argument (empty means all fields)"""
+        fields = [f.strip() for f in (value or "").split(",") if f.strip()]
+        return cls(fields or None, extra_columns, photo_size or DEFAULT_LIST_PHOTO_SIZE)
+
+    def select(self):
+        """SELECT statement for this projection over tbl_pumps"""
+        columns = [getattr(Pump, name) for name in self.columns]
+        if not self.needs_user:
+            return select(*columns)
+        return select(*columns, *[getattr(User, c) for c in _USER_COLUMNS]).outerjoin(
+            User, Pump.user_id == User.ccn_user
+        )
+
+    def value(self, row: Sequence[Any], column: str) -> Any:
+        """Raw value of a selected pump column from a result row"""
+        return row[self._position[column]]
+
+    def dump(self, row: Sequence[Any]) -> Dict[str, Any]:
+        return self.dump_many([row])[0]
+
+    def dump_many(
+        self, rows: Iterable[Sequence[Any]], connection=None
+    ) -> List[Dict[str, Any]]:
+        rows = list(rows)
+        photos: Dict[str, List[str]] = {}
+        if self.needs_photos and rows:
+            index = self._position["ccn_pump"]
+            photos = load_photo_map([row[index] for row in rows], connection)
+        getters = self._getters
+        return [
+            {field: getter(row, photos) for field, getter in getters} for row in rows
+        ]
+
+    def _compile(self, field: str):
+        """Getter ``(row, photo_map) -> value`` for one field"""
+        position = self._position
+        user = self._user_offset
+
+        if field == "user":
+            index = position["user_id"]
+            return lambda row, photos: row[index]
+        if field == "user_ccn":
+            return lambda row, photos: row[user]
+        if field == "user_name":
+
+            def user_name(row, photos):
+                if row[user] is None:
+                    return "Unknown User"
+                middle = f" {row[user + 2]}" if row[user + 2] else ""
+                return f"{row[user + 1]}{middle} {row[user + 3]}"
+
+            return user_name
+        if field == "photos":
+            pump_index = position["ccn_pump"]
+            return lambda row, photos: list(photos.get(row[pump_index], ()))
+        if field == "photo_urls":
+            pump_index = position["ccn_pump"]
+            prefix = f"{self.api_domain}/api/v1/pumps/"
+            suffix = f"?size={self.photo_size}"
+            return lambda row, photos: [
+                f"{prefix}{row[pump_index]}/photos/{photo}{suffix}"
+                for photo in photos.get(row[pump_index], ())
+            ]
+
+        index = position[field]
+        return lambda row, photos: _iso(row[index])
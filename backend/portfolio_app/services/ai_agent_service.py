@@ -5,11 +5,18 @@ Integrates OpenAI API, MPC, and Blockchain for secure AI governance
 
 import json
 import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Tuple, Optional, Callable
 from datetime import datetime
-from openai import OpenAI
 import os
 
+from flask import current_app, has_app_context
+
+from .llm_client_service import OPENAI_BASE_URL, get_llm_client, get_ollama_client
 from .mpc_service import MPCService, classify_sensitivity
 from .blockchain_service import get_blockchain_service
 from ..extensions import db
@@ -18,6 +25,8 @@ from ..models.tbl_ai_agents import AIAgent
 from ..models.tbl_human_approvals import HumanApproval
 from ..models.tbl_mpc_operations import MPCOperation
 
+logger = logging.getLogger(__name__)
+
 
 def _resolve_ollama_base_url(raw_url: Optional[str], is_docker: bool) -> str:
     """Normalize Ollama URL so Docker containers can reach the host machine."""
@@ -31,6 +40,100 @@ def _resolve_ollama_base_url(raw_url: Optional[str], is_docker: bool) -> str:
     return base_url
 
 
+def _setting(name: str, default: Any) -> Any:
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+_probe_executor: Optional[ThreadPoolExecutor] = None
+_probe_lock = threading.Lock()
+# base_url -> last probe result; "checked_at" is a time.monotonic() value
+_probe_results: Dict[str, Dict[str, Any]] = {}
+_probes_running: set = set()
+
+
+def get_agent_probe_executor() -> ThreadPoolExecutor:
+    """Get the process-wide thread pool that probes Ollama backends"""
+    global _probe_executor
+    with _probe_lock:
+        if _probe_executor is None:
+            _probe_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="agent-probe"
+            )
+        return _probe_executor
+
+
+def schedule_ollama_probe(base_url: str, model_name: str) -> None:
+    """
+    Check an Ollama backend and its model in the background
+
+    A backend is probed at most once per
+    ``AGENT_HEALTH_PROBE_INTERVAL_SECONDS``; the caller never waits.
+    """
+    interval = _setting("AGENT_HEALTH_PROBE_INTERVAL_SECONDS", 300.0)
+    with _probe_lock:
+        last = _probe_results.get(base_url)
+        if base_url in _probes_running or (
+            last and time.monotonic() - last["checked_at"] < interval
+        ):
+            return
+        _probes_running.add(base_url)
+    get_agent_probe_executor().submit(_probe_ollama, base_url, model_name)
+
+
+def _probe_ollama(base_url: str, model_name: str) -> None:
+    from urllib.request import urlopen
+
+    test_url = base_url.replace("/v1", "/api/tags")
+    result: Dict[str, Any] = {"ok": False, "models": [], "error": None}
+    try:
+        with urlopen(test_url, timeout=5) as response:
+            if response.status == 200:
+                data = json.loads(response.read().decode())
+                model_names = [m.get("name", "") for m in data.get("models", [])]
+                result.update(ok=True, models=model_names)
+                logger.info("Ollama connection OK. Available models: %s", model_names)
+                base_names = [m.split(":")[0] for m in model_names]
+                if model_name not in model_names and model_name not in base_names:
+                    logger.warning(
+                        "Model '%s' not found in Ollama. Available: %s",
+                        model_name,
+                        model_names,
+                    )
+            else:
+                result["error"] = f"status {response.status}"
+                logger.warning("Ollama returned status %s", response.status)
+    except Exception as conn_error:
+        result["error"] = str(conn_error)
+        logger.warning(
+            "Could not verify Ollama connection at %s: %s. "
+            "This may cause errors when executing tasks.",
+            test_url,
+            conn_error,
+        )
+    finally:
+        result["checked_at"] = time.monotonic()
+        with _probe_lock:
+            _probe_results[base_url] = result
+            _probes_running.discard(base_url)
+
+
+def ollama_health() -> Dict[str, Dict[str, Any]]:
+    """Last probe result of every Ollama backend used by an agent"""
+    now = time.monotonic()
+    with _probe_lock:
+        return {
+            url: {
+                "ok": result["ok"],
+                "models": result["models"],
+                "error": result["error"],
+                "checked_seconds_ago": round(now - result["checked_at"], 1),
+            }
+            for url, result in _probe_results.items()
+        }
+
+
 class AIAgentService:
     """
     AI Agent Orchestrator
@@ -77,46 +180,27 @@ class AIAgentService:
             "local_model_name", "qwen2.5:0.5b-instruct"
         )
 
+        # Backend whose inference slots this agent's tasks take
+        self.inference_backend = (
+            self.local_model_url if self.use_local_model else OPENAI_BASE_URL
+        )
+
         # Configure AI client (OpenAI or Ollama)
         if self.use_local_model:
             # Use Ollama (compatible with OpenAI API)
-            self.openai_client = OpenAI(
-                api_key="ollama",  # Ollama doesn't require a real API key
-                base_url=self.local_model_url,
-                timeout=300.0,  # 5 minutes timeout for local models
-            )
-            print(
-                f"✅ Using local model: {self.local_model_name} at {self.local_model_url}"
+            # Shared pooled client (local backends get the long read timeout)
+            self.openai_client = get_ollama_client(self.local_model_url)
+            logger.info(
+                "Using local model: %s at %s",
+                self.local_model_name,
+                self.local_model_url,
             )
-            # Test connection to Ollama (optional, non-blocking)
-            # Use urllib instead of requests to avoid dependency issues
-            try:
-                from urllib.request import urlopen
-                from urllib.error import URLError
-                import json as json_module
-                
-                test_url = self.local_model_url.replace("/v1", "/api/tags")
-                with urlopen(test_url, timeout=5) as response:
-                    if response.status == 200:
-                        data = json_module.loads(response.read().decode())
-                        models = data.get("models", [])
-                        model_names = [m.get("name", "") for m in models]
-                        print(f"✅ Ollama connection OK. Available models: {model_names}")
-                        if self.local_model_name not in model_names and self.local_model_name not in [m.split(":")[0] for m in model_names]:
-                            print(f"⚠️  Warning: Model '{self.local_model_name}' not found in Ollama. Available: {model_names}")
-                    else:
-                        print(f"⚠️  Warning: Ollama returned status {response.status}")
-            except Exception as conn_error:
-                test_url = self.local_model_url.replace("/v1", "/api/tags")
-                print(f"⚠️  Warning: Could not verify Ollama connection: {conn_error}")
-                print(f"   URL tested: {test_url}")
-                print(f"   This may cause errors when executing tasks.")
         else:
             # Use OpenAI
             api_key = os.getenv("OPENAI_API_KEY")
-            self.openai_client = OpenAI(api_key=api_key) if api_key else None
+            self.openai_client = get_llm_client(None, api_key) if api_key else None
             if self.openai_client:
-                print(f"✅ Using OpenAI model: {self.model_name}")
+                logger.info("Using OpenAI model: %s", self.model_name)
 
     async def execute_task(
         self, task_data: Dict[str, Any], submitted_by: Optional[int] = None, is_public: bool = False, company_id: Optional[str] = None
@@ -1416,6 +1500,82 @@ Provide a comprehensive analysis with clear structure and actionable insights.""
         return str(uuid.uuid4())
 
 
+def agent_config_version(config: Dict[str, Any]) -> str:
+    """Hash of an agent configuration; changes whenever a setting does"""
+    raw = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+class AgentServiceCache:
+    """
+    AIAgentService instances keyed by agent_id and configuration version
+
+    AIAgentService keeps no per-task state, so concurrent tasks of one agent
+    share an instance. An entry whose version no longer matches the agent's
+    configuration is rebuilt, so edits made by other workers are picked up on
+    the next task; ``invalidate`` drops entries at once after local edits.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[str, AIAgentService]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(
+        self,
+        config: Dict[str, Any],
+        build: Callable[[Dict[str, Any]], "AIAgentService"],
+    ) -> "AIAgentService":
+        """Cached service for ``config``, built with ``build`` on a miss"""
+        agent_id = config["agent_id"]
+        version = agent_config_version(config)
+        with self._lock:
+            entry = self._entries.get(agent_id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(agent_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        service = build(config)
+        size = _setting("AGENT_CACHE_SIZE", 32)
+        with self._lock:
+            self._entries[agent_id] = (version, service)
+            self._entries.move_to_end(agent_id)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+        return service
+
+    def invalidate(self, agent_id: Optional[str] = None) -> None:
+        """Forget one agent's service, or every service"""
+        with self._lock:
+            if agent_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(agent_id, None)
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "agents": list(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+_agent_cache = AgentServiceCache()
+
+
+def get_agent_service_cache() -> AgentServiceCache:
+    """Get the process-wide cache of agent services"""
+    return _agent_cache
+
+
 # Factory function
 def create_ai_agent(agent_id_or_config) -> AIAgentService:
     """
@@ -1431,7 +1591,7 @@ def create_ai_agent(agent_id_or_config) -> AIAgentService:
             - description: Agent description
 
     Returns:
-        AIAgentService instance
+        AIAgentService instance, shared while the configuration is unchanged
     """
     # If it's a dict, use it directly
     if isinstance(agent_id_or_config, dict):
@@ -1491,4 +1651,9 @@ def create_ai_agent(agent_id_or_config) -> AIAgentService:
             ),
         }
 
-    return AIAgentService(config)
+    service = get_agent_service_cache().get(config, AIAgentService)
+    if service.use_local_model:
+        # Cached services too: the probe is rate-limited and runs in the
+        # background, so task setup never waits on Ollama
+        schedule_ollama_probe(service.local_model_url, service.local_model_name)
+    return service
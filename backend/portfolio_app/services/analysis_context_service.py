@@ -0,0 +1,356 @@
+"""
+Analysis Context Service
+Builds the pump data context of the analysis chat within a token budget.
+
+The context has a summary section (status / location distribution, numeric
+statistics, system metrics) followed by as many pump detail rows as fit in
+``ANALYSIS_CONTEXT_TOKEN_BUDGET``. Both are computed once per fleet version.
+Detail rows are serialized to compact JSON on the first render that includes
+them, so summary-only requests never pay for it, and each request only joins
+the prefix that fits the budget. The analysis chat renders the summary only and
+spends the rest of the budget on the pumps its retrieval stage selected.
+
+Fleets sent by the frontend (``pumpsData``) are keyed by a SHA-256 of their
+compact JSON, so a client re-sending the same list on every turn reuses the
+sections built for the first one. Token counts are estimated at
+``CHARS_PER_TOKEN`` characters per token.
+"""
+
+import hashlib
+import json
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from flask import current_app
+
+from ..extensions import db
+from .pump_snapshot_service import (
+    NUMERIC_COLUMNS,
+    as_float,
+    get_fleet_version,
+    get_pumps_dataframe,
+    stat_float,
+)
+
+CHARS_PER_TOKEN = 4
+DETAIL_COLUMNS = [
+    "ccn_pump",
+    "model",
+    "serial_number",
+    "location",
+    "status",
+    "flow_rate",
+    "pressure",
+    "power",
+    "efficiency",
+    "voltage",
+    "current",
+    "power_factor",
+    "last_maintenance",
+    "next_maintenance",
+    "purchase_date",
+]
+DATE_COLUMNS = ["last_maintenance", "next_maintenance", "purchase_date"]
+KNOWN_STATUSES = ["Active", "Maintenance", "Inactive", "Standby", "Testing", "Repair"]
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a prompt fragment"""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def pumps_data_hash(pumps_data: List[Dict[str, Any]]) -> str:
+    """Content hash of a client-supplied pump list"""
+    raw = json.dumps(pumps_data, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ContextSections:
+    """Summary text and lazily serialized detail rows of one fleet version"""
+
+    def __init__(
+        self, total: int, summary: str, details: Optional[pd.DataFrame] = None
+    ):
+        self.total = total
+        self.summary = summary
+        self._details = details
+        self._rows: Optional[List[str]] = None
+        self._row_ends: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    @property
+    def rows(self) -> List[str]:
+        """Detail rows as compact JSON, serialized on first use"""
+        self._serialize()
+        return self._rows
+
+    @property
+    def row_ends(self) -> np.ndarray:
+        """Length of the JSON array of rows[:k], for each k"""
+        self._serialize()
+        return self._row_ends
+
+    def _serialize(self) -> None:
+        with self._lock:
+            if self._rows is not None:
+                return
+            rows = _detail_rows(self._details) if self._details is not None else []
+            self._row_ends = np.cumsum([len(row) + 1 for row in rows]) + 1
+            self._rows = rows
+            self._details = None
+
+    def render(
+        self, token_budget: int, include_details: bool = True
+    ) -> Tuple[str, int]:
+        """Context text within the budget and the number of detail rows in it"""
+        if self.total == 0:
+            return "No pump data available in the system.", 0
+
+        head = f"PUMP ANALYSIS DATA CONTEXT:\n\nTotal Pumps: {self.total}\n\n"
+        if not include_details:
+            return head + self.summary, 0
+        chars_left = token_budget * CHARS_PER_TOKEN - len(head) - len(self.summary)
+        chars_left -= len(_details_header(self.total, self.total))
+        # Longest variant of the instructions, with as many digits as needed
+        chars_left -= len(_lookup_instructions(self.total, self.total + 1)) + 1
+        count = int(np.searchsorted(self.row_ends, chars_left, side="right"))
+        details = "[" + ",".join(self.rows[:count]) + "]" if count else "[]"
+        text = (
+            head
+            + self.summary
+            + _details_header(count, self.total)
+            + details
+            + "\n"
+            + _lookup_instructions(count, self.total)
+        )
+        return text, count
+
+
+def _details_header(shown: int, total: int) -> str:
+    return (
+        "\n=== INDIVIDUAL PUMP DATA ===\n"
+        "Each pump has a unique ID (ccn_pump), a 64-character hexadecimal string.\n"
+        f"Full Pump Details (showing {shown} of {total} pumps):\n"
+    )
+
+
+def _lookup_instructions(shown: int, total: int) -> str:
+    missing = (
+        "The pump ID was not found in the available data."
+        if shown == total
+        else "The pump ID was not found in the available data. It may not exist, "
+        f"or it may be beyond the first {shown} pumps in the system "
+        f"(total: {total} pumps)."
+    )
+    return (
+        "\n=== CRITICAL INSTRUCTIONS FOR PUMP ID LOOKUP ===\n"
+        '1. When a user provides a pump ID, look for the exact match in the "ccn_pump" '
+        'field of the "Full Pump Details" array above\n'
+        "2. Once found, provide model, serial_number, location, status (the current "
+        "state of the pump), all technical metrics and the maintenance and purchase "
+        "dates\n"
+        f'3. If the ID is not in the list above, say: "{missing}"\n'
+    )
+
+
+def _format_dates(frame: pd.DataFrame) -> None:
+    for col in DATE_COLUMNS:
+        if col not in frame.columns:
+            continue
+        values = frame[col]
+        parsed = pd.to_datetime(values, errors="coerce", utc=True, format="ISO8601")
+        formatted = parsed.dt.tz_convert(None).dt.strftime(DATE_FORMAT)
+        # Unparseable values are kept as sent, missing ones become null
+        frame[col] = formatted.where(parsed.notna(), values).astype(object)
+        frame.loc[values.isna(), col] = None
+
+
+def _summary(frame: pd.DataFrame) -> str:
+    total = len(frame)
+    statuses = frame["status"] if "status" in frame.columns else pd.Series(dtype=object)
+    value_counts = statuses.value_counts()
+    status_counts = {
+        status: int(value_counts[status])
+        for status in KNOWN_STATUSES
+        if value_counts.get(status, 0) > 0
+    }
+    status_distribution = [
+        {
+            "status": status,
+            "count": int(count),
+            "percentage": round((count / total) * 100, 1),
+        }
+        for status, count in value_counts.items()
+    ]
+
+    locations = []
+    if "location" in frame.columns:
+        locations = [
+            {"building": building, "count": int(count)}
+            for building, count in frame["location"].value_counts().head(10).items()
+        ]
+
+    numeric_stats = {}
+    for col in NUMERIC_COLUMNS:
+        if col not in frame.columns:
+            continue
+        series = pd.to_numeric(frame[col], errors="coerce").astype("float64")
+        empty = series.dropna().empty
+        numeric_stats[col] = {
+            "min": None if empty else as_float(series.min()),
+            "max": None if empty else as_float(series.max()),
+            "mean": None if empty else stat_float(series.mean()),
+            "median": None if empty else stat_float(series.median()),
+            "std": None if empty else stat_float(series.std(ddof=0)),
+            "count": int(series.count()),
+        }
+
+    active = status_counts.get("Active", 0)
+    maintenance = status_counts.get("Maintenance", 0)
+    standby = status_counts.get("Standby", 0)
+
+    def compact(value):
+        return json.dumps(value, separators=(",", ":"), default=str)
+
+    return (
+        "=== SUMMARY STATISTICS ===\n"
+        f"Status Distribution: {compact(status_distribution)}\n"
+        f"Status Counts: {compact(status_counts)}\n"
+        f"Location Distribution (Top 10): {compact(locations)}\n"
+        f"Numeric Statistics (aggregated): {compact(numeric_stats)}\n"
+        "System Metrics:\n"
+        f"- Operational Efficiency: {round((active / total) * 100, 1)}%\n"
+        f"- Maintenance: {round((maintenance / total) * 100, 1)}%\n"
+        f"- System Availability: {round(((active + standby) / total) * 100, 1)}%\n"
+    )
+
+
+def _detail_rows(details: pd.DataFrame) -> List[str]:
+    for col in details.columns:
+        if details[col].dtype == np.float32:
+            # Shortest float32 repr, so 3.2 is not sent as 3.2000000477
+            details[col] = details[col].astype(str).astype(np.float64)
+        elif isinstance(details[col].dtype, pd.CategoricalDtype):
+            details[col] = details[col].astype(object)
+    _format_dates(details)
+    lines = details.to_json(orient="records", lines=True, force_ascii=False)
+    return lines.splitlines()
+
+
+def build_sections(frame: pd.DataFrame) -> ContextSections:
+    """Summary and detail rows of a fleet frame (snapshot or client data)"""
+    if frame.empty:
+        return ContextSections(0, "")
+
+    # A copy of the detail columns: rows are serialized on the first render
+    # that includes them, after the snapshot frame may have moved on
+    columns = [col for col in DETAIL_COLUMNS if col in frame.columns]
+    details = frame[columns].reset_index(drop=True)
+    return ContextSections(len(frame), _summary(frame), details)
+
+
+class AnalysisContextBuilder:
+    """
+    Cached context sections of one database engine
+
+    The snapshot sections are replaced when the fleet version changes; client
+    payloads are kept in a small LRU keyed by content hash.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fleet_token: Optional[str] = None
+        self._fleet_sections: Optional[ContextSections] = None
+        self._payloads: "OrderedDict[str, ContextSections]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def build(
+        self,
+        pumps_data: Optional[List[Dict[str, Any]]] = None,
+        token_budget: Optional[int] = None,
+        include_details: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Build the analysis context
+
+        Args:
+            pumps_data: Pump list sent by the frontend; the snapshot is used
+                when empty
+            token_budget: Estimated token limit of the context (default
+                ``ANALYSIS_CONTEXT_TOKEN_BUDGET``)
+            include_details: False for the summary only, when the pumps
+                are supplied by the retrieval stage
+
+        Returns:
+            context text, estimated tokens, total_pumps, pumps_included and
+            whether the sections came from the cache
+        """
+        if token_budget is None:
+            token_budget = current_app.config.get("ANALYSIS_CONTEXT_TOKEN_BUDGET", 6000)
+
+        if pumps_data:
+            sections, cached = self._payload_sections(pumps_data)
+        else:
+            sections, cached = self._snapshot_sections()
+
+        text, included = sections.render(token_budget, include_details)
+        return {
+            "context": text,
+            "tokens": estimate_tokens(text),
+            "total_pumps": sections.total,
+            "pumps_included": included,
+            "cached": cached,
+        }
+
+    def _snapshot_sections(self) -> Tuple[ContextSections, bool]:
+        token, _ = get_fleet_version().current()
+        with self._lock:
+            if self._fleet_sections is not None and self._fleet_token == token:
+                self.hits += 1
+                return self._fleet_sections, True
+        sections = build_sections(get_pumps_dataframe())
+        with self._lock:
+            self.misses += 1
+            self._fleet_sections = sections
+            self._fleet_token = token
+        return sections, False
+
+    def _payload_sections(
+        self, pumps_data: List[Dict[str, Any]]
+    ) -> Tuple[ContextSections, bool]:
+        key = pumps_data_hash(pumps_data)
+        with self._lock:
+            sections = self._payloads.get(key)
+            if sections is not None:
+                self._payloads.move_to_end(key)
+                self.hits += 1
+                return sections, True
+        sections = build_sections(pd.DataFrame(pumps_data))
+        size = current_app.config.get("ANALYSIS_CONTEXT_CACHE_SIZE", 16)
+        with self._lock:
+            self.misses += 1
+            self._payloads[key] = sections
+            while len(self._payloads) > size:
+                self._payloads.popitem(last=False)
+        return sections, False
+
+
+_builders: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_builders_lock = threading.Lock()
+
+
+def get_analysis_context_builder() -> AnalysisContextBuilder:
+    """Get the analysis context builder for the current app's database engine"""
+    engine = db.engine
+    with _builders_lock:
+        builder = _builders.get(engine)
+        if builder is None:
+            builder = AnalysisContextBuilder()
+            _builders[engine] = builder
+        return builder
@@ -0,0 +1,453 @@
+"""
+Analysis Retrieval Service
+Selects the pumps relevant to a chat question so the analysis chat prompt
+grows with the question instead of with the fleet.
+
+The question is parsed into:
+
+- pump IDs (64-character hex) and exact serial numbers, always included
+- statuses, models and locations named in full, used as filters
+- metric ranges such as ``efficiency below 60%``, ``pressure > 3`` or
+  ``flow rate between 80 and 120``, used as filters
+- the remaining words, ranked with BM25 against the model, location and status
+  of each pump
+
+Filters and BM25 run vectorized over the pump snapshot: the text fields are
+categoricals, so term frequencies are computed per category and gathered per
+row through the category codes. The selected pumps are then read with a single
+``IN`` query and rendered as a compact pipe-separated table, trimmed to the
+rows that fit the token budget left by the fleet summary.
+"""
+
+import math
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from flask import current_app
+from sqlalchemy import select
+
+from ..extensions import db
+from ..models.tbl_pumps import Pump
+from .analysis_context_service import CHARS_PER_TOKEN, DETAIL_COLUMNS
+from .pump_snapshot_service import get_pumps_dataframe
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+BM25_FIELDS = ["model", "location", "status"]
+DEFAULT_RETRIEVAL_LIMIT = 25
+
+PUMP_ID_RE = re.compile(r"\b[0-9a-f]{64}\b")
+WORD_RE = re.compile(r"[0-9a-záéíóúñü]+")
+NUMBER = r"-?\d+(?:[.,]\d+)?"
+
+# Metric names as users write them, longest first so "power factor" wins
+METRIC_ALIASES = {
+    "power factor": "power_factor",
+    "power_factor": "power_factor",
+    "factor de potencia": "power_factor",
+    "flow rate": "flow_rate",
+    "flow_rate": "flow_rate",
+    "flow": "flow_rate",
+    "caudal": "flow_rate",
+    "pressure": "pressure",
+    "presión": "pressure",
+    "presion": "pressure",
+    "power": "power",
+    "potencia": "power",
+    "efficiency": "efficiency",
+    "eficiencia": "efficiency",
+    "voltage": "voltage",
+    "voltaje": "voltage",
+    "current": "current",
+    "corriente": "current",
+}
+# Metrics stored as fractions; "60%" means 0.6 (efficiency is stored in %)
+FRACTION_METRICS = {"power_factor"}
+OPERATORS = {
+    ">=": ">=",
+    "<=": "<=",
+    ">": ">",
+    "<": "<",
+    "=": "=",
+    "above": ">",
+    "over": ">",
+    "greater than": ">",
+    "more than": ">",
+    "higher than": ">",
+    "at least": ">=",
+    "below": "<",
+    "under": "<",
+    "less than": "<",
+    "lower than": "<",
+    "at most": "<=",
+    "mayor que": ">",
+    "mayor a": ">",
+    "superior a": ">",
+    "menor que": "<",
+    "menor a": "<",
+    "inferior a": "<",
+    "between": "between",
+    "entre": "between",
+}
+STATUS_SYNONYMS = {
+    "activa": "Active",
+    "activas": "Active",
+    "activo": "Active",
+    "activos": "Active",
+    "mantenimiento": "Maintenance",
+    "inactiva": "Inactive",
+    "inactivas": "Inactive",
+    "inactivo": "Inactive",
+    "inactivos": "Inactive",
+    "reserva": "Standby",
+    "pruebas": "Testing",
+    "reparación": "Repair",
+    "reparacion": "Repair",
+}
+# fmt: off
+STOPWORDS = {
+    "a", "an", "and", "are", "at", "by", "de", "del", "el", "en", "for", "how",
+    "in", "is", "la", "las", "los", "me", "of", "on", "or", "que", "show", "the",
+    "there", "to", "what", "which", "with", "y",
+}
+# fmt: on
+
+_RANGE_RE = re.compile(
+    r"(?P<metric>{metrics})\s*(?:is\s+|of\s+|de\s+)?(?P<op>{ops})\s*"
+    r"(?P<low>{number})\s*(?P<pct>%?)"
+    r"(?:\s*(?:and|y|-)\s*(?P<high>{number})\s*%?)?".format(
+        metrics="|".join(re.escape(a) for a in sorted(METRIC_ALIASES, key=len)[::-1]),
+        ops="|".join(re.escape(o) for o in sorted(OPERATORS, key=len)[::-1]),
+        number=NUMBER,
+    )
+)
+
+
+def _number(raw: str, metric: str, percent: bool) -> float:
+    value = float(raw.replace(",", "."))
+    if percent and metric in FRACTION_METRICS:
+        value /= 100.0
+    return value
+
+
+def parse_metric_ranges(question: str) -> List[Dict[str, Any]]:
+    """Metric conditions in a question as {metric, op, value[, high]}"""
+    ranges = []
+    for match in _RANGE_RE.finditer(question.lower()):
+        metric = METRIC_ALIASES[match.group("metric")]
+        op = OPERATORS[match.group("op")]
+        percent = bool(match.group("pct"))
+        condition = {
+            "metric": metric,
+            "op": op,
+            "value": _number(match.group("low"), metric, percent),
+        }
+        if op == "between":
+            if match.group("high") is None:
+                continue
+            condition["high"] = _number(match.group("high"), metric, percent)
+        ranges.append(condition)
+    return ranges
+
+
+def _phrase_in(phrase: str, text: str) -> bool:
+    return re.search(rf"(?<![0-9a-z]){re.escape(phrase)}(?![0-9a-z])", text) is not None
+
+
+def _range_mask(frame: pd.DataFrame, condition: Dict[str, Any]) -> np.ndarray:
+    values = frame[condition["metric"]].to_numpy(dtype=np.float64)
+    low = condition["value"]
+    op = condition["op"]
+    with np.errstate(invalid="ignore"):
+        if op == ">":
+            return values > low
+        if op == ">=":
+            return values >= low
+        if op == "<":
+            return values < low
+        if op == "<=":
+            return values <= low
+        if op == "=":
+            return np.isclose(values, low)
+        high = condition["high"]
+        return (values >= min(low, high)) & (values <= max(low, high))
+
+
+def bm25_scores(frame: pd.DataFrame, terms: List[str]) -> Tuple[np.ndarray, List[str]]:
+    """
+    BM25 score of every row for the query terms over BM25_FIELDS
+
+    Returns:
+        (scores, matched terms); terms that occur in no pump are dropped
+    """
+    total = len(frame)
+    codes, category_words = {}, {}
+    doc_len = np.zeros(total)
+    for field in BM25_FIELDS:
+        column = frame[field]
+        if not isinstance(column.dtype, pd.CategoricalDtype):
+            column = column.astype("category")
+        codes[field] = column.cat.codes.to_numpy()
+        category_words[field] = [
+            WORD_RE.findall(str(c).lower()) for c in column.cat.categories
+        ]
+        lengths = np.array([len(w) for w in category_words[field]] + [0])
+        doc_len += lengths[codes[field]]
+    average = doc_len.mean() if total else 0.0
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len / max(average, 1e-9))
+
+    scores = np.zeros(total)
+    matched = []
+    for term in terms:
+        tf = np.zeros(total)
+        for field in BM25_FIELDS:
+            # Per-category frequency; code -1 (missing) maps to the trailing 0
+            per_category = np.array(
+                [words.count(term) for words in category_words[field]] + [0],
+                dtype=np.float64,
+            )
+            if per_category.any():
+                tf += per_category[codes[field]]
+        df = int(np.count_nonzero(tf))
+        if not df:
+            continue
+        matched.append(term)
+        idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+        scores += idf * tf * (BM25_K1 + 1) / (tf + norm)
+    return scores, matched
+
+
+class AnalysisRetrievalService:
+    """Question-driven pump selection for the analysis chat"""
+
+    @staticmethod
+    def parse(question: str, frame: pd.DataFrame) -> Dict[str, Any]:
+        """
+        Structured filters of a question against the current fleet
+
+        Returns:
+            ids, serials, statuses, models, locations, ranges and the
+            remaining BM25 terms
+        """
+        question = question or ""
+        text = question.lower()
+        # Serial-like tokens as typed, lower- and upper-cased: hashing a few
+        # variants is much cheaper than lower-casing every serial number
+        tokens = {
+            variant
+            for token in re.findall(
+                r"[0-9A-Za-z][0-9A-Za-z_\-/.]*[0-9A-Za-z]", question
+            )
+            if any(c.isdigit() for c in token)
+            for variant in (token, token.lower(), token.upper())
+        }
+        serials = frame["serial_number"]
+        found_serials = (
+            sorted(set(serials[serials.isin(tokens)].tolist())) if tokens else []
+        )
+
+        def named(field: str) -> List[str]:
+            categories = frame[field].astype("category").cat.categories
+            return [c for c in categories if _phrase_in(str(c).lower(), text)]
+
+        statuses = set(named("status"))
+        known = set(frame["status"].astype("category").cat.categories)
+        for word in WORD_RE.findall(text):
+            status = STATUS_SYNONYMS.get(word)
+            if status in known:
+                statuses.add(status)
+
+        ranges = parse_metric_ranges(text)
+        consumed = set()
+        for phrase in [*found_serials, *statuses]:
+            consumed.update(WORD_RE.findall(str(phrase).lower()))
+        for alias in METRIC_ALIASES:
+            if _phrase_in(alias, text):
+                consumed.update(WORD_RE.findall(alias))
+        # Metric conditions are already filters, their numbers included
+        terms = [
+            word
+            for word in dict.fromkeys(
+                WORD_RE.findall(_RANGE_RE.sub(" ", PUMP_ID_RE.sub(" ", text)))
+            )
+            if word not in STOPWORDS
+            and word not in consumed
+            and word not in STATUS_SYNONYMS
+        ]
+
+        return {
+            "ids": list(dict.fromkeys(PUMP_ID_RE.findall(text))),
+            "serials": found_serials,
+            "statuses": sorted(statuses),
+            "models": named("model"),
+            "locations": named("location"),
+            "ranges": ranges,
+            "terms": terms,
+        }
+
+    @staticmethod
+    def retrieve(
+        question: str,
+        limit: Optional[int] = None,
+        frame: Optional[pd.DataFrame] = None,
+    ) -> Dict[str, Any]:
+        """
+        Pumps relevant to a question, best first
+
+        Pumps named by ID or serial number come first. Other rows must pass the
+        status / model / location / metric filters and, when the question has
+        words matching some pump, are ranked by BM25; otherwise they are
+        ordered by the first metric condition (or serial number).
+
+        Returns:
+            parsed filters, matched (number of pumps that qualify),
+            ``records`` (dicts with DETAIL_COLUMNS) and ``missing`` (pump IDs
+            in the question that do not exist), read with one IN query
+        """
+        if limit is None:
+            limit = current_app.config.get(
+                "ANALYSIS_RETRIEVAL_LIMIT", DEFAULT_RETRIEVAL_LIMIT
+            )
+        frame = get_pumps_dataframe() if frame is None else frame
+        if frame.empty:
+            return {"filters": {}, "matched": 0, "records": [], "missing": []}
+
+        filters = AnalysisRetrievalService.parse(question, frame)
+        named = frame.index.isin(filters["ids"]) | frame["serial_number"].isin(
+            filters["serials"]
+        )
+
+        mask = np.ones(len(frame), dtype=bool)
+        filtered = False
+        for field, key in (
+            ("status", "statuses"),
+            ("model", "models"),
+            ("location", "locations"),
+        ):
+            if filters[key]:
+                mask &= frame[field].isin(filters[key]).to_numpy()
+                filtered = True
+        for condition in filters["ranges"]:
+            mask &= _range_mask(frame, condition)
+            filtered = True
+
+        scores, matched_terms = bm25_scores(frame, filters["terms"])
+        filters["terms"] = matched_terms
+        if matched_terms:
+            mask &= scores > 0
+        elif not filtered:
+            mask[:] = False
+        mask &= ~named
+
+        candidates = np.flatnonzero(mask)
+        if matched_terms:
+            order = scores[candidates]
+        elif filters["ranges"]:
+            first = filters["ranges"][0]
+            order = frame[first["metric"]].to_numpy(dtype=np.float64)[candidates]
+            # Most extreme values first: lowest for "<", highest otherwise
+            order = -order if first["op"] in ("<", "<=") else order
+        else:
+            order = np.zeros(len(candidates))
+        ranked = candidates[np.lexsort((np.arange(len(candidates)), -order))]
+
+        # Every named pump is read, also past the limit or missing from the
+        # snapshot, so existence is decided by the IN query
+        named_ids = list(
+            dict.fromkeys(filters["ids"] + frame.index[np.flatnonzero(named)].tolist())
+        )
+        fetched = AnalysisRetrievalService.fetch(
+            named_ids + frame.index[ranked[:limit]].tolist()
+        )
+        found = {record["ccn_pump"] for record in fetched}
+
+        return {
+            "filters": filters,
+            "matched": len(found.intersection(named_ids)) + len(candidates),
+            "records": fetched[:limit],
+            "missing": [ccn for ccn in filters["ids"] if ccn not in found],
+        }
+
+    @staticmethod
+    def fetch(ccn_pumps: List[str]) -> List[Dict[str, Any]]:
+        """Read pumps with one IN query, keeping the given order"""
+        if not ccn_pumps:
+            return []
+        columns = [getattr(Pump, col) for col in DETAIL_COLUMNS]
+        rows = db.session.execute(
+            select(*columns).where(Pump.ccn_pump.in_(ccn_pumps))
+        ).all()
+        by_id = {row.ccn_pump: dict(zip(DETAIL_COLUMNS, row)) for row in rows}
+        return [by_id[ccn] for ccn in ccn_pumps if ccn in by_id]
+
+    @staticmethod
+    def render(result: Dict[str, Any], token_budget: Optional[int] = None) -> str:
+        """
+        Prompt section with the filters and a compact table of the records
+
+        Args:
+            result: Output of ``retrieve``
+            token_budget: Estimated token limit of the section; the best
+                records that fit are kept (no limit when None)
+        """
+        filters = result["filters"]
+        described = []
+        for key in ("statuses", "models", "locations", "serials", "terms"):
+            if filters.get(key):
+                described.append(f"{key}={', '.join(filters[key])}")
+        for condition in filters.get("ranges", []):
+            if condition["op"] == "between":
+                described.append(
+                    f"{condition['metric']} between {condition['value']:g} "
+                    f"and {condition['high']:g}"
+                )
+            else:
+                described.append(
+                    f"{condition['metric']}{condition['op']}{condition['value']:g}"
+                )
+        if filters.get("ids"):
+            described.append(f"ids={len(filters['ids'])}")
+
+        rows = [
+            "|".join(_cell(r[col]) for col in DETAIL_COLUMNS) for r in result["records"]
+        ]
+        missing = result.get("missing", [])
+        head = [
+            "=== RETRIEVED ASSETS ===",
+            f"Filters from the question: {'; '.join(described) or 'none'}",
+        ]
+        tail = [f"Pump IDs not found: {', '.join(missing)}"] if missing else []
+
+        count = len(rows)
+        if token_budget is not None:
+            # Fixed lines, with the longest "showing N" and the column header
+            chars_left = token_budget * CHARS_PER_TOKEN - sum(
+                len(line) + 1 for line in head + tail
+            )
+            chars_left -= len(_showing(result["matched"], len(rows))) + 1
+            chars_left -= len("|".join(DETAIL_COLUMNS)) + 1
+            ends = np.cumsum([len(row) + 1 for row in rows])
+            count = int(np.searchsorted(ends, chars_left, side="right"))
+
+        lines = head + [_showing(result["matched"], count)]
+        if count:
+            lines.append("|".join(DETAIL_COLUMNS))
+            lines.extend(rows[:count])
+        return "\n".join(lines + tail) + "\n"
+
+
+def _showing(matched: int, shown: int) -> str:
+    return f"Matching pumps: {matched}, showing {shown} (best match first):"
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, float):
+        return f"{value:g}"
+    return str(value).replace("|", "/")
@@ -0,0 +1,147 @@
+"""
+Async Bridge Service
+Runs the AI agent coroutines and callback streams without threads or event loops.
+
+The agent and blockchain coroutines only await each other; their I/O (model
+streams, MySQL) is blocking socket I/O, which the gevent worker makes
+cooperative. ``run_coroutine`` therefore drives a coroutine to completion
+directly instead of creating an event loop per request (``asyncio.run`` also
+fails when two greenlets of one worker use it at the same time).
+
+``iterate_callback_stream`` turns a callback-based producer (e.g.
+``execute_task_streaming(stream_callback=...)``) into a generator by running
+the producer in a child greenlet that switches back to the consumer on every
+item. A stream costs one greenlet, not an OS thread with its own event loop
+and a polled ``queue.Queue``.
+
+A stream can be given a deadline. Under a monkey-patched gevent worker a
+``gevent.Timeout`` interrupts the producer while it waits on I/O; elsewhere the
+deadline is checked on every emit and the client read timeouts bound a single
+blocked call. Either way the producer sees ``StreamTimeout`` and can clean up.
+"""
+
+import contextvars
+import time
+from typing import Any, Callable, Coroutine, Iterator, Optional, Tuple
+
+from greenlet import getcurrent, greenlet
+
+
+class StreamTimeout(Exception):
+    """A callback stream ran past its deadline"""
+
+
+def gevent_patched() -> bool:
+    """True when running in a gevent worker that monkey-patched threading"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("threading")
+
+
+def run_coroutine(coro: Coroutine) -> Any:
+    """
+    Run a coroutine that never suspends on a pending future
+
+    Raises:
+        RuntimeError: the coroutine awaited something that needs an event loop
+    """
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coro.close()
+    raise RuntimeError(
+        f"{coro.__qualname__} awaited a pending future; run it with asyncio.run"
+    )
+
+
+def _timeout_error(timeout: float) -> StreamTimeout:
+    return StreamTimeout(f"Execution timeout after {timeout:g} s")
+
+
+def iterate_callback_stream(
+    produce: Callable[[Callable[[Any], None]], Any],
+    timeout: Optional[float] = None,
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Stream the items a producer emits while it runs
+
+    Args:
+        produce: Called with an ``emit(item)`` callback; its return value is
+            the result of the stream
+        timeout: Seconds the producer may run; past them it gets
+            ``StreamTimeout`` (once, so it can still emit its clean-up items)
+
+    Yields:
+        ("item", item) for every emitted item, then ("result", return value).
+        Exceptions of the producer are raised to the consumer. If the consumer
+        stops early the producer still runs to completion, without emitting.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    state = {"consumer": None, "closed": False, "timer": None, "expired": False}
+
+    def expired() -> StreamTimeout:
+        state["expired"] = True
+        return _timeout_error(timeout)
+
+    def fired() -> bool:
+        timer = state["timer"]
+        return timer is not None and not timer.pending
+
+    def arm() -> None:
+        # The gevent timer only runs while the producer is the active greenlet
+        if deadline is None or state["expired"] or not gevent_patched():
+            return
+        from gevent import Timeout
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise expired()
+        state["timer"] = Timeout.start_new(remaining, _timeout_error(timeout))
+
+    def disarm() -> None:
+        if state["timer"] is not None:
+            state["timer"].close()
+            state["timer"] = None
+
+    def emit(item: Any) -> None:
+        if fired():
+            state["expired"] = True
+        if deadline is not None and not state["expired"]:
+            if time.monotonic() > deadline:
+                disarm()
+                raise expired()
+        if not state["closed"]:
+            disarm()
+            state["consumer"].switch(("item", item))
+            arm()
+
+    def body() -> Tuple[str, Any]:
+        try:
+            arm()
+            return "result", produce(emit)
+        except BaseException as e:  # handed to the consumer
+            return "error", e
+        finally:
+            disarm()
+
+    producer = greenlet(body)
+    # Same contextvars (app context, request) as the consumer
+    producer.gr_context = contextvars.copy_context()
+    try:
+        while True:
+            state["consumer"] = getcurrent()
+            producer.parent = state["consumer"]
+            kind, value = producer.switch()
+            if kind == "error":
+                raise value
+            yield kind, value
+            if kind == "result":
+                return
+    finally:
+        if not producer.dead:
+            state["closed"] = True
+            producer.parent = getcurrent()
+            producer.switch()
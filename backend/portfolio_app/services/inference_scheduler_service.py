@@ -0,0 +1,304 @@
+"""
+Inference Scheduler Service
+Admission control and fair queueing in front of every model call.
+
+Each backend (an Ollama or OpenAI base URL) has a concurrency limit:
+``LLM_LOCAL_MAX_CONCURRENCY`` for local backends, ``LLM_REMOTE_MAX_CONCURRENCY``
+for remote ones. Requests beyond the limit wait in a priority queue
+(interactive chat before dashboard insights before batch agent tasks) and,
+within a priority, users are served round-robin so one user's burst cannot
+starve the others.
+
+A request is rejected at once with ``InferenceQueueFull`` (HTTP 429 with
+``Retry-After``) when the backend already has ``LLM_QUEUE_MAX_DEPTH`` waiters
+or the user has ``LLM_QUEUE_MAX_PER_USER``, and after waiting
+``LLM_QUEUE_TIMEOUT_SECONDS`` without a slot. Limits apply per worker process.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional
+
+from flask import (
+    Response,
+    current_app,
+    has_request_context,
+    jsonify,
+    make_response,
+    request,
+)
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+from .llm_client_service import is_local_backend
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_BATCH = 2
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_DEFAULT: "default",
+    PRIORITY_BATCH: "batch",
+}
+
+# Service time assumed for Retry-After before any call has finished
+DEFAULT_SERVICE_SECONDS = 5.0
+SERVICE_TIME_SMOOTHING = 0.2
+MAX_RETRY_AFTER_SECONDS = 300
+
+
+class InferenceQueueFull(Exception):
+    """The backend's queue is full or the wait for a slot timed out"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def queue_full_response(error: InferenceQueueFull) -> Response:
+    """429 response with Retry-After for a rejected inference request"""
+    response = make_response(
+        jsonify({"error": str(error), "retry_after": error.retry_after}), 429
+    )
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+
+def requester_key() -> str:
+    """Fairness key of the current request: JWT identity, else client address"""
+    if not has_request_context():
+        return "system"
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        identity = None
+    if identity:
+        return f"user:{identity}"
+    return f"ip:{request.remote_addr}"
+
+
+class _Waiter:
+    __slots__ = ("user", "priority", "event", "granted", "enqueued_at")
+
+    def __init__(self, user: str, priority: int):
+        self.user = user
+        self.priority = priority
+        self.event = threading.Event()
+        self.granted = False
+        self.enqueued_at = time.monotonic()
+
+
+class _Backend:
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.active = 0
+        # priority -> user -> waiters, users kept in round-robin order
+        self.queues: Dict[int, "OrderedDict[str, Deque[_Waiter]]"] = {}
+        self.depth = 0
+        self.user_depth: Dict[str, int] = {}
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.service_seconds = DEFAULT_SERVICE_SECONDS
+
+    def enqueue(self, waiter: _Waiter) -> None:
+        users = self.queues.setdefault(waiter.priority, OrderedDict())
+        users.setdefault(waiter.user, deque()).append(waiter)
+        self.depth += 1
+        self.user_depth[waiter.user] = self.user_depth.get(waiter.user, 0) + 1
+
+    def remove(self, waiter: _Waiter) -> None:
+        users = self.queues[waiter.priority]
+        waiters = users[waiter.user]
+        waiters.remove(waiter)
+        if not waiters:
+            del users[waiter.user]
+        self._forget(waiter)
+
+    def pop_next(self) -> _Waiter:
+        priority = min(p for p, users in self.queues.items() if users)
+        users = self.queues[priority]
+        user, waiters = next(iter(users.items()))
+        waiter = waiters.popleft()
+        if waiters:
+            users.move_to_end(user)
+        else:
+            del users[user]
+        self._forget(waiter)
+        return waiter
+
+    def _forget(self, waiter: _Waiter) -> None:
+        self.depth -= 1
+        self.user_depth[waiter.user] -= 1
+        if not self.user_depth[waiter.user]:
+            del self.user_depth[waiter.user]
+
+    def retry_after(self) -> int:
+        seconds = self.service_seconds * (self.depth + 1) / max(self.limit, 1)
+        return min(max(1, math.ceil(seconds)), MAX_RETRY_AFTER_SECONDS)
+
+    def record_wait(self, seconds: float) -> None:
+        self.admitted += 1
+        self.waited += seconds > 0
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "limit": self.limit,
+            "active": self.active,
+            "queue_depth": self.depth,
+            "queued": {
+                PRIORITY_NAMES.get(p, str(p)): sum(len(w) for w in users.values())
+                for p, users in sorted(self.queues.items())
+            },
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "queued_requests": self.waited,
+            "avg_wait_ms": (
+                round(self.wait_total / self.admitted * 1000, 1)
+                if self.admitted
+                else 0.0
+            ),
+            "max_wait_ms": round(self.wait_max * 1000, 1),
+            "avg_service_seconds": round(self.service_seconds, 3),
+        }
+
+
+class InferenceTicket:
+    """A granted inference slot; release() is idempotent"""
+
+    def __init__(self, scheduler: "InferenceScheduler", backend: _Backend):
+        self._scheduler = scheduler
+        self._backend = backend
+        self._started_at = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        self._scheduler._release(self)
+
+    def __enter__(self) -> "InferenceTicket":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class InferenceScheduler:
+    """Per-backend concurrency limits with a fair priority queue"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._backends: Dict[str, _Backend] = {}
+
+    def acquire(
+        self,
+        backend: str,
+        user: str,
+        priority: int = PRIORITY_INTERACTIVE,
+        timeout: Optional[float] = None,
+    ) -> InferenceTicket:
+        """
+        Wait for a slot on a backend
+
+        Args:
+            backend: Base URL of the model backend
+            user: Fairness key (see ``requester_key``)
+            priority: PRIORITY_INTERACTIVE, PRIORITY_DEFAULT or PRIORITY_BATCH
+            timeout: Longest wait for a slot (default
+                ``LLM_QUEUE_TIMEOUT_SECONDS``)
+
+        Raises:
+            InferenceQueueFull: the queue is over its limits or the wait
+                timed out
+        """
+        config = current_app.config
+        if timeout is None:
+            timeout = config.get("LLM_QUEUE_TIMEOUT_SECONDS", 60.0)
+        max_depth = config.get("LLM_QUEUE_MAX_DEPTH", 32)
+        max_per_user = config.get("LLM_QUEUE_MAX_PER_USER", 4)
+
+        with self._lock:
+            state = self._backend(backend.rstrip("/"))
+            if state.active < state.limit and not state.depth:
+                state.active += 1
+                state.record_wait(0.0)
+                return InferenceTicket(self, state)
+            if (
+                state.depth >= max_depth
+                or state.user_depth.get(user, 0) >= max_per_user
+            ):
+                state.rejected += 1
+                raise InferenceQueueFull(
+                    "Model backend is busy, please retry later", state.retry_after()
+                )
+            waiter = _Waiter(user, priority)
+            state.enqueue(waiter)
+
+        waiter.event.wait(timeout)
+        with self._lock:
+            if not waiter.granted:
+                state.remove(waiter)
+                state.timeouts += 1
+                raise InferenceQueueFull(
+                    "Timed out waiting for the model backend", state.retry_after()
+                )
+            state.record_wait(time.monotonic() - waiter.enqueued_at)
+        return InferenceTicket(self, state)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Limits, queue depth and wait times of every backend"""
+        with self._lock:
+            return {"backends": [b.metrics() for b in self._backends.values()]}
+
+    def _backend(self, name: str) -> _Backend:
+        state = self._backends.get(name)
+        if is_local_backend(name):
+            limit = current_app.config.get("LLM_LOCAL_MAX_CONCURRENCY", 2)
+        else:
+            limit = current_app.config.get("LLM_REMOTE_MAX_CONCURRENCY", 8)
+        limit = int(limit)
+        if state is None:
+            state = _Backend(name, limit)
+            self._backends[name] = state
+        elif state.limit != limit:
+            state.limit = limit
+            self._dispatch(state)
+        return state
+
+    def _release(self, ticket: InferenceTicket) -> None:
+        with self._lock:
+            if ticket._released:
+                return
+            ticket._released = True
+            state = ticket._backend
+            state.active -= 1
+            held = time.monotonic() - ticket._started_at
+            state.service_seconds += SERVICE_TIME_SMOOTHING * (
+                held - state.service_seconds
+            )
+            self._dispatch(state)
+
+    @staticmethod
+    def _dispatch(state: _Backend) -> None:
+        while state.active < state.limit and state.depth:
+            waiter = state.pop_next()
+            waiter.granted = True
+            state.active += 1
+            waiter.event.set()
+
+
+_scheduler = InferenceScheduler()
+
+
+def get_inference_scheduler() -> InferenceScheduler:
+    """Get the process-wide inference scheduler"""
+    return _scheduler
@@ -0,0 +1,187 @@
+"""
+Insight Cache Service
+Caches generated AI insights by a fingerprint of their input data.
+
+Each insight slot (the dashboard insights, one slot per chart) keeps its latest
+text with the fingerprint of the data it was generated from:
+
+- same fingerprint, younger than ``INSIGHT_CACHE_TTL_SECONDS``: served as is
+- different fingerprint (the fleet changed) or expired: the stale text is
+  served at once and a background worker regenerates it
+- nothing cached yet: generated in the request
+
+Concurrent generations of the same slot and fingerprint are collapsed into one
+(single-flight), both in requests and in the background worker. Failed
+generations are never cached; a failed refresh keeps the stale text and the
+slot is not refreshed again for ``INSIGHT_REFRESH_RETRY_SECONDS``.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import current_app
+
+from ..extensions import db
+
+REFRESH_WORKERS = 2
+
+_refresh_executor: Optional[ThreadPoolExecutor] = None
+_refresh_lock = threading.Lock()
+
+
+def get_insight_refresh_executor() -> ThreadPoolExecutor:
+    """Get the process-wide thread pool that regenerates stale insights"""
+    global _refresh_executor
+    with _refresh_lock:
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(
+                max_workers=REFRESH_WORKERS, thread_name_prefix="insight-refresh"
+            )
+        return _refresh_executor
+
+
+def insight_fingerprint(*inputs: Any) -> str:
+    """Content hash of the data an insight is generated from"""
+    raw = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "value", "created_at")
+
+    def __init__(self, fingerprint: str, value: str):
+        self.fingerprint = fingerprint
+        self.value = value
+        self.created_at = time.monotonic()
+
+
+class InsightCache:
+    """Stale-while-revalidate cache of insight texts with single-flight"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], Future] = {}
+        # slot -> time.monotonic() of its last failed generation
+        self._failed_at: Dict[str, float] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    def get(self, slot: str, fingerprint: str, generate: Callable[[], str]) -> str:
+        """
+        Get the insight of a slot for the given input fingerprint
+
+        Args:
+            slot: Insight slot, e.g. "pump_insights" or "chart:pie:Status"
+            fingerprint: ``insight_fingerprint`` of the inputs
+            generate: Produces the text; runs in the request on a miss and in
+                the background worker to revalidate a stale entry
+
+        Raises:
+            Whatever ``generate`` raises on a miss (nothing is cached)
+        """
+        ttl = current_app.config.get("INSIGHT_CACHE_TTL_SECONDS", 21600.0)
+        retry = current_app.config.get("INSIGHT_REFRESH_RETRY_SECONDS", 60.0)
+        key = (slot, fingerprint)
+        with self._lock:
+            entry = self._entries.get(slot)
+            if entry is not None:
+                self._entries.move_to_end(slot)
+                now = time.monotonic()
+                fresh = now - entry.created_at < ttl
+                if entry.fingerprint == fingerprint and fresh:
+                    self.hits += 1
+                    return entry.value
+                self.stale_hits += 1
+                backing_off = now - self._failed_at.get(slot, -retry) < retry
+                if key not in self._inflight and not backing_off:
+                    self._inflight[key] = self._submit_refresh(key, generate)
+                return entry.value
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                self.misses += 1
+                future = Future()
+                self._inflight[key] = future
+
+        if not leader:
+            return future.result()
+        self._run(key, generate, future)
+        return future.result()
+
+    def invalidate(self) -> None:
+        """Forget every cached insight"""
+        with self._lock:
+            self._entries.clear()
+            self._failed_at.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "refreshing": len(self._inflight),
+                "backing_off": len(self._failed_at),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "errors": self.errors,
+            }
+
+    def _submit_refresh(
+        self, key: Tuple[str, str], generate: Callable[[], str]
+    ) -> Future:
+        app = current_app._get_current_object()
+        future: Future = Future()
+
+        def refresh():
+            with app.app_context():
+                try:
+                    self._run(key, generate, future)
+                finally:
+                    db.session.remove()
+
+        get_insight_refresh_executor().submit(refresh)
+        return future
+
+    def _run(
+        self, key: Tuple[str, str], generate: Callable[[], str], future: Future
+    ) -> None:
+        slot, fingerprint = key
+        try:
+            value = generate()
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+                self._failed_at[slot] = time.monotonic()
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            return
+        size = current_app.config.get("INSIGHT_CACHE_SIZE", 64)
+        with self._lock:
+            if slot in self._entries:
+                self.refreshes += 1
+            self._entries[slot] = _Entry(fingerprint, value)
+            self._entries.move_to_end(slot)
+            self._failed_at.pop(slot, None)
+            while len(self._entries) > size:
+                evicted, _ = self._entries.popitem(last=False)
+                self._failed_at.pop(evicted, None)
+            self._inflight.pop(key, None)
+        future.set_result(value)
+
+
+_cache = InsightCache()
+
+
+def get_insight_cache() -> InsightCache:
+    """Get the process-wide insight cache"""
+    return _cache
@@ -0,0 +1,186 @@
+"""
+LLM Client Service
+Process-wide registry of OpenAI-compatible clients (OpenAI and Ollama).
+
+Creating an ``OpenAI`` client per request also creates a new HTTP connection
+pool, so every call paid a TCP (and for OpenAI a TLS) handshake. The registry
+keeps one client per ``(base_url, api_key)`` on a shared ``httpx.Client`` with
+keep-alive limits and per-backend timeouts: local backends (Ollama) get a long
+read timeout for slow CPU generations, remote ones a shorter one.
+
+Connections are counted through the httpcore ``trace`` extension, so
+``metrics()`` can report requests, new connections, the connection reuse ratio
+and the connections currently open in each pool.
+"""
+
+import hashlib
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+from flask import current_app, has_app_context
+from openai import OpenAI
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "host.docker.internal", "ollama"}
+
+# Defaults when no app context is available; see Config for the overrides
+DEFAULT_SETTINGS = {
+    "LLM_LOCAL_TIMEOUT_SECONDS": 300.0,
+    "LLM_REMOTE_TIMEOUT_SECONDS": 60.0,
+    "LLM_CONNECT_TIMEOUT_SECONDS": 5.0,
+    "LLM_MAX_CONNECTIONS": 20,
+    "LLM_MAX_KEEPALIVE_CONNECTIONS": 10,
+    "LLM_KEEPALIVE_EXPIRY_SECONDS": 30.0,
+}
+
+
+def _setting(name: str) -> Any:
+    if has_app_context():
+        return current_app.config.get(name, DEFAULT_SETTINGS[name])
+    return DEFAULT_SETTINGS[name]
+
+
+def ollama_base_url(base_url: Optional[str] = None) -> str:
+    """Ollama OpenAI-compatible endpoint: explicit, OLLAMA_BASE_URL or default"""
+    base_url = base_url or os.getenv("OLLAMA_BASE_URL")
+    if base_url:
+        return base_url
+    is_docker = os.path.exists("/.dockerenv") or os.getenv("DOCKER_CONTAINER")
+    if is_docker:
+        return "http://host.docker.internal:11434/v1"
+    return "http://localhost:11434/v1"
+
+
+def is_local_backend(base_url: str) -> bool:
+    """True for self-hosted backends (Ollama), which get the long timeout"""
+    host = urlparse(base_url).hostname or ""
+    return host in LOCAL_HOSTS or host.endswith(".local") or not host.count(".")
+
+
+class _PooledBackend:
+    """One OpenAI client on a keep-alive httpx pool, with connection counters"""
+
+    def __init__(self, base_url: str, api_key: str):
+        self.base_url = base_url
+        self.local = is_local_backend(base_url)
+        self.key_fingerprint = hashlib.sha256(api_key.encode()).hexdigest()[:8]
+        self.requests = 0
+        self.connections_opened = 0
+        self._lock = threading.Lock()
+
+        read_timeout = _setting(
+            "LLM_LOCAL_TIMEOUT_SECONDS" if self.local else "LLM_REMOTE_TIMEOUT_SECONDS"
+        )
+        self.timeout = httpx.Timeout(
+            read_timeout, connect=_setting("LLM_CONNECT_TIMEOUT_SECONDS")
+        )
+        self.limits = httpx.Limits(
+            max_connections=int(_setting("LLM_MAX_CONNECTIONS")),
+            max_keepalive_connections=int(_setting("LLM_MAX_KEEPALIVE_CONNECTIONS")),
+            keepalive_expiry=_setting("LLM_KEEPALIVE_EXPIRY_SECONDS"),
+        )
+        self.transport = httpx.HTTPTransport(limits=self.limits)
+        self.http_client = httpx.Client(
+            transport=self.transport,
+            timeout=self.timeout,
+            event_hooks={"request": [self._on_request]},
+        )
+        self.client = OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=self.timeout,
+            http_client=self.http_client,
+        )
+
+    def _on_request(self, request: httpx.Request) -> None:
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connections_opened += 1
+
+    def open_connections(self) -> Tuple[int, int]:
+        """(open, idle) connections of the pool"""
+        pool = getattr(self.transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        open_ = [c for c in connections if not c.is_closed()]
+        idle = [c for c in open_ if c.is_idle()]
+        return len(open_), len(idle)
+
+    def metrics(self) -> Dict[str, Any]:
+        open_, idle = self.open_connections()
+        with self._lock:
+            requests, opened = self.requests, self.connections_opened
+        return {
+            "base_url": self.base_url,
+            "api_key": self.key_fingerprint,
+            "backend": "local" if self.local else "remote",
+            "requests": requests,
+            "connections_opened": opened,
+            "reuse_ratio": round(1 - opened / requests, 3) if requests else None,
+            "open_connections": open_,
+            "idle_connections": idle,
+            "max_connections": self.limits.max_connections,
+            "read_timeout": self.timeout.read,
+        }
+
+    def close(self) -> None:
+        self.http_client.close()
+
+
+class LLMClientRegistry:
+    """Pooled OpenAI-compatible clients keyed by (base_url, api_key)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._backends: Dict[Tuple[str, str], _PooledBackend] = {}
+
+    def get(self, base_url: Optional[str], api_key: str) -> OpenAI:
+        """Get (creating on first use) the shared client of a backend"""
+        key = ((base_url or OPENAI_BASE_URL).rstrip("/"), api_key)
+        backend = self._backends.get(key)
+        if backend is None:
+            with self._lock:
+                backend = self._backends.get(key)
+                if backend is None:
+                    backend = _PooledBackend(*key)
+                    self._backends[key] = backend
+        return backend.client
+
+    def metrics(self) -> List[Dict[str, Any]]:
+        """Pool and reuse metrics of every backend"""
+        with self._lock:
+            backends = list(self._backends.values())
+        return [backend.metrics() for backend in backends]
+
+    def close(self) -> None:
+        """Close every pool (the next get() creates fresh clients)"""
+        with self._lock:
+            backends = list(self._backends.values())
+            self._backends.clear()
+        for backend in backends:
+            backend.close()
+
+
+_registry = LLMClientRegistry()
+
+
+def get_llm_client_registry() -> LLMClientRegistry:
+    """Get the process-wide LLM client registry"""
+    return _registry
+
+
+def get_llm_client(base_url: Optional[str], api_key: str) -> OpenAI:
+    """Shortcut for ``get_llm_client_registry().get(base_url, api_key)``"""
+    return _registry.get(base_url, api_key)
+
+
+def get_ollama_client(base_url: Optional[str] = None) -> OpenAI:
+    """Shared client of the Ollama backend (see ``ollama_base_url``)"""
+    return _registry.get(ollama_base_url(base_url), "ollama")
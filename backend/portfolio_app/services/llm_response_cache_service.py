@@ -0,0 +1,169 @@
+"""
+LLM Response Cache Service
+Replays chat answers for repeated questions instead of generating them again.
+
+Entries are keyed on the model, the generation parameters, a hash of the
+normalized system prompt and the normalized message history (roles plus
+case-folded, whitespace-collapsed content without trailing punctuation), so
+"What are your skills?" and "what are your skills" share one answer.
+
+Each entry stores the streamed chunks as they were produced, which lets the
+endpoints replay a hit as the same SSE events. Entries expire after
+``LLM_RESPONSE_CACHE_TTL_SECONDS`` and the least recently used ones are evicted
+once the cached text exceeds ``LLM_RESPONSE_CACHE_MAX_BYTES``. Every entry
+belongs to a scope (e.g. "portfolio", "analysis") with a version (CV hash,
+fleet version token); a new version drops the scope's entries at once.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+
+# Rough per-entry bookkeeping cost, added to the chunk bytes
+ENTRY_OVERHEAD_BYTES = 256
+CHUNK_OVERHEAD_BYTES = 56
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION_RE = re.compile(r"[\s?!.¿¡]+$")
+
+
+def normalize_text(text: Any) -> str:
+    """Case-folded text with collapsed whitespace"""
+    return _WHITESPACE_RE.sub(" ", str(text or "")).strip().casefold()
+
+
+def normalize_messages(messages: List[Dict[str, Any]]) -> List[List[str]]:
+    """Role and normalized content of each message"""
+    normalized = []
+    for message in messages:
+        content = normalize_text(message.get("content"))
+        if message.get("role") == "user":
+            content = _TRAILING_PUNCTUATION_RE.sub("", content)
+        normalized.append([str(message.get("role", "")), content])
+    return normalized
+
+
+def response_key(
+    model: str,
+    system_prompt: str,
+    messages: List[Dict[str, Any]],
+    **params: Any,
+) -> str:
+    """Cache key of a chat completion request"""
+    prompt_hash = hashlib.sha256(normalize_text(system_prompt).encode()).hexdigest()
+    raw = json.dumps(
+        [model, prompt_hash, normalize_messages(messages), params],
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("chunks", "size", "expires_at", "scope")
+
+    def __init__(self, chunks: List[str], size: int, expires_at: float, scope: str):
+        self.chunks = chunks
+        self.size = size
+        self.expires_at = expires_at
+        self.scope = scope
+
+
+class LLMResponseCache:
+    """Byte-bounded LRU of streamed chat answers with TTL and scope versions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._versions: Dict[str, str] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def sync(self, scope: str, version: str) -> None:
+        """Drop the scope's entries if its version changed"""
+        with self._lock:
+            if self._versions.get(scope) == version:
+                return
+            self._versions[scope] = version
+            self._drop(lambda entry: entry.scope == scope)
+
+    def invalidate(self, scope: Optional[str] = None) -> None:
+        """Drop the entries of a scope (all entries when None)"""
+        with self._lock:
+            if scope is None:
+                self._versions.clear()
+                self._drop(lambda entry: True)
+            else:
+                self._versions.pop(scope, None)
+                self._drop(lambda entry: entry.scope == scope)
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Cached chunks of a request, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.chunks
+
+    def put(self, key: str, chunks: List[str], scope: str) -> None:
+        """Store the chunks of a complete answer"""
+        ttl = current_app.config.get("LLM_RESPONSE_CACHE_TTL_SECONDS", 3600.0)
+        max_bytes = current_app.config.get(
+            "LLM_RESPONSE_CACHE_MAX_BYTES", 8 * 1024 * 1024
+        )
+        size = ENTRY_OVERHEAD_BYTES + sum(
+            len(chunk.encode()) + CHUNK_OVERHEAD_BYTES for chunk in chunks
+        )
+        if ttl <= 0 or size > max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(
+                list(chunks), size, time.monotonic() + ttl, scope
+            )
+            self.bytes += size
+            while self.bytes > max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key: str) -> None:
+        self.bytes -= self._entries.pop(key).size
+
+    def _drop(self, predicate) -> None:
+        for key in [key for key, entry in self._entries.items() if predicate(entry)]:
+            self._remove(key)
+
+
+_cache = LLMResponseCache()
+
+
+def get_llm_response_cache() -> LLMResponseCache:
+    """Get the process-wide LLM response cache"""
+    return _cache
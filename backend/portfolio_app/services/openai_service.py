@@ -3,17 +3,26 @@ from flask import current_app
 from openai import OpenAI
 import json
 
+from .inference_scheduler_service import (
+    PRIORITY_DEFAULT,
+    InferenceQueueFull,
+    get_inference_scheduler,
+    requester_key,
+)
+from .insight_cache_service import get_insight_cache, insight_fingerprint
+from .llm_client_service import OPENAI_BASE_URL, get_llm_client
+
 
 class OpenAIService:
     """Service for OpenAI integration to generate insights from pump data"""
 
     @staticmethod
     def get_client() -> OpenAI:
-        """Get OpenAI client instance"""
+        """Get the shared (pooled) OpenAI client instance"""
         api_key: Optional[str] = current_app.config.get("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY not configured")
-        return OpenAI(api_key=api_key)
+        return get_llm_client(None, api_key)
 
     @staticmethod
     def generate_pump_insights(
@@ -34,57 +43,24 @@ class OpenAIService:
         Returns:
             AI-generated insights as a string
         """
+        # Only what the prompt sends: numeric_stats is not part of it, so metric
+        # changes (e.g. telemetry ingests) do not make the insight stale
+        fingerprint = insight_fingerprint(
+            summary_data, status_distribution, (locations or [])[:5]
+        )
         try:
-            client = OpenAIService.get_client()
-
-            # Prepare data summary for AI
-            data_context = f"""
-            Pump System Analysis Data:
-            
-            Total Pumps: {summary_data.get('total_pumps', 0)}
-            
-            Status Distribution:
-            {json.dumps(status_distribution, indent=2)}
-            
-            Metrics:
-            - Operational Efficiency: {summary_data.get('metrics', {}).get('operational_efficiency_pct', 0):.1f}%
-            - Maintenance Pumps: {summary_data.get('metrics', {}).get('maintenance_pct', 0):.1f}%
-            - System Availability: {summary_data.get('metrics', {}).get('system_availability_pct', 0):.1f}%
-            
-            Top Locations:
-            {json.dumps(locations[:5], indent=2) if locations else 'No location data'}
-            """
-
-            prompt = f"""
-            You are an industrial pump system analyst. Based on the following data from a pump monitoring system, provide 3-5 key insights in a professional, concise manner. Focus on:
-            
-            1. Overall system health and operational status
-            2. Potential issues or areas of concern
-            3. Maintenance recommendations if applicable
-            4. Notable patterns or trends
-            
-            Format the response as a bulleted list in English. Be specific and actionable.
-            
-            {data_context}
-            """
-
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",  # Using mini for cost efficiency
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert industrial equipment analyst specializing in pump systems and maintenance optimization.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.7,
-                max_tokens=500,
+            return get_insight_cache().get(
+                "pump_insights",
+                fingerprint,
+                lambda: OpenAIService._request_pump_insights(
+                    summary_data, status_distribution, locations
+                ),
             )
 
-            return response.choices[0].message.content.strip()
-
         except ValueError:
             return "AI insights unavailable: OpenAI API key not configured"
+        except InferenceQueueFull:
+            return "AI insights temporarily unavailable: Too many concurrent requests."
         except Exception as e:
             print(f"Error generating AI insights: {str(e)}")
             return f"Unable to generate insights: {str(e)}"
@@ -106,19 +82,110 @@ class OpenAIService:
         Returns:
             AI-generated insight for the specific chart
         """
+        fingerprint = insight_fingerprint(chart_type, chart_title, chart_data)
         try:
-            client = OpenAIService.get_client()
+            return get_insight_cache().get(
+                f"chart:{chart_type}:{chart_title}",
+                fingerprint,
+                lambda: OpenAIService._request_chart_insight(
+                    chart_type, chart_data, chart_title
+                ),
+            )
 
-            data_summary = json.dumps(chart_data, indent=2) if chart_data else "No data"
+        except ValueError:
+            return "AI insight unavailable: OpenAI API key not configured"
+        except InferenceQueueFull:
+            return "AI insight temporarily unavailable: Too many concurrent requests."
+        except Exception as e:
+            error_message = str(e).lower()
+            if "insufficient_quota" in error_message or "quota" in error_message:
+                return "AI insight unavailable: No credits available in OpenAI account."
+            elif "429" in error_message or "rate limit" in error_message:
+                return "AI insight temporarily unavailable: Rate limit exceeded."
+            else:
+                print(f"Error generating chart insight: {str(e)}")
+                return "Unable to generate insight"
 
-            prompt = f"""
-            Analyze the following {chart_type} chart data titled "{chart_title}" and provide 1-2 key insights in a single sentence. Be concise and specific.
-            
-            Chart Data:
-            {data_summary}
-            
-            Insight:"""
+    @staticmethod
+    def _request_pump_insights(
+        summary_data: Dict[str, Any],
+        status_distribution: List[Dict[str, Any]],
+        locations: List[Dict[str, Any]],
+    ) -> str:
+        """Ask the model for the dashboard insights (raises on failure)"""
+        client = OpenAIService.get_client()
+
+        # Prepare data summary for AI
+        data_context = f"""
+        Pump System Analysis Data:
+        
+        Total Pumps: {summary_data.get('total_pumps', 0)}
+        
+        Status Distribution:
+        {json.dumps(status_distribution, indent=2)}
+        
+        Metrics:
+        - Operational Efficiency: {summary_data.get('metrics', {}).get('operational_efficiency_pct', 0):.1f}%
+        - Maintenance Pumps: {summary_data.get('metrics', {}).get('maintenance_pct', 0):.1f}%
+        - System Availability: {summary_data.get('metrics', {}).get('system_availability_pct', 0):.1f}%
+        
+        Top Locations:
+        {json.dumps(locations[:5], indent=2) if locations else 'No location data'}
+        """
 
+        prompt = f"""
+        You are an industrial pump system analyst. Based on the following data from a pump monitoring system, provide 3-5 key insights in a professional, concise manner. Focus on:
+        
+        1. Overall system health and operational status
+        2. Potential issues or areas of concern
+        3. Maintenance recommendations if applicable
+        4. Notable patterns or trends
+        
+        Format the response as a bulleted list in English. Be specific and actionable.
+        
+        {data_context}
+        """
+
+        with get_inference_scheduler().acquire(
+            OPENAI_BASE_URL, requester_key(), PRIORITY_DEFAULT
+        ):
+            response = client.chat.completions.create(
+                model="gpt-4o-mini",  # Using mini for cost efficiency
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are an expert industrial equipment analyst specializing in pump systems and maintenance optimization.",
+                    },
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.7,
+                max_tokens=500,
+            )
+
+        return response.choices[0].message.content.strip()
+
+    @staticmethod
+    def _request_chart_insight(
+        chart_type: str,
+        chart_data: List[Dict[str, Any]],
+        chart_title: str,
+    ) -> str:
+        """Ask the model for a chart insight (raises on failure)"""
+        client = OpenAIService.get_client()
+
+        data_summary = json.dumps(chart_data, indent=2) if chart_data else "No data"
+
+        prompt = f"""
+        Analyze the following {chart_type} chart data titled "{chart_title}" and provide 1-2 key insights in a single sentence. Be concise and specific.
+        
+        Chart Data:
+        {data_summary}
+        
+        Insight:"""
+
+        with get_inference_scheduler().acquire(
+            OPENAI_BASE_URL, requester_key(), PRIORITY_DEFAULT
+        ):
             response = client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[
@@ -132,16 +199,4 @@ class OpenAIService:
                 max_tokens=150,
             )
 
-            return response.choices[0].message.content.strip()
-
-        except ValueError:
-            return "AI insight unavailable: OpenAI API key not configured"
-        except Exception as e:
-            error_message = str(e).lower()
-            if "insufficient_quota" in error_message or "quota" in error_message:
-                return "AI insight unavailable: No credits available in OpenAI account."
-            elif "429" in error_message or "rate limit" in error_message:
-                return "AI insight temporarily unavailable: Rate limit exceeded."
-            else:
-                print(f"Error generating chart insight: {str(e)}")
-                return "Unable to generate insight"
+        return response.choices[0].message.content.strip()
@@ -0,0 +1,46 @@
+"""
+Photo Cleanup Service
+Removal of photo files and directories, shared by the photo store and bulk
+pump operations.
+
+Legacy per-pump photo directories are removed in a process-wide background
+thread pool so requests do not wait on the filesystem; the photo store removes
+released blob files directly while it holds the blob row lock.
+"""
+
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+CLEANUP_WORKERS = 4
+
+_cleanup_executor: Optional[ThreadPoolExecutor] = None
+_cleanup_lock = threading.Lock()
+
+
+def get_photo_cleanup_executor() -> ThreadPoolExecutor:
+    """Get the process-wide thread pool used to remove photo files"""
+    global _cleanup_executor
+    with _cleanup_lock:
+        if _cleanup_executor is None:
+            _cleanup_executor = ThreadPoolExecutor(
+                max_workers=CLEANUP_WORKERS, thread_name_prefix="pump-photo-cleanup"
+            )
+        return _cleanup_executor
+
+
+def remove_files(paths: Iterable[str]) -> None:
+    """Remove files, ignoring the ones already gone"""
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def remove_directories(paths: Iterable[str]) -> None:
+    """Remove directory trees, ignoring errors"""
+    for path in paths:
+        shutil.rmtree(path, ignore_errors=True)
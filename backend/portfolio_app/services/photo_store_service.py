@@ -0,0 +1,468 @@
+"""
+Photo Store Service
+Content-addressed, deduplicated storage for pump photos.
+
+Uploads are stored once per SHA-256 digest under sharded directories
+(``<root>/ab/cd/<sha256>.<ext>``) and attached to pumps as ``tbl_pump_photos``
+rows carrying that file name and hash. ``tbl_photo_blobs.ref_count`` counts
+the photo rows referencing each blob; it is adjusted by PumpPhoto insert and
+delete events, and blobs that drop to zero references are removed by
+``collect_released``. Both ``save`` and the collection lock the blob row
+(``SELECT ... FOR UPDATE``), so a blob is never reused while its file is being
+removed. ``sweep_orphans`` (``flask sweep-photos``) removes what failed
+uploads leave behind: blob rows still at zero references and files whose row
+was rolled back.
+
+Photos uploaded before the store existed keep their ``<uuid>.<ext>`` names in
+the per-pump directories and are served from there.
+
+``PhotoOwnershipIndex`` answers "does pump X have photo Y" from memory so the
+photo endpoint does not query the database on every hit; committed photo
+changes are applied to it as deltas.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+import weakref
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from flask import current_app
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+
+from ..extensions import db
+from ..models.tbl_photo_blobs import PhotoBlob
+from ..models.tbl_pump_photos import PumpPhoto
+from ..models.tbl_pumps import Pump
+from .photo_cleanup_service import remove_files
+from .pump_image_service import rendition_filenames
+
+BLOB_NAME_RE = re.compile(r"^([0-9a-f]{64})\.([a-z0-9]{1,10})$")
+CHUNK_SIZE = 64 * 1024
+SWEEP_CHUNK_SIZE = 500
+
+_RELEASED_KEY = "photo_blobs_released"
+_PHOTO_CHANGES_KEY = "pump_photo_changes"
+
+
+def _photo_changes(session: Optional[Session]) -> Optional[Dict[str, Any]]:
+    """
+    Photo row changes of the session's transaction, applied to the ownership
+    index on commit: ``pairs`` maps (ccn_pump, filename) to whether the row
+    was added (last change wins) and ``pumps`` holds deleted pumps
+    """
+    if session is None:
+        return None
+    return session.info.setdefault(_PHOTO_CHANGES_KEY, {"pairs": {}, "pumps": set()})
+
+
+def blob_hash(filename: str) -> Optional[str]:
+    """SHA-256 of a content-addressed photo name, or None for legacy names"""
+    match = BLOB_NAME_RE.match(filename or "")
+    return match.group(1) if match else None
+
+
+def store_root() -> str:
+    return current_app.config.get(
+        "PHOTO_STORE_ROOT", os.path.join("portfolio_app", "static", "photo_store")
+    )
+
+
+def blob_relpath(filename: str) -> str:
+    """Path of a blob relative to the store root (two levels of sharding)"""
+    return "/".join([filename[:2], filename[2:4], filename])
+
+
+def blob_path(filename: str) -> str:
+    return os.path.join(store_root(), filename[:2], filename[2:4], filename)
+
+
+class PhotoStore:
+    """Content-addressed blob storage with reference counting"""
+
+    @staticmethod
+    def save(file, extension: str) -> str:
+        """
+        Store an uploaded file, reusing the existing blob for identical content
+
+        The file is streamed to a temporary file while hashing, then renamed
+        into its sharded location. The blob row is created with ref_count 0;
+        each PumpPhoto row with the returned name takes a reference.
+
+        Returns:
+            Blob file name (``<sha256>.<ext>``)
+        """
+        root = store_root()
+        os.makedirs(root, exist_ok=True)
+
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=root, delete=False) as tmp:
+            while True:
+                chunk = file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+        content_hash = digest.hexdigest()
+
+        # The row stays locked until the upload commits its photo rows, so
+        # collect_released cannot remove the file in between
+        blob = _locked_blob(content_hash)
+        while blob is None:
+            try:
+                with db.session.begin_nested():
+                    blob = PhotoBlob(
+                        content_hash=content_hash,
+                        extension=extension,
+                        size_bytes=size,
+                        ref_count=0,
+                    )
+                    db.session.add(blob)
+            except IntegrityError:
+                # Another worker stored the same content concurrently
+                blob = _locked_blob(content_hash)
+
+        filename = blob.filename
+        path = blob_path(filename)
+        if os.path.exists(path):
+            os.remove(tmp.name)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp.name, path)
+        return filename
+
+    @staticmethod
+    def adjust(connection, deltas: Dict[str, int]) -> None:
+        """Apply reference count changes with atomic UPDATE ... SET ref_count + n"""
+        table = PhotoBlob.__table__
+        for content_hash, delta in deltas.items():
+            if delta:
+                connection.execute(
+                    table.update()
+                    .where(table.c.content_hash == content_hash)
+                    .values(ref_count=table.c.ref_count + delta)
+                )
+
+    @staticmethod
+    def describe(filename: str) -> Dict[str, Any]:
+        """
+        PumpPhoto details of a stored blob: size, content hash and dimensions
+
+        Only the image header is read for the dimensions.
+        """
+        path = blob_path(filename)
+        details: Dict[str, Any] = {
+            "content_hash": blob_hash(filename),
+            "size_bytes": os.path.getsize(path),
+        }
+        try:
+            from PIL import Image
+
+            with Image.open(path) as image:
+                details["width"], details["height"] = image.size
+        except Exception:
+            pass
+        return details
+
+    @staticmethod
+    def release_pumps(session: Session, ccn_pumps: List[str]) -> None:
+        """
+        Delete the photo rows of pumps removed with set-based SQL and drop
+        their blob references (one IN query per statement)
+        """
+        table = PumpPhoto.__table__
+        hashes = Counter(
+            content_hash
+            for content_hash in session.execute(
+                select(table.c.content_hash).where(
+                    table.c.ccn_pump.in_(ccn_pumps), table.c.content_hash.isnot(None)
+                )
+            ).scalars()
+        )
+        session.execute(table.delete().where(table.c.ccn_pump.in_(ccn_pumps)))
+        _photo_changes(session)["pumps"].update(ccn_pumps)
+        if hashes:
+            PhotoStore.adjust(
+                session.connection(), {h: -count for h, count in hashes.items()}
+            )
+            session.info.setdefault(_RELEASED_KEY, set()).update(hashes)
+
+    @staticmethod
+    def collect_released() -> List[str]:
+        """
+        Delete blobs released in this session that no pump references any more
+
+        Call after commit. See ``collect``.
+
+        Returns:
+            Names of the removed blobs
+        """
+        released = db.session.info.pop(_RELEASED_KEY, None)
+        if not released:
+            return []
+        return PhotoStore.collect(sorted(released))
+
+    @staticmethod
+    def collect(content_hashes: Iterable[str]) -> List[str]:
+        """
+        Delete the given blobs that are at zero references, with their files
+
+        Each blob is handled in its own transaction: the row is read with
+        ``SELECT ... WHERE ref_count <= 0 FOR UPDATE``, and its file and
+        renditions are removed before the DELETE commits. A concurrent
+        ``save`` of the same content waits on the row lock and then stores
+        the file again, and a blob it re-referenced first is kept.
+
+        Returns:
+            Names of the removed blobs
+        """
+        table = PhotoBlob.__table__
+        removed = []
+        for content_hash in content_hashes:
+            extension = db.session.execute(
+                select(table.c.extension)
+                .where(table.c.content_hash == content_hash, table.c.ref_count <= 0)
+                .with_for_update()
+            ).scalar()
+            if extension is not None:
+                filename = f"{content_hash}.{extension}"
+                db.session.execute(
+                    table.delete().where(table.c.content_hash == content_hash)
+                )
+                remove_files(_blob_files(filename))
+                removed.append(filename)
+            db.session.commit()
+        return removed
+
+    @staticmethod
+    def sweep_orphans(grace_seconds: Optional[float] = None) -> List[str]:
+        """
+        Remove what failed uploads left in the store
+
+        Blob rows at zero references and created more than ``grace_seconds``
+        ago (``PHOTO_ORPHAN_GRACE_SECONDS`` by default) are collected. Blob
+        files modified before then without any row (their upload rolled back)
+        are claimed by inserting a placeholder row, which waits for, or fails
+        against, an upload storing the same content, and removed with it.
+
+        Returns:
+            Names of the removed blobs
+        """
+        if grace_seconds is None:
+            grace_seconds = current_app.config.get("PHOTO_ORPHAN_GRACE_SECONDS", 3600.0)
+        table = PhotoBlob.__table__
+
+        stale = (
+            db.session.execute(
+                select(table.c.content_hash).where(
+                    table.c.ref_count <= 0,
+                    table.c.created_at
+                    < datetime.now() - timedelta(seconds=grace_seconds),
+                )
+            )
+            .scalars()
+            .all()
+        )
+        removed = PhotoStore.collect(stale)
+
+        cutoff = time.time() - grace_seconds
+        files: Dict[str, str] = {}
+        for directory, _, names in os.walk(store_root()):
+            for name in names:
+                content_hash = blob_hash(name)
+                if (
+                    content_hash
+                    and os.path.getmtime(os.path.join(directory, name)) < cutoff
+                ):
+                    files[content_hash] = name
+
+        hashes = sorted(files)
+        for start in range(0, len(hashes), SWEEP_CHUNK_SIZE):
+            chunk = hashes[start : start + SWEEP_CHUNK_SIZE]
+            known = set(
+                db.session.execute(
+                    select(table.c.content_hash).where(table.c.content_hash.in_(chunk))
+                ).scalars()
+            )
+            db.session.commit()
+            for content_hash in chunk:
+                if content_hash in known:
+                    continue
+                filename = files[content_hash]
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(
+                            table.insert().values(
+                                content_hash=content_hash,
+                                extension=filename.rsplit(".", 1)[1],
+                                size_bytes=0,
+                                ref_count=0,
+                                created_at=datetime.now(),
+                            )
+                        )
+                except IntegrityError:
+                    # Stored again since the scan
+                    continue
+                remove_files(_blob_files(filename))
+                db.session.execute(
+                    table.delete().where(table.c.content_hash == content_hash)
+                )
+                db.session.commit()
+                removed.append(filename)
+        return removed
+
+
+def _locked_blob(content_hash: str) -> Optional[PhotoBlob]:
+    return db.session.execute(
+        select(PhotoBlob)
+        .where(PhotoBlob.content_hash == content_hash)
+        .with_for_update()
+    ).scalar_one_or_none()
+
+
+def _blob_files(filename: str) -> List[str]:
+    """Paths of a blob and its renditions"""
+    path = blob_path(filename)
+    directory = os.path.dirname(path)
+    return [path] + [os.path.join(directory, r) for r in rendition_filenames(filename)]
+
+
+class PhotoOwnershipIndex:
+    """
+    In-memory map of pump -> photo filenames
+
+    Loaded once, then kept current with the photo rows this process commits
+    (``apply``, no rescan of tbl_pump_photos). It is reloaded at the latest
+    every ``PHOTO_INDEX_MAX_AGE_SECONDS`` so deletes made by other workers
+    are picked up. A miss falls back to one indexed (ccn_pump, filename)
+    lookup, which also covers photos added by another worker since the last
+    load.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._photos: Dict[str, Set[str]] = {}
+        self._built_at: Optional[float] = None
+        self.rebuilds = 0
+
+    def owns(self, ccn_pump: str, filename: str) -> bool:
+        max_age = current_app.config.get("PHOTO_INDEX_MAX_AGE_SECONDS", 300.0)
+        with self._lock:
+            now = time.monotonic()
+            if self._built_at is None or now - self._built_at >= max_age:
+                self._rebuild()
+                self._built_at = now
+            if filename in self._photos.get(ccn_pump, ()):
+                return True
+
+        found = db.session.execute(
+            select(PumpPhoto.ccn_pump_photo).where(
+                PumpPhoto.ccn_pump == ccn_pump, PumpPhoto.filename == filename
+            )
+        ).first()
+        if found:
+            with self._lock:
+                self._photos.setdefault(ccn_pump, set()).add(filename)
+            return True
+        return False
+
+    def apply(
+        self, pairs: Dict[Tuple[str, str], bool], deleted_pumps: Set[str]
+    ) -> None:
+        """Apply committed photo row changes (see ``_photo_changes``)"""
+        with self._lock:
+            if self._built_at is None:
+                return
+            for ccn_pump in deleted_pumps:
+                self._photos.pop(ccn_pump, None)
+            for (ccn_pump, filename), added in pairs.items():
+                if added:
+                    self._photos.setdefault(ccn_pump, set()).add(filename)
+                else:
+                    self._photos.get(ccn_pump, set()).discard(filename)
+
+    def _rebuild(self) -> None:
+        photos: Dict[str, Set[str]] = {}
+        rows = db.session.execute(select(PumpPhoto.ccn_pump, PumpPhoto.filename))
+        for ccn_pump, filename in rows:
+            photos.setdefault(ccn_pump, set()).add(filename)
+        self._photos = photos
+        self.rebuilds += 1
+
+
+_indexes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def get_photo_ownership_index() -> PhotoOwnershipIndex:
+    """Get the photo ownership index for the current app's database engine"""
+    engine = db.engine
+    with _indexes_lock:
+        index = _indexes.get(engine)
+        if index is None:
+            index = PhotoOwnershipIndex()
+            _indexes[engine] = index
+        return index
+
+
+# ---------------------------------------------------------------------------
+# Reference counting: one reference per tbl_pump_photos row with a content hash
+# ---------------------------------------------------------------------------
+
+
+@event.listens_for(PumpPhoto, "after_insert")
+def _photo_row_inserted(mapper, connection, target):
+    changes = _photo_changes(object_session(target))
+    if changes is not None:
+        changes["pairs"][(target.ccn_pump, target.filename)] = True
+    if target.content_hash:
+        PhotoStore.adjust(connection, {target.content_hash: 1})
+
+
+@event.listens_for(PumpPhoto, "after_delete")
+def _photo_row_deleted(mapper, connection, target):
+    session = object_session(target)
+    changes = _photo_changes(session)
+    if changes is not None:
+        changes["pairs"][(target.ccn_pump, target.filename)] = False
+    if target.content_hash:
+        PhotoStore.adjust(connection, {target.content_hash: -1})
+        if session is not None:
+            session.info.setdefault(_RELEASED_KEY, set()).add(target.content_hash)
+
+
+@event.listens_for(Pump, "after_delete")
+def _pump_row_deleted(mapper, connection, target):
+    # Unloaded photo rows go with ON DELETE CASCADE, without PumpPhoto events
+    changes = _photo_changes(object_session(target))
+    if changes is not None:
+        changes["pumps"].add(target.ccn_pump)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_photo_changes(session):
+    changes = session.info.pop(_PHOTO_CHANGES_KEY, None)
+    if not changes:
+        return
+    try:
+        engine = session.get_bind(mapper=PumpPhoto.__mapper__)
+    except Exception:
+        return
+    index = _indexes.get(engine)
+    if index is not None:
+        index.apply(changes["pairs"], changes["pumps"])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_released_photos(session):
+    session.info.pop(_RELEASED_KEY, None)
+    session.info.pop(_PHOTO_CHANGES_KEY, None)
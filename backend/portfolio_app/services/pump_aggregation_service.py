@@ -0,0 +1,360 @@
+"""
+Pump Aggregation Service
+Fleet statistics computed inside the database with GROUP BY / aggregate queries,
+so response time and worker memory do not grow with the size of tbl_pumps.
+
+Every dashboard section is derived from one ``GROUP BY status, location`` query
+that returns mergeable partial aggregates (count, min, max, mean, spread) per
+group; medians are resolved with a single percentile statement on demand
+(PostgreSQL, SQLite) or read from the in-memory pump snapshot (MySQL).
+"""
+
+import math
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import and_, literal, select, union_all, func
+
+from ..extensions import db
+from ..models.tbl_pumps import Pump
+from .openai_service import OpenAIService
+from .pump_snapshot_service import as_float, get_pumps_dataframe
+
+# Statuses reported in the summary, in display order
+SUMMARY_STATUSES = ["Active", "Maintenance", "Inactive", "Standby", "Testing", "Repair"]
+
+NUMERIC_COLUMNS = [
+    "flow_rate",
+    "pressure",
+    "power",
+    "efficiency",
+    "voltage",
+    "current",
+    "power_factor",
+]
+
+DASHBOARD_SECTIONS = [
+    "summary",
+    "status_distribution",
+    "locations",
+    "numeric_stats",
+    "insights",
+]
+
+# Columns per metric in the grouped query: min, max, count, avg, spread
+_METRIC_WIDTH = 5
+
+
+def _pct(part: int, total: int) -> float:
+    return round((part / total) * 100, 1) if total else 0.0
+
+
+def _native_stddev() -> bool:
+    return db.engine.dialect.name in ("mysql", "mariadb", "postgresql")
+
+
+def _snapshot_medians(names: List[str]) -> Dict[str, Optional[float]]:
+    """Medians of snapshot columns (the middle value(s) by partial sort)"""
+    frame = get_pumps_dataframe()
+    medians: Dict[str, Optional[float]] = {}
+    for name in names:
+        values = frame[name].dropna().to_numpy()
+        if not len(values):
+            medians[name] = None
+            continue
+        middle = sorted({(len(values) - 1) // 2, len(values) // 2})
+        picked = np.partition(values, middle)[middle]
+        medians[name] = sum(as_float(v) for v in picked) / len(picked)
+    return medians
+
+
+class PumpAggregationService:
+    """SQL-backed aggregations over tbl_pumps"""
+
+    @staticmethod
+    def grouped_partials() -> List[Dict[str, Any]]:
+        """
+        One row per (status, location) with per-metric partial aggregates
+
+        Spread is STDDEV_POP where the database has it. SQLite has no standard
+        deviation, so the pumps are joined to their group means and spread is
+        the population variance ``AVG((x - mean)^2)`` of the centered values
+        (two passes, without the cancellation of ``AVG(x*x) - mean^2`` on
+        large values). Both are merged exactly in ``numeric_stats``.
+        """
+        native = _native_stddev()
+        means = None
+        if not native:
+            means = (
+                select(
+                    Pump.status,
+                    Pump.location,
+                    *[
+                        func.avg(getattr(Pump, name)).label(name)
+                        for name in NUMERIC_COLUMNS
+                    ],
+                )
+                .group_by(Pump.status, Pump.location)
+                .subquery()
+            )
+
+        columns = [Pump.status, Pump.location, func.count(Pump.ccn_pump)]
+        for name in NUMERIC_COLUMNS:
+            col = getattr(Pump, name)
+            if native:
+                spread = func.stddev_pop(col)
+            else:
+                deviation = col - means.c[name]
+                spread = func.avg(deviation * deviation)
+            columns.extend(
+                [func.min(col), func.max(col), func.count(col), func.avg(col), spread]
+            )
+
+        query = db.session.query(*columns)
+        if means is not None:
+            # IS: NULL status / location groups match their own means
+            query = query.join(
+                means,
+                and_(
+                    Pump.status.is_(means.c.status),
+                    Pump.location.is_(means.c.location),
+                ),
+            )
+        rows = query.group_by(Pump.status, Pump.location).all()
+
+        groups = []
+        for row in rows:
+            metrics = {}
+            for i, name in enumerate(NUMERIC_COLUMNS):
+                start = 3 + i * _METRIC_WIDTH
+                minimum, maximum, count, mean, spread = row[
+                    start : start + _METRIC_WIDTH
+                ]
+                count = int(count or 0)
+                if count == 0:
+                    continue
+                mean = float(mean)
+                if native:
+                    variance = float(spread or 0.0) ** 2
+                else:
+                    variance = float(spread or 0.0)
+                metrics[name] = {
+                    "min": float(minimum),
+                    "max": float(maximum),
+                    "count": count,
+                    "mean": mean,
+                    "variance": variance,
+                }
+            groups.append(
+                {
+                    "status": row[0],
+                    "location": row[1],
+                    "count": int(row[2]),
+                    "metrics": metrics,
+                }
+            )
+        return groups
+
+    @staticmethod
+    def status_counts(groups: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Pump count per status, most frequent first"""
+        counts: Dict[str, int] = {}
+        for group in groups:
+            counts[group["status"]] = counts.get(group["status"], 0) + group["count"]
+        return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+
+    @staticmethod
+    def summary(status_counts: Dict[str, int]) -> Dict[str, Any]:
+        """Totals, known-status counts and availability metrics"""
+        total = sum(status_counts.values())
+
+        known = {
+            status: status_counts[status]
+            for status in SUMMARY_STATUSES
+            if status_counts.get(status, 0) > 0
+        }
+        active = status_counts.get("Active", 0)
+        maintenance = status_counts.get("Maintenance", 0)
+        standby = status_counts.get("Standby", 0)
+
+        return {
+            "total_pumps": total,
+            "status": known,
+            "metrics": {
+                "operational_efficiency_pct": _pct(active, total),
+                "maintenance_pct": _pct(maintenance, total),
+                "system_availability_pct": _pct(active + standby, total),
+            },
+        }
+
+    @staticmethod
+    def status_distribution(status_counts: Dict[str, int]) -> List[Dict[str, Any]]:
+        """Status counts with percentages, most frequent first"""
+        total = sum(status_counts.values())
+        return [
+            {"status": status, "count": count, "percentage": _pct(count, total)}
+            for status, count in status_counts.items()
+        ]
+
+    @staticmethod
+    def building_counts(groups: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Pump counts per building, where "Building - Room" locations are folded
+        into their first part. Folding happens on the grouped rows, so it costs
+        one pass over distinct locations rather than over pumps.
+        """
+        buildings: Dict[str, int] = {}
+        for group in groups:
+            location = group["location"]
+            building = (
+                location.split(" - ")[0] if isinstance(location, str) else "Unknown"
+            )
+            buildings[building] = buildings.get(building, 0) + group["count"]
+
+        return [
+            {"building": building, "count": count}
+            for building, count in sorted(
+                buildings.items(), key=lambda item: (-item[1], item[0])
+            )
+        ]
+
+    @staticmethod
+    def numeric_stats(
+        groups: List[Dict[str, Any]],
+    ) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Merge per-group partials into fleet-wide min/max/mean/median/std
+
+        Variances are combined with the parallel (Chan) formula, so the result
+        matches a population standard deviation over all rows.
+        """
+        stats: Dict[str, Optional[Dict[str, Any]]] = {}
+        for name in NUMERIC_COLUMNS:
+            partials = [g["metrics"][name] for g in groups if name in g["metrics"]]
+            count = sum(p["count"] for p in partials)
+            if count == 0:
+                stats[name] = None
+                continue
+
+            mean = sum(p["mean"] * p["count"] for p in partials) / count
+            m2 = sum(
+                p["count"] * (p["variance"] + (p["mean"] - mean) ** 2) for p in partials
+            )
+            stats[name] = {
+                "min": min(p["min"] for p in partials),
+                "max": max(p["max"] for p in partials),
+                "mean": mean,
+                "median": None,
+                "std": math.sqrt(m2 / count),
+                "count": count,
+            }
+
+        medians = PumpAggregationService.medians(
+            {name: s["count"] for name, s in stats.items() if s}
+        )
+        for name, value in medians.items():
+            stats[name]["median"] = value
+        return stats
+
+    @staticmethod
+    def medians(counts: Dict[str, int]) -> Dict[str, Optional[float]]:
+        """
+        Medians for several metrics via a 50th-percentile lookup in one statement
+
+        PostgreSQL uses PERCENTILE_CONT. MySQL has no percentile aggregate and
+        an ORDER BY ... LIMIT/OFFSET lookup sorts the whole column per metric,
+        so the medians are read from the pump snapshot instead: its float32
+        columns hold exactly the values of MySQL FLOAT columns, and it may lag
+        writes from other workers by ``PUMP_SNAPSHOT_REVALIDATE_SECONDS``.
+        SQLite reads the middle row(s) of each column with ORDER BY ...
+        LIMIT/OFFSET subqueries joined by UNION ALL, one sort per metric.
+        """
+        counts = {name: count for name, count in counts.items() if count}
+        if not counts:
+            return {}
+
+        if db.engine.dialect.name in ("mysql", "mariadb"):
+            return _snapshot_medians(list(counts))
+
+        if db.engine.dialect.name == "postgresql":
+            row = db.session.execute(
+                select(
+                    *[
+                        func.percentile_cont(0.5).within_group(
+                            getattr(Pump, name).asc()
+                        )
+                        for name in counts
+                    ]
+                )
+            ).one()
+            return {
+                name: None if value is None else float(value)
+                for name, value in zip(counts, row)
+            }
+
+        parts = []
+        for name, count in counts.items():
+            col = getattr(Pump, name)
+            middle = (
+                select(col.label("value"))
+                .where(col.isnot(None))
+                .order_by(col.asc())
+                .limit(1 if count % 2 else 2)
+                .offset((count - 1) // 2)
+                .subquery()
+            )
+            parts.append(select(literal(name).label("metric"), middle.c.value))
+
+        values: Dict[str, List[float]] = {}
+        for metric, value in db.session.execute(union_all(*parts)).all():
+            values.setdefault(metric, []).append(float(value))
+        return {name: sum(vals) / len(vals) for name, vals in values.items()}
+
+    @staticmethod
+    def dashboard(sections: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        Compute the requested dashboard sections from a single grouped query
+
+        Args:
+            sections: Subset of DASHBOARD_SECTIONS; all sections when omitted
+
+        Returns:
+            Dict keyed by section name
+        """
+        wanted = list(sections) if sections else list(DASHBOARD_SECTIONS)
+        unknown = [s for s in wanted if s not in DASHBOARD_SECTIONS]
+        if unknown:
+            raise ValueError(f"Unknown dashboard sections: {', '.join(unknown)}")
+
+        groups = PumpAggregationService.grouped_partials()
+        status_counts = PumpAggregationService.status_counts(groups)
+        total = sum(status_counts.values())
+
+        # Insights are built from the other sections, so compute them as inputs
+        needs = set(wanted)
+        if "insights" in needs:
+            needs.update(DASHBOARD_SECTIONS)
+
+        computed: Dict[str, Any] = {}
+        if "summary" in needs:
+            computed["summary"] = PumpAggregationService.summary(status_counts)
+        if "status_distribution" in needs:
+            computed["status_distribution"] = {
+                "distribution": PumpAggregationService.status_distribution(
+                    status_counts
+                ),
+                "total": total,
+            }
+        if "locations" in needs:
+            computed["locations"] = PumpAggregationService.building_counts(groups)
+        if "numeric_stats" in needs:
+            computed["numeric_stats"] = PumpAggregationService.numeric_stats(groups)
+        if "insights" in needs:
+            computed["insights"] = OpenAIService.generate_pump_insights(
+                computed["summary"],
+                computed["status_distribution"]["distribution"],
+                computed["numeric_stats"],
+                computed["locations"],
+            )
+
+        return {section: computed[section] for section in wanted}
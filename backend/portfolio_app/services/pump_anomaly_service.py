@@ -0,0 +1,246 @@
+"""
+Pump Anomaly Service
+Fleet outlier detection on the columnar pump snapshot.
+
+Each numeric metric is scored with a robust z-score against the pumps of the
+same (model, location) group::
+
+    z = 0.6745 * (x - median) / MAD
+
+falling back to ``1.2533 * mean absolute deviation`` when the MAD is zero.
+Rows are also checked for physical consistency: the rated ``power`` (kW) should
+match the three-phase electrical power ``sqrt(3) * voltage * current *
+power_factor / 1000`` within a tolerance, and ``power_factor`` must lie in
+(0, 1].
+
+Grouped medians are computed without per-group Python loops: one
+``np.lexsort`` per metric orders the rows by group and then by value, so every
+group's values are contiguous and sorted exactly, and the medians are read at
+fixed offsets. Only the top ranked rows are turned into dicts.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .pump_snapshot_service import (
+    NUMERIC_COLUMNS,
+    as_float,
+    get_pumps_dataframe,
+    stat_float,
+)
+
+# 0.6745 = Phi^-1(0.75) makes the MAD-based z comparable to a standard z-score
+MAD_SCALE = 0.6745
+# Mean absolute deviation of a normal distribution is sigma * sqrt(2 / pi)
+MEAN_AD_SCALE = 1.2533
+DEFAULT_Z_THRESHOLD = 3.5
+DEFAULT_POWER_TOLERANCE = 0.25
+DEFAULT_MIN_GROUP_SIZE = 5
+DEFAULT_OUTLIER_LIMIT = 100
+MAX_OUTLIER_LIMIT = 1000
+SQRT3 = np.sqrt(3.0)
+
+
+def grouped_median(
+    values: np.ndarray, groups: np.ndarray, group_count: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Median of every column of ``values`` within each group, ignoring NaN
+
+    Args:
+        values: (metrics, rows) float array
+        groups: (rows,) group index in [0, group_count)
+        group_count: Number of groups
+
+    Returns:
+        (medians, counts): (metrics, group_count) medians (NaN for groups
+        without values) and the number of non-NaN values per group
+    """
+    values = np.asarray(values, dtype=np.float64)
+    sizes = np.bincount(groups, minlength=group_count)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+
+    valid = ~np.isnan(values)
+    if valid.all():
+        counts = np.broadcast_to(sizes, (values.shape[0], group_count))
+    else:
+        counts = np.stack(
+            [np.bincount(groups, weights=row, minlength=group_count) for row in valid]
+        ).astype(np.int64)
+
+    empty = counts == 0
+    lower = starts + np.maximum(counts - 1, 0) // 2
+    upper = np.where(empty, lower, starts + counts // 2)
+    last = values.shape[1] - 1
+
+    medians = np.full((values.shape[0], group_count), np.nan)
+    if last < 0:
+        return medians, counts
+    for i, row in enumerate(values):
+        # Sorted by group, then by value (exactly); NaN go to the end of their group
+        ordered = row[np.lexsort((row, groups))]
+        medians[i] = (
+            ordered[np.minimum(lower[i], last)] + ordered[np.minimum(upper[i], last)]
+        ) / 2.0
+    medians[empty] = np.nan
+    return medians, counts
+
+
+class PumpAnomalyService:
+    """Robust outlier scoring and consistency checks over the pump fleet"""
+
+    @staticmethod
+    def detect(
+        threshold: float = DEFAULT_Z_THRESHOLD,
+        power_tolerance: float = DEFAULT_POWER_TOLERANCE,
+        min_group_size: int = DEFAULT_MIN_GROUP_SIZE,
+        limit: int = DEFAULT_OUTLIER_LIMIT,
+        metrics: Optional[List[str]] = None,
+        frame: Optional[pd.DataFrame] = None,
+    ) -> Dict[str, Any]:
+        """
+        Rank the most anomalous pumps of the fleet
+
+        Args:
+            threshold: |z| at or above which a metric is an outlier
+            power_tolerance: Allowed relative gap between power and
+                sqrt(3) * V * I * pf / 1000
+            min_group_size: Groups with fewer pumps are not z-scored
+            limit: Number of ranked outliers to return
+            metrics: Metrics to score (default: every numeric column)
+            frame: Fleet frame (default: the pump snapshot)
+
+        Returns:
+            Counts, parameters and ``outliers`` sorted by severity, where
+            severity is the largest of |z| / threshold and
+            power gap / power_tolerance
+        """
+        metrics = metrics or list(NUMERIC_COLUMNS)
+        unknown = [m for m in metrics if m not in NUMERIC_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+        if threshold <= 0 or power_tolerance <= 0:
+            raise ValueError("threshold and power_tolerance must be positive")
+        if not 1 <= limit <= MAX_OUTLIER_LIMIT:
+            raise ValueError(f"limit must be between 1 and {MAX_OUTLIER_LIMIT}")
+
+        frame = get_pumps_dataframe() if frame is None else frame
+        total = len(frame)
+        parameters = {
+            "threshold": threshold,
+            "power_tolerance": power_tolerance,
+            "min_group_size": min_group_size,
+            "metrics": metrics,
+        }
+        if total == 0:
+            return {
+                "total_pumps": 0,
+                "groups": 0,
+                "flagged": 0,
+                "parameters": parameters,
+                "outliers": [],
+            }
+
+        # (model, location) group index per row from the categorical codes
+        model_codes = frame["model"].cat.codes.to_numpy().astype(np.int64)
+        location_codes = frame["location"].cat.codes.to_numpy().astype(np.int64)
+        combined = model_codes * (len(frame["location"].cat.categories) + 1)
+        combined += location_codes + 1
+        used = np.flatnonzero(np.bincount(combined))
+        lookup = np.zeros(combined.max() + 1, dtype=np.int64)
+        lookup[used] = np.arange(len(used))
+        groups = lookup[combined]
+        group_count = len(used)
+
+        values = np.stack([frame[m].to_numpy(dtype=np.float64) for m in metrics])
+        medians, counts = grouped_median(values, groups, group_count)
+        centered = values - medians[:, groups]
+        deviations = np.abs(centered)
+        mads, _ = grouped_median(deviations, groups, group_count)
+        has_nan = bool(np.isnan(values).any())
+        if has_nan:
+            deviations = np.nan_to_num(deviations)
+
+        # Mean absolute deviation for groups whose MAD is zero
+        mean_ads = np.stack(
+            [
+                np.bincount(groups, weights=row, minlength=group_count)
+                for row in deviations
+            ]
+        ) / np.maximum(counts, 1)
+        scale = np.where(mads > 0, mads / MAD_SCALE, mean_ads * MEAN_AD_SCALE)
+        # Constant or too small groups are not scored: |x - median| / inf == 0
+        scale[(scale <= 0) | (counts < min_group_size) | np.isnan(scale)] = np.inf
+        z = centered
+        z /= scale[:, groups]
+        if has_nan:
+            np.nan_to_num(z, copy=False, nan=0.0)
+        z_severity = np.abs(z).max(axis=0) / threshold
+
+        # Physical consistency of the electrical metrics
+        power = frame["power"].to_numpy(dtype=np.float64)
+        voltage = frame["voltage"].to_numpy(dtype=np.float64)
+        current = frame["current"].to_numpy(dtype=np.float64)
+        power_factor = frame["power_factor"].to_numpy(dtype=np.float64)
+        expected = SQRT3 * voltage * current * power_factor / 1000.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gap = np.abs(power - expected) / np.maximum(np.abs(expected), 1e-9)
+        gap[~np.isfinite(gap)] = 0.0
+        power_severity = gap / power_tolerance
+        bad_power_factor = (power_factor <= 0) | (power_factor > 1)
+
+        severity = np.maximum(z_severity, power_severity)
+        severity = np.where(bad_power_factor, np.maximum(severity, 1.0), severity)
+        flagged = np.flatnonzero(severity >= 1.0)
+
+        # Top-k by severity without sorting the whole fleet
+        if len(flagged) > limit:
+            top = flagged[np.argpartition(-severity[flagged], limit - 1)[:limit]]
+        else:
+            top = flagged
+        top = top[np.argsort(-severity[top], kind="stable")]
+
+        columns = ["ccn_pump", "serial_number", "model", "location", "status"]
+        records = frame.iloc[top][columns].astype(object).to_dict("records")
+        outliers = []
+        for row, record in zip(top, records):
+            group = groups[row]
+            record["severity"] = round(float(severity[row]), 2)
+            record["metrics"] = {
+                metric: {
+                    "value": as_float(values[i, row]),
+                    "median": stat_float(medians[i, group]),
+                    "scale": stat_float(scale[i, group]),
+                    "z": round(float(z[i, row]), 2),
+                }
+                for i, metric in enumerate(metrics)
+                if abs(z[i, row]) >= threshold
+            }
+            record["checks"] = []
+            if gap[row] > power_tolerance:
+                record["checks"].append(
+                    {
+                        "check": "power_mismatch",
+                        "power": as_float(power[row]),
+                        "expected_power": round(float(expected[row]), 2),
+                        "relative_gap": round(float(gap[row]), 3),
+                    }
+                )
+            if bad_power_factor[row]:
+                record["checks"].append(
+                    {
+                        "check": "power_factor_out_of_range",
+                        "power_factor": as_float(power_factor[row]),
+                    }
+                )
+            outliers.append(record)
+
+        return {
+            "total_pumps": total,
+            "groups": group_count,
+            "flagged": int(len(flagged)),
+            "parameters": parameters,
+            "outliers": outliers,
+        }
@@ -0,0 +1,135 @@
+"""
+Pump Bulk Service
+Set-based UPDATE/DELETE over many pumps selected by ID list or filter.
+
+Statements run against tbl_pumps directly (no per-row ORM load/flush). Since
+they bypass the Pump mapper events, callers must invalidate the pump snapshot
+after committing. Photo directories of deleted pumps are removed in a
+background thread pool so the request does not wait on the filesystem, and
+their references to shared photo blobs are released.
+"""
+
+import os
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sqlalchemy import delete, select, update
+
+from ..extensions import db
+from ..models.tbl_pumps import Pump
+from ..models.tbl_users import User
+from .photo_cleanup_service import get_photo_cleanup_executor, remove_directories
+from .photo_store_service import PhotoStore
+from .pump_import_service import EDITABLE_FIELDS, convert_pump_field
+
+FILTER_FIELDS = ["status", "location", "model"]
+ID_CHUNK_SIZE = 1000
+
+
+def _chunks(items: List[str], size: int = ID_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+class PumpBulkService:
+    """Bulk operations over tbl_pumps"""
+
+    @staticmethod
+    def criteria(payload: Dict[str, Any]) -> List[Any]:
+        """
+        Build WHERE clauses from ``{"ids": [...]}`` and/or
+        ``{"filter": {"status"|"location"|"model": value or [values]}}``
+
+        Raises:
+            ValueError: If nothing selects the pumps or the filter is invalid
+        """
+        clauses = []
+
+        ids = payload.get("ids")
+        if ids is not None:
+            if not isinstance(ids, list) or not ids:
+                raise ValueError("ids must be a non-empty list")
+            clauses.append(Pump.ccn_pump.in_([str(i) for i in ids]))
+
+        filters = payload.get("filter")
+        if filters is not None:
+            if not isinstance(filters, dict) or not filters:
+                raise ValueError(
+                    f"filter must be an object with any of: {', '.join(FILTER_FIELDS)}"
+                )
+            unknown = [key for key in filters if key not in FILTER_FIELDS]
+            if unknown:
+                raise ValueError(f"Unknown filter fields: {', '.join(unknown)}")
+            for key, value in filters.items():
+                column = getattr(Pump, key)
+                values = value if isinstance(value, list) else [value]
+                if not values:
+                    raise ValueError(f"filter.{key} must not be empty")
+                clauses.append(column.in_([str(v) for v in values]))
+
+        if not clauses:
+            raise ValueError("Select pumps with ids or filter")
+        return clauses
+
+    @staticmethod
+    def update(clauses: List[Any], changes: Dict[str, Any]) -> int:
+        """
+        Apply ``changes`` to every matching pump with one UPDATE, without committing
+
+        Returns:
+            Number of updated pumps
+        """
+        if not isinstance(changes, dict) or not changes:
+            raise ValueError("changes must be a non-empty object")
+        unknown = [field for field in changes if field not in EDITABLE_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown pump fields: {', '.join(unknown)}")
+
+        values = {
+            field: convert_pump_field(field, value) for field, value in changes.items()
+        }
+        if "user_id" in values and not db.session.get(User, values["user_id"]):
+            raise ValueError(f"Unknown user_id: {values['user_id']}")
+        values["updated_at"] = datetime.now()
+
+        result = db.session.execute(
+            update(Pump)
+            .where(*clauses)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+    @staticmethod
+    def delete(clauses: List[Any]) -> List[str]:
+        """
+        Delete every matching pump, without committing
+
+        Matching IDs are read first; for each chunk of IDs, the photo rows are
+        deleted and their blob references released, then the pumps are removed
+        with one DELETE.
+
+        Returns:
+            ccn_pump of the deleted pumps
+        """
+        ids = list(db.session.execute(select(Pump.ccn_pump).where(*clauses)).scalars())
+        for chunk in _chunks(ids):
+            PhotoStore.release_pumps(db.session, chunk)
+            db.session.execute(
+                delete(Pump)
+                .where(Pump.ccn_pump.in_(chunk))
+                .execution_options(synchronize_session=False)
+            )
+        return ids
+
+    @staticmethod
+    def schedule_photo_cleanup(ccn_pumps: List[str]) -> List[Future]:
+        """Remove photo directories of deleted pumps in the background"""
+        base = os.path.abspath(os.path.join("portfolio_app", "static", "pumps"))
+        executor = get_photo_cleanup_executor()
+        futures = []
+        for chunk in _chunks(ccn_pumps, 100):
+            paths = [os.path.join(base, ccn) for ccn in chunk]
+            futures.append(executor.submit(remove_directories, paths))
+        return futures
@@ -0,0 +1,76 @@
+"""
+Pump Export Service
+Streams the whole pump fleet as NDJSON or CSV with bounded memory.
+
+Rows are read through a server-side cursor in fixed-size batches, serialized
+from plain column tuples by a PumpProjection (no ORM objects or marshmallow
+schema), and yielded per batch so the response is flushed to the client as it goes.
+"""
+
+import csv
+import io
+import json
+from typing import Any, Dict, Iterator, List
+
+from ..extensions import db
+from ..schemas.schema_pumps import PumpProjection
+
+EXPORT_BATCH_SIZE = 1000
+
+
+class PumpExportService:
+    """Bounded-memory serialization of the full pump list"""
+
+    @staticmethod
+    def iter_batches(
+        projection: PumpProjection, batch_size: int = EXPORT_BATCH_SIZE
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield lists of records for ``projection``, reading tbl_pumps through a
+        server-side cursor ``batch_size`` rows at a time
+
+        Photos of each batch are read on a second connection, since the
+        session's connection is busy with the open cursor.
+        """
+        stmt = projection.select().execution_options(yield_per=batch_size)
+        result = db.session.execute(stmt)
+        if not projection.needs_photos:
+            for partition in result.partitions():
+                yield projection.dump_many(partition)
+            return
+        with db.engine.connect() as photo_connection:
+            for partition in result.partitions():
+                yield projection.dump_many(partition, photo_connection)
+
+    @staticmethod
+    def ndjson_stream(projection: PumpProjection) -> Iterator[str]:
+        """One JSON object per line"""
+        for batch in PumpExportService.iter_batches(projection):
+            yield "".join(
+                json.dumps(record, separators=(",", ":")) + "\n" for record in batch
+            )
+
+    @staticmethod
+    def csv_stream(projection: PumpProjection) -> Iterator[str]:
+        """CSV with a header row; photos and photo_urls are space-separated"""
+        fields = projection.fields
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        yield buffer.getvalue()
+
+        for batch in PumpExportService.iter_batches(projection):
+            buffer.seek(0)
+            buffer.truncate()
+            for record in batch:
+                writer.writerow(
+                    [
+                        (
+                            " ".join(record[field])
+                            if isinstance(record[field], list)
+                            else record[field]
+                        )
+                        for field in fields
+                    ]
+                )
+            yield buffer.getvalue()
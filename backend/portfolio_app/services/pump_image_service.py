@@ -0,0 +1,129 @@
+"""
+Pump Image Service
+Responsive WebP renditions of pump photos, rendered off the request path.
+
+After an upload is saved, ``schedule_renditions`` hands the original to a
+process pool that writes ``<stem>.thumb.webp`` and ``<stem>.medium.webp`` next
+to it. Monkey-patched gevent workers render in gevent's pool of native threads
+instead, since a process pool's management thread would become a greenlet. The photo endpoint serves a rendition with ``?size=thumb|medium`` once
+it exists and falls back to the original until then (or for ``?size=full``).
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from .async_bridge_service import gevent_patched
+
+# Longest side in pixels of each rendition; "full" is the uploaded original
+PHOTO_SIZES: Dict[str, Optional[int]] = {"thumb": 320, "medium": 1280, "full": None}
+DEFAULT_LIST_PHOTO_SIZE = "thumb"
+WEBP_QUALITY = 80
+IMAGE_WORKERS = 2
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+
+
+def rendition_filename(photo_filename: str, size: str) -> str:
+    """File name of the ``size`` rendition of an uploaded photo"""
+    if PHOTO_SIZES.get(size) is None:
+        return photo_filename
+    stem = photo_filename.rsplit(".", 1)[0]
+    return f"{stem}.{size}.webp"
+
+
+def rendition_filenames(photo_filename: str) -> List[str]:
+    """File names of every generated rendition of a photo"""
+    return [
+        rendition_filename(photo_filename, size)
+        for size, edge in PHOTO_SIZES.items()
+        if edge is not None
+    ]
+
+
+def render_renditions(source_path: str) -> List[str]:
+    """
+    Write the WebP renditions of ``source_path`` (runs in a worker process)
+
+    Each file is written under a temporary name and renamed into place, so the
+    photo endpoint never serves a partially written image.
+
+    Returns:
+        Paths of the written renditions
+    """
+    from PIL import Image, ImageOps
+
+    directory, filename = os.path.split(source_path)
+    written = []
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+        for size, edge in PHOTO_SIZES.items():
+            if edge is None:
+                continue
+            rendition = image.copy()
+            rendition.thumbnail((edge, edge), Image.LANCZOS)
+
+            target = os.path.join(directory, rendition_filename(filename, size))
+            temporary = f"{target}.tmp"
+            rendition.save(temporary, "WEBP", quality=WEBP_QUALITY, method=4)
+            os.replace(temporary, target)
+            written.append(target)
+    return written
+
+
+def get_image_executor() -> Executor:
+    """Get the pool that renders photo renditions"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if gevent_patched():
+                # Real OS threads; Pillow releases the GIL while resizing
+                from gevent.threadpool import ThreadPoolExecutor
+
+                _executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS)
+            else:
+                # Spawned workers do not inherit the web worker's threads and locks
+                _executor = ProcessPoolExecutor(
+                    max_workers=IMAGE_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+        return _executor
+
+
+class PumpImageService:
+    """Scheduling and lookup of pump photo renditions"""
+
+    @staticmethod
+    def schedule_renditions(source_path: str) -> Future:
+        """Render the renditions of an uploaded photo in the background"""
+        return get_image_executor().submit(
+            render_renditions, os.path.abspath(source_path)
+        )
+
+    @staticmethod
+    def resolve(pump_dir: str, photo_filename: str, size: str) -> str:
+        """
+        File name to serve for ``size``, falling back to the original while the
+        rendition has not been rendered yet
+        """
+        filename = rendition_filename(photo_filename, size)
+        if filename != photo_filename and os.path.exists(
+            os.path.join(pump_dir, filename)
+        ):
+            return filename
+        return photo_filename
+
+    @staticmethod
+    def remove_renditions(pump_dir: str, photo_filename: str) -> None:
+        """Delete the renditions of a photo that is being removed"""
+        for filename in rendition_filenames(photo_filename):
+            try:
+                os.remove(os.path.join(pump_dir, filename))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,246 @@
+"""
+Pump Import Service
+Bulk creation of pumps from CSV or NDJSON uploads.
+
+Rows are parsed and validated one at a time as the upload is read, and valid
+rows are inserted in executemany batches inside the caller's transaction. The
+per-pump photo directory is not created here; it is created on the first photo
+upload (see ``save_pump_photo``).
+"""
+
+import csv
+import io
+import json
+import math
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ..extensions import db
+from ..models.tbl_pumps import Pump
+from ..models.tbl_users import User
+
+IMPORT_FORMATS = {
+    "csv": "csv",
+    "ndjson": "ndjson",
+    "jsonl": "ndjson",
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+STRING_FIELDS = ["model", "serial_number", "location", "status"]
+FLOAT_FIELDS = [
+    "flow_rate",
+    "pressure",
+    "power",
+    "efficiency",
+    "voltage",
+    "current",
+    "power_factor",
+]
+DATE_FIELDS = ["purchase_date", "last_maintenance", "next_maintenance"]
+REQUIRED_FIELDS = STRING_FIELDS + DATE_FIELDS + FLOAT_FIELDS
+EDITABLE_FIELDS = REQUIRED_FIELDS + ["user_id"]
+
+
+def parse_date_field(date_str):
+    """Parse date field that can be in YYYY-MM-DD or ISO format"""
+    try:
+        # Try ISO format first
+        if "T" in date_str or "Z" in date_str:
+            return datetime.fromisoformat(date_str.replace("Z", "+00:00"))
+        # Try simple date format YYYY-MM-DD
+        return datetime.strptime(date_str, "%Y-%m-%d")
+    except (ValueError, AttributeError) as e:
+        raise ValueError(f"Invalid date format: {date_str}. {str(e)}")
+
+
+def convert_pump_field(field: str, value: Any) -> Any:
+    """
+    Convert a raw value into the tbl_pumps column type for ``field``
+
+    Raises:
+        ValueError: If the field is not editable or the value is invalid
+    """
+    if field in STRING_FIELDS:
+        value = str(value).strip()
+        max_length = Pump.__table__.c[field].type.length
+        if max_length and len(value) > max_length:
+            raise ValueError(f"{field} is longer than {max_length} characters")
+        return value
+
+    if field in FLOAT_FIELDS:
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be a number: {value!r}")
+        if not math.isfinite(number):
+            raise ValueError(f"{field} must be a finite number")
+        return number
+
+    if field in DATE_FIELDS:
+        return parse_date_field(str(value).strip())
+
+    if field == "user_id":
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"user_id must be an integer: {value!r}")
+
+    raise ValueError(f"Unknown pump field: {field}")
+
+
+def _is_blank(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+class PumpImportService:
+    """Streaming validation and batched insertion of pump rows"""
+
+    @staticmethod
+    def iter_records(
+        stream: io.TextIOBase, file_format: str
+    ) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+        """
+        Yield (row_number, record, error) for each data row of the upload
+
+        Row numbers count data rows from 1 (the CSV header is not a row).
+        ``record`` is None when the row could not be parsed at all.
+        """
+        if file_format == "csv":
+            for number, record in enumerate(csv.DictReader(stream), start=1):
+                if None in record:
+                    yield number, None, "Row has more values than the header"
+                else:
+                    yield number, record, None
+            return
+
+        number = 0
+        for line in stream:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield number, None, f"Invalid JSON: {e.msg}"
+                continue
+            if not isinstance(record, dict):
+                yield number, None, "Each line must be a JSON object"
+                continue
+            yield number, record, None
+
+    @staticmethod
+    def validate(
+        record: Dict[str, Any], default_user_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Convert a raw record into tbl_pumps column values
+
+        Raises:
+            ValueError: With a message describing the first invalid field
+        """
+        for field in REQUIRED_FIELDS:
+            if _is_blank(record.get(field)):
+                raise ValueError(f"Missing required field: {field}")
+
+        values = {
+            field: convert_pump_field(field, record[field]) for field in REQUIRED_FIELDS
+        }
+
+        user_id = record.get("user_id")
+        if _is_blank(user_id):
+            if default_user_id is None:
+                raise ValueError("Missing required field: user_id")
+            user_id = default_user_id
+        values["user_id"] = convert_pump_field("user_id", user_id)
+
+        return values
+
+    @staticmethod
+    def import_records(
+        records: Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]],
+        default_user_id: Optional[int] = None,
+        batch_size: int = IMPORT_BATCH_SIZE,
+    ) -> Dict[str, Any]:
+        """
+        Validate and insert records in batches, without committing
+
+        Args:
+            records: Output of ``iter_records``
+            default_user_id: Owner for rows that do not carry a user_id
+            batch_size: Rows per executemany INSERT
+
+        Returns:
+            Report with received/imported/failed counts and the first
+            MAX_REPORTED_ERRORS row errors
+        """
+        report: Dict[str, Any] = {
+            "received": 0,
+            "imported": 0,
+            "failed": 0,
+            "errors": [],
+            "errors_truncated": False,
+        }
+
+        def fail(number: int, message: str) -> None:
+            report["failed"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                report["errors"].append({"row": number, "error": message})
+            else:
+                report["errors_truncated"] = True
+
+        batch: List[Tuple[int, Dict[str, Any]]] = []
+        for number, record, error in records:
+            report["received"] += 1
+            if error is None:
+                try:
+                    batch.append(
+                        (number, PumpImportService.validate(record, default_user_id))
+                    )
+                except ValueError as e:
+                    error = str(e)
+            if error is not None:
+                fail(number, error)
+
+            if len(batch) >= batch_size:
+                PumpImportService._insert_batch(batch, fail, report)
+                batch = []
+
+        if batch:
+            PumpImportService._insert_batch(batch, fail, report)
+
+        # Owner checks run per batch, so restore upload order in the report
+        report["errors"].sort(key=lambda item: item["row"])
+        return report
+
+    @staticmethod
+    def _insert_batch(batch, fail, report) -> None:
+        # Reject unknown owners up front so one bad row cannot abort the transaction
+        user_ids = {values["user_id"] for _, values in batch}
+        known = {
+            row[0]
+            for row in db.session.query(User.ccn_user).filter(
+                User.ccn_user.in_(user_ids)
+            )
+        }
+
+        now = datetime.now()
+        rows = []
+        for number, values in batch:
+            if values["user_id"] not in known:
+                fail(number, f"Unknown user_id: {values['user_id']}")
+                continue
+            values["ccn_pump"] = Pump.generate_ccn(
+                values["model"], values["serial_number"]
+            )
+            values["created_at"] = now
+            values["updated_at"] = now
+            rows.append(values)
+
+        if rows:
+            # Core executemany: no ORM objects, no per-row mapper events
+            db.session.execute(Pump.__table__.insert(), rows)
+            report["imported"] += len(rows)
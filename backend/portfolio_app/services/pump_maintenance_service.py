@@ -0,0 +1,214 @@
+"""
+Pump Maintenance Service
+Maintenance-due queries served by index range scans, and a periodic
+per-location summary.
+
+``due`` reads pumps whose ``next_maintenance`` falls before a horizon through
+``idx_pumps_next_maintenance`` (or ``idx_pumps_status_next_maintenance`` when
+filtering by status) instead of loading every pump into pandas.
+
+``MaintenanceScheduler`` recomputes the overdue / upcoming buckets per location
+with one grouped range query every ``MAINTENANCE_SCHEDULER_INTERVAL_SECONDS``
+in a background thread and publishes the result as an immutable document that
+requests read from memory. With the interval set to 0 (tests) no thread runs
+and the document is recomputed on read when the fleet version changes.
+"""
+
+import hashlib
+import json
+import threading
+import time
+import weakref
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+from sqlalchemy import and_, case, func, select
+
+from ..extensions import db
+from ..models.tbl_pumps import Pump
+
+# Upcoming buckets of the summary: name -> days ahead (exclusive upper bound)
+UPCOMING_BUCKETS: Dict[str, int] = {"due_7d": 7, "due_30d": 30}
+DEFAULT_DUE_LIMIT = 500
+MAX_DUE_LIMIT = 5000
+# Longest due horizon; wider ones overflow datetime arithmetic
+MAX_DUE_WITHIN_DAYS = 3650
+
+
+class PumpMaintenanceService:
+    """Maintenance-due queries over tbl_pumps"""
+
+    @staticmethod
+    def due_clauses(
+        now: datetime,
+        within: timedelta,
+        statuses: Optional[List[str]] = None,
+        include_overdue: bool = True,
+    ) -> List[Any]:
+        """
+        WHERE clauses selecting pumps due before ``now + within``
+
+        Each clause is a plain range (plus an equality/IN on status) so the
+        maintenance indexes can serve it.
+        """
+        clauses = [Pump.next_maintenance < now + within]
+        if not include_overdue:
+            clauses.append(Pump.next_maintenance >= now)
+        if statuses:
+            clauses.append(Pump.status.in_(statuses))
+        return clauses
+
+    @staticmethod
+    def summarize(now: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Overdue and upcoming maintenance counts per location
+
+        One grouped query over the ``next_maintenance`` range up to the widest
+        upcoming bucket.
+
+        Returns:
+            Document with generated_at, the bucket horizons, per-location
+            counts (with the earliest upcoming date) and fleet totals
+        """
+        now = now or datetime.now()
+        horizons = {
+            name: now + timedelta(days=days) for name, days in UPCOMING_BUCKETS.items()
+        }
+        due = Pump.next_maintenance
+        columns = [
+            func.sum(case((due < now, 1), else_=0)).label("overdue"),
+        ]
+        lower = now
+        for name, upper in horizons.items():
+            columns.append(
+                func.sum(case((and_(due >= lower, due < upper), 1), else_=0)).label(
+                    name
+                )
+            )
+            lower = upper
+        columns.append(func.min(case((due >= now, due), else_=None)).label("next_due"))
+
+        rows = db.session.execute(
+            select(Pump.location, *columns)
+            .where(due < max(horizons.values()))
+            .group_by(Pump.location)
+            .order_by(Pump.location)
+        ).all()
+
+        bucket_names = ["overdue", *UPCOMING_BUCKETS]
+        totals = {name: 0 for name in bucket_names}
+        locations = []
+        for row in rows:
+            entry = {"location": row.location}
+            for name in bucket_names:
+                entry[name] = int(getattr(row, name) or 0)
+                totals[name] += entry[name]
+            next_due = row.next_due
+            if isinstance(next_due, str):
+                # SQLite returns MIN() over a CASE as text
+                next_due = datetime.fromisoformat(next_due)
+            entry["next_due"] = next_due.isoformat() if next_due else None
+            locations.append(entry)
+
+        return {
+            "generated_at": now.isoformat(),
+            "buckets": {"overdue": 0, **UPCOMING_BUCKETS},
+            "locations": locations,
+            "totals": totals,
+        }
+
+
+class MaintenanceScheduler:
+    """
+    Publishes the maintenance summary document of one database engine
+
+    The document is replaced atomically, so readers never see a partial
+    update; its ETag is a hash of the content.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._document: Optional[Dict[str, Any]] = None
+        self._etag: Optional[str] = None
+        self._token: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def document(self):
+        """
+        Get the published (document, etag), computing it first if nothing was
+        published yet or, without a background thread, the fleet has changed
+        """
+        from .pump_snapshot_service import get_fleet_version
+
+        self.ensure_started()
+        token, _ = get_fleet_version().current()
+        with self._lock:
+            if self._document is None or (
+                self._thread is None and token != self._token
+            ):
+                self._publish(PumpMaintenanceService.summarize(), token)
+            return self._document, self._etag
+
+    def refresh(self) -> None:
+        """Recompute and publish the summary now"""
+        from .pump_snapshot_service import get_fleet_version
+
+        token, _ = get_fleet_version().current()
+        document = PumpMaintenanceService.summarize()
+        with self._lock:
+            self._publish(document, token)
+
+    def ensure_started(self) -> None:
+        """Start the background refresh thread once per process"""
+        interval = current_app.config.get("MAINTENANCE_SCHEDULER_INTERVAL_SECONDS", 0)
+        if not interval or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            app = current_app._get_current_object()
+            self._thread = threading.Thread(
+                target=self._run,
+                args=(app, interval),
+                name="pump-maintenance-scheduler",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _publish(self, document: Dict[str, Any], token: Optional[str]) -> None:
+        raw = json.dumps(document, sort_keys=True, separators=(",", ":"))
+        self._document = document
+        self._etag = hashlib.sha1(raw.encode()).hexdigest()
+        self._token = token
+
+    def _run(self, app, interval: float) -> None:
+        while not self._stop.is_set():
+            started = time.monotonic()
+            with app.app_context():
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"⚠️ Maintenance summary refresh failed: {str(e)}")
+                finally:
+                    db.session.remove()
+            self._stop.wait(max(0.0, interval - (time.monotonic() - started)))
+
+
+_schedulers: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_schedulers_lock = threading.Lock()
+
+
+def get_maintenance_scheduler() -> MaintenanceScheduler:
+    """Get the maintenance scheduler for the current app's database engine"""
+    engine = db.engine
+    with _schedulers_lock:
+        scheduler = _schedulers.get(engine)
+        if scheduler is None:
+            scheduler = MaintenanceScheduler()
+            _schedulers[engine] = scheduler
+        return scheduler
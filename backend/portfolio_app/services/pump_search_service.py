@@ -0,0 +1,576 @@
+"""
+Pump Search Service
+Type-ahead search over ``serial_number``, ``model``, ``location`` and
+``ccn_pump`` with ranked, highlighted results.
+
+``PumpSearchIndex`` keeps one in-memory index per database engine. Every field
+is dictionary-encoded (one integer code per pump, like a pandas categorical)
+and the distinct values of the text fields are indexed by trigram, so a query
+token only has to be checked against the few values sharing its trigrams.
+Tokens shorter than three characters match the start of a value or of a word,
+and ``ccn_pump`` (a hex id) is matched by a prefix of at least
+``MIN_ID_PREFIX`` characters, both with a binary search over sorted values.
+Scores are then gathered per pump with numpy and the top-k taken with
+``argpartition``.
+
+The index is patched from the committed changes published by the pump
+snapshot service and revalidated with its ``COUNT(*)/MAX(updated_at)`` stamp,
+so writes of other workers show up within ``PUMP_SNAPSHOT_REVALIDATE_SECONDS``.
+
+With ``PUMP_SEARCH_BACKEND = "database"`` (workers sharing one cache instead of
+holding an index each), or for fleets larger than
+``PUMP_SEARCH_MAX_INDEXED_PUMPS``, queries go to the database instead: the
+``ft_pumps_search`` FULLTEXT index on MySQL, ``LIKE`` elsewhere.
+"""
+
+import bisect
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from flask import current_app
+from markupsafe import escape
+from sqlalchemy import and_, func, or_, select, text
+
+from ..extensions import db
+from ..models.tbl_pumps import Pump
+from .pump_snapshot_service import (
+    SNAPSHOT_COLUMNS,
+    read_stamp,
+    stamp_value,
+    subscribe_pump_changes,
+)
+
+SEARCH_FIELDS = ["serial_number", "model", "location", "ccn_pump"]
+# Fields indexed by trigram; ccn_pump is only matched by prefix
+TRIGRAM_FIELDS = ["serial_number", "model", "location"]
+RESULT_COLUMNS = ["ccn_pump", "serial_number", "model", "location", "status"]
+FIELD_WEIGHTS = {"serial_number": 4.0, "ccn_pump": 4.0, "model": 2.0, "location": 1.0}
+# Shorter tokens would match 1/16th of the ids per hex digit
+MIN_ID_PREFIX = 4
+# Score factor by how a token matches a value
+MATCH_EXACT = 1.0
+MATCH_PREFIX = 0.75
+MATCH_WORD = 0.5
+MATCH_INFIX = 0.25
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+MAX_QUERY_TOKENS = 8
+# Rows ranked in Python by score_row in the database searches (LIKE, FULLTEXT)
+LIKE_CANDIDATES = 500
+# Word boundaries recognized by the LIKE fallback for short tokens
+LIKE_WORD_SEPARATORS = [" ", "-", "/", "."]
+
+# Positions of RESULT_COLUMNS in the snapshot rows of the change feed
+_SNAPSHOT_POSITIONS = [SNAPSHOT_COLUMNS.index(col) for col in RESULT_COLUMNS]
+_TOKEN_RE = re.compile(r"\S+")
+_WORD_RE = re.compile(r"[0-9a-z]+")
+
+
+def tokenize(query: str) -> List[str]:
+    """Lowercase, de-duplicated query tokens (at most MAX_QUERY_TOKENS)"""
+    tokens = list(dict.fromkeys(_TOKEN_RE.findall((query or "").lower())))
+    return tokens[:MAX_QUERY_TOKENS]
+
+
+def trigrams(value: str) -> set:
+    return {value[i : i + 3] for i in range(len(value) - 2)}
+
+
+def match_kind(token: str, value: str, infix: bool = True) -> float:
+    """
+    Score factor of a lowercase token inside a lowercase value (0: no match)
+
+    With ``infix=False`` (short tokens) only matches at the start of the value
+    or of a word count.
+    """
+    position = value.find(token)
+    if position < 0:
+        return 0.0
+    if value == token:
+        return MATCH_EXACT
+    if position == 0:
+        return MATCH_PREFIX
+    while position >= 0:
+        if not value[position - 1].isalnum():
+            return MATCH_WORD
+        position = value.find(token, position + 1)
+    return MATCH_INFIX if infix else 0.0
+
+
+def word_starts(value: str) -> List[int]:
+    """Offsets of the words of a value after the first character"""
+    return [
+        i
+        for i in range(1, len(value))
+        if value[i].isalnum() and not value[i - 1].isalnum()
+    ]
+
+
+def highlight(value: Optional[str], tokens: Sequence[str]) -> Optional[str]:
+    """
+    HTML-escaped ``value`` with every token occurrence wrapped in ``<mark>``
+
+    Returns None when no token occurs in the value.
+    """
+    if not value:
+        return None
+    lowered = value.lower()
+    spans = []
+    for token in tokens:
+        start = lowered.find(token)
+        while start >= 0:
+            spans.append((start, start + len(token)))
+            start = lowered.find(token, start + 1)
+    if not spans:
+        return None
+
+    spans.sort()
+    merged = [list(spans[0])]
+    for start, end in spans[1:]:
+        if start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    parts = []
+    cursor = 0
+    for start, end in merged:
+        parts.append(str(escape(value[cursor:start])))
+        parts.append(f"<mark>{escape(value[start:end])}</mark>")
+        cursor = end
+    parts.append(str(escape(value[cursor:])))
+    return "".join(parts)
+
+
+def _result(row: Sequence[Any], score: float, tokens: Sequence[str]) -> Dict[str, Any]:
+    record = dict(zip(RESULT_COLUMNS, row))
+    record["score"] = round(float(score), 3)
+    highlights = {}
+    for field in SEARCH_FIELDS:
+        marked = highlight(record[field], tokens)
+        if marked is not None:
+            highlights[field] = marked
+    record["highlights"] = highlights
+    return record
+
+
+def score_row(row: Sequence[Any], tokens: Sequence[str]) -> float:
+    """Score of one result row; 0 unless every token matches some field"""
+    record = dict(zip(RESULT_COLUMNS, row))
+    total = 0.0
+    for token in tokens:
+        best = 0.0
+        for field in SEARCH_FIELDS:
+            value = (record[field] or "").lower()
+            if field == "ccn_pump":
+                prefix = len(token) >= MIN_ID_PREFIX and value.startswith(token)
+                kind = match_kind(token, value) if prefix else 0.0
+            else:
+                kind = match_kind(token, value, infix=len(token) >= 3)
+            best = max(best, kind * FIELD_WEIGHTS[field])
+        if not best:
+            return 0.0
+        total += best
+    return total
+
+
+class _FieldIndex:
+    """Dictionary-encoded values of one field with trigram / prefix lookups"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.weight = FIELD_WEIGHTS[name]
+        self.with_trigrams = name in TRIGRAM_FIELDS
+        self.ids: Dict[str, int] = {}
+        self.lowered: List[str] = []
+        # (value or suffix from a word start, code) for prefix lookups
+        self.sorted: List[Tuple[str, int]] = []
+        self.trigrams: Dict[str, List[int]] = {}
+
+    def code(self, value: Optional[str], keep_sorted: bool = True) -> int:
+        """
+        Code of a value, adding it to the dictionary if new
+
+        Bulk loads pass ``keep_sorted=False`` and call ``sort()`` once at the end
+        """
+        value = value or ""
+        code = self.ids.get(value)
+        if code is None:
+            code = len(self.lowered)
+            lowered = value.lower()
+            self.ids[value] = code
+            self.lowered.append(lowered)
+            entries = [(lowered, code)]
+            if self.with_trigrams:
+                entries += [(lowered[i:], code) for i in word_starts(lowered)]
+            for entry in entries:
+                if keep_sorted:
+                    bisect.insort(self.sorted, entry)
+                else:
+                    self.sorted.append(entry)
+            if self.with_trigrams:
+                for gram in trigrams(lowered):
+                    self.trigrams.setdefault(gram, []).append(code)
+        return code
+
+    def match(self, token: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(codes, score factors) of the values the token matches"""
+        if self.name == "ccn_pump" and len(token) < MIN_ID_PREFIX:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        if self.with_trigrams and len(token) >= 3:
+            postings = [self.trigrams.get(gram) for gram in trigrams(token)]
+            if not all(postings):
+                return np.empty(0, dtype=np.int64), np.empty(0)
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+                if not candidates:
+                    break
+            codes, kinds = [], []
+            for code in candidates:
+                kind = match_kind(token, self.lowered[code])
+                if kind:
+                    codes.append(code)
+                    kinds.append(kind)
+            return np.asarray(codes, dtype=np.int64), np.asarray(kinds)
+
+        # Prefix range of the sorted values and word suffixes
+        start = bisect.bisect_left(self.sorted, (token,))
+        found: Dict[int, float] = {}
+        for entry, code in self.sorted[start:]:
+            if not entry.startswith(token):
+                break
+            if code not in found:
+                found[code] = match_kind(token, self.lowered[code], infix=False)
+        return (
+            np.fromiter(found.keys(), dtype=np.int64, count=len(found)),
+            np.fromiter(found.values(), dtype=np.float64, count=len(found)),
+        )
+
+    def sort(self) -> None:
+        self.sorted.sort()
+
+
+class PumpSearchIndex:
+    """In-memory search index of the pump fleet for a single database engine"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._oversized = False
+        self._fields: Dict[str, _FieldIndex] = {}
+        self._codes: Dict[str, np.ndarray] = {}
+        self._rows: List[Optional[Tuple]] = []
+        self._positions: Dict[str, int] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._count = 0
+        self._max_updated_at = None
+        self._checked_at = 0.0
+
+    def available(self) -> bool:
+        """Build or revalidate the index; False when the fleet is too large"""
+        with self._lock:
+            if not self._built or self._is_stale():
+                self._load()
+            return not self._oversized
+
+    def invalidate(self) -> None:
+        """Drop the index so the next query rebuilds it (e.g. after bulk SQL)"""
+        with self._lock:
+            self._built = False
+
+    def search(self, tokens: Sequence[str], limit: int) -> Dict[str, Any]:
+        """Top ``limit`` pumps matching every token, best score first"""
+        with self._lock:
+            size = len(self._rows)
+            total_scores = np.zeros(size)
+            matched = self._alive[:size].copy()
+            for token in tokens:
+                token_scores = np.zeros(size)
+                for field in self._fields.values():
+                    codes, kinds = field.match(token)
+                    if not len(codes):
+                        continue
+                    by_value = np.zeros(len(field.lowered))
+                    by_value[codes] = kinds * field.weight
+                    np.maximum(
+                        token_scores,
+                        by_value[self._codes[field.name][:size]],
+                        out=token_scores,
+                    )
+                matched &= token_scores > 0
+                total_scores += token_scores
+
+            hits = np.flatnonzero(matched)
+            if len(hits) > limit:
+                hits = hits[np.argpartition(-total_scores[hits], limit - 1)[:limit]]
+            ranked = sorted(
+                hits.tolist(),
+                key=lambda i: (-total_scores[i], self._rows[i][1] or ""),
+            )
+            return {
+                "total": int(matched.sum()),
+                "results": [
+                    _result(self._rows[i], total_scores[i], tokens) for i in ranked
+                ],
+            }
+
+    def apply(self, changes: "OrderedDict[str, Optional[Dict[str, Any]]]") -> None:
+        """
+        Patch committed changes into the index
+
+        Args:
+            changes: ccn_pump -> row tuple (SNAPSHOT_COLUMNS) and updated_at
+                for upserts, or None for deletes, in commit order
+        """
+        with self._lock:
+            if not self._built or self._oversized:
+                return
+            for ccn_pump, change in changes.items():
+                position = self._positions.get(ccn_pump)
+                if change is None:
+                    if position is not None:
+                        self._alive[position] = False
+                        self._rows[position] = None
+                        del self._positions[ccn_pump]
+                    continue
+                row = tuple(change["row"][i] for i in _SNAPSHOT_POSITIONS)
+                if position is None:
+                    position = self._append(row)
+                else:
+                    self._set(position, row)
+                updated_at = stamp_value(change["updated_at"])
+                if updated_at is not None and (
+                    self._max_updated_at is None or updated_at > self._max_updated_at
+                ):
+                    self._max_updated_at = updated_at
+            self._count = len(self._positions)
+
+    def _is_stale(self) -> bool:
+        interval = current_app.config.get("PUMP_SNAPSHOT_REVALIDATE_SECONDS", 5.0)
+        now = time.monotonic()
+        if now - self._checked_at < interval:
+            return False
+
+        self._checked_at = now
+        return read_stamp() != (self._count, self._max_updated_at)
+
+    def _load(self) -> None:
+        count, max_updated_at = read_stamp()
+        limit = current_app.config.get("PUMP_SEARCH_MAX_INDEXED_PUMPS", 250000)
+        self._fields = {name: _FieldIndex(name) for name in SEARCH_FIELDS}
+        self._oversized = count > limit
+        rows = []
+        if not self._oversized:
+            rows = [
+                tuple(row)
+                for row in db.session.execute(
+                    select(*[getattr(Pump, col) for col in RESULT_COLUMNS])
+                )
+            ]
+
+        # Encode column by column; the sorted prefix lists are sorted once
+        self._rows = rows
+        self._positions = {row[0]: position for position, row in enumerate(rows)}
+        self._codes = {}
+        for name, field in self._fields.items():
+            column = RESULT_COLUMNS.index(name)
+            self._codes[name] = np.fromiter(
+                (field.code(row[column], keep_sorted=False) for row in rows),
+                dtype=np.int64,
+                count=len(rows),
+            )
+            field.sort()
+        self._alive = np.ones(len(rows), dtype=bool)
+
+        self._count = count
+        self._max_updated_at = max_updated_at
+        self._checked_at = time.monotonic()
+        self._built = True
+
+    def _append(self, row: Tuple) -> int:
+        position = len(self._rows)
+        if position >= len(self._alive):
+            # Grow by doubling so inserts are amortized O(1)
+            capacity = max(16, position * 2)
+            for name, codes in self._codes.items():
+                grown = np.zeros(capacity, dtype=codes.dtype)
+                grown[:position] = codes[:position]
+                self._codes[name] = grown
+            alive = np.zeros(capacity, dtype=bool)
+            alive[:position] = self._alive[:position]
+            self._alive = alive
+        self._rows.append(None)
+        self._positions[row[0]] = position
+        self._set(position, row)
+        return position
+
+    def _set(self, position: int, row: Tuple) -> None:
+        self._rows[position] = row
+        self._alive[position] = True
+        for name, field in self._fields.items():
+            value = row[RESULT_COLUMNS.index(name)]
+            self._codes[name][position] = field.code(value)
+
+
+_indexes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def get_pump_search_index() -> PumpSearchIndex:
+    """Get the pump search index for the current app's database engine"""
+    engine = db.engine
+    with _indexes_lock:
+        index = _indexes.get(engine)
+        if index is None:
+            index = PumpSearchIndex()
+            _indexes[engine] = index
+        return index
+
+
+class PumpSearchService:
+    """Ranked pump search on the in-memory index or the database"""
+
+    @staticmethod
+    def search(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> Dict[str, Any]:
+        """
+        Search pumps by serial number, model, location or id
+
+        Every whitespace-separated token must match one of the fields
+        (substring, or prefix for short tokens and ids). Exact and prefix
+        matches rank above matches inside a word, and serial numbers / ids
+        weigh more than models and locations.
+
+        Returns:
+            query, backend ("memory" or "database"), total matches, took_ms
+            and ``results`` with the pump columns, score and per-field
+            ``highlights`` (HTML with ``<mark>``)
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            raise ValueError("q is required")
+        if not 1 <= limit <= MAX_SEARCH_LIMIT:
+            raise ValueError(f"limit must be between 1 and {MAX_SEARCH_LIMIT}")
+
+        started = time.perf_counter()
+        backend = "memory"
+        if current_app.config.get("PUMP_SEARCH_BACKEND", "memory") == "database":
+            backend = "database"
+        else:
+            index = get_pump_search_index()
+            if not index.available():
+                backend = "database"
+
+        if backend == "memory":
+            found = index.search(tokens, limit)
+        else:
+            found = PumpSearchService.search_database(tokens, limit)
+
+        return {
+            "query": query,
+            "backend": backend,
+            "total": found["total"],
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+            "results": found["results"],
+        }
+
+    @staticmethod
+    def search_database(tokens: Sequence[str], limit: int) -> Dict[str, Any]:
+        """Same search answered by the database (FULLTEXT on MySQL)"""
+        columns = [getattr(Pump, col) for col in RESULT_COLUMNS]
+        if db.engine.dialect.name == "mysql":
+            return PumpSearchService._search_fulltext(columns, tokens, limit)
+
+        clauses = []
+        for token in tokens:
+            escaped = re.sub(r"([\\%_])", r"\\\1", token)
+            if len(token) >= 3:
+                patterns = [f"%{escaped}%"]
+            else:
+                # Short tokens match at the start of the value or of a word
+                patterns = [f"{escaped}%"]
+                patterns += [f"%{sep}{escaped}%" for sep in LIKE_WORD_SEPARATORS]
+            matches = [
+                func.lower(getattr(Pump, field)).like(pattern, escape="\\")
+                for field in TRIGRAM_FIELDS
+                for pattern in patterns
+            ]
+            if len(token) >= MIN_ID_PREFIX:
+                matches.append(
+                    func.lower(Pump.ccn_pump).like(f"{escaped}%", escape="\\")
+                )
+            clauses.append(or_(*matches))
+        where = and_(*clauses)
+        total = db.session.execute(
+            select(func.count()).select_from(Pump).where(where)
+        ).scalar()
+        rows = db.session.execute(
+            select(*columns).where(where).limit(max(LIKE_CANDIDATES, limit))
+        ).all()
+        scored = [(score_row(row, tokens), tuple(row)) for row in rows]
+        scored.sort(key=lambda item: (-item[0], item[1][1] or ""))
+        return {
+            "total": int(total or 0),
+            "results": [_result(row, score, tokens) for score, row in scored[:limit]],
+        }
+
+    @staticmethod
+    def _search_fulltext(columns, tokens: Sequence[str], limit: int) -> Dict[str, Any]:
+        # InnoDB splits values on punctuation, so "SN-00" becomes +sn* +00*
+        clauses = []
+        for token in tokens:
+            words = _WORD_RE.findall(token)
+            boolean = " ".join(f"+{word}*" for word in words)
+            matches = []
+            if boolean:
+                matches.append(
+                    text(
+                        "MATCH (model, serial_number, location) "
+                        f"AGAINST (:q{len(clauses)} IN BOOLEAN MODE)"
+                    ).bindparams(**{f"q{len(clauses)}": boolean})
+                )
+            if len(token) >= MIN_ID_PREFIX and re.fullmatch(r"[0-9a-f]+", token):
+                matches.append(Pump.ccn_pump.like(f"{token}%"))
+            if not matches:
+                return {"total": 0, "results": []}
+            clauses.append(or_(*matches))
+        where = and_(*clauses)
+        relevance = text(
+            "MATCH (model, serial_number, location) AGAINST (:all IN NATURAL LANGUAGE MODE)"
+        ).bindparams(all=" ".join(tokens))
+
+        total = db.session.execute(
+            select(func.count()).select_from(Pump).where(where)
+        ).scalar()
+        # Relevance picks the candidates; score_row ranks them like the index
+        rows = db.session.execute(
+            select(*columns)
+            .where(where)
+            .order_by(relevance.desc())
+            .limit(max(LIKE_CANDIDATES, limit))
+        ).all()
+        scored = [(score_row(row, tokens), tuple(row)) for row in rows]
+        scored.sort(key=lambda item: (-item[0], item[1][1] or ""))
+        return {
+            "total": int(total or 0),
+            "results": [_result(row, score, tokens) for score, row in scored[:limit]],
+        }
+
+
+# ---------------------------------------------------------------------------
+# Committed pump changes, published by the pump snapshot service
+# ---------------------------------------------------------------------------
+
+
+@subscribe_pump_changes
+def _apply_to_search_index(engine, changes):
+    index = _indexes.get(engine)
+    if index is not None:
+        index.apply(changes)
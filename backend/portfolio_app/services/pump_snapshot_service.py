@@ -0,0 +1,510 @@
+"""
+Pump Snapshot Service
+Process-wide columnar snapshot of tbl_pumps used by the analysis endpoints.
+
+The snapshot is loaded once per database engine and kept fresh by SQLAlchemy
+events on ``Pump``: rows written by this process are patched into the frame when
+the session commits, and writes made by other workers are detected through a
+cheap ``COUNT(*)/MAX(updated_at)`` stamp that is checked at most every
+``PUMP_SNAPSHOT_REVALIDATE_SECONDS``.
+
+The same events feed ``FleetVersion``, a version stamp of the whole fleet used
+for ETag / Last-Modified validators on the pump and analysis endpoints. Pump
+payloads embed owner names, so the version also follows ``tbl_users``: its
+``MAX(updated_at)`` is part of the stamp and local user writes count as fleet
+writes. Other
+in-memory views of tbl_pumps (the search index) receive the committed changes
+through ``subscribe_pump_changes`` instead of listening to ``Pump`` themselves.
+"""
+
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from flask import current_app
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session, object_session
+
+from ..extensions import db
+from ..models.tbl_pumps import Pump
+from ..models.tbl_users import User
+
+SNAPSHOT_COLUMNS = [
+    "ccn_pump",
+    "model",
+    "serial_number",
+    "location",
+    "purchase_date",
+    "status",
+    "flow_rate",
+    "pressure",
+    "power",
+    "efficiency",
+    "voltage",
+    "current",
+    "power_factor",
+    "last_maintenance",
+    "next_maintenance",
+    "user_id",
+]
+CATEGORICAL_COLUMNS = ["model", "location", "status"]
+NUMERIC_COLUMNS = [
+    "flow_rate",
+    "pressure",
+    "power",
+    "efficiency",
+    "voltage",
+    "current",
+    "power_factor",
+]
+DATETIME_COLUMNS = ["purchase_date", "last_maintenance", "next_maintenance"]
+
+_PENDING_KEY = "pump_snapshot_pending"
+_USERS_CHANGED_KEY = "pump_owners_changed"
+# Callbacks run with (engine, changes) after each commit that wrote pumps
+_change_subscribers: List[Callable[[Any, "OrderedDict"], None]] = []
+
+
+def as_float(value: Any) -> Optional[float]:
+    """
+    A value read from a float32 snapshot column as a Python float, without
+    float32 noise (0.85, not 0.8500000238)
+
+    Only for stored values: statistics computed from them go through
+    ``stat_float``, since rounding through float32 truncates float64 results.
+    """
+    if value is None or pd.isna(value):
+        return None
+    return float(str(np.float32(value)))
+
+
+def stat_float(value: Any) -> Optional[float]:
+    """A computed statistic as a Python float, at full precision"""
+    if value is None or pd.isna(value):
+        return None
+    return float(value)
+
+
+def stamp_value(max_updated_at: Any) -> Any:
+    """An ``updated_at`` as compared in freshness stamps (whole seconds)"""
+    # MySQL DATETIME drops microseconds, so compare at second resolution
+    if max_updated_at is None:
+        return None
+    return pd.Timestamp(max_updated_at).floor("s")
+
+
+def _build_frame(rows: List[Tuple]) -> pd.DataFrame:
+    """Build a compact, ccn_pump-indexed frame from rows in SNAPSHOT_COLUMNS order"""
+    frame = pd.DataFrame.from_records(rows, columns=SNAPSHOT_COLUMNS)
+    for col in CATEGORICAL_COLUMNS:
+        frame[col] = frame[col].astype("category")
+    for col in NUMERIC_COLUMNS:
+        frame[col] = pd.to_numeric(frame[col], errors="coerce").astype(np.float32)
+    for col in DATETIME_COLUMNS:
+        frame[col] = pd.to_datetime(frame[col], errors="coerce")
+    frame["user_id"] = pd.to_numeric(frame["user_id"], errors="coerce").astype("Int32")
+    frame.index = pd.Index(frame["ccn_pump"].tolist(), dtype=object)
+    return frame
+
+
+def _row_from_pump(pump: Pump) -> Tuple:
+    return tuple(getattr(pump, col) for col in SNAPSHOT_COLUMNS)
+
+
+def read_stamp() -> Tuple[int, Any]:
+    """``(COUNT(*), MAX(updated_at))`` of tbl_pumps, the cheap freshness stamp"""
+    count, max_updated_at = db.session.query(
+        func.count(Pump.ccn_pump), func.max(Pump.updated_at)
+    ).one()
+    return int(count or 0), stamp_value(max_updated_at)
+
+
+def _read_fleet_stamp() -> Tuple[int, Any, Any]:
+    # Owner names are part of the pump payloads: follow tbl_users too
+    owners = select(func.max(User.updated_at)).scalar_subquery()
+    count, max_updated_at, owners_updated_at = db.session.execute(
+        select(func.count(Pump.ccn_pump), func.max(Pump.updated_at), owners)
+    ).one()
+    return (
+        int(count or 0),
+        stamp_value(max_updated_at),
+        stamp_value(owners_updated_at),
+    )
+
+
+class PumpSnapshot:
+    """Columnar, in-memory copy of the pump fleet for a single database engine"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._frame: Optional[pd.DataFrame] = None
+        self._count = 0
+        self._max_updated_at = None
+        self._checked_at = 0.0
+        self.version = 0
+
+    def dataframe(self) -> pd.DataFrame:
+        """
+        Return the current fleet as a DataFrame
+
+        The returned frame is a shallow copy: callers may add columns freely but
+        must not modify existing values in place.
+        """
+        with self._lock:
+            if self._frame is None or self._is_stale():
+                self._load()
+            return self._frame.copy(deep=False)
+
+    def invalidate(self) -> None:
+        """Drop the snapshot so the next read reloads it (e.g. after bulk SQL)"""
+        with self._lock:
+            self._frame = None
+            self.version += 1
+        get_fleet_version().record_write()
+
+    def _is_stale(self) -> bool:
+        interval = current_app.config.get("PUMP_SNAPSHOT_REVALIDATE_SECONDS", 5.0)
+        now = time.monotonic()
+        if now - self._checked_at < interval:
+            return False
+
+        self._checked_at = now
+        return read_stamp() != (self._count, self._max_updated_at)
+
+    def _load(self) -> None:
+        # Read the stamp first so a write racing the load triggers a reload
+        count, max_updated_at = read_stamp()
+        rows = db.session.query(*[getattr(Pump, col) for col in SNAPSHOT_COLUMNS]).all()
+
+        self._frame = _build_frame([tuple(row) for row in rows])
+        self._count = count
+        self._max_updated_at = max_updated_at
+        self._checked_at = time.monotonic()
+        self.version += 1
+
+    def apply_values(self, updates: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Patch metric values written with Core UPDATEs, which bypass the Pump
+        mapper events, into the snapshot and note the write
+
+        Args:
+            updates: ccn_pump -> {"values": metric -> value, "updated_at": ...}
+                for pumps whose other columns are unchanged
+        """
+        with self._lock:
+            if self._frame is not None:
+                if all(key in self._frame.index for key in updates):
+                    self._patch_values(updates)
+                else:
+                    # Pumps this process has not loaded yet: reload on next read
+                    self._frame = None
+                self.version += 1
+        get_fleet_version().record_write()
+
+    def _patch_values(self, updates: Dict[str, Dict[str, Any]]) -> None:
+        columns: Dict[str, Tuple[List[str], List[Any]]] = {}
+        for key, change in updates.items():
+            for col, value in change["values"].items():
+                keys, values = columns.setdefault(col, ([], []))
+                keys.append(key)
+                values.append(value)
+            stamp = stamp_value(change["updated_at"])
+            if stamp is not None and (
+                self._max_updated_at is None or stamp > self._max_updated_at
+            ):
+                self._max_updated_at = stamp
+
+        # Readers hold shallow copies, so never modify the published frame
+        frame = self._frame.copy()
+        for col, (keys, values) in columns.items():
+            frame.loc[keys, col] = np.asarray(values, dtype=np.float32)
+        self._frame = frame
+
+    def apply(self, changes: "OrderedDict[str, Optional[Dict[str, Any]]]") -> None:
+        """
+        Patch committed changes into the snapshot
+
+        Args:
+            changes: ccn_pump -> row tuple and updated_at for upserts, or None
+                for deletes, in commit order
+        """
+        with self._lock:
+            if self._frame is None:
+                return
+
+            # Readers hold shallow copies, so never modify the published frame
+            frame = self._frame.copy(deep=False)
+            deleted = [key for key, change in changes.items() if change is None]
+            upserts = {key: change for key, change in changes.items() if change}
+            updated = [key for key in upserts if key in frame.index]
+            inserted = [key for key in upserts if key not in frame.index]
+
+            if deleted:
+                frame = frame.drop(index=[k for k in deleted if k in frame.index])
+
+            if updated:
+                frame = frame.copy()
+                self._ensure_categories(frame, [upserts[k]["row"] for k in updated])
+                update_frame = _build_frame([upserts[k]["row"] for k in updated])
+                for col in SNAPSHOT_COLUMNS[1:]:
+                    values = update_frame[col]
+                    if col in CATEGORICAL_COLUMNS:
+                        values = values.astype(object)
+                    frame.loc[updated, col] = values.to_numpy()
+
+            if inserted:
+                new_rows = _build_frame([upserts[k]["row"] for k in inserted])
+                self._ensure_categories(frame, [upserts[k]["row"] for k in inserted])
+                for col in CATEGORICAL_COLUMNS:
+                    new_rows[col] = new_rows[col].cat.set_categories(
+                        frame[col].cat.categories
+                    )
+                frame = pd.concat([frame, new_rows]) if len(frame) else new_rows
+
+            for change in upserts.values():
+                stamp = stamp_value(change["updated_at"])
+                if stamp is not None and (
+                    self._max_updated_at is None or stamp > self._max_updated_at
+                ):
+                    self._max_updated_at = stamp
+
+            if deleted or updated:
+                for col in CATEGORICAL_COLUMNS:
+                    frame[col] = frame[col].cat.remove_unused_categories()
+
+            self._frame = frame
+            self._count = len(frame)
+            self.version += 1
+
+    @staticmethod
+    def _ensure_categories(frame: pd.DataFrame, rows: List[Tuple]) -> None:
+        for col in CATEGORICAL_COLUMNS:
+            position = SNAPSHOT_COLUMNS.index(col)
+            current = frame[col].cat.categories
+            missing = sorted(
+                {row[position] for row in rows if row[position] is not None}
+                - set(current)
+            )
+            if missing:
+                frame[col] = frame[col].cat.add_categories(missing)
+
+
+class FleetVersion:
+    """
+    Version stamp of the pump fleet for conditional GETs
+
+    The stamp is ``(COUNT(*), MAX(updated_at))`` of tbl_pumps and
+    ``MAX(updated_at)`` of tbl_users (owner names are in the pump payloads),
+    plus a counter of pump and user writes committed by this process since the
+    stamp last changed. Within
+    ``PUMP_SNAPSHOT_REVALIDATE_SECONDS`` it is answered from memory; a local
+    write forces a re-read on the next call. Because the counter resets whenever
+    the database stamp moves, workers that have seen the same data agree on the
+    same token.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stamp: Optional[Tuple[int, Any, Any]] = None
+        self._writes = 0
+        self._changed_at: Optional[datetime] = None
+        self._checked_at = 0.0
+
+    def record_write(self) -> None:
+        """Note a committed pump or owner write (or bulk change) made here"""
+        with self._lock:
+            self._writes += 1
+            self._changed_at = datetime.now()
+            self._checked_at = 0.0
+
+    def current(self) -> Tuple[str, Optional[datetime]]:
+        """
+        Get the fleet version
+
+        Returns:
+            (token, last_modified) where token is an opaque string that changes
+            whenever pump data changes and last_modified is an aware UTC
+            datetime, or None for an empty fleet
+        """
+        with self._lock:
+            interval = current_app.config.get("PUMP_SNAPSHOT_REVALIDATE_SECONDS", 5.0)
+            now = time.monotonic()
+            if self._stamp is None or now - self._checked_at >= interval:
+                stamp = _read_fleet_stamp()
+                if stamp != self._stamp:
+                    if self._stamp is not None:
+                        self._changed_at = datetime.now()
+                    self._stamp = stamp
+                    self._writes = 0
+                self._checked_at = now
+
+            count, max_updated_at, owners_updated_at = self._stamp
+            updated = max_updated_at.to_pydatetime() if max_updated_at else None
+            owners = owners_updated_at.to_pydatetime() if owners_updated_at else None
+            token = "{}-{}-{}-{}".format(
+                count,
+                updated.strftime("%Y%m%d%H%M%S") if updated else 0,
+                owners.strftime("%Y%m%d%H%M%S") if owners else 0,
+                self._writes,
+            )
+
+            candidates = [
+                dt for dt in (updated, owners, self._changed_at) if dt is not None
+            ]
+            last_modified = (
+                max(candidates).astimezone(timezone.utc).replace(microsecond=0)
+                if candidates
+                else None
+            )
+            return token, last_modified
+
+
+_snapshots: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_versions: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_snapshots_lock = threading.Lock()
+
+
+def get_pump_snapshot() -> PumpSnapshot:
+    """Get the pump snapshot for the current app's database engine"""
+    engine = db.engine
+    with _snapshots_lock:
+        snapshot = _snapshots.get(engine)
+        if snapshot is None:
+            snapshot = PumpSnapshot()
+            _snapshots[engine] = snapshot
+        return snapshot
+
+
+def get_fleet_version() -> FleetVersion:
+    """Get the fleet version stamp for the current app's database engine"""
+    engine = db.engine
+    with _snapshots_lock:
+        version = _versions.get(engine)
+        if version is None:
+            version = FleetVersion()
+            _versions[engine] = version
+        return version
+
+
+def get_pumps_dataframe() -> pd.DataFrame:
+    """Shortcut for ``get_pump_snapshot().dataframe()``"""
+    return get_pump_snapshot().dataframe()
+
+
+# ---------------------------------------------------------------------------
+# Model events: queue row changes during flush, publish them on commit
+# ---------------------------------------------------------------------------
+
+
+def subscribe_pump_changes(
+    callback: Callable[[Any, "OrderedDict[str, Optional[Dict[str, Any]]]"], None],
+) -> Callable:
+    """
+    Register a callback for the pump changes of each committed transaction
+
+    Args:
+        callback: Called with the session's engine and an ordered mapping of
+            ccn_pump -> row tuple (SNAPSHOT_COLUMNS) and updated_at for
+            upserts, or None for deletes, in commit order
+
+    Returns:
+        The callback, so this can be used as a decorator
+    """
+    _change_subscribers.append(callback)
+    return callback
+
+
+def _queue_change(target: Pump, deleted: bool) -> None:
+    session = object_session(target)
+    if session is None:
+        return
+    pending = session.info.setdefault(_PENDING_KEY, OrderedDict())
+    pending.pop(target.ccn_pump, None)
+    pending[target.ccn_pump] = (
+        None
+        if deleted
+        else {"row": _row_from_pump(target), "updated_at": target.updated_at}
+    )
+
+
+@event.listens_for(Pump, "after_insert")
+def _pump_after_insert(mapper, connection, target):
+    _queue_change(target, deleted=False)
+
+
+@event.listens_for(Pump, "after_update")
+def _pump_after_update(mapper, connection, target):
+    _queue_change(target, deleted=False)
+
+
+@event.listens_for(Pump, "after_delete")
+def _pump_after_delete(mapper, connection, target):
+    _queue_change(target, deleted=True)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_pump_changes(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    try:
+        engine = session.get_bind(mapper=Pump.__mapper__)
+    except Exception:
+        return
+    for callback in _change_subscribers:
+        callback(engine, pending)
+
+
+@subscribe_pump_changes
+def _apply_to_snapshot(engine, changes):
+    snapshot = _snapshots.get(engine)
+    if snapshot is not None:
+        snapshot.apply(changes)
+    version = _versions.get(engine)
+    if version is not None:
+        version.record_write()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_pump_changes(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_USERS_CHANGED_KEY, None)
+
+
+def _mark_owners_changed(target: User) -> None:
+    session = object_session(target)
+    if session is not None:
+        session.info[_USERS_CHANGED_KEY] = True
+
+
+@event.listens_for(User, "after_insert")
+def _user_after_insert(mapper, connection, target):
+    _mark_owners_changed(target)
+
+
+@event.listens_for(User, "after_update")
+def _user_after_update(mapper, connection, target):
+    _mark_owners_changed(target)
+
+
+@event.listens_for(User, "after_delete")
+def _user_after_delete(mapper, connection, target):
+    _mark_owners_changed(target)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_owner_changes(session):
+    if not session.info.pop(_USERS_CHANGED_KEY, False):
+        return
+    try:
+        engine = session.get_bind(mapper=User.__mapper__)
+    except Exception:
+        return
+    version = _versions.get(engine)
+    if version is not None:
+        version.record_write()
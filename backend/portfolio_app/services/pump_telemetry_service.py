@@ -0,0 +1,699 @@
+"""
+Pump Telemetry Service
+High-rate ingestion of pump readings and time-bucketed rollups.
+
+Readings are appended to ``tbl_pump_readings`` in executemany batches, and
+the latest value of each metric is written back to ``tbl_pumps`` with one
+UPDATE per batch of pumps instead of one per reading.
+
+A background thread folds new readings into 1-minute, 1-hour and 1-day
+aggregates (count/sum/min/max per metric) in ``tbl_pump_reading_rollups``.
+Progress is tracked by a watermark on the reading ID that is advanced with a
+compare-and-swap UPDATE, so only one worker folds a given range of readings.
+Readings are only folded once they are older than
+``TELEMETRY_ROLLUP_SETTLE_SECONDS``, which lets concurrent ingest
+transactions with lower IDs commit first.
+
+Series queries read the coarsest rollup whose bucket fits the requested step
+and complete it with the readings not folded yet.
+"""
+
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from flask import current_app
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.exc import IntegrityError
+
+from ..extensions import db
+from ..models.tbl_pump_reading_rollups import PumpReadingRollup
+from ..models.tbl_pump_readings import PumpReading
+from ..models.tbl_pumps import Pump
+from ..models.tbl_rollup_watermarks import RollupWatermark
+from .pump_import_service import (
+    FLOAT_FIELDS,
+    IMPORT_BATCH_SIZE,
+    MAX_REPORTED_ERRORS,
+    convert_pump_field,
+    parse_date_field,
+)
+
+TELEMETRY_METRICS = list(FLOAT_FIELDS)
+# Rollup resolutions from finest to coarsest, in seconds per bucket
+ROLLUP_RESOLUTIONS: Dict[str, int] = {"1m": 60, "1h": 3600, "1d": 86400}
+RAW_RESOLUTION = "raw"
+ROLLUP_BATCH_SIZE = 20000
+DEFAULT_MAX_POINTS = 500
+MAX_RAW_POINTS = 10000
+WATERMARK_NAME = "tbl_pump_readings"
+ID_CHUNK_SIZE = 1000
+EPOCH_RE = re.compile(r"^[+-]?(\d+\.?\d*|\.\d+)$")
+
+_rollup_executor: Optional[ThreadPoolExecutor] = None
+_rollup_lock = threading.Lock()
+_rollup_pending = False
+
+
+def get_rollup_executor() -> ThreadPoolExecutor:
+    """Get the single background thread that folds readings into rollups"""
+    global _rollup_executor
+    with _rollup_lock:
+        if _rollup_executor is None:
+            _rollup_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="pump-telemetry-rollup"
+            )
+        return _rollup_executor
+
+
+def parse_reading_time(value: Any) -> datetime:
+    """
+    Parse ``recorded_at``: epoch seconds (a number or numeric string, as in
+    the ``from`` / ``to`` query arguments) or an ISO / YYYY-MM-DD string
+
+    Aware times are converted to naive local time like the rest of tbl_pumps.
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid recorded_at: {value!r}")
+    if isinstance(value, str) and EPOCH_RE.match(value.strip()):
+        value = float(value)
+    if isinstance(value, (int, float)):
+        try:
+            return datetime.fromtimestamp(value)
+        except (OverflowError, OSError, ValueError):
+            raise ValueError(f"Invalid recorded_at: {value!r}")
+    parsed = parse_date_field(str(value).strip())
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def parse_duration(value: Optional[str], name: str = "duration") -> Optional[int]:
+    """
+    Parse a duration such as ``90``, ``30s``, ``5m``, ``1h``, ``7d`` or ``2w``
+    into seconds (a bare number is seconds)
+    """
+    if not value:
+        return None
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+    text = value.strip().lower()
+    multiplier = units.get(text[-1:])
+    number = text[:-1] if multiplier else text
+    try:
+        seconds = int(float(number) * (multiplier or 1))
+    except (OverflowError, ValueError):
+        # inf and 1e400 overflow int()
+        raise ValueError(f"Invalid {name}: {value!r}")
+    if seconds <= 0:
+        raise ValueError(f"{name} must be positive")
+    return seconds
+
+
+def choose_resolution(step_seconds: int) -> str:
+    """Coarsest rollup whose buckets are not wider than ``step_seconds``"""
+    chosen = RAW_RESOLUTION
+    for resolution, seconds in ROLLUP_RESOLUTIONS.items():
+        if seconds <= step_seconds:
+            chosen = resolution
+    return chosen
+
+
+def _chunks(items: List[Any], size: int = ID_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _aggregate(frame: pd.DataFrame, seconds: int) -> pd.DataFrame:
+    """
+    Fold long-format readings (ccn_pump, recorded_at, metric, value) into
+    buckets of ``seconds``
+    """
+    bucketed = frame.assign(
+        bucket_start=frame["recorded_at"].dt.floor(pd.Timedelta(seconds=seconds))
+    )
+    return (
+        bucketed.groupby(["ccn_pump", "bucket_start", "metric"], observed=True)["value"]
+        .agg(sample_count="count", value_sum="sum", value_min="min", value_max="max")
+        .reset_index()
+    )
+
+
+def _long_frame(rows: List[Tuple], metrics: List[str]) -> pd.DataFrame:
+    """Melt reading rows (ccn_pump, recorded_at, *metrics) into one row per value"""
+    frame = pd.DataFrame.from_records(
+        rows, columns=["ccn_pump", "recorded_at", *metrics]
+    )
+    frame["recorded_at"] = pd.to_datetime(frame["recorded_at"])
+    frame[metrics] = frame[metrics].astype("float64")
+    return frame.melt(
+        id_vars=["ccn_pump", "recorded_at"], var_name="metric", value_name="value"
+    ).dropna(subset=["value"])
+
+
+class PumpTelemetryService:
+    """Ingestion, rollup and querying of pump telemetry"""
+
+    @staticmethod
+    def validate(record: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Convert a raw reading into tbl_pump_readings column values
+
+        Raises:
+            ValueError: With a message describing the first invalid field
+        """
+        ccn_pump = record.get("ccn_pump")
+        if not ccn_pump:
+            raise ValueError("Missing required field: ccn_pump")
+        if record.get("recorded_at") in (None, ""):
+            raise ValueError("Missing required field: recorded_at")
+
+        values = {
+            "ccn_pump": str(ccn_pump),
+            "recorded_at": parse_reading_time(record["recorded_at"]),
+        }
+        for metric in TELEMETRY_METRICS:
+            if record.get(metric) is not None:
+                values[metric] = convert_pump_field(metric, record[metric])
+        if len(values) == 2:
+            raise ValueError(
+                f"Reading has no metrics (expected any of: {', '.join(TELEMETRY_METRICS)})"
+            )
+        return values
+
+    @staticmethod
+    def ingest(
+        records: Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]],
+        batch_size: int = IMPORT_BATCH_SIZE,
+        last_values: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Validate and append readings in batches, then write the latest value
+        of each metric back to the pumps, without committing
+
+        Args:
+            records: ``(row_number, record, error)`` as yielded by
+                ``PumpImportService.iter_records`` for NDJSON
+            batch_size: Readings per executemany INSERT
+            last_values: Filled with ccn_pump -> {"values": metric -> value,
+                "updated_at": ...} for every pump written back, in the form
+                ``PumpSnapshot.apply_values`` takes
+
+        Returns:
+            Report with received/accepted/failed counts, the first
+            MAX_REPORTED_ERRORS row errors and the number of updated pumps
+        """
+        report: Dict[str, Any] = {
+            "received": 0,
+            "accepted": 0,
+            "failed": 0,
+            "errors": [],
+            "errors_truncated": False,
+            "pumps_updated": 0,
+        }
+
+        def fail(number: int, message: str) -> None:
+            report["failed"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                report["errors"].append({"row": number, "error": message})
+            else:
+                report["errors_truncated"] = True
+
+        # ccn_pump -> metric -> (recorded_at, value) of the newest accepted reading
+        latest: Dict[str, Dict[str, Tuple[datetime, float]]] = {}
+        # ccn_pump -> newest recorded_at stored before this request
+        stored_latest: Dict[str, Optional[datetime]] = {}
+
+        batch: List[Tuple[int, Dict[str, Any]]] = []
+        for number, record, error in records:
+            report["received"] += 1
+            if error is None:
+                try:
+                    batch.append((number, PumpTelemetryService.validate(record)))
+                except ValueError as e:
+                    error = str(e)
+            if error is not None:
+                fail(number, error)
+
+            if len(batch) >= batch_size:
+                PumpTelemetryService._insert_batch(
+                    batch, fail, report, latest, stored_latest
+                )
+                batch = []
+
+        if batch:
+            PumpTelemetryService._insert_batch(
+                batch, fail, report, latest, stored_latest
+            )
+
+        written = {} if last_values is None else last_values
+        report["pumps_updated"] = PumpTelemetryService._update_last_values(
+            latest, stored_latest, written
+        )
+        report["errors"].sort(key=lambda item: item["row"])
+        return report
+
+    @staticmethod
+    def _insert_batch(batch, fail, report, latest, stored_latest) -> None:
+        # Unknown pumps are rejected up front so one bad row cannot abort the batch
+        new_ids = list(
+            {values["ccn_pump"] for _, values in batch} - stored_latest.keys()
+        )
+        if new_ids:
+            known = set(
+                db.session.execute(
+                    select(Pump.ccn_pump).where(Pump.ccn_pump.in_(new_ids))
+                ).scalars()
+            )
+            newest = dict(
+                db.session.execute(
+                    select(PumpReading.ccn_pump, func.max(PumpReading.recorded_at))
+                    .where(PumpReading.ccn_pump.in_(known))
+                    .group_by(PumpReading.ccn_pump)
+                ).all()
+            )
+            for ccn_pump in known:
+                stored_latest[ccn_pump] = newest.get(ccn_pump)
+
+        now = datetime.now()
+        rows = []
+        for number, values in batch:
+            ccn_pump = values["ccn_pump"]
+            if ccn_pump not in stored_latest:
+                fail(number, f"Unknown ccn_pump: {ccn_pump}")
+                continue
+            recorded_at = values["recorded_at"]
+            metrics = latest.setdefault(ccn_pump, {})
+            for metric in TELEMETRY_METRICS:
+                if metric in values and (
+                    metric not in metrics or metrics[metric][0] <= recorded_at
+                ):
+                    metrics[metric] = (recorded_at, values[metric])
+            # executemany needs the same keys in every parameter set
+            row = {metric: values.get(metric) for metric in TELEMETRY_METRICS}
+            row.update(ccn_pump=ccn_pump, recorded_at=recorded_at, created_at=now)
+            rows.append(row)
+
+        if rows:
+            db.session.execute(PumpReading.__table__.insert(), rows)
+            report["accepted"] += len(rows)
+
+    @staticmethod
+    def _update_last_values(latest, stored_latest, written) -> int:
+        """
+        Copy the newest metric values into tbl_pumps, one executemany UPDATE
+        per set of metrics; pumps whose stored readings are newer than
+        everything received (late backfills) are left alone
+        """
+        now = datetime.now()
+        groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        for ccn_pump, metrics in latest.items():
+            newest = max(recorded_at for recorded_at, _ in metrics.values())
+            stored = stored_latest.get(ccn_pump)
+            if stored is not None and stored > newest:
+                continue
+            names = tuple(sorted(metrics))
+            params = {f"new_{name}": metrics[name][1] for name in names}
+            params["pump_id"] = ccn_pump
+            groups.setdefault(names, []).append(params)
+            written[ccn_pump] = {
+                "values": {name: metrics[name][1] for name in names},
+                "updated_at": now,
+            }
+
+        table = Pump.__table__
+        updated = 0
+        for names, params in groups.items():
+            statement = (
+                update(table)
+                .where(table.c.ccn_pump == bindparam("pump_id"))
+                .values(
+                    updated_at=now,
+                    **{name: bindparam(f"new_{name}") for name in names},
+                )
+            )
+            db.session.execute(statement, params)
+            updated += len(params)
+        return updated
+
+    # ------------------------------------------------------------------
+    # Rollups
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def schedule_rollup() -> Optional[Future]:
+        """
+        Fold new readings into the rollups in the background
+
+        Calls made while a run is already queued are coalesced into it.
+        """
+        global _rollup_pending
+        with _rollup_lock:
+            if _rollup_pending:
+                return None
+            _rollup_pending = True
+        app = current_app._get_current_object()
+        return get_rollup_executor().submit(_run_rollups, app)
+
+    @staticmethod
+    def rollup(
+        settle_seconds: Optional[float] = None, batch_size: int = ROLLUP_BATCH_SIZE
+    ) -> int:
+        """
+        Fold settled readings past the watermark into every resolution
+
+        Each batch is committed together with the watermark move. If another
+        worker moved the watermark first, the batch is rolled back and this
+        call stops.
+
+        Returns:
+            Number of readings folded
+        """
+        if settle_seconds is None:
+            settle_seconds = current_app.config.get(
+                "TELEMETRY_ROLLUP_SETTLE_SECONDS", 30.0
+            )
+        metrics = TELEMETRY_METRICS
+        readings = PumpReading.__table__
+        folded = 0
+        while True:
+            watermark = PumpTelemetryService._read_watermark()
+            cutoff = datetime.now() - timedelta(seconds=settle_seconds)
+            rows = db.session.execute(
+                select(
+                    readings.c.ccn_pump_reading,
+                    readings.c.ccn_pump,
+                    readings.c.recorded_at,
+                    *[readings.c[m] for m in metrics],
+                )
+                .where(
+                    readings.c.ccn_pump_reading > watermark,
+                    readings.c.created_at <= cutoff,
+                )
+                .order_by(readings.c.ccn_pump_reading)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                db.session.rollback()
+                return folded
+
+            last_id = rows[-1][0]
+            # Claim the range first; the row lock serializes competing workers
+            claimed = db.session.execute(
+                update(RollupWatermark.__table__)
+                .where(
+                    RollupWatermark.name == WATERMARK_NAME,
+                    RollupWatermark.last_id == watermark,
+                )
+                .values(last_id=last_id, updated_at=datetime.now())
+            ).rowcount
+            if not claimed:
+                db.session.rollback()
+                return folded
+
+            frame = _long_frame([row[1:] for row in rows], metrics)
+            for resolution, seconds in ROLLUP_RESOLUTIONS.items():
+                PumpTelemetryService._merge_rollups(
+                    resolution, _aggregate(frame, seconds)
+                )
+            db.session.commit()
+            folded += len(rows)
+            if len(rows) < batch_size:
+                return folded
+
+    @staticmethod
+    def pending_readings() -> int:
+        """Number of readings past the rollup watermark"""
+        watermark = PumpTelemetryService._read_watermark()
+        count = db.session.execute(
+            select(func.count()).where(PumpReading.ccn_pump_reading > watermark)
+        ).scalar()
+        db.session.rollback()
+        return count or 0
+
+    @staticmethod
+    def _read_watermark() -> int:
+        last_id = db.session.execute(
+            select(RollupWatermark.last_id).where(
+                RollupWatermark.name == WATERMARK_NAME
+            )
+        ).scalar()
+        if last_id is not None:
+            return last_id
+        try:
+            with db.session.begin_nested():
+                db.session.add(RollupWatermark(name=WATERMARK_NAME, last_id=0))
+        except IntegrityError:
+            # Another worker created it concurrently
+            pass
+        return 0
+
+    @staticmethod
+    def _merge_rollups(resolution: str, aggregates: pd.DataFrame) -> None:
+        """Add freshly aggregated buckets into the stored rollups of ``resolution``"""
+        if aggregates.empty:
+            return
+        table = PumpReadingRollup.__table__
+        pumps = aggregates["ccn_pump"].unique().tolist()
+        first = aggregates["bucket_start"].min().to_pydatetime()
+        last = aggregates["bucket_start"].max().to_pydatetime()
+
+        existing = {}
+        for chunk in _chunks(pumps):
+            for row in db.session.execute(
+                select(table).where(
+                    table.c.resolution == resolution,
+                    table.c.ccn_pump.in_(chunk),
+                    table.c.bucket_start.between(first, last),
+                )
+            ):
+                existing[(row.ccn_pump, row.bucket_start, row.metric)] = row
+
+        inserts, updates = [], []
+        for item in aggregates.itertuples(index=False):
+            bucket_start = item.bucket_start.to_pydatetime()
+            stored = existing.get((item.ccn_pump, bucket_start, item.metric))
+            if stored is None:
+                inserts.append(
+                    {
+                        "ccn_pump": item.ccn_pump,
+                        "resolution": resolution,
+                        "bucket_start": bucket_start,
+                        "metric": item.metric,
+                        "sample_count": int(item.sample_count),
+                        "value_sum": float(item.value_sum),
+                        "value_min": float(item.value_min),
+                        "value_max": float(item.value_max),
+                    }
+                )
+            else:
+                updates.append(
+                    {
+                        "k_pump": item.ccn_pump,
+                        "k_bucket": bucket_start,
+                        "k_metric": item.metric,
+                        "new_count": stored.sample_count + int(item.sample_count),
+                        "new_sum": stored.value_sum + float(item.value_sum),
+                        "new_min": min(stored.value_min, float(item.value_min)),
+                        "new_max": max(stored.value_max, float(item.value_max)),
+                    }
+                )
+
+        if inserts:
+            db.session.execute(table.insert(), inserts)
+        if updates:
+            db.session.execute(
+                update(table)
+                .where(
+                    table.c.ccn_pump == bindparam("k_pump"),
+                    table.c.resolution == resolution,
+                    table.c.bucket_start == bindparam("k_bucket"),
+                    table.c.metric == bindparam("k_metric"),
+                )
+                .values(
+                    sample_count=bindparam("new_count"),
+                    value_sum=bindparam("new_sum"),
+                    value_min=bindparam("new_min"),
+                    value_max=bindparam("new_max"),
+                ),
+                updates,
+            )
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def series(
+        ccn_pump: str,
+        start: datetime,
+        end: datetime,
+        metrics: Optional[List[str]] = None,
+        step_seconds: Optional[int] = None,
+        max_points: int = DEFAULT_MAX_POINTS,
+    ) -> Dict[str, Any]:
+        """
+        Time series of a pump's metrics between ``start`` and ``end``
+
+        Without ``step_seconds`` the step is the range divided by
+        ``max_points``. The coarsest rollup not wider than the step is read
+        (raw readings below one minute), and readings not folded into the
+        rollups yet are aggregated on the fly.
+
+        Returns:
+            ``{"resolution", "step_seconds", "series": {metric: [points]}}``
+            where each point has t, avg, min, max and count
+        """
+        metrics = metrics or TELEMETRY_METRICS
+        unknown = [m for m in metrics if m not in TELEMETRY_METRICS]
+        if unknown:
+            raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+        if end <= start:
+            raise ValueError("'to' must be after 'from'")
+        if step_seconds is None:
+            span = (end - start).total_seconds()
+            step_seconds = max(1, int(np.ceil(span / max(1, max_points))))
+        resolution = choose_resolution(step_seconds)
+
+        readings = PumpReading.__table__
+        if resolution == RAW_RESOLUTION:
+            rows = db.session.execute(
+                select(
+                    readings.c.ccn_pump,
+                    readings.c.recorded_at,
+                    *[readings.c[m] for m in metrics],
+                )
+                .where(
+                    readings.c.ccn_pump == ccn_pump,
+                    readings.c.recorded_at >= start,
+                    readings.c.recorded_at < end,
+                )
+                .order_by(readings.c.recorded_at)
+                .limit(MAX_RAW_POINTS)
+            ).all()
+            series = {metric: [] for metric in metrics}
+            for row in rows:
+                for offset, metric in enumerate(metrics, start=2):
+                    value = row[offset]
+                    if value is not None:
+                        series[metric].append(
+                            {
+                                "t": row[1].isoformat(),
+                                "avg": value,
+                                "min": value,
+                                "max": value,
+                                "count": 1,
+                            }
+                        )
+            return {
+                "resolution": resolution,
+                "step_seconds": step_seconds,
+                "series": series,
+            }
+
+        seconds = ROLLUP_RESOLUTIONS[resolution]
+        bucket_floor = pd.Timestamp(start).floor(pd.Timedelta(seconds=seconds))
+        table = PumpReadingRollup.__table__
+        stored = db.session.execute(
+            select(
+                table.c.ccn_pump,
+                table.c.bucket_start,
+                table.c.metric,
+                table.c.sample_count,
+                table.c.value_sum,
+                table.c.value_min,
+                table.c.value_max,
+            ).where(
+                table.c.ccn_pump == ccn_pump,
+                table.c.resolution == resolution,
+                table.c.metric.in_(metrics),
+                table.c.bucket_start >= bucket_floor.to_pydatetime(),
+                table.c.bucket_start < end,
+            )
+        ).all()
+        frames = [
+            pd.DataFrame.from_records(
+                stored,
+                columns=[
+                    "ccn_pump",
+                    "bucket_start",
+                    "metric",
+                    "sample_count",
+                    "value_sum",
+                    "value_min",
+                    "value_max",
+                ],
+            )
+        ]
+
+        # Readings past the watermark are not in the rollups yet
+        watermark = PumpTelemetryService._read_watermark()
+        fresh = db.session.execute(
+            select(
+                readings.c.ccn_pump,
+                readings.c.recorded_at,
+                *[readings.c[m] for m in metrics],
+            ).where(
+                readings.c.ccn_pump == ccn_pump,
+                readings.c.ccn_pump_reading > watermark,
+                readings.c.recorded_at >= bucket_floor.to_pydatetime(),
+                readings.c.recorded_at < end,
+            )
+        ).all()
+        if fresh:
+            frames.append(_aggregate(_long_frame(fresh, metrics), seconds))
+
+        combined = pd.concat([f for f in frames if not f.empty] or frames[:1])
+        combined["bucket_start"] = pd.to_datetime(combined["bucket_start"])
+        combined = (
+            combined.groupby(["metric", "bucket_start"])
+            .agg(
+                sample_count=("sample_count", "sum"),
+                value_sum=("value_sum", "sum"),
+                value_min=("value_min", "min"),
+                value_max=("value_max", "max"),
+            )
+            .reset_index()
+            .sort_values(["metric", "bucket_start"])
+        )
+
+        series = {metric: [] for metric in metrics}
+        for item in combined.itertuples(index=False):
+            series[item.metric].append(
+                {
+                    "t": item.bucket_start.isoformat(),
+                    "avg": float(item.value_sum) / int(item.sample_count),
+                    "min": float(item.value_min),
+                    "max": float(item.value_max),
+                    "count": int(item.sample_count),
+                }
+            )
+        return {
+            "resolution": resolution,
+            "step_seconds": step_seconds,
+            "series": series,
+        }
+
+
+def _run_rollups(app) -> None:
+    """Background job: fold readings until nothing is left past the watermark"""
+    global _rollup_pending
+    with app.app_context():
+        try:
+            while True:
+                with _rollup_lock:
+                    _rollup_pending = False
+                PumpTelemetryService.rollup()
+                if not PumpTelemetryService.pending_readings():
+                    break
+                # Unsettled readings remain; wait for them instead of spinning
+                time.sleep(app.config.get("TELEMETRY_ROLLUP_SETTLE_SECONDS", 30.0))
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Telemetry rollup failed: {str(e)}")
+        finally:
+            db.session.remove()
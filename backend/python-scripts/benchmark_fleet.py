@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Script de benchmark de los endpoints de bombas y análisis sobre una flota grande
+
+Times the pump listing endpoints, every ``/api/v1/analysis/pumps/*`` endpoint
+and the analysis-chat context builder against a synthetic fleet (see
+``generate_fleet.py``) and writes the results as JSON:
+
+    python python-scripts/benchmark_fleet.py --size 100k --generate --reset
+    python python-scripts/benchmark_fleet.py --database-url mysql+pymysql://...
+
+Requests go through the Flask test client, so the numbers cover routing,
+auth, queries and serialization but no network. The LLM is replaced by a local
+stand-in that answers instantly with a fixed text, so insight and chat timings
+measure this app's work only and never depend on Ollama or OpenAI.
+
+Every case resets the in-process caches (pump snapshot, context builder,
+insight and response caches) and records the first, cold call, then runs
+``--repeats`` warm calls and records min / median / p95 / max / mean in ms.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+# Establecer variables de entorno para desarrollo ANTES de importar
+os.environ.setdefault("FLASK_ENV", "development")
+os.environ.setdefault("JWT_SECRET_KEY", "default-jwt-secret-development")
+os.environ.setdefault("SECRET_KEY", "default-secret-key-development")
+
+# Agregar el directorio backend y el de scripts al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+import generate_fleet  # noqa: E402
+
+DEFAULT_REPEATS = 5
+BENCHMARK_EMAIL = f"benchmark@{generate_fleet.FLEET_EMAIL_DOMAIN}"
+CHAT_QUESTION = "Which active pumps in Edificio A have efficiency below 70?"
+STAND_IN_ANSWER = "- Fleet looks healthy.\n- Review pumps with low efficiency."
+
+
+class _StandInCompletions:
+    """OpenAI-compatible completions answering at once with a fixed text"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, stream: bool = False, **kwargs):
+        self.calls += 1
+        if stream:
+            return (
+                SimpleNamespace(
+                    choices=[SimpleNamespace(delta=SimpleNamespace(content=part))]
+                )
+                for part in STAND_IN_ANSWER.split(" ")
+            )
+        message = SimpleNamespace(content=STAND_IN_ANSWER)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class StandInLLM:
+    """Routes the Ollama and OpenAI clients of the app to the stand-in"""
+
+    def __init__(self):
+        self.completions = _StandInCompletions()
+        self.client = SimpleNamespace(
+            chat=SimpleNamespace(completions=self.completions)
+        )
+        self._restore: List[tuple] = []
+
+    def __enter__(self) -> "StandInLLM":
+        from portfolio_app.resources import resource_analysis
+        from portfolio_app.services.openai_service import OpenAIService
+
+        for owner, name, value in (
+            (resource_analysis, "_get_ollama_client", lambda: self.client),
+            (OpenAIService, "get_client", staticmethod(lambda: self.client)),
+        ):
+            self._restore.append((owner, name, owner.__dict__[name]))
+            setattr(owner, name, value)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        for owner, name, value in reversed(self._restore):
+            setattr(owner, name, value)
+        self._restore.clear()
+
+
+def reset_caches() -> None:
+    """
+    Drop every in-process cache the benchmarked paths read from
+
+    Invalidating the snapshot also bumps the fleet version, which retires the
+    context builder's sections and the conditional-GET validators.
+    """
+    from portfolio_app.services.insight_cache_service import get_insight_cache
+    from portfolio_app.services.llm_response_cache_service import (
+        get_llm_response_cache,
+    )
+    from portfolio_app.services.pump_search_service import get_pump_search_index
+    from portfolio_app.services.pump_snapshot_service import get_pump_snapshot
+
+    get_pump_snapshot().invalidate()
+    get_pump_search_index().invalidate()
+    get_insight_cache().invalidate()
+    get_llm_response_cache().invalidate()
+
+
+def benchmark_token() -> str:
+    """Access token of an admin user owned by the benchmark"""
+    from flask_jwt_extended import create_access_token
+    from werkzeug.security import generate_password_hash
+
+    from portfolio_app import db
+    from portfolio_app.models.tbl_roles import Roles
+    from portfolio_app.models.tbl_users import User
+    from portfolio_app.services.auth_service import AuthService
+
+    if not Roles.query.first():
+        AuthService.create_default_roles_and_permissions()
+    user = User.query.filter_by(email=BENCHMARK_EMAIL).first()
+    if user is None:
+        user = User(
+            first_name="Benchmark",
+            middle_name="",
+            last_name="Runner",
+            email=BENCHMARK_EMAIL,
+            password=generate_password_hash("benchmark"),
+        )
+        db.session.add(user)
+        db.session.commit()
+        AuthService.assign_role_to_user(user.ccn_user, "admin")
+    return create_access_token(identity=user.email)
+
+
+def _timings(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))]
+    return {
+        "min_ms": round(ordered[0] * 1000, 3),
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(p95 * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+
+def measure(run: Callable[[], Any], repeats: int) -> Dict[str, Any]:
+    """Time one cold call (after ``reset_caches``) and ``repeats`` warm calls"""
+    from portfolio_app import db
+
+    reset_caches()
+    db.session.remove()
+    tick = time.perf_counter()
+    detail = run()
+    first = time.perf_counter() - tick
+
+    samples = []
+    for _ in range(repeats):
+        db.session.remove()
+        tick = time.perf_counter()
+        detail = run()
+        samples.append(time.perf_counter() - tick)
+    return {"first_ms": round(first * 1000, 3), **_timings(samples), **detail}
+
+
+def _endpoints(total: int) -> Dict[str, Dict[str, Any]]:
+    last_page = max(1, -(-total // 100))
+    chat = {"messages": [{"role": "user", "content": CHAT_QUESTION}]}
+    return {
+        "get_all_pumps": {"path": "/api/v1/pumps?page=1&per_page=100"},
+        "get_all_pumps.last_page": {
+            "path": f"/api/v1/pumps?page={last_page}&per_page=100"
+        },
+        "get_all_pumps.cursor": {"path": "/api/v1/pumps?cursor=&per_page=100"},
+        "get_all_pumps_no_pagination": {"path": "/api/v1/pumps/all"},
+        "get_all_pumps_no_pagination.ndjson": {
+            "path": "/api/v1/pumps/all?format=ndjson"
+        },
+        "analysis.dashboard": {"path": "/api/v1/analysis/pumps/dashboard"},
+        "analysis.summary": {"path": "/api/v1/analysis/pumps/summary"},
+        "analysis.status_distribution": {
+            "path": "/api/v1/analysis/pumps/status-distribution"
+        },
+        "analysis.location": {"path": "/api/v1/analysis/pumps/location"},
+        "analysis.numeric_stats": {"path": "/api/v1/analysis/pumps/numeric-stats"},
+        "analysis.insights": {"path": "/api/v1/analysis/pumps/insights"},
+        "analysis.anomalies": {"path": "/api/v1/analysis/pumps/anomalies"},
+        "analysis.chat_stream": {
+            "path": "/api/v1/analysis/pumps/chat-stream",
+            "method": "POST",
+            "json": chat,
+        },
+    }
+
+
+def _request_case(client, headers, spec) -> Callable[[], Dict[str, Any]]:
+    def run():
+        if spec.get("method") == "POST":
+            # A new answer each time: replaying the response cache is not the
+            # path being measured
+            from portfolio_app.services.llm_response_cache_service import (
+                get_llm_response_cache,
+            )
+
+            get_llm_response_cache().invalidate()
+            response = client.post(spec["path"], headers=headers, json=spec["json"])
+        else:
+            response = client.get(spec["path"], headers=headers)
+        body = response.get_data()
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"{spec['path']} returned {response.status_code}: {body[:200]!r}"
+            )
+        return {"status": response.status_code, "bytes": len(body)}
+
+    return run
+
+
+def _context_cases() -> Dict[str, Callable[[], Dict[str, Any]]]:
+    from portfolio_app.services.analysis_context_service import (
+        build_sections,
+        get_analysis_context_builder,
+    )
+    from portfolio_app.services.analysis_retrieval_service import (
+        AnalysisRetrievalService,
+    )
+    from portfolio_app.services.pump_snapshot_service import get_pumps_dataframe
+
+    def builder():
+        built = get_analysis_context_builder().build(include_details=False)
+        return {"tokens": built["tokens"], "total_pumps": built["total_pumps"]}
+
+    def sections():
+        built = build_sections(get_pumps_dataframe())
+        return {"total_pumps": built.total, "rows": len(built.rows)}
+
+    def retrieval():
+        retrieved = AnalysisRetrievalService.retrieve(CHAT_QUESTION)
+        context = AnalysisRetrievalService.render(retrieved)
+        return {"matched": retrieved["matched"], "chars": len(context)}
+
+    return {
+        "context_builder.build": builder,
+        "context_builder.build_sections": sections,
+        "context_builder.retrieval": retrieval,
+    }
+
+
+def run_benchmarks(
+    app, repeats: int = DEFAULT_REPEATS, only: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Run the benchmark suite against the app's database
+
+    Args:
+        app: Flask app whose database holds the fleet
+        repeats: Warm calls per case
+        only: Names (or name prefixes) of the cases to run; all when empty
+
+    Returns:
+        The results document: environment, fleet counts and per-case timings
+    """
+    from portfolio_app import db
+    from portfolio_app.models.tbl_pump_photos import PumpPhoto
+    from portfolio_app.models.tbl_pumps import Pump
+    from portfolio_app.models.tbl_users import User
+
+    def selected(name):
+        return not only or any(name.startswith(prefix) for prefix in only)
+
+    results: Dict[str, Any] = {}
+    with app.app_context(), StandInLLM() as llm:
+        fleet = {
+            "pumps": db.session.scalar(db.select(db.func.count(Pump.ccn_pump))),
+            "users": db.session.scalar(db.select(db.func.count(User.ccn_user))),
+            "photos": db.session.scalar(
+                db.select(db.func.count(PumpPhoto.ccn_pump_photo))
+            ),
+        }
+        headers = {"Authorization": f"Bearer {benchmark_token()}"}
+        client = app.test_client()
+
+        cases: Dict[str, Callable[[], Dict[str, Any]]] = {
+            name: _request_case(client, headers, spec)
+            for name, spec in _endpoints(fleet["pumps"]).items()
+        }
+        cases.update(_context_cases())
+        for name, run in cases.items():
+            if selected(name):
+                results[name] = measure(run, repeats)
+        database = db.engine.dialect.name
+
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "database": database,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeats": repeats,
+        "fleet": fleet,
+        "llm_stand_in_calls": llm.completions.calls,
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--database-url",
+        default=os.environ.get("DATABASE_URL") or generate_fleet.DEFAULT_DATABASE_URL,
+        help="SQLite or MySQL (mysql+pymysql://...) URL",
+    )
+    parser.add_argument(
+        "--generate", action="store_true", help="generate the fleet before timing"
+    )
+    parser.add_argument(
+        "--reset", action="store_true", help="delete the previous synthetic fleet"
+    )
+    parser.add_argument(
+        "--size", type=generate_fleet.parse_size, default="10k", help="with --generate"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument(
+        "--only", action="append", help="case name or prefix (repeatable)"
+    )
+    parser.add_argument(
+        "--output", help="JSON file (default benchmarks/fleet-<pumps>-<time>.json)"
+    )
+    args = parser.parse_args(argv)
+
+    os.environ["DATABASE_URL"] = args.database_url
+    from portfolio_app import create_app, db
+
+    app = create_app()
+    # Per-request INFO logs would be part of every timing
+    app.logger.setLevel(logging.WARNING)
+    generated = None
+    with app.app_context():
+        db.create_all()
+        if args.reset:
+            print(f"🗑️ Eliminado: {generate_fleet.clear_fleet()}")
+        if args.generate:
+            generated = generate_fleet.generate_fleet(
+                args.size, seed=args.seed, progress=print
+            )
+            print(f"🎉 Flota generada: {generated}")
+
+    document = run_benchmarks(app, repeats=args.repeats, only=args.only)
+    if generated:
+        document["generated"] = generated
+    for name, result in document["results"].items():
+        print(
+            f"{name:40s} first {result['first_ms']:>10.1f} ms"
+            f"  median {result['median_ms']:>10.1f} ms  p95 {result['p95_ms']:>10.1f} ms"
+        )
+
+    output = Path(
+        args.output
+        or "benchmarks/fleet-{}-{}.json".format(
+            document["fleet"]["pumps"], datetime.now().strftime("%Y%m%d-%H%M%S")
+        )
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(document, indent=2, ensure_ascii=False))
+    print(f"📄 Resultados: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 """Pytest configuration and fixtures"""
 
 import os
+from datetime import datetime, timedelta
+
 import pytest
+from flask_jwt_extended import create_access_token
 
 # Set FLASK_ENV before importing app modules
 os.environ["FLASK_ENV"] = "testing"
@@ -10,6 +13,7 @@ from portfolio_app import create_app
 from portfolio_app import db
 from portfolio_app.models.tbl_users import User
 from portfolio_app.models.tbl_audit_logs import AuditLog
+from portfolio_app.models.tbl_pumps import Pump
 from werkzeug.security import generate_password_hash
 
 
@@ -84,3 +88,42 @@ def sample_user(app):
     # Return user object that can be accessed outside app_context
     with app.app_context():
         return User.query.get(user_id)
+
+
+@pytest.fixture
+def auth_headers(app, admin_user):
+    """Bearer token headers for the admin user"""
+    with app.app_context():
+        token = create_access_token(identity=admin_user.email)
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def pumps_workdir(tmp_path, monkeypatch):
+    """Pump() creates photo directories relative to the working directory"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def make_pump(user_id, **overrides):
+    """Build a Pump with sensible defaults; keyword arguments override fields"""
+    now = datetime.now()
+    values = {
+        "model": "P-100",
+        "serial_number": "SN-0001",
+        "location": "Building A - Room 1",
+        "purchase_date": now - timedelta(days=365),
+        "status": "Active",
+        "flow_rate": 120.5,
+        "pressure": 3.2,
+        "power": 15.0,
+        "efficiency": 85.0,
+        "voltage": 400.0,
+        "current": 25.0,
+        "power_factor": 0.9,
+        "last_maintenance": now - timedelta(days=30),
+        "next_maintenance": now + timedelta(days=60),
+        "user_id": user_id,
+    }
+    values.update(overrides)
+    return Pump(**values)
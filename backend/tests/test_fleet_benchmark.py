@@ -0,0 +1,84 @@
+"""Tests for the synthetic fleet generator and the benchmark suite"""
+
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from portfolio_app import db
+from portfolio_app.models.tbl_photo_blobs import PhotoBlob
+from portfolio_app.models.tbl_pump_photos import PumpPhoto
+from portfolio_app.models.tbl_pumps import Pump
+from portfolio_app.models.tbl_users import User
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "python-scripts"))
+
+import benchmark_fleet  # noqa: E402
+import generate_fleet  # noqa: E402
+
+
+def test_generate_fleet_bulk_inserts_reproducible_rows(app):
+    summary = generate_fleet.generate_fleet(250, seed=7, chunk_size=100)
+    assert summary["pumps"] == 250 and summary["users"] == 1
+    assert db.session.query(Pump).count() == 250
+    assert db.session.query(PumpPhoto).count() == summary["photos"] > 0
+    # Photos follow the photo store invariant: one referenced blob each
+    photos = db.session.query(PumpPhoto).all()
+    blobs = {blob.content_hash: blob for blob in db.session.query(PhotoBlob)}
+    assert len(blobs) == len(photos)
+    assert all(
+        photo.filename == blobs[photo.content_hash].filename
+        and blobs[photo.content_hash].ref_count == 1
+        for photo in photos
+    )
+
+    pumps = db.session.query(Pump).order_by(Pump.serial_number).all()
+    assert all(len(p.location) <= 20 and len(p.model) <= 20 for p in pumps)
+    assert all(p.last_maintenance < p.next_maintenance for p in pumps)
+    assert {p.status for p in pumps} <= set(generate_fleet.STATUS_WEIGHTS)
+
+    # Same seed and chunks, same pumps
+    owners = [pumps[0].user_id]
+    again = [
+        row
+        for start in range(0, 250, 100)
+        for row in generate_fleet.pump_rows(
+            7, start, min(start + 100, 250), owners, datetime.now()
+        )
+    ]
+    assert {row["ccn_pump"] for row in again} == {p.ccn_pump for p in pumps}
+    assert sorted(row["serial_number"] for row in again) == [
+        p.serial_number for p in pumps
+    ]
+
+    removed = generate_fleet.clear_fleet()
+    assert removed == {"users": 1, "pumps": 250, "photos": summary["photos"]}
+    assert db.session.query(User).count() == 0
+    assert db.session.query(PhotoBlob).count() == 0
+
+
+def test_benchmark_suite_times_endpoints_with_stand_in_llm(app):
+    generate_fleet.generate_fleet(120, chunk_size=50)
+
+    document = benchmark_fleet.run_benchmarks(
+        app,
+        repeats=2,
+        only=["get_all_pumps", "analysis.", "context_builder."],
+    )
+
+    assert document["fleet"]["pumps"] == 120
+    assert document["database"] == "sqlite"
+    names = set(document["results"])
+    assert {
+        "get_all_pumps",
+        "get_all_pumps_no_pagination",
+        "analysis.dashboard",
+        "analysis.anomalies",
+        "analysis.insights",
+        "analysis.chat_stream",
+        "context_builder.build",
+    } <= names
+    for result in document["results"].values():
+        assert result["min_ms"] <= result["median_ms"] <= result["max_ms"]
+        assert result["first_ms"] > 0
+    assert document["results"]["context_builder.build"]["total_pumps"] == 120
+    assert document["llm_stand_in_calls"] > 0
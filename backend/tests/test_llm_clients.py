@@ -0,0 +1,501 @@
+"""Tests for the shared LLM clients, response cache and inference scheduler"""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+from flask import current_app
+from portfolio_app import db
+from portfolio_app.models.tbl_ai_agents import AIAgent
+from portfolio_app.services.ai_agent_service import (
+    create_ai_agent,
+    get_agent_service_cache,
+    ollama_health,
+)
+from portfolio_app.services.async_bridge_service import (
+    StreamTimeout,
+    iterate_callback_stream,
+    run_coroutine,
+)
+from portfolio_app.services.inference_scheduler_service import (
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    InferenceScheduler,
+    get_inference_scheduler,
+)
+from portfolio_app.services.llm_client_service import (
+    LLMClientRegistry,
+    is_local_backend,
+    ollama_base_url,
+)
+from portfolio_app.services.llm_response_cache_service import (
+    LLMResponseCache,
+    get_llm_response_cache,
+    response_key,
+)
+
+
+class _ModelsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = json.dumps({"object": "list", "data": []}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def llm_server():
+    """OpenAI-compatible stub answering /v1/models with keep-alive"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ModelsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+    server.server_close()
+
+
+def test_registry_reuses_clients_and_connections(llm_server):
+    registry = LLMClientRegistry()
+    try:
+        client = registry.get(llm_server, "ollama")
+        assert registry.get(llm_server + "/", "ollama") is client
+        assert registry.get(llm_server, "other-key") is not client
+
+        for _ in range(4):
+            client.models.list()
+
+        metrics = {m["api_key"]: m for m in registry.metrics()}
+        assert len(metrics) == 2
+        used = next(m for m in metrics.values() if m["requests"])
+        assert used["backend"] == "local"
+        assert used["requests"] == 4
+        assert used["connections_opened"] == 1
+        assert used["reuse_ratio"] == 0.75
+        assert used["open_connections"] == 1
+        assert used["idle_connections"] == 1
+        assert "ollama" not in json.dumps(list(metrics.values()))
+    finally:
+        registry.close()
+    assert registry.metrics() == []
+
+
+def test_backend_timeouts_and_metrics_endpoint(app, client, auth_headers):
+    assert is_local_backend("http://host.docker.internal:11434/v1")
+    assert not is_local_backend("https://api.openai.com/v1")
+
+    registry = LLMClientRegistry()
+    try:
+        app.config["LLM_REMOTE_TIMEOUT_SECONDS"] = 42.0
+        assert registry.get(None, "sk-test").timeout.read == 42.0
+        assert registry.get("http://localhost:11434/v1", "ollama").timeout.read == 300
+    finally:
+        registry.close()
+
+    response = client.get("/api/v1/ai/llm-clients/metrics", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.get_json()["success"] is True
+    assert isinstance(response.get_json()["clients"], list)
+
+
+class _FakeCompletions:
+    """Streams a fixed answer in three chunks and counts the calls"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        for content in ["Python, ", "SQL ", "and Flask."]:
+            delta = SimpleNamespace(content=content)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    from portfolio_app.resources import resource_portfolio_chat
+
+    completions = _FakeCompletions()
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(
+        resource_portfolio_chat, "_get_ollama_client", lambda: fake_client
+    )
+    get_llm_response_cache().invalidate()
+    yield completions
+    get_llm_response_cache().invalidate()
+
+
+def _ask(client, question):
+    response = client.post(
+        "/api/v1/portfolio/chat-stream",
+        json={"messages": [{"role": "user", "content": question}]},
+    )
+    assert response.status_code == 200
+    return response.headers["X-Cache"], response.get_data(as_text=True)
+
+
+def test_portfolio_chat_replays_cached_answers(client, fake_llm):
+    from portfolio_app.resources.resource_portfolio_chat import _clear_cv_cache
+
+    first, body = _ask(client, "What are your skills?")
+    assert first == "MISS"
+    assert '"content": "and Flask."' in body and '"type": "complete"' in body
+
+    again, replay = _ask(client, "  what are   your skills ")
+    assert again == "HIT"
+    assert replay == body
+    assert fake_llm.calls == 1
+
+    assert _ask(client, "Where do you live?")[0] == "MISS"
+    _clear_cv_cache()
+    assert _ask(client, "What are your skills?")[0] == "MISS"
+    assert fake_llm.calls == 3
+
+
+def test_response_cache_ttl_and_byte_bound(app, monkeypatch):
+    cache = LLMResponseCache()
+    app.config["LLM_RESPONSE_CACHE_MAX_BYTES"] = 1000
+    for i in range(5):
+        cache.put(f"k{i}", ["x" * 100], "analysis")
+    assert cache.stats()["bytes"] <= 1000
+    assert cache.get("k0") is None and cache.get("k4") == ["x" * 100]
+
+    cache.sync("analysis", "v1")
+    assert cache.stats()["entries"] == 0
+    cache.put("k", ["answer"], "analysis")
+    cache.sync("analysis", "v1")
+    assert cache.get("k") == ["answer"]
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 7200)
+    assert cache.get("k") is None
+
+    assert response_key("m", "Prompt  A", [{"role": "user", "content": "Hi?"}]) == (
+        response_key("m", "prompt a", [{"role": "user", "content": "hi"}])
+    )
+    assert response_key("m", "p", [], temperature=0.3) != response_key(
+        "m", "p", [], temperature=0.7
+    )
+
+
+def test_scheduler_orders_by_priority_then_user(app):
+    scheduler = InferenceScheduler()
+    backend = "http://localhost:11434/v1"
+    app.config["LLM_LOCAL_MAX_CONCURRENCY"] = 1
+    holder = scheduler.acquire(backend, "user:x")
+    granted = []
+
+    def wait(name, user, priority):
+        with app.app_context():
+            with scheduler.acquire(backend, user, priority, timeout=5):
+                granted.append(name)
+
+    threads = []
+    for name, user, priority in [
+        ("a-batch", "user:a", PRIORITY_BATCH),
+        ("a-chat-1", "user:a", PRIORITY_INTERACTIVE),
+        ("a-chat-2", "user:a", PRIORITY_INTERACTIVE),
+        ("b-chat", "user:b", PRIORITY_INTERACTIVE),
+    ]:
+        thread = threading.Thread(target=wait, args=(name, user, priority))
+        thread.start()
+        threads.append(thread)
+        while scheduler.metrics()["backends"][0]["queue_depth"] < len(threads):
+            time.sleep(0.005)
+
+    holder.release()
+    for thread in threads:
+        thread.join(5)
+    assert granted == ["a-chat-1", "b-chat", "a-chat-2", "a-batch"]
+    metrics = scheduler.metrics()["backends"][0]
+    assert metrics["active"] == 0 and metrics["admitted"] == 5
+    assert metrics["queued_requests"] == 4 and metrics["max_wait_ms"] > 0
+
+
+def test_chat_returns_429_when_backend_queue_is_full(app, client, fake_llm):
+    app.config["LLM_LOCAL_MAX_CONCURRENCY"] = 1
+    app.config["LLM_QUEUE_MAX_DEPTH"] = 0
+    scheduler = get_inference_scheduler()
+    holder = scheduler.acquire(ollama_base_url(), "user:x")
+    try:
+        response = client.post(
+            "/api/v1/portfolio/chat-stream",
+            json={"messages": [{"role": "user", "content": "Busy?"}]},
+        )
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+    finally:
+        holder.release()
+
+    assert _ask(client, "Busy?")[0] == "MISS"
+    local = [
+        b
+        for b in scheduler.metrics()["backends"]
+        if b["backend"] == ollama_base_url().rstrip("/")
+    ]
+    assert local[0]["active"] == 0 and local[0]["rejected"] >= 1
+
+
+def test_chat_keeps_no_model_slot_when_setup_fails(app, client, monkeypatch):
+    from portfolio_app.resources import resource_portfolio_chat
+
+    def broken_client():
+        raise RuntimeError("no client")
+
+    monkeypatch.setattr(resource_portfolio_chat, "_get_ollama_client", broken_client)
+    get_llm_response_cache().invalidate()
+    response = client.post(
+        "/api/v1/portfolio/chat-stream",
+        json={"messages": [{"role": "user", "content": "Still there?"}]},
+    )
+    assert response.status_code == 500
+
+    local = [
+        b
+        for b in get_inference_scheduler().metrics()["backends"]
+        if b["backend"] == ollama_base_url().rstrip("/")
+    ]
+    assert not local or local[0]["active"] == 0
+
+
+def test_callback_stream_runs_producer_in_greenlet(app):
+    log = []
+
+    async def step(value):
+        return value * 2
+
+    async def task(emit):
+        for i in range(3):
+            emit(await step(i))
+        return "done"
+
+    def produce(emit):
+        assert current_app.name == app.name
+        return run_coroutine(task(emit))
+
+    assert list(iterate_callback_stream(produce)) == [
+        ("item", 0),
+        ("item", 2),
+        ("item", 4),
+        ("result", "done"),
+    ]
+
+    def failing(emit):
+        emit("first")
+        raise ValueError("boom")
+
+    stream = iterate_callback_stream(failing)
+    assert next(stream) == ("item", "first")
+    with pytest.raises(ValueError):
+        next(stream)
+
+    def slow(emit):
+        emit("first")
+        time.sleep(0.05)
+        try:
+            emit("second")
+        except StreamTimeout:
+            emit("cleaned up")
+            raise
+
+    stream = iterate_callback_stream(slow, timeout=0.01)
+    assert next(stream) == ("item", "first")
+    assert next(stream) == ("item", "cleaned up")
+    with pytest.raises(StreamTimeout):
+        next(stream)
+
+    def logged(emit):
+        for i in range(3):
+            emit(i)
+            log.append(i)
+        log.append("finished")
+
+    stream = iterate_callback_stream(logged)
+    assert next(stream) == ("item", 0)
+    stream.close()
+    assert log == [0, 1, 2, "finished"]
+
+    async def suspends():
+        await asyncio.sleep(0)
+
+    with pytest.raises(RuntimeError):
+        run_coroutine(suspends())
+
+
+class _FakeAgent:
+    """Agent whose streaming task emits two chunks and completes"""
+
+    inference_backend = "http://localhost:11434/v1"
+
+    async def execute_task_streaming(self, task_data, submitted_by, stream_callback):
+        from portfolio_app.models.tbl_ai_tasks import AITask
+
+        stream_callback({"type": "stream_start", "message": "Generando respuesta..."})
+        for content in ["Hola ", "mundo"]:
+            stream_callback({"type": "chunk", "content": content})
+        task = db.session.get(AITask, task_data["task_id"])
+        task.status = "completed"
+        db.session.commit()
+        result = {"success": True, "task_id": task_data["task_id"]}
+        stream_callback({"type": "complete", "result": result})
+        return result
+
+
+def test_task_stream_runs_agent_without_threads(app, client, auth_headers, monkeypatch):
+    from portfolio_app.resources import resource_ai_governance
+
+    monkeypatch.setattr(
+        resource_ai_governance, "create_ai_agent", lambda agent_id: _FakeAgent()
+    )
+    threads = threading.active_count()
+    response = client.post(
+        "/api/v1/ai/tasks/stream",
+        headers=auth_headers,
+        json={"agent_id": "agent-1", "task_type": "general", "input_data": {"q": 1}},
+    )
+    assert response.status_code == 200
+    events = [
+        json.loads(line[len("data: ") :])
+        for line in response.get_data(as_text=True).splitlines()
+        if line.startswith("data: ")
+    ]
+    assert [e["type"] for e in events] == [
+        "status",
+        "task_id",
+        "stream_start",
+        "chunk",
+        "chunk",
+        "complete",
+        "complete",
+    ]
+    assert events[-1]["result"]["task_id"] == events[1]["task_id"]
+    assert threading.active_count() == threads
+
+    local = [
+        b
+        for b in get_inference_scheduler().metrics()["backends"]
+        if b["backend"] == _FakeAgent.inference_backend
+    ]
+    assert local[0]["active"] == 0
+
+
+class _SlowAgent(_FakeAgent):
+    """Agent that keeps streaming past the task deadline"""
+
+    async def execute_task_streaming(self, task_data, submitted_by, stream_callback):
+        for _ in range(50):
+            stream_callback({"type": "chunk", "content": "..."})
+            time.sleep(0.02)
+        return {"success": True, "task_id": task_data["task_id"]}
+
+
+def test_task_stream_fails_tasks_past_the_deadline(
+    app, client, auth_headers, monkeypatch
+):
+    from portfolio_app.models.tbl_ai_tasks import AITask
+    from portfolio_app.resources import resource_ai_governance
+
+    monkeypatch.setattr(
+        resource_ai_governance, "create_ai_agent", lambda agent_id: _SlowAgent()
+    )
+    app.config["AI_TASK_TIMEOUT_SECONDS"] = 0.1
+    response = client.post(
+        "/api/v1/ai/tasks/stream",
+        headers=auth_headers,
+        json={"agent_id": "agent-1", "task_type": "general", "input_data": {"q": 1}},
+    )
+    events = [
+        json.loads(line[len("data: ") :])
+        for line in response.get_data(as_text=True).splitlines()
+        if line.startswith("data: ")
+    ]
+    assert events[-1]["type"] == "error"
+    assert "timeout" in events[-1]["error"]
+    assert len([e for e in events if e["type"] == "chunk"]) < 50
+
+    task = db.session.get(AITask, events[1]["task_id"])
+    assert task.status == "failed" and "timeout" in task.error_message
+    local = [
+        b
+        for b in get_inference_scheduler().metrics()["backends"]
+        if b["backend"] == _SlowAgent.inference_backend
+    ]
+    assert local[0]["active"] == 0
+
+
+def test_agent_services_are_cached_by_config_version(
+    app, client, auth_headers, llm_server, monkeypatch
+):
+    agent = AIAgent(
+        name="Fleet analyst",
+        agent_type="general",
+        model_name="qwen2.5:0.5b-instruct",
+        use_local_model=True,
+        local_model_url=llm_server,
+        status="active",
+    )
+    db.session.add(agent)
+    db.session.commit()
+    agent_id = agent.agent_id
+    cache = get_agent_service_cache()
+    cache.invalidate()
+
+    first = create_ai_agent(agent_id)
+    assert create_ai_agent(agent_id) is first
+    assert cache.stats()["hits"] >= 1
+
+    # The health probe runs in the background and is not repeated per task
+    deadline = time.monotonic() + 5
+    while llm_server not in ollama_health() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert ollama_health()[llm_server]["ok"] is True
+
+    # Cached services still schedule it; the interval keeps it from repeating
+    from portfolio_app.services import ai_agent_service
+
+    probes = []
+    with monkeypatch.context() as patch:
+        patch.setattr(
+            ai_agent_service,
+            "schedule_ollama_probe",
+            lambda url, model: probes.append(url),
+        )
+        assert create_ai_agent(agent_id) is first
+    assert probes == [llm_server]
+
+    # An edit made elsewhere changes the config version
+    agent.confidence_threshold = 0.9
+    db.session.commit()
+    second = create_ai_agent(agent_id)
+    assert second is not first and second.confidence_threshold == 0.9
+
+    response = client.put(
+        f"/api/v1/ai/agents/{agent_id}",
+        headers=auth_headers,
+        json={"description": "Answers fleet questions"},
+    )
+    assert response.status_code == 200
+    assert agent_id not in cache.stats()["agents"]
+    assert create_ai_agent(agent_id).agent_description == "Answers fleet questions"
+
+    assert (
+        client.delete(f"/api/v1/ai/agents/{agent_id}", headers=auth_headers).status_code
+        == 200
+    )
+    assert agent_id not in cache.stats()["agents"]
+    with pytest.raises(ValueError):
+        create_ai_agent(agent_id)
+
+    response = client.get("/api/v1/ai/agent-cache/metrics", headers=auth_headers)
+    assert response.status_code == 200
+    assert llm_server in response.get_json()["health"]
@@ -0,0 +1,578 @@
+"""Tests for the pump analysis endpoints and the in-memory pump snapshot"""
+
+import threading
+import time
+
+import pytest
+from portfolio_app import db
+from portfolio_app.models.tbl_pumps import Pump
+from portfolio_app.services.pump_snapshot_service import get_pump_snapshot
+from tests.conftest import make_pump
+
+pytestmark = pytest.mark.usefixtures("pumps_workdir")
+
+
+@pytest.fixture
+def fleet(app, admin_user):
+    """Four pumps across two buildings"""
+    with app.app_context():
+        pumps = [
+            make_pump(admin_user.ccn_user, serial_number="SN-1"),
+            make_pump(admin_user.ccn_user, serial_number="SN-2", flow_rate=80.0),
+            make_pump(
+                admin_user.ccn_user,
+                serial_number="SN-3",
+                status="Maintenance",
+                location="Building B - Room 2",
+            ),
+            make_pump(
+                admin_user.ccn_user,
+                serial_number="SN-4",
+                status="Standby",
+                location="Building B - Room 3",
+            ),
+        ]
+        db.session.add_all(pumps)
+        db.session.commit()
+        return [pump.ccn_pump for pump in pumps]
+
+
+def test_summary_counts_statuses(client, fleet, auth_headers):
+    response = client.get("/api/v1/analysis/pumps/summary", headers=auth_headers)
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["total_pumps"] == 4
+    assert data["status"] == {"Active": 2, "Maintenance": 1, "Standby": 1}
+    assert data["metrics"]["operational_efficiency_pct"] == 50.0
+    assert data["metrics"]["system_availability_pct"] == 75.0
+
+
+def test_numeric_stats_min_max_count(client, fleet, auth_headers):
+    response = client.get("/api/v1/analysis/pumps/numeric-stats", headers=auth_headers)
+
+    stats = response.get_json()["stats"]
+    assert stats["efficiency"]["min"] == 85.0
+    assert stats["flow_rate"]["min"] == 80.0
+    assert stats["flow_rate"]["max"] == 120.5
+    assert stats["flow_rate"]["count"] == 4
+
+
+def test_snapshot_is_patched_on_commit(app, fleet, admin_user):
+    with app.app_context():
+        snapshot = get_pump_snapshot()
+        assert len(snapshot.dataframe()) == 4
+
+        pump = db.session.get(Pump, fleet[0])
+        pump.status = "Repair"
+        db.session.add(make_pump(admin_user.ccn_user, location="Building C - Lab"))
+        db.session.delete(db.session.get(Pump, fleet[1]))
+        db.session.commit()
+
+        df = snapshot.dataframe()
+        assert len(df) == 4
+        assert df.loc[fleet[0], "status"] == "Repair"
+        assert fleet[1] not in df.index
+        assert "Building C - Lab" in set(df["location"])
+        assert df["status"].value_counts().to_dict() == {
+            "Maintenance": 1,
+            "Standby": 1,
+            "Repair": 1,
+            "Active": 1,
+        }
+
+
+def test_snapshot_ignores_rolled_back_writes(app, fleet):
+    with app.app_context():
+        snapshot = get_pump_snapshot()
+        snapshot.dataframe()
+
+        pump = db.session.get(Pump, fleet[0])
+        pump.status = "Inactive"
+        db.session.flush()
+        db.session.rollback()
+
+        assert snapshot.dataframe().loc[fleet[0], "status"] == "Active"
+
+
+def test_location_and_distribution_are_grouped_in_sql(client, fleet, auth_headers):
+    locations = client.get(
+        "/api/v1/analysis/pumps/location", headers=auth_headers
+    ).get_json()["locations"]
+    distribution = client.get(
+        "/api/v1/analysis/pumps/status-distribution", headers=auth_headers
+    ).get_json()
+
+    assert locations == [
+        {"building": "Building A", "count": 2},
+        {"building": "Building B", "count": 2},
+    ]
+    assert distribution["total"] == 4
+    assert distribution["distribution"][0] == {
+        "status": "Active",
+        "count": 2,
+        "percentage": 50.0,
+    }
+
+
+def test_numeric_stats_median_and_std(client, fleet, auth_headers):
+    stats = client.get(
+        "/api/v1/analysis/pumps/numeric-stats", headers=auth_headers
+    ).get_json()["stats"]
+
+    # flow_rate values: 80.0, 120.5, 120.5, 120.5
+    assert stats["flow_rate"]["median"] == 120.5
+    assert stats["flow_rate"]["mean"] == pytest.approx(110.375)
+    assert stats["flow_rate"]["std"] == pytest.approx(17.5370, rel=1e-4)
+    assert stats["voltage"]["std"] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_numeric_stats_std_of_large_values(app, client, admin_user, auth_headers):
+    with app.app_context():
+        db.session.add_all(
+            [
+                make_pump(admin_user.ccn_user, serial_number=f"SN-L{i}", power=1e9 + i)
+                for i in range(3)
+            ]
+        )
+        db.session.commit()
+
+    stats = client.get(
+        "/api/v1/analysis/pumps/numeric-stats", headers=auth_headers
+    ).get_json()["stats"]
+
+    # AVG(x*x) - mean^2 loses every digit of a variance of 2/3 at 1e18
+    assert stats["power"]["std"] == pytest.approx((2 / 3) ** 0.5, rel=1e-9)
+
+
+def test_snapshot_medians_match_sql_medians(app, fleet):
+    from portfolio_app.services.pump_aggregation_service import (
+        NUMERIC_COLUMNS,
+        PumpAggregationService,
+        _snapshot_medians,
+    )
+
+    with app.app_context():
+        counts = {name: len(fleet) for name in NUMERIC_COLUMNS}
+        assert _snapshot_medians(NUMERIC_COLUMNS) == PumpAggregationService.medians(
+            counts
+        )
+        assert _snapshot_medians(["flow_rate"]) == {"flow_rate": 120.5}
+
+
+def test_context_statistics_keep_float64_precision():
+    import numpy as np
+    import pandas as pd
+    from portfolio_app.services.analysis_context_service import _summary
+    from portfolio_app.services.pump_snapshot_service import as_float, stat_float
+
+    # Stored float32 values lose their noise, computed statistics keep digits
+    assert as_float(np.float32(0.85)) == 0.85
+    power = np.array([16777216, 16777218], dtype=np.float32)
+    assert as_float(power.astype(np.float64).mean()) != 16777217.0
+    assert stat_float(power.astype(np.float64).mean()) == 16777217.0
+
+    summary = _summary(pd.DataFrame({"status": ["Active"] * 2, "power": power}))
+    assert '"mean":16777217.0' in summary
+    assert '"max":16777218.0' in summary
+
+
+def test_numeric_stats_on_empty_fleet(client, auth_headers):
+    stats = client.get(
+        "/api/v1/analysis/pumps/numeric-stats", headers=auth_headers
+    ).get_json()["stats"]
+
+    assert stats == {
+        "flow_rate": None,
+        "pressure": None,
+        "power": None,
+        "efficiency": None,
+        "voltage": None,
+        "current": None,
+        "power_factor": None,
+    }
+
+
+def test_dashboard_sections_subset(client, fleet, auth_headers):
+    response = client.get(
+        "/api/v1/analysis/pumps/dashboard?sections=summary,locations",
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert set(data) == {"summary", "locations"}
+    assert data["summary"]["total_pumps"] == 4
+    assert data["locations"][0]["count"] == 2
+
+
+def test_dashboard_rejects_unknown_sections(client, auth_headers):
+    response = client.get(
+        "/api/v1/analysis/pumps/dashboard?sections=summary,bogus",
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 400
+    assert "bogus" in response.get_json()["error"]
+
+
+def test_dashboard_data_sections_cost_two_statements(app, client, fleet, auth_headers):
+    from sqlalchemy import event
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        response = client.get(
+            "/api/v1/analysis/pumps/dashboard"
+            "?sections=summary,status_distribution,locations,numeric_stats",
+            headers=auth_headers,
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+    assert response.status_code == 200
+    # The fleet version stamp for the ETag is a validator, not a data section
+    pump_statements = [
+        s
+        for s in statements
+        if "tbl_pumps" in s and "max(tbl_pumps.updated_at)" not in s
+    ]
+    # One grouped aggregate query plus one UNION ALL median lookup
+    assert len(pump_statements) == 2
+
+
+def test_grouped_median_matches_pandas():
+    import numpy as np
+    import pandas as pd
+    from portfolio_app.services.pump_anomaly_service import grouped_median
+
+    rng = np.random.default_rng(7)
+    groups = rng.integers(0, 12, 2000)
+    values = rng.normal(size=(2, 2000))
+    values[0, rng.integers(0, 2000, 100)] = np.nan
+    values[1, groups == 3] = np.nan
+
+    medians, counts = grouped_median(values, groups, 12)
+
+    frame = pd.DataFrame({"g": groups, "a": values[0], "b": values[1]})
+    expected = frame.groupby("g")[["a", "b"]].median().to_numpy().T
+    np.testing.assert_allclose(medians, expected, atol=1e-9)
+    assert np.isnan(medians[1, 3]) and counts[1, 3] == 0
+
+    # Groups of very different spread keep every digit of their medians
+    wide_and_narrow = np.array([[0.0, 1e12, 1.0, 1.0 + 1e-9, 1.0 + 2e-9]])
+    medians, _ = grouped_median(wide_and_narrow, np.array([0, 0, 1, 1, 1]), 2)
+    assert medians[0].tolist() == [5e11, 1.0 + 1e-9]
+
+
+def test_anomalies_rank_outliers_and_inconsistent_power(
+    app, client, admin_user, auth_headers
+):
+    with app.app_context():
+        pumps = [
+            make_pump(
+                admin_user.ccn_user,
+                serial_number=f"SN-{i}",
+                flow_rate=100.0 + i,
+                # sqrt(3) * 400 V * 25 A * 0.9 = 15.6 kW
+                power=15.6,
+            )
+            for i in range(8)
+        ]
+        pumps[0].flow_rate = 400.0
+        pumps[1].power = 40.0
+        # Alone in its (model, location) group: never z-scored
+        pumps.append(
+            make_pump(
+                admin_user.ccn_user,
+                serial_number="SN-SOLO",
+                model="P-900",
+                flow_rate=9999.0,
+                power=15.6,
+            )
+        )
+        db.session.add_all(pumps)
+        db.session.commit()
+
+    response = client.get("/api/v1/analysis/pumps/anomalies", headers=auth_headers)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body["total_pumps"], body["groups"], body["flagged"]) == (9, 2, 2)
+    first, second = body["outliers"]
+    assert first["serial_number"] == "SN-0"
+    assert first["metrics"]["flow_rate"]["z"] > 3.5
+    assert first["checks"] == []
+    assert second["serial_number"] == "SN-1"
+    assert second["checks"][0]["check"] == "power_mismatch"
+    assert second["checks"][0]["expected_power"] == 15.59
+
+    bad = client.get(
+        "/api/v1/analysis/pumps/anomalies?metrics=colour", headers=auth_headers
+    )
+    assert bad.status_code == 400
+
+
+def test_analysis_context_is_cached_and_token_budgeted(app, fleet, admin_user):
+    import json
+
+    from portfolio_app.services.analysis_context_service import (
+        estimate_tokens,
+        get_analysis_context_builder,
+    )
+
+    with app.app_context():
+        builder = get_analysis_context_builder()
+        full = builder.build(token_budget=100000)
+        assert (full["total_pumps"], full["pumps_included"]) == (4, 4)
+        assert not full["cached"]
+        assert '"flow_rate":80.0' in full["context"]
+        assert '"Maintenance":1' in full["context"]
+
+        # Same fleet version: served from the cached sections, fewer rows fit
+        small = builder.build(token_budget=estimate_tokens(full["context"]) - 100)
+        assert small["cached"]
+        assert small["pumps_included"] < 4
+        assert small["tokens"] <= estimate_tokens(full["context"]) - 100
+
+        db.session.add(make_pump(admin_user.ccn_user, serial_number="SN-5"))
+        db.session.commit()
+        rebuilt = builder.build(token_budget=100000)
+        assert not rebuilt["cached"] and rebuilt["total_pumps"] == 5
+
+        # Client payloads are keyed by content hash
+        pumps_data = [
+            {
+                "ccn_pump": "a" * 64,
+                "serial_number": "SN-X",
+                "status": "Active",
+                "flow_rate": 10,
+                "next_maintenance": "2026-05-01T08:30:00Z",
+            }
+        ]
+        first = builder.build(pumps_data, token_budget=100000)
+        again = builder.build(json.loads(json.dumps(pumps_data)), 100000)
+        assert not first["cached"] and again["cached"]
+        assert '"next_maintenance":"2026-05-01 08:30:00"' in again["context"]
+
+
+def test_summary_only_context_skips_detail_serialization(app, fleet, monkeypatch):
+    from portfolio_app.services import analysis_context_service
+
+    serialized = []
+    detail_rows = analysis_context_service._detail_rows
+    monkeypatch.setattr(
+        analysis_context_service,
+        "_detail_rows",
+        lambda details: serialized.append(len(details)) or detail_rows(details),
+    )
+
+    with app.app_context():
+        builder = analysis_context_service.get_analysis_context_builder()
+        summary = builder.build(include_details=False)
+        assert summary["pumps_included"] == 0 and summary["total_pumps"] == 4
+        assert builder.build(include_details=False)["cached"]
+        assert serialized == []
+
+        # The first detailed render serializes the rows once
+        full = builder.build(token_budget=100000)
+        assert full["cached"] and full["pumps_included"] == 4
+        builder.build(token_budget=100000)
+        assert serialized == [4]
+
+
+def test_retrieval_selects_question_pumps_with_one_query(app, fleet, admin_user):
+    from sqlalchemy import event
+
+    from portfolio_app.services.analysis_context_service import estimate_tokens
+    from portfolio_app.services.analysis_retrieval_service import (
+        AnalysisRetrievalService,
+        parse_metric_ranges,
+    )
+
+    assert parse_metric_ranges("efficiency below 60% and flow rate between 80 and 120")
+    assert parse_metric_ranges("efficiency below 60%")[0]["value"] == 60.0
+    assert parse_metric_ranges("power factor below 80%")[0]["value"] == 0.8
+    assert parse_metric_ranges("caudal entre 80 y 120")[0] == {
+        "metric": "flow_rate",
+        "op": "between",
+        "value": 80.0,
+        "high": 120.0,
+    }
+
+    with app.app_context():
+        engine = db.engine
+        by_id = AnalysisRetrievalService.retrieve(f"What about {fleet[2]}?")
+        assert [r["serial_number"] for r in by_id["records"]] == ["SN-3"]
+
+        # IDs cut by the limit exist; only unknown IDs are reported missing
+        unknown = "f" * 64
+        several = AnalysisRetrievalService.retrieve(
+            f"Compare {fleet[2]}, {fleet[3]} and {unknown}", limit=1
+        )
+        assert len(several["records"]) == 1
+        assert several["missing"] == [unknown]
+        assert several["matched"] == 2
+        rendered = AnalysisRetrievalService.render(several)
+        assert f"Pump IDs not found: {unknown}\n" in rendered
+        assert fleet[3] not in rendered.split("Pump IDs not found")[1]
+
+        # Status filter plus metric range, lowest flow first
+        low_flow = AnalysisRetrievalService.retrieve(
+            "Which active pumps have a flow rate under 200?"
+        )
+        assert low_flow["filters"]["statuses"] == ["Active"]
+        assert [r["serial_number"] for r in low_flow["records"]] == ["SN-2", "SN-1"]
+
+        # Free words are ranked with BM25 over model, location and status
+        statements = []
+
+        def count_statement(conn, cursor, statement, parameters, context, many):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", count_statement)
+        try:
+            room = AnalysisRetrievalService.retrieve("pumps in room 3 or sn-1")
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+        serials = [r["serial_number"] for r in room["records"]]
+        assert serials[0] == "SN-1"
+        assert serials[1] == "SN-4"
+        assert len(statements) == 1
+
+        # A general question retrieves nothing: the summary answers it
+        assert (
+            AnalysisRetrievalService.retrieve("How is the fleet doing?")["records"]
+            == []
+        )
+
+        table = AnalysisRetrievalService.render(low_flow)
+        assert "ccn_pump|model|serial_number" in table
+        assert "|SN-2|" in table
+
+        # A token budget keeps the best rows that fit
+        budget = estimate_tokens(table) - 10
+        trimmed = AnalysisRetrievalService.render(low_flow, budget)
+        assert estimate_tokens(trimmed) <= budget
+        assert "showing 1 (best match first)" in trimmed
+        assert "|SN-2|" in trimmed and "|SN-1|" not in trimmed
+        assert "showing 0" in AnalysisRetrievalService.render(low_flow, 0)
+
+
+def test_retrieval_compares_efficiency_in_percent(app, admin_user, pumps_workdir):
+    from portfolio_app.services.analysis_retrieval_service import (
+        AnalysisRetrievalService,
+    )
+
+    with app.app_context():
+        db.session.add_all(
+            [
+                make_pump(admin_user.ccn_user, serial_number=f"SN-E{i}", efficiency=e)
+                for i, e in enumerate([62.0, 68.5, 75.0, 90.0])
+            ]
+        )
+        db.session.commit()
+
+        low = AnalysisRetrievalService.retrieve(
+            "Which pumps have efficiency below 70%?"
+        )
+        assert sorted(r["serial_number"] for r in low["records"]) == ["SN-E0", "SN-E1"]
+        assert low["matched"] == 2
+
+        high = AnalysisRetrievalService.retrieve("efficiency above 80%")
+        assert [r["serial_number"] for r in high["records"]] == ["SN-E3"]
+
+
+def test_insights_are_cached_by_fingerprint_with_single_flight(app, monkeypatch):
+    from portfolio_app.services.insight_cache_service import get_insight_cache
+    from portfolio_app.services.openai_service import OpenAIService
+
+    calls = []
+
+    def fake_request(summary, distribution, locations):
+        calls.append(summary["total_pumps"])
+        time.sleep(0.05)
+        return f"{summary['total_pumps']} pumps"
+
+    monkeypatch.setattr(
+        OpenAIService, "_request_pump_insights", staticmethod(fake_request)
+    )
+    get_insight_cache().invalidate()
+
+    def insights(total):
+        return OpenAIService.generate_pump_insights({"total_pumps": total}, [], {}, [])
+
+    results = []
+
+    def request_insights():
+        with app.app_context():
+            results.append(insights(4))
+
+    threads = [threading.Thread(target=request_insights) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["4 pumps"] * 4
+    assert insights(4) == "4 pumps"
+    assert calls == [4]
+
+    # The fleet changed: the stale text is served while it is regenerated
+    assert insights(5) == "4 pumps"
+    deadline = time.monotonic() + 5
+    while insights(5) != "5 pumps" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert insights(5) == "5 pumps"
+    assert calls == [4, 5]
+
+    # numeric_stats is not sent to the model, so it does not stale the text
+    stats = {"power": {"max": 99.0}}
+    assert OpenAIService.generate_pump_insights({"total_pumps": 5}, [], stats, [])
+    assert get_insight_cache().stats()["refreshing"] == 0
+    assert calls == [4, 5]
+
+    # A failed refresh keeps the stale text and is not retried at once
+    def failing_insights(summary, distribution, locations):
+        calls.append("failed")
+        raise RuntimeError("backend down")
+
+    monkeypatch.setattr(
+        OpenAIService, "_request_pump_insights", staticmethod(failing_insights)
+    )
+
+    def wait_idle():
+        deadline = time.monotonic() + 5
+        while get_insight_cache().stats()["refreshing"] and (
+            time.monotonic() < deadline
+        ):
+            time.sleep(0.01)
+
+    assert insights(6) == "5 pumps"
+    wait_idle()
+    for _ in range(3):
+        assert insights(6) == "5 pumps"
+    wait_idle()
+    assert calls.count("failed") == 1
+
+    app.config["INSIGHT_REFRESH_RETRY_SECONDS"] = 0
+    assert insights(6) == "5 pumps"
+    wait_idle()
+    assert calls.count("failed") == 2
+
+    def failing_request(chart_type, chart_data, chart_title):
+        raise RuntimeError("backend down")
+
+    monkeypatch.setattr(
+        OpenAIService, "_request_chart_insight", staticmethod(failing_request)
+    )
+    errors = get_insight_cache().stats()["errors"]
+    chart = OpenAIService.generate_chart_insight("pie", [{"x": 1}], "Status")
+    assert chart == "Unable to generate insight"
+    assert get_insight_cache().stats()["errors"] == errors + 1
+    get_insight_cache().invalidate()
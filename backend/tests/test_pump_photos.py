@@ -0,0 +1,360 @@
+"""Tests for pump photo storage and serving"""
+
+import os
+
+import pytest
+from portfolio_app import db
+from portfolio_app.services.pump_image_service import (
+    PumpImageService,
+    render_renditions,
+)
+from tests.conftest import make_pump
+
+pytestmark = pytest.mark.usefixtures("pumps_workdir")
+
+
+@pytest.fixture
+def photo_pump(app, admin_user, tmp_path):
+    """A pump with one 2000x1000 PNG photo on disk"""
+    from PIL import Image
+
+    with app.app_context():
+        pump = make_pump(admin_user.ccn_user, photos=["original.png"])
+        db.session.add(pump)
+        db.session.commit()
+        pump_dir = tmp_path / "portfolio_app" / "static" / "pumps" / pump.ccn_pump
+        Image.new("RGB", (2000, 1000), (10, 120, 200)).save(pump_dir / "original.png")
+        return pump.ccn_pump, pump_dir
+
+
+def test_render_renditions_writes_bounded_webp(photo_pump):
+    from PIL import Image
+
+    _, pump_dir = photo_pump
+
+    written = render_renditions(str(pump_dir / "original.png"))
+
+    assert sorted(p.rsplit("/", 1)[1] for p in written) == [
+        "original.medium.webp",
+        "original.thumb.webp",
+    ]
+    with Image.open(pump_dir / "original.thumb.webp") as thumb:
+        assert thumb.format == "WEBP"
+        assert thumb.size == (320, 160)
+    with Image.open(pump_dir / "original.medium.webp") as medium:
+        assert medium.size == (1280, 640)
+
+
+def test_photo_endpoint_serves_requested_size(client, photo_pump):
+    ccn_pump, pump_dir = photo_pump
+    url = f"/api/v1/pumps/{ccn_pump}/photos/original.png"
+
+    # Until the renditions exist, every size falls back to the original
+    assert client.get(f"{url}?size=thumb").mimetype == "image/png"
+
+    render_renditions(str(pump_dir / "original.png"))
+
+    assert client.get(f"{url}?size=thumb").mimetype == "image/webp"
+    assert client.get(f"{url}?size=medium").mimetype == "image/webp"
+    assert client.get(url).mimetype == "image/png"
+    assert client.get(f"{url}?size=huge").status_code == 400
+
+
+def test_photo_urls_point_at_thumbnails(client, photo_pump, auth_headers):
+    ccn_pump, _ = photo_pump
+
+    listed = client.get("/api/v1/pumps", headers=auth_headers).get_json()["Pumps"]
+    full = client.get(
+        f"/api/v1/pumps/{ccn_pump}?photo_size=full", headers=auth_headers
+    ).get_json()["Pump"]
+
+    assert listed[0]["photo_urls"][0].endswith("/original.png?size=thumb")
+    assert full["photo_urls"][0].endswith("/original.png?size=full")
+
+
+def test_remove_renditions(photo_pump):
+    _, pump_dir = photo_pump
+    render_renditions(str(pump_dir / "original.png"))
+
+    PumpImageService.remove_renditions(str(pump_dir), "original.png")
+
+    assert sorted(p.name for p in pump_dir.iterdir()) == ["original.png"]
+
+
+GEVENT_RENDER_SCRIPT = """
+from gevent import monkey
+
+monkey.patch_all()
+
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from portfolio_app.services.pump_image_service import (
+    PumpImageService,
+    get_image_executor,
+)
+
+assert not isinstance(get_image_executor(), ProcessPoolExecutor)
+written = PumpImageService.schedule_renditions(sys.argv[1]).result(timeout=60)
+print(len(written))
+"""
+
+
+def test_renditions_render_under_gevent_monkey_patching(photo_pump):
+    import subprocess
+    import sys
+
+    pytest.importorskip("gevent")
+    _, pump_dir = photo_pump
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    done = subprocess.run(
+        [sys.executable, "-c", GEVENT_RENDER_SCRIPT, str(pump_dir / "original.png")],
+        cwd=backend,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert done.returncode == 0, done.stderr
+    assert done.stdout.strip() == "2"
+    assert (pump_dir / "original.thumb.webp").exists()
+
+
+@pytest.fixture
+def two_pumps(app, admin_user, monkeypatch):
+    """Two photo-less pumps; renditions are not rendered in these tests"""
+    monkeypatch.setattr(
+        PumpImageService, "schedule_renditions", staticmethod(lambda path: None)
+    )
+    with app.app_context():
+        pumps = [
+            make_pump(admin_user.ccn_user, serial_number="SN-A"),
+            make_pump(admin_user.ccn_user, serial_number="SN-B"),
+        ]
+        db.session.add_all(pumps)
+        db.session.commit()
+        return [pump.ccn_pump for pump in pumps]
+
+
+def _upload(client, auth_headers, ccn_pump, content=b"same image bytes"):
+    import io
+
+    response = client.post(
+        f"/api/v1/pumps/{ccn_pump}/photos",
+        headers=auth_headers,
+        data={"photos": (io.BytesIO(content), "pump.jpg")},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200
+    return response.get_json()["uploaded_photos"][0]
+
+
+def _ref_count(app, filename):
+    from portfolio_app.models.tbl_photo_blobs import PhotoBlob
+
+    with app.app_context():
+        blob = db.session.get(PhotoBlob, filename.split(".")[0])
+        return None if blob is None else blob.ref_count
+
+
+def test_identical_uploads_share_one_blob(app, client, two_pumps, auth_headers):
+    import hashlib
+    import time
+    from portfolio_app.services.photo_store_service import blob_path
+
+    first = _upload(client, auth_headers, two_pumps[0])
+    second = _upload(client, auth_headers, two_pumps[1])
+
+    assert first == second == f"{hashlib.sha256(b'same image bytes').hexdigest()}.jpg"
+    assert _ref_count(app, first) == 2
+    with app.app_context():
+        path = blob_path(first)
+    assert path.endswith(f"{first[:2]}/{first[2:4]}/{first}")
+
+    client.delete(f"/api/v1/pumps/{two_pumps[0]}/photos/{first}", headers=auth_headers)
+    assert _ref_count(app, first) == 1
+    assert open(path, "rb").read() == b"same image bytes"
+
+    client.delete(f"/api/v1/pumps/{two_pumps[1]}", headers=auth_headers)
+    assert _ref_count(app, first) is None
+
+    deadline = time.monotonic() + 5
+    while os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not os.path.exists(path)
+
+
+def test_bulk_delete_releases_blob_references(app, client, two_pumps, auth_headers):
+    filename = _upload(client, auth_headers, two_pumps[0])
+    _upload(client, auth_headers, two_pumps[1])
+
+    client.delete(
+        "/api/v1/pumps/bulk", headers=auth_headers, json={"ids": two_pumps[:1]}
+    )
+
+    assert _ref_count(app, filename) == 1
+
+
+def test_blob_serving_headers(app, client, two_pumps, auth_headers):
+    filename = _upload(client, auth_headers, two_pumps[0], content=b"0123456789")
+    url = f"/api/v1/pumps/{two_pumps[0]}/photos/{filename}"
+
+    full = client.get(url)
+    assert full.data == b"0123456789"
+    assert "immutable" in full.headers["Cache-Control"]
+
+    partial = client.get(url, headers={"Range": "bytes=2-5"})
+    assert partial.status_code == 206
+    assert partial.data == b"2345"
+
+    # No rendition yet: the original is served but not cached for good
+    fallback = client.get(f"{url}?size=thumb")
+    assert fallback.data == b"0123456789"
+    assert fallback.headers["Cache-Control"] == "no-cache"
+
+    app.config["PHOTO_ACCEL_REDIRECT_PREFIX"] = "/protected-photos/"
+    accel = client.get(url)
+    assert accel.data == b""
+    assert accel.headers["X-Accel-Redirect"] == (
+        f"/protected-photos/{filename[:2]}/{filename[2:4]}/{filename}"
+    )
+
+
+def test_blob_is_only_served_for_its_pumps(client, two_pumps, auth_headers):
+    filename = _upload(client, auth_headers, two_pumps[0])
+
+    response = client.get(f"/api/v1/pumps/{two_pumps[1]}/photos/{filename}")
+
+    assert response.status_code == 404
+
+
+def test_ownership_index_is_rebuilt_only_on_photo_changes(
+    app, client, two_pumps, auth_headers
+):
+    from portfolio_app.services.photo_store_service import get_photo_ownership_index
+
+    filename = _upload(client, auth_headers, two_pumps[0])
+    _upload(client, auth_headers, two_pumps[1])
+    url = f"/api/v1/pumps/{two_pumps[0]}/photos/{filename}"
+    assert client.get(url).status_code == 200
+    with app.app_context():
+        rebuilds = get_photo_ownership_index().rebuilds
+
+    # Pump writes that do not touch photos keep the index
+    response = client.patch(
+        "/api/v1/pumps/bulk",
+        headers=auth_headers,
+        json={"ids": two_pumps, "changes": {"status": "Standby"}},
+    )
+    assert response.status_code == 200
+    assert client.get(url).status_code == 200
+    with app.app_context():
+        assert get_photo_ownership_index().rebuilds == rebuilds
+
+    # Photo changes are applied in place, without rescanning the photo rows
+    client.delete(url, headers=auth_headers)
+    assert client.get(url).status_code == 404
+    filename = _upload(client, auth_headers, two_pumps[0], content=b"new bytes")
+    url = f"/api/v1/pumps/{two_pumps[0]}/photos/{filename}"
+    assert client.get(url).status_code == 200
+    client.delete(f"/api/v1/pumps/{two_pumps[0]}", headers=auth_headers)
+    assert client.get(url).status_code == 404
+    with app.app_context():
+        assert get_photo_ownership_index().rebuilds == rebuilds
+
+
+def test_sweep_removes_blobs_left_by_failed_uploads(
+    app, client, two_pumps, auth_headers
+):
+    import io
+    from datetime import datetime, timedelta
+    from portfolio_app.models.tbl_photo_blobs import PhotoBlob
+    from portfolio_app.services.photo_store_service import PhotoStore, blob_path
+
+    kept = _upload(client, auth_headers, two_pumps[0])
+    with app.app_context():
+        # A committed blob row that never got a photo row
+        unreferenced = PhotoStore.save(io.BytesIO(b"unreferenced"), "jpg")
+        db.session.get(PhotoBlob, unreferenced.split(".")[0]).created_at = (
+            datetime.now() - timedelta(hours=2)
+        )
+        db.session.commit()
+        # A file whose blob row was rolled back
+        rolled_back = PhotoStore.save(io.BytesIO(b"rolled back"), "png")
+        db.session.delete(db.session.get(PhotoBlob, rolled_back.split(".")[0]))
+        db.session.commit()
+        paths = {name: blob_path(name) for name in (kept, unreferenced, rolled_back)}
+    old = datetime.now().timestamp() - 7200
+    for path in paths.values():
+        os.utime(path, (old, old))
+
+    with app.app_context():
+        removed = PhotoStore.sweep_orphans(grace_seconds=3600)
+
+    assert sorted(removed) == sorted([unreferenced, rolled_back])
+    assert os.path.exists(paths[kept])
+    assert not os.path.exists(paths[unreferenced])
+    assert not os.path.exists(paths[rolled_back])
+    assert _ref_count(app, kept) == 1
+    assert _ref_count(app, unreferenced) is None
+    assert _ref_count(app, rolled_back) is None
+
+
+def test_pump_list_loads_photos_in_one_query(app, client, admin_user, auth_headers):
+    from sqlalchemy import event
+
+    with app.app_context():
+        for index in range(5):
+            pump = make_pump(
+                admin_user.ccn_user,
+                serial_number=f"SN-{index}",
+                photos=[f"photo-{index}-a.png", f"photo-{index}-b.png"],
+            )
+            db.session.add(pump)
+        db.session.commit()
+        engine = db.engine
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        response = client.get(
+            "/api/v1/pumps?fields=ccn_pump,photos,photo_urls", headers=auth_headers
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+    pumps = response.get_json()["Pumps"]
+    assert len(pumps) == 5
+    assert all(len(pump["photos"]) == 2 for pump in pumps)
+    assert sorted(pumps[0]["photos"]) == pumps[0]["photos"]
+    assert len([s for s in statements if "tbl_pump_photos" in s]) == 1
+
+
+def test_concurrent_photo_additions_are_not_lost(app, admin_user):
+    from sqlalchemy.orm import Session
+    from portfolio_app.models.tbl_pumps import Pump
+
+    with app.app_context():
+        pump = make_pump(admin_user.ccn_user)
+        db.session.add(pump)
+        db.session.commit()
+        ccn_pump = pump.ccn_pump
+        engine = db.engine
+
+    # Both requests read the pump before either one commits its photo
+    first, second = Session(engine), Session(engine)
+    try:
+        first.get(Pump, ccn_pump).add_photo("first.png")
+        second.get(Pump, ccn_pump).add_photo("second.png")
+        second.commit()
+        first.commit()
+    finally:
+        first.close()
+        second.close()
+
+    with app.app_context():
+        photos = db.session.get(Pump, ccn_pump).get_photos_list()
+    assert sorted(photos) == ["first.png", "second.png"]
@@ -0,0 +1,251 @@
+"""Tests for pump telemetry ingestion and rollups"""
+
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from portfolio_app import db
+from portfolio_app.services.pump_telemetry_service import (
+    PumpTelemetryService,
+    parse_reading_time,
+)
+from tests.conftest import make_pump
+
+pytestmark = pytest.mark.usefixtures("pumps_workdir")
+
+BASE = datetime(2026, 3, 2, 10, 0, 0)
+
+
+@pytest.fixture
+def telemetry_pumps(app, admin_user, monkeypatch):
+    """Two pumps; rollups are run explicitly instead of in the background"""
+    monkeypatch.setattr(
+        PumpTelemetryService, "schedule_rollup", staticmethod(lambda: None)
+    )
+    with app.app_context():
+        pumps = [
+            make_pump(admin_user.ccn_user, serial_number="SN-T1"),
+            make_pump(admin_user.ccn_user, serial_number="SN-T2"),
+        ]
+        db.session.add_all(pumps)
+        db.session.commit()
+        return [pump.ccn_pump for pump in pumps]
+
+
+def _ingest(client, auth_headers, readings):
+    body = "\n".join(
+        r if isinstance(r, str) else json.dumps(r, default=str) for r in readings
+    )
+    return client.post(
+        "/api/v1/pumps/telemetry",
+        headers=auth_headers,
+        data=body,
+        content_type="application/x-ndjson",
+    )
+
+
+def _reading(ccn_pump, minutes, **metrics):
+    return {
+        "ccn_pump": ccn_pump,
+        "recorded_at": (BASE + timedelta(minutes=minutes)).isoformat(),
+        **metrics,
+    }
+
+
+def test_ingest_reports_bad_lines_and_updates_last_values(
+    app, client, telemetry_pumps, auth_headers
+):
+    from sqlalchemy import event
+    from portfolio_app.models.tbl_pumps import Pump
+
+    first, second = telemetry_pumps
+    with app.app_context():
+        engine = db.engine
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        response = _ingest(
+            client,
+            auth_headers,
+            [
+                _reading(first, 2, flow_rate=110.0, pressure=3.0),
+                _reading(first, 1, flow_rate=100.0, pressure=2.0),
+                _reading(second, 1, flow_rate=90.0, pressure=1.5),
+                "not json",
+                _reading("missing-pump", 1, flow_rate=1.0),
+                _reading(first, 3),
+            ],
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+    report = response.get_json()
+    assert response.status_code == 201
+    assert (report["received"], report["accepted"], report["failed"]) == (6, 3, 3)
+    assert [error["row"] for error in report["errors"]] == [4, 5, 6]
+    assert report["pumps_updated"] == 2
+
+    pump_updates = [s for s in statements if s.startswith("UPDATE tbl_pumps")]
+    assert len(pump_updates) == 1
+
+    with app.app_context():
+        # The newest reading wins even though it arrived first
+        assert db.session.get(Pump, first).flow_rate == 110.0
+        assert db.session.get(Pump, second).pressure == 1.5
+        # Metrics that were not reported keep their value
+        assert db.session.get(Pump, first).voltage == 400.0
+
+
+def test_ingest_patches_last_values_into_the_snapshot(
+    app, client, telemetry_pumps, auth_headers, monkeypatch
+):
+    from portfolio_app.services.pump_snapshot_service import (
+        PumpSnapshot,
+        get_fleet_version,
+        get_pump_snapshot,
+    )
+
+    first, second = telemetry_pumps
+    app.config["PUMP_SNAPSHOT_REVALIDATE_SECONDS"] = 0
+    with app.app_context():
+        get_pump_snapshot().dataframe()
+        token = get_fleet_version().current()[0]
+
+    loads = []
+    load = PumpSnapshot._load
+    monkeypatch.setattr(
+        PumpSnapshot, "_load", lambda self: loads.append(1) or load(self)
+    )
+    response = _ingest(
+        client,
+        auth_headers,
+        [_reading(first, 1, flow_rate=123.5), _reading(second, 1, pressure=4.25)],
+    )
+    assert response.status_code == 201
+
+    with app.app_context():
+        frame = get_pump_snapshot().dataframe()
+        assert frame.loc[first, "flow_rate"] == 123.5
+        assert frame.loc[second, "pressure"] == 4.25
+        # Metrics that were not reported keep their value
+        assert frame.loc[second, "flow_rate"] == np.float32(120.5)
+        assert get_fleet_version().current()[0] != token
+    # Patched in place: the stamp check agrees, no reload
+    assert loads == []
+
+
+def test_late_readings_do_not_overwrite_newer_values(
+    app, client, telemetry_pumps, auth_headers
+):
+    from portfolio_app.models.tbl_pumps import Pump
+
+    pump = telemetry_pumps[0]
+    _ingest(client, auth_headers, [_reading(pump, 10, flow_rate=150.0)])
+    _ingest(client, auth_headers, [_reading(pump, 5, flow_rate=80.0)])
+
+    with app.app_context():
+        assert db.session.get(Pump, pump).flow_rate == 150.0
+
+
+def test_rollup_folds_readings_once_and_merges_buckets(
+    app, client, telemetry_pumps, auth_headers
+):
+    from portfolio_app.models.tbl_pump_reading_rollups import PumpReadingRollup
+
+    pump = telemetry_pumps[0]
+    _ingest(
+        client,
+        auth_headers,
+        [
+            _reading(pump, 0, flow_rate=10.0),
+            _reading(pump, 0.5, flow_rate=20.0),
+            _reading(pump, 1, flow_rate=30.0),
+        ],
+    )
+
+    with app.app_context():
+        assert PumpTelemetryService.rollup(settle_seconds=0) == 3
+        assert PumpTelemetryService.rollup(settle_seconds=0) == 0
+
+    _ingest(client, auth_headers, [_reading(pump, 0.75, flow_rate=60.0)])
+    with app.app_context():
+        # Readings still inside the settle window are left for a later run
+        assert PumpTelemetryService.rollup(settle_seconds=3600) == 0
+        assert PumpTelemetryService.rollup(settle_seconds=0) == 1
+
+        minute = db.session.get(PumpReadingRollup, (pump, "1m", BASE, "flow_rate"))
+        assert (minute.sample_count, minute.value_sum) == (3, 90.0)
+        assert (minute.value_min, minute.value_max) == (10.0, 60.0)
+
+        hour = db.session.get(PumpReadingRollup, (pump, "1h", BASE, "flow_rate"))
+        assert (hour.sample_count, hour.value_sum) == (4, 120.0)
+        day = db.session.get(
+            PumpReadingRollup,
+            (pump, "1d", BASE.replace(hour=0), "flow_rate"),
+        )
+        assert day.sample_count == 4
+
+
+def test_series_uses_coarsest_fitting_rollup(
+    app, client, telemetry_pumps, auth_headers
+):
+    pump = telemetry_pumps[0]
+    _ingest(
+        client,
+        auth_headers,
+        [
+            _reading(pump, minutes, power=float(minutes))
+            for minutes in range(0, 180, 15)
+        ],
+    )
+    with app.app_context():
+        PumpTelemetryService.rollup(settle_seconds=0)
+    # Not folded yet: must still show up in the series
+    _ingest(client, auth_headers, [_reading(pump, 185, power=1000.0)])
+
+    url = f"/api/v1/pumps/{pump}/telemetry"
+    window = {
+        "from": BASE.isoformat(),
+        "to": (BASE + timedelta(hours=4)).isoformat(),
+        "metrics": "power",
+    }
+
+    hourly = client.get(
+        url, headers=auth_headers, query_string={**window, "step": "1h"}
+    )
+    body = hourly.get_json()
+    assert body["resolution"] == "1h"
+    points = body["series"]["power"]
+    assert [p["count"] for p in points] == [4, 4, 4, 1]
+    assert points[0]["avg"] == 22.5
+    assert points[3]["max"] == 1000.0
+
+    # 4 hours over 10 points is a 24 minute step: minute buckets
+    fine = client.get(
+        url, headers=auth_headers, query_string={**window, "max_points": 10}
+    )
+    assert fine.get_json()["resolution"] == "1m"
+    assert len(fine.get_json()["series"]["power"]) == 13
+
+    raw = client.get(url, headers=auth_headers, query_string={**window, "step": "10s"})
+    assert raw.get_json()["resolution"] == "raw"
+
+    bad = client.get(url, headers=auth_headers, query_string={"metrics": "colour"})
+    assert bad.status_code == 400
+
+
+def test_parse_reading_time_accepts_epoch_strings():
+    epoch = BASE.timestamp()
+
+    assert parse_reading_time(str(int(epoch))) == BASE
+    assert parse_reading_time(f" {epoch + 0.5} ") == BASE + timedelta(seconds=0.5)
+    assert parse_reading_time(epoch) == BASE
+    assert parse_reading_time(BASE.isoformat()) == BASE
+    assert parse_reading_time("2026-03-02") == datetime(2026, 3, 2)
+    with pytest.raises(ValueError):
+        parse_reading_time("1e400")
@@ -0,0 +1,698 @@
+"""Tests for the pump list endpoints"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from portfolio_app import db
+from tests.conftest import make_pump
+
+pytestmark = pytest.mark.usefixtures("pumps_workdir")
+
+
+@pytest.fixture
+def ordered_pumps(app, admin_user):
+    """Five pumps with increasing created_at; returns their ids in keyset order"""
+    base = datetime(2025, 1, 1, 12, 0, 0)
+    with app.app_context():
+        pumps = []
+        for i in range(5):
+            pump = make_pump(admin_user.ccn_user, serial_number=f"SN-{i}")
+            pump.created_at = base + timedelta(minutes=i)
+            pumps.append(pump)
+        db.session.add_all(pumps)
+        db.session.commit()
+        return [pump.ccn_pump for pump in pumps]
+
+
+def _ids(response):
+    return [pump["ccn_pump"] for pump in response.get_json()["Pumps"]]
+
+
+def test_cursor_pagination_walks_forward_and_back(client, ordered_pumps, auth_headers):
+    first = client.get("/api/v1/pumps?cursor=&per_page=2", headers=auth_headers)
+    assert first.status_code == 200
+    assert _ids(first) == ordered_pumps[:2]
+    pagination = first.get_json()["pagination"]
+    assert pagination["has_next"] is True
+    assert pagination["has_prev"] is False
+    assert pagination["prev_cursor"] is None
+    assert "total" not in pagination
+
+    second = client.get(
+        f"/api/v1/pumps?cursor={pagination['next_cursor']}&per_page=2",
+        headers=auth_headers,
+    )
+    assert _ids(second) == ordered_pumps[2:4]
+
+    third = client.get(
+        f"/api/v1/pumps?cursor={second.get_json()['pagination']['next_cursor']}"
+        "&per_page=2",
+        headers=auth_headers,
+    )
+    assert _ids(third) == ordered_pumps[4:]
+    assert third.get_json()["pagination"]["has_next"] is False
+    assert third.get_json()["pagination"]["next_cursor"] is None
+
+    back = client.get(
+        f"/api/v1/pumps?cursor={third.get_json()['pagination']['prev_cursor']}"
+        "&per_page=2",
+        headers=auth_headers,
+    )
+    assert _ids(back) == ordered_pumps[2:4]
+    assert back.get_json()["pagination"]["has_prev"] is True
+
+
+def test_cursor_pagination_approximate_total(client, ordered_pumps, auth_headers):
+    response = client.get(
+        "/api/v1/pumps?cursor=&per_page=2&include_total=approx", headers=auth_headers
+    )
+
+    pagination = response.get_json()["pagination"]
+    assert pagination["total"] == 5
+    assert pagination["total_is_approximate"] is True
+
+
+def test_cursor_pagination_rejects_bad_token(client, auth_headers):
+    response = client.get("/api/v1/pumps?cursor=not-a-cursor", headers=auth_headers)
+
+    assert response.status_code == 400
+
+
+def test_offset_pagination_is_unchanged(client, ordered_pumps, auth_headers):
+    response = client.get("/api/v1/pumps?page=2&per_page=2", headers=auth_headers)
+
+    data = response.get_json()
+    assert len(data["Pumps"]) == 2
+    assert data["pagination"]["total"] == 5
+    assert data["pagination"]["pages"] == 3
+
+
+def test_export_ndjson_streams_one_record_per_line(client, ordered_pumps, auth_headers):
+    import json
+
+    response = client.get(
+        "/api/v1/pumps/all",
+        headers={**auth_headers, "Accept": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.get_data(as_text=True).splitlines()
+    records = [json.loads(line) for line in lines]
+    assert sorted(r["ccn_pump"] for r in records) == sorted(ordered_pumps)
+    assert records[0]["user_name"] == "Admin Test"
+    assert records[0]["photo_urls"] == []
+
+    # Same records as the JSON document, key for key
+    document = client.get("/api/v1/pumps/all", headers=auth_headers).get_json()
+    by_id = {p["ccn_pump"]: p for p in document["Pumps"]}
+    assert set(records[0]) == set(by_id[records[0]["ccn_pump"]])
+
+
+def test_export_csv(app, client, ordered_pumps, admin_user, auth_headers):
+    import csv
+    import io
+
+    response = client.get("/api/v1/pumps/all?format=csv", headers=auth_headers)
+
+    assert response.mimetype == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert len(rows) == 5
+    assert rows[0]["status"] == "Active"
+
+    # List fields are space-separated, not Python reprs
+    with app.app_context():
+        db.session.add(
+            make_pump(
+                admin_user.ccn_user, serial_number="SN-P", photos=["a.jpg", "b.png"]
+            )
+        )
+        db.session.commit()
+    response = client.get(
+        "/api/v1/pumps/all?format=csv&fields=serial_number,photos,photo_urls",
+        headers=auth_headers,
+    )
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    row = next(r for r in rows if r["serial_number"] == "SN-P")
+    assert row["photos"] == "a.jpg b.png"
+    assert rows[0]["photos"] == ""
+    assert "[" not in row["photo_urls"] and len(row["photo_urls"].split(" ")) == 2
+
+
+def test_sparse_fieldset_returns_only_requested_fields(
+    client, ordered_pumps, auth_headers
+):
+    response = client.get(
+        "/api/v1/pumps?fields=ccn_pump,status&per_page=2", headers=auth_headers
+    )
+
+    pumps = response.get_json()["Pumps"]
+    assert len(pumps) == 2
+    assert all(set(p) == {"ccn_pump", "status"} for p in pumps)
+
+    single = client.get(
+        f"/api/v1/pumps/{ordered_pumps[0]}?fields=serial_number,user_name",
+        headers=auth_headers,
+    ).get_json()["Pump"]
+    assert single == {"serial_number": "SN-0", "user_name": "Admin Test"}
+
+
+def test_sparse_fieldset_skips_user_join(app, client, ordered_pumps, auth_headers):
+    from sqlalchemy import event
+
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", record_statement)
+    try:
+        response = client.get(
+            "/api/v1/pumps?cursor=&fields=ccn_pump,model", headers=auth_headers
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", record_statement)
+
+    assert response.status_code == 200
+    listing = [s for s in statements if "FROM tbl_pumps" in s]
+    assert listing and "tbl_users" not in listing[-1]
+    assert "photos" not in listing[-1]
+
+
+def test_sparse_fieldset_rejects_unknown_fields(client, auth_headers):
+    response = client.get(
+        "/api/v1/pumps/all?fields=ccn_pump,bogus", headers=auth_headers
+    )
+
+    assert response.status_code == 400
+    assert "bogus" in response.get_json()["error"]
+
+
+def test_conditional_get_returns_304_without_pump_queries(
+    app, client, ordered_pumps, auth_headers
+):
+    from sqlalchemy import event
+
+    first = client.get("/api/v1/pumps?per_page=2", headers=auth_headers)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert first.headers["Last-Modified"]
+
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", record_statement)
+    try:
+        second = client.get(
+            "/api/v1/pumps?per_page=2",
+            headers={**auth_headers, "If-None-Match": etag},
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", record_statement)
+
+    assert second.status_code == 304
+    assert second.get_data() == b""
+    assert second.headers["ETag"] == etag
+    assert not [s for s in statements if "tbl_pumps" in s]
+
+    # Another representation of the same fleet gets its own tag
+    other = client.get("/api/v1/pumps?per_page=3", headers=auth_headers)
+    assert other.headers["ETag"] != etag
+
+
+def test_conditional_get_etag_changes_after_write(
+    app, client, ordered_pumps, auth_headers
+):
+    from portfolio_app.models.tbl_pumps import Pump
+
+    etag = client.get("/api/v1/analysis/pumps/summary", headers=auth_headers).headers[
+        "ETag"
+    ]
+
+    with app.app_context():
+        pump = db.session.get(Pump, ordered_pumps[0])
+        pump.status = "Repair"
+        db.session.commit()
+
+    response = client.get(
+        "/api/v1/analysis/pumps/summary",
+        headers={**auth_headers, "If-None-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.get_json()["status"]["Repair"] == 1
+
+
+def test_conditional_get_etag_follows_owner_renames(
+    app, client, ordered_pumps, admin_user, auth_headers
+):
+    from sqlalchemy import update
+    from portfolio_app.models.tbl_users import User
+
+    def listing(etag=None):
+        headers = {**auth_headers, "If-None-Match": etag} if etag else auth_headers
+        return client.get("/api/v1/pumps?fields=ccn_pump,user_name", headers=headers)
+
+    etag = listing().headers["ETag"]
+    with app.app_context():
+        user = db.session.get(User, admin_user.ccn_user)
+        user.first_name = "Renamed"
+        db.session.commit()
+
+    response = listing(etag)
+    assert response.status_code == 200
+    assert response.get_json()["Pumps"][0]["user_name"].startswith("Renamed")
+
+    # A rename committed by another worker shows up through MAX(updated_at)
+    etag = response.headers["ETag"]
+    app.config["PUMP_SNAPSHOT_REVALIDATE_SECONDS"] = 0
+    with app.app_context():
+        db.session.execute(
+            update(User)
+            .where(User.ccn_user == admin_user.ccn_user)
+            .values(first_name="Elsewhere", updated_at=datetime.now() + timedelta(1))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+    assert listing(etag).status_code == 200
+
+
+BULK_CSV_HEADER = (
+    "model,serial_number,location,purchase_date,status,flow_rate,pressure,power,"
+    "efficiency,voltage,current,power_factor,last_maintenance,next_maintenance\n"
+)
+
+
+def _bulk_csv_row(serial, **overrides):
+    values = {
+        "model": "Model X",
+        "serial_number": serial,
+        "location": "Building A - Room 1",
+        "purchase_date": "2024-01-10",
+        "status": "Active",
+        "flow_rate": "120.5",
+        "pressure": "3.2",
+        "power": "15.0",
+        "efficiency": "0.85",
+        "voltage": "380",
+        "current": "25.0",
+        "power_factor": "0.9",
+        "last_maintenance": "2025-01-01",
+        "next_maintenance": "2025-06-01T08:00:00",
+    }
+    values.update(overrides)
+    return ",".join(values.values()) + "\n"
+
+
+def test_bulk_import_csv_reports_row_errors(app, client, auth_headers, tmp_path):
+    import io
+    import os
+    from portfolio_app.models.tbl_pumps import Pump
+
+    body = (
+        BULK_CSV_HEADER
+        + _bulk_csv_row("BULK-1")
+        + _bulk_csv_row("BULK-2", flow_rate="fast")
+        + _bulk_csv_row("BULK-3", next_maintenance="someday")
+        + _bulk_csv_row("BULK-4")
+    )
+
+    response = client.post(
+        "/api/v1/pumps/bulk",
+        headers=auth_headers,
+        data={"file": (io.BytesIO(body.encode()), "pumps.csv")},
+        content_type="multipart/form-data",
+    )
+
+    assert response.status_code == 201
+    report = response.get_json()
+    assert report["received"] == 4
+    assert report["imported"] == 2
+    assert [e["row"] for e in report["errors"]] == [2, 3]
+    assert "flow_rate" in report["errors"][0]["error"]
+
+    with app.app_context():
+        serials = {p.serial_number for p in Pump.query.all()}
+    assert serials == {"BULK-1", "BULK-4"}
+    # Photo directories are only created when a photo is uploaded
+    assert not os.path.exists(tmp_path / "portfolio_app" / "static" / "pumps")
+
+    summary = client.get("/api/v1/analysis/pumps/summary", headers=auth_headers)
+    assert summary.get_json()["total_pumps"] == 2
+
+
+def test_bulk_import_ndjson_body_checks_owner(app, client, auth_headers, admin_user):
+    import json
+
+    base = {
+        "model": "Model Y",
+        "location": "Building B - Room 1",
+        "purchase_date": "2024-01-10",
+        "status": "Standby",
+        "flow_rate": 90,
+        "pressure": 2.5,
+        "power": 10,
+        "efficiency": 0.8,
+        "voltage": 220,
+        "current": 12,
+        "power_factor": 0.88,
+        "last_maintenance": "2025-01-01",
+        "next_maintenance": "2025-07-01",
+    }
+    lines = [
+        json.dumps({**base, "serial_number": "ND-1"}),
+        "{not json",
+        json.dumps({**base, "serial_number": "ND-3", "user_id": 999999}),
+        json.dumps({**base, "serial_number": "ND-4", "user_id": admin_user.ccn_user}),
+    ]
+
+    response = client.post(
+        "/api/v1/pumps/bulk",
+        headers={**auth_headers, "Content-Type": "application/x-ndjson"},
+        data="\n".join(lines),
+    )
+
+    report = response.get_json()
+    assert response.status_code == 201
+    assert report["imported"] == 2
+    assert [e["row"] for e in report["errors"]] == [2, 3]
+    assert "999999" in report["errors"][1]["error"]
+
+
+def test_bulk_import_rejects_unknown_format(client, auth_headers):
+    response = client.post(
+        "/api/v1/pumps/bulk",
+        headers={**auth_headers, "Content-Type": "application/xml"},
+        data="<pumps/>",
+    )
+
+    assert response.status_code == 400
+
+
+def test_bulk_patch_by_filter(app, client, ordered_pumps, auth_headers):
+    from portfolio_app.models.tbl_pumps import Pump
+
+    response = client.patch(
+        "/api/v1/pumps/bulk",
+        headers=auth_headers,
+        json={
+            "filter": {"status": "Active", "location": "Building A - Room 1"},
+            "changes": {"status": "Maintenance", "pressure": "4.5"},
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.get_json()["updated"] == 5
+    with app.app_context():
+        pumps = db.session.query(Pump.status, Pump.pressure).all()
+    assert set(pumps) == {("Maintenance", 4.5)}
+
+    summary = client.get("/api/v1/analysis/pumps/summary", headers=auth_headers)
+    assert summary.get_json()["status"] == {"Maintenance": 5}
+
+
+def test_bulk_patch_validates_changes(client, ordered_pumps, auth_headers):
+    no_selection = client.patch(
+        "/api/v1/pumps/bulk", headers=auth_headers, json={"changes": {"status": "X"}}
+    )
+    bad_field = client.patch(
+        "/api/v1/pumps/bulk",
+        headers=auth_headers,
+        json={"ids": ordered_pumps[:1], "changes": {"ccn_pump": "x"}},
+    )
+    bad_value = client.patch(
+        "/api/v1/pumps/bulk",
+        headers=auth_headers,
+        json={"ids": ordered_pumps[:1], "changes": {"power": "lots"}},
+    )
+
+    assert no_selection.status_code == 400
+    assert bad_field.status_code == 400
+    assert bad_value.status_code == 400
+
+
+def test_bulk_delete_by_ids_cleans_photo_directories(
+    app, client, ordered_pumps, auth_headers, tmp_path
+):
+    import time
+    from portfolio_app.models.tbl_pumps import Pump
+
+    pump_dirs = [
+        tmp_path / "portfolio_app" / "static" / "pumps" / ccn for ccn in ordered_pumps
+    ]
+    assert all(path.exists() for path in pump_dirs)
+
+    response = client.delete(
+        "/api/v1/pumps/bulk", headers=auth_headers, json={"ids": ordered_pumps[:3]}
+    )
+
+    assert response.status_code == 200
+    assert response.get_json()["deleted"] == 3
+    with app.app_context():
+        remaining = {p.ccn_pump for p in Pump.query.all()}
+    assert remaining == set(ordered_pumps[3:])
+
+    deadline = time.monotonic() + 5
+    while any(p.exists() for p in pump_dirs[:3]) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not any(p.exists() for p in pump_dirs[:3])
+    assert all(p.exists() for p in pump_dirs[3:])
+
+
+@pytest.fixture
+def maintenance_pumps(app, admin_user):
+    """Pumps due at various offsets from now, in two locations"""
+    now = datetime.now()
+    plan = [
+        ("SN-OVERDUE", "Plant North", "Active", -3),
+        ("SN-SOON", "Plant North", "Active", 2),
+        ("SN-WEEK", "Plant South", "Maintenance", 6),
+        ("SN-MONTH", "Plant South", "Active", 20),
+        ("SN-LATER", "Plant South", "Active", 90),
+    ]
+    with app.app_context():
+        for serial, location, status, days in plan:
+            db.session.add(
+                make_pump(
+                    admin_user.ccn_user,
+                    serial_number=serial,
+                    location=location,
+                    status=status,
+                    next_maintenance=now + timedelta(days=days),
+                )
+            )
+        db.session.commit()
+
+
+def _serials(response):
+    return [pump["serial_number"] for pump in response.get_json()["Pumps"]]
+
+
+def test_maintenance_due_within_window(client, maintenance_pumps, auth_headers):
+    url = "/api/v1/pumps/maintenance/due"
+
+    week = client.get(f"{url}?within=7d&fields=serial_number", headers=auth_headers)
+    assert _serials(week) == ["SN-OVERDUE", "SN-SOON", "SN-WEEK"]
+    assert (week.get_json()["overdue"], week.get_json()["upcoming"]) == (1, 2)
+    assert set(week.get_json()["Pumps"][0]) == {"serial_number"}
+
+    upcoming = client.get(
+        f"{url}?within=1w&include_overdue=false&status=Active", headers=auth_headers
+    )
+    assert _serials(upcoming) == ["SN-SOON"]
+
+    capped = client.get(f"{url}?within=30d&limit=2", headers=auth_headers)
+    assert len(_serials(capped)) == 2 and capped.get_json()["truncated"]
+
+    assert client.get(f"{url}?within=soon", headers=auth_headers).status_code == 400
+    for within in ("inf", "1e400d", "99999999999d"):
+        response = client.get(f"{url}?within={within}", headers=auth_headers)
+        assert response.status_code == 400
+
+
+def test_maintenance_due_query_uses_index(app):
+    from sqlalchemy import text
+
+    with app.app_context():
+        plan = db.session.execute(
+            text(
+                "EXPLAIN QUERY PLAN SELECT ccn_pump FROM tbl_pumps "
+                "WHERE status = 'Active' AND next_maintenance < '2030-01-01'"
+            )
+        ).all()
+    assert "idx_pumps_status_next_maintenance" in " ".join(str(row) for row in plan)
+
+
+def test_maintenance_summary_buckets_per_location(
+    app, client, maintenance_pumps, auth_headers
+):
+    url = "/api/v1/pumps/maintenance/summary"
+
+    response = client.get(url, headers=auth_headers)
+    summary = response.get_json()
+    by_location = {entry["location"]: entry for entry in summary["locations"]}
+    assert (
+        by_location["Plant North"]["overdue"],
+        by_location["Plant North"]["due_7d"],
+    ) == (1, 1)
+    assert (
+        by_location["Plant South"]["due_7d"],
+        by_location["Plant South"]["due_30d"],
+    ) == (1, 1)
+    assert summary["totals"] == {"overdue": 1, "due_7d": 2, "due_30d": 1}
+
+    # The published document is reused until the fleet changes
+    cached = client.get(
+        url, headers={**auth_headers, "If-None-Match": response.headers["ETag"]}
+    )
+    assert cached.status_code == 304
+
+    with app.app_context():
+        from portfolio_app.models.tbl_pumps import Pump
+
+        pump = Pump.query.filter_by(serial_number="SN-LATER").one()
+        pump.next_maintenance = datetime.now() - timedelta(days=1)
+        db.session.commit()
+
+    refreshed = client.get(
+        url, headers={**auth_headers, "If-None-Match": response.headers["ETag"]}
+    )
+    assert refreshed.status_code == 200
+    assert refreshed.get_json()["totals"]["overdue"] == 2
+
+
+@pytest.fixture
+def search_pumps(app, admin_user):
+    """Pumps with overlapping serials, models and locations"""
+    plan = [
+        ("SN-4410", "Grundfos CR-10", "Plant North"),
+        ("SN-4411", "Grundfos CR-15", "Plant South"),
+        ("XK-0441", "KSB Etanorm", "Warehouse <B>"),
+        ("SN-9000", "KSB Etanorm", "Plant North"),
+    ]
+    with app.app_context():
+        for serial, model, location in plan:
+            db.session.add(
+                make_pump(
+                    admin_user.ccn_user,
+                    serial_number=serial,
+                    model=model,
+                    location=location,
+                )
+            )
+        db.session.commit()
+
+
+def _search(client, auth_headers, q, **params):
+    response = client.get(
+        "/api/v1/pumps/search", headers=auth_headers, query_string={"q": q, **params}
+    )
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_search_ranks_and_highlights_matches(app, client, search_pumps, auth_headers):
+    body = _search(client, auth_headers, "441")
+    assert body["backend"] == "memory"
+    # Serial prefix matches rank above a match inside the serial
+    assert [r["serial_number"] for r in body["results"]] == [
+        "SN-4410",
+        "SN-4411",
+        "XK-0441",
+    ]
+    assert body["results"][0]["highlights"] == {"serial_number": "SN-<mark>441</mark>0"}
+
+    # Every token must match; highlights are HTML-escaped
+    body = _search(client, auth_headers, "ksb warehouse")
+    assert [r["serial_number"] for r in body["results"]] == ["XK-0441"]
+    assert body["results"][0]["highlights"]["location"] == (
+        "<mark>Warehouse</mark> &lt;B&gt;"
+    )
+
+    # Short tokens match by prefix
+    assert _search(client, auth_headers, "pl n")["total"] == 2
+
+    response = client.get("/api/v1/pumps/search?q=", headers=auth_headers)
+    assert response.status_code == 400
+
+    # ORM writes are patched into the index on commit
+    with app.app_context():
+        from portfolio_app.models.tbl_pumps import Pump
+
+        pump = Pump.query.filter_by(serial_number="SN-9000").one()
+        pump.location = "Dock 7"
+        db.session.delete(Pump.query.filter_by(serial_number="XK-0441").one())
+        db.session.commit()
+
+    assert [
+        r["serial_number"] for r in _search(client, auth_headers, "dock")["results"]
+    ] == ["SN-9000"]
+    assert _search(client, auth_headers, "ksb")["total"] == 1
+
+
+def test_search_database_backend_matches_memory(
+    app, client, search_pumps, auth_headers
+):
+    queries = ["441", "ksb warehouse", "grundfos", "cr-1 south"]
+    memory = {q: _search(client, auth_headers, q) for q in queries}
+
+    app.config["PUMP_SEARCH_BACKEND"] = "database"
+    try:
+        for q in queries:
+            body = _search(client, auth_headers, q)
+            assert body["backend"] == "database"
+            assert body["total"] == memory[q]["total"]
+            assert body["results"] == memory[q]["results"]
+    finally:
+        app.config["PUMP_SEARCH_BACKEND"] = "memory"
+
+    # Fleets over the index size limit are searched in the database
+    app.config["PUMP_SEARCH_MAX_INDEXED_PUMPS"] = 2
+    with app.app_context():
+        from portfolio_app.services.pump_search_service import get_pump_search_index
+
+        get_pump_search_index().invalidate()
+    try:
+        assert _search(client, auth_headers, "grundfos")["backend"] == "database"
+    finally:
+        app.config["PUMP_SEARCH_MAX_INDEXED_PUMPS"] = 250000
+
+
+def test_pump_change_feed_publishes_commits_only(app, search_pumps, monkeypatch):
+    from portfolio_app.models.tbl_pumps import Pump
+    from portfolio_app.services import pump_snapshot_service
+
+    published = []
+    monkeypatch.setattr(
+        pump_snapshot_service,
+        "_change_subscribers",
+        pump_snapshot_service._change_subscribers
+        + [lambda engine, changes: published.append(dict(changes))],
+    )
+
+    with app.app_context():
+        pump = Pump.query.filter_by(serial_number="SN-9000").one()
+        pump.location = "Dock 7"
+        db.session.flush()
+        db.session.rollback()
+        assert published == []
+
+        pump = Pump.query.filter_by(serial_number="SN-9000").one()
+        pump.location = "Dock 7"
+        moved_id = pump.ccn_pump
+        gone = Pump.query.filter_by(serial_number="XK-0441").one()
+        gone_id = gone.ccn_pump
+        db.session.delete(gone)
+        db.session.commit()
+
+    # One batch per commit, shared by the snapshot and the search index
+    assert len(published) == 1
+    assert published[0][gone_id] is None
+    row = published[0][moved_id]["row"]
+    assert row[pump_snapshot_service.SNAPSHOT_COLUMNS.index("location")] == "Dock 7"
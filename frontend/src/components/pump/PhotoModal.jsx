@@ -6,6 +6,10 @@ import {
 } from "@heroicons/react/24/outline";
 import PropTypes from "prop-types";
 
+// photo_urls point at thumbnails; request a larger rendition for the main view
+const photoAtSize = (photoUrl, size) =>
+  photoUrl ? `${photoUrl.split("?")[0]}?size=${size}` : photoUrl;
+
 const PhotoModal = ({ isOpen, onClose, pump, photoOrder, setPhotoOrder }) => {
   const [currentPhotoIndex, setCurrentPhotoIndex] = useState(0);
 
@@ -88,7 +92,7 @@ const PhotoModal = ({ isOpen, onClose, pump, photoOrder, setPhotoOrder }) => {
               {/* Main Photo */}
               <div className="flex items-center justify-center">
                 <img
-                  src={currentPhoto}
+                  src={photoAtSize(currentPhoto, "medium")}
                   alt={`Pump photo ${currentPhotoIndex + 1}`}
                   className="max-w-full max-h-[60vh] object-contain rounded-lg"
                 />
@@ -75,7 +75,8 @@ const PumpDetailModal = ({
   // Helper function to extract filename from URL
   const getPhotoFilename = (photoUrl) => {
     if (!photoUrl) return null;
-    const urlParts = photoUrl.split("/");
+    // photo_urls carry a ?size= rendition query after the filename
+    const urlParts = photoUrl.split("?")[0].split("/");
     return urlParts[urlParts.length - 1];
   };
 
@@ -352,7 +353,7 @@ const PumpDetailModal = ({
                   <div className="relative group">
                     {currentPhoto && !imageError ? (
                       <img
-                        src={currentPhoto}
+                        src={`${currentPhoto.split("?")[0]}?size=medium`}
                         alt={`Equipment documentation ${validIndex + 1}`}
                         onError={() => setImageError(true)}
                         className="w-full h-64 object-cover rounded-lg border border-slate-200 dark:border-gray-600"